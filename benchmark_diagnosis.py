@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+Diagnosis Benchmark - Offline latency/throughput benchmark of every diagnosis engine
+Runs a fixed, seeded corpus of synthetic patient profiles and stores the results as JSON
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
+import platform
+import resource
+import subprocess
+import importlib.util
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from diagnosis_index import DiagnosisIndex
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OUTPUT = 'benchmark_results.json'
+
+# Synthetic profiles: 1-20 present symptoms, drawn from common (low IC) or rare (high IC) symptoms
+PROFILE_KINDS = ('common', 'rare')
+MAX_PRESENT_SYMPTOMS = 20
+MAX_ABSENT_SYMPTOMS = 2
+
+PERCENTILES = (50, 95, 99)
+
+# The loop-based engines take seconds to minutes per profile on the full dataset
+DEFAULT_TIME_BUDGET = 30.0
+
+
+def make_profiles(index: DiagnosisIndex, n_profiles: int = 200, seed: int = 42) -> List[Dict[str, Any]]:
+    """
+    Deterministic synthetic patient profiles. Each profile is anchored on a random disorder:
+    'common' profiles take its most widespread symptoms, 'rare' ones its most specific,
+    topped up with random index symptoms when the disorder has fewer annotations.
+    """
+    rng = np.random.default_rng(seed)
+    symptom_of_posting = np.repeat(np.arange(index.n_symptoms), np.diff(index.indptr))
+
+    profiles = []
+    for i in range(n_profiles):
+        kind = PROFILE_KINDS[i % len(PROFILE_KINDS)]
+        n_present = 1 + i // len(PROFILE_KINDS) % MAX_PRESENT_SYMPTOMS
+
+        disease_id = int(rng.integers(index.n_diseases))
+        annotated = symptom_of_posting[index.indices == disease_id]
+        by_ic = annotated[np.argsort(index.symptom_ic[annotated], kind='stable')]
+        if kind == 'rare':
+            by_ic = by_ic[::-1]
+
+        present = by_ic[:n_present].tolist()
+        others = np.setdiff1d(np.arange(index.n_symptoms), present)
+        if len(present) < n_present:
+            present += rng.choice(others, size=min(n_present - len(present), len(others)), replace=False).tolist()
+            others = np.setdiff1d(others, present)
+
+        n_absent = int(rng.integers(MAX_ABSENT_SYMPTOMS + 1))
+        absent = rng.choice(others, size=min(n_absent, len(others)), replace=False).tolist()
+
+        profiles.append({
+            'kind': kind,
+            'present': [index.symptom_names[s] for s in present],
+            'absent': [index.symptom_names[s] for s in absent]
+        })
+    return profiles
+
+
+def load_replay_profiles(path: str, index: DiagnosisIndex) -> List[Dict[str, Any]]:
+    """
+    Profiles from the slow request log: DIAGNOSIS_SLOW_LOG JSON lines or a saved /debug/slow-requests response.
+    Symptoms unknown to the index are dropped, as the API does; redacted entries (logged while
+    profiling was disabled) carry no inputs and are skipped.
+    """
+    with open(path) as f:
+        text = f.read()
+    try:
+        data = json.loads(text)
+        entries = data['requests'] if isinstance(data, dict) else data
+    except json.JSONDecodeError:
+        entries = [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    known = set(index.symptom_names)
+    profiles = []
+    redacted = sum('request' not in entry for entry in entries)
+    if redacted:
+        logger.warning(f"⚠️ {redacted} of {len(entries)} entries in {path} are redacted (DIAGNOSIS_PROFILING was off)")
+    for entry in entries:
+        request = entry.get('request')
+        if request is None:
+            continue
+        present = [s for s in request.get('present_symptoms', []) if s in known]
+        if not present:
+            continue
+        profiles.append({
+            'kind': 'replay',
+            'present': present,
+            'absent': [s for s in request.get('absent_symptoms', []) if s in known],
+            'request_id': entry.get('request_id')
+        })
+    return profiles
+
+
+def corpus_hash(profiles: List[Dict[str, Any]]) -> str:
+    """Short digest of the corpus, to check two result files ran the same profiles"""
+    return hashlib.sha256(json.dumps(profiles, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far (ru_maxrss is KB on Linux, bytes on macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def summarize(latencies_ms: List[float]) -> Dict[str, float]:
+    """Latency percentiles, mean and throughput for one set of calls"""
+    latencies = np.asarray(latencies_ms, dtype=np.float64)
+    if not len(latencies):
+        return {'calls': 0}
+
+    summary = {'calls': int(len(latencies)), 'mean_ms': float(latencies.mean())}
+    for p in PERCENTILES:
+        summary[f'p{p}_ms'] = float(np.percentile(latencies, p))
+    summary['throughput_per_s'] = float(len(latencies) / (latencies.sum() / 1000)) if latencies.sum() > 0 else 0.0
+    return summary
+
+
+def run_engine(
+    run: Callable[[Dict[str, Any]], Any],
+    profiles: List[Dict[str, Any]],
+    warmup: int = 3,
+    time_budget: Optional[float] = None
+) -> Dict[str, Any]:
+    """Time run(profile) over the corpus; warm-up and timed calls each stop once time_budget seconds are spent"""
+    started = time.perf_counter()
+    for profile in profiles[:warmup]:
+        run(profile)
+        if time_budget is not None and time.perf_counter() - started > time_budget:
+            break
+
+    rss_before = peak_rss_mb()
+    latencies = {kind: [] for kind in PROFILE_KINDS}
+    started = time.perf_counter()
+
+    for profile in profiles:
+        call_start = time.perf_counter()
+        run(profile)
+        latencies.setdefault(profile['kind'], []).append((time.perf_counter() - call_start) * 1000)
+
+        if time_budget is not None and time.perf_counter() - started > time_budget:
+            break
+
+    result = summarize([ms for kind in latencies for ms in latencies[kind]])
+    result['by_kind'] = {kind: summarize(latencies[kind]) for kind in latencies}
+    result['peak_rss_mb'] = peak_rss_mb()
+    result['rss_growth_mb'] = result['peak_rss_mb'] - rss_before
+    result['complete'] = result['calls'] == len(profiles)
+    return result
+
+
+def _relevant_diseases(disease_data, present: List[str]) -> List[str]:
+    """Disorders annotated with a present symptom, as selected by the regular /diagnose path"""
+    relevant = disease_data.loc[disease_data['hpo_term'].isin(present), 'disorder_name'].unique()
+    return sorted(relevant)
+
+
+def loop_engine(module, function_name: str, top_n: int = 10) -> Callable[[Dict[str, Any]], Any]:
+    """One request of a per-disease engine: score every relevant disorder, keep the top_n"""
+    calculate = getattr(module, function_name)
+
+    def run(profile: Dict[str, Any]):
+        scored = [
+            (calculate(disease, profile['present'], profile['absent'])['probability'], disease)
+            for disease in _relevant_diseases(module.disease_data, profile['present'])
+        ]
+        return sorted(scored, reverse=True)[:top_n]
+
+    return run
+
+
+def load_railway_main():
+    """railway-deploy/main.py (home of calculate_true_bayesian_probability) under its own module name"""
+    deploy_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'railway-deploy')
+    if deploy_dir not in sys.path:
+        sys.path.append(deploy_dir)  # its Supabase clients; the shared modules resolve to the root copies
+    spec = importlib.util.spec_from_file_location('railway_main', os.path.join(deploy_dir, 'main.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def build_engines(fast_diagnosis, data_path: Optional[str], top_n: int = 10) -> Dict[str, Optional[Callable]]:
+    """Engine name -> run(profile); None for engines whose data or dependencies are missing"""
+    index = fast_diagnosis.index
+    engines: Dict[str, Optional[Callable]] = {
+        'ultra_fast': lambda p: fast_diagnosis.ultra_fast_diagnosis(p['present'], p['absent'], top_n),
+        'ultra_fast_ic': lambda p: fast_diagnosis.ultra_fast_diagnosis(p['present'], p['absent'], top_n, weighting='ic'),
+        'bayesian_index': lambda p: fast_diagnosis.bayesian_diagnosis(p['present'], p['absent'], top_n),
+        'bayesian_index_groups': None,
+        'bayesian_propagate': None,
+        'ic_similarity': None,
+        'calculate_bayesian_probability': None,
+        'calculate_true_bayesian_probability': None
+    }
+
+    if index.group_ids is not None:
+        engines['bayesian_index_groups'] = lambda p: fast_diagnosis.bayesian_diagnosis(
+            p['present'], p['absent'], top_n, top_groups=5
+        )
+    if index.ontology is not None:
+        engines['bayesian_propagate'] = lambda p: fast_diagnosis.bayesian_diagnosis(
+            p['present'], p['absent'], top_n, scoring='propagate'
+        )
+        engines['ic_similarity'] = lambda p: fast_diagnosis.bayesian_diagnosis(
+            p['present'], p['absent'], top_n, scoring='ic_similarity'
+        )
+
+    try:
+        import main as api_main
+        if api_main.load_disease_data(data_path):
+            engines['calculate_bayesian_probability'] = loop_engine(api_main, 'calculate_bayesian_probability', top_n)
+    except Exception as e:
+        logger.warning(f"⚠️ calculate_bayesian_probability unavailable: {e}")
+
+    try:
+        railway_main = load_railway_main()
+        if railway_main.load_disease_data(data_path):
+            engines['calculate_true_bayesian_probability'] = loop_engine(
+                railway_main, 'calculate_true_bayesian_probability', top_n
+            )
+    except Exception as e:
+        logger.warning(f"⚠️ calculate_true_bayesian_probability unavailable: {e}")
+
+    return engines
+
+
+def git_commit() -> Optional[str]:
+    """Current commit hash, when run inside the git checkout"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]):
+    """Print p50/p95 ratios against a previous result file (> 1.0 means slower now)"""
+    if current['corpus_hash'] != baseline.get('corpus_hash'):
+        print("⚠️  Baseline ran a different profile corpus - ratios are indicative only")
+
+    print(f"\n📈 Compared with {baseline.get('git_commit') or 'baseline'}:")
+    for name, result in current['engines'].items():
+        old = baseline.get('engines', {}).get(name)
+        if not result.get('calls') or not old or not old.get('calls'):
+            continue
+        ratios = [f"p{p} x{result[f'p{p}_ms'] / old[f'p{p}_ms']:.2f}" for p in (50, 95) if old[f'p{p}_ms'] > 0]
+        print(f"  {name:38s} {'  '.join(ratios)}")
+
+
+def print_report(report: Dict[str, Any]):
+    """Human-readable table of the engine results"""
+    print(f"\n⏱️  {report['n_profiles']} profiles, {report['dataset']['n_diseases']} diseases, "
+          f"{report['dataset']['n_symptoms']} symptoms")
+    print(f"  {'engine':38s} {'calls':>6s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} {'req/s':>9s} {'RSS MB':>8s}")
+    for name, result in report['engines'].items():
+        if not result.get('calls'):
+            print(f"  {name:38s} skipped")
+            continue
+        print(f"  {name:38s} {result['calls']:6d} {result['p50_ms']:9.2f} {result['p95_ms']:9.2f} "
+              f"{result['p99_ms']:9.2f} {result['throughput_per_s']:9.1f} {result['peak_rss_mb']:8.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the diagnosis engines on synthetic patient profiles')
+    parser.add_argument('--data', help='Clinical signs dataset (default: cache, then file/ lookup)')
+    parser.add_argument('--profiles', type=int, default=200, help='Number of synthetic profiles')
+    parser.add_argument('--seed', type=int, default=42, help='Seed of the profile corpus')
+    parser.add_argument('--replay', help='Benchmark the inputs of a slow request log instead of synthetic profiles')
+    parser.add_argument('--engines', nargs='+', help='Only run these engines')
+    parser.add_argument('--warmup', type=int, default=3, help='Untimed calls before each engine')
+    parser.add_argument('--time-budget', type=float, default=DEFAULT_TIME_BUDGET,
+                        help='Seconds per engine before stopping early (0 = run the whole corpus)')
+    parser.add_argument('--output', '-o', default=DEFAULT_OUTPUT, help='JSON result file')
+    parser.add_argument('--compare', help='Previous JSON result file to compare against')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    from local_fast_diagnosis import fast_diagnosis, initialize_fast_diagnosis
+
+    load_start = time.perf_counter()
+    ready = fast_diagnosis.load_and_precompute(args.data) if args.data else initialize_fast_diagnosis()
+    if not ready or fast_diagnosis.index is None:
+        print("❌ Diagnosis data could not be loaded")
+        sys.exit(1)
+    load_seconds = time.perf_counter() - load_start
+
+    index = fast_diagnosis.index
+    profiles = load_replay_profiles(args.replay, index) if args.replay else make_profiles(index, args.profiles, args.seed)
+    if not profiles:
+        print(f"❌ No replayable requests in {args.replay}")
+        sys.exit(1)
+    engines = build_engines(fast_diagnosis, args.data)
+    if args.engines:
+        unknown = set(args.engines) - set(engines)
+        if unknown:
+            parser.error(f"Unknown engine(s): {', '.join(sorted(unknown))}")
+        engines = {name: engines[name] for name in args.engines}
+
+    report = {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'dataset': {'path': args.data, 'n_diseases': index.n_diseases, 'n_symptoms': index.n_symptoms},
+        'load_seconds': load_seconds,
+        'seed': args.seed,
+        'replay': args.replay,
+        'n_profiles': len(profiles),
+        'corpus_hash': corpus_hash(profiles),
+        'engines': {}
+    }
+
+    for name, run in engines.items():
+        if run is None:
+            report['engines'][name] = {'calls': 0, 'skipped': True}
+            continue
+        print(f"🏃 {name}...")
+        report['engines'][name] = run_engine(run, profiles, args.warmup, args.time_budget or None)
+
+    print_report(report)
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Results saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+XML Backend Benchmark - lxml vs ElementTree on the Orphanet readers' workload
+Times whole-tree parsing, path lookups over the tree and streamed batches on the _SM.txt samples
+and on a synthetic file of full-size Orphanet shape, and stores the results as JSON
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+from xml.sax.saxutils import escape
+
+from xml_backend import BACKENDS, LXML_AVAILABLE, XMLBackend
+
+DEFAULT_OUTPUT = 'benchmark_xml_backends.json'
+
+# Shape of the full clinical signs dump (~4300 disorders with ~25 HPO annotations each)
+FULL_SIZE_DISORDERS = 4300
+ANNOTATIONS_PER_DISORDER = 25
+
+FREQUENCIES = ['Very frequent (99-80%)', 'Frequent (79-30%)', 'Occasional (29-5%)', 'Very rare (<4-1%)']
+
+
+def synthesize(path: str, n_disorders: int = FULL_SIZE_DISORDERS, seed: int = 42):
+    """Write a clinical-signs-shaped JDBOR file with n_disorders disorders"""
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='ISO-8859-1') as f:
+        f.write('<?xml version="1.0" encoding="ISO-8859-1"?>\n<JDBOR date="2024-01-01" version="1.3.16">\n')
+        f.write(f'  <HPODisorderSetStatusList count="{n_disorders}">\n')
+        for i in range(n_disorders):
+            code = 1000 + i
+            f.write(f'    <HPODisorderSetStatus id="{i}">\n      <Disorder id="{i}">\n'
+                    f'        <OrphaCode>{code}</OrphaCode>\n'
+                    f'        <ExpertLink lang="en">http://www.orpha.net/consor/cgi-bin/OC_Exp.php?lng=en&amp;Expert={code}</ExpertLink>\n'
+                    f'        <Name lang="en">Synthetic disorder {code}</Name>\n'
+                    f'        <DisorderType id="21394"><Name lang="en">Disease</Name></DisorderType>\n'
+                    f'        <DisorderGroup id="36547"><Name lang="en">Disorder</Name></DisorderGroup>\n')
+            n_annotations = rng.randint(1, 2 * ANNOTATIONS_PER_DISORDER)
+            f.write(f'        <HPODisorderAssociationList count="{n_annotations}">\n')
+            for j in range(n_annotations):
+                hpo = rng.randint(1, 20000)
+                f.write(f'          <HPODisorderAssociation id="{i * 100 + j}">\n'
+                        f'            <HPO id="{hpo}"><HPOId>HP:{hpo:07d}</HPOId><HPOTerm>Phenotype {hpo}</HPOTerm></HPO>\n'
+                        f'            <HPOFrequency id="28405"><Name lang="en">{escape(rng.choice(FREQUENCIES))}</Name></HPOFrequency>\n'
+                        f'            <DiagnosticCriteria/>\n'
+                        f'          </HPODisorderAssociation>\n')
+            f.write('        </HPODisorderAssociationList>\n      </Disorder>\n'
+                    '      <Source>ORPHA:1</Source>\n      <ValidationStatus>y</ValidationStatus>\n'
+                    '    </HPODisorderSetStatus>\n')
+        f.write('  </HPODisorderSetStatusList>\n</JDBOR>\n')
+
+
+def extract(backend: XMLBackend, disorder: Any) -> int:
+    """The converter's lookups for one disorder; returns the number of values read"""
+    values = [
+        backend.findtext(disorder, './/OrphaCode'),
+        backend.findtext(disorder, './/Name[@lang="en"]'),
+        backend.findtext(disorder, './/DisorderType/Name[@lang="en"]'),
+        backend.findtext(disorder, './/DisorderGroup/Name[@lang="en"]'),
+        backend.findtext(disorder, './/ExpertLink[@lang="en"]'),
+    ]
+    for assoc in backend.findall(disorder, './/HPODisorderAssociation'):
+        values.append(backend.findtext(assoc, './/HPOId'))
+        values.append(backend.findtext(assoc, './/HPOFrequency/Name[@lang="en"]'))
+    for prevalence in backend.findall(disorder, './/Prevalence'):
+        values.append(backend.findtext(prevalence, './/PrevalenceType/Name[@lang="en"]'))
+    for gene_assoc in backend.findall(disorder, './/DisorderGeneAssociation'):
+        values.append(backend.findtext(gene_assoc, './/GeneLocus'))
+    return len(values)
+
+
+def best_of(run: Callable[[], Any], repeat: int) -> Dict[str, Any]:
+    """Fastest of repeat runs in milliseconds, with the run's result"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {'ms': round(min(timings), 2), 'result': result}
+
+
+def bench_file(backend: XMLBackend, xml_file: str, repeat: int) -> Dict[str, Any]:
+    """parse, parse + lookups over the tree, and streamed batches + lookups, for one file"""
+    parse = best_of(lambda: backend.parse(xml_file), repeat)
+    root = parse['result']
+
+    def lookups():
+        disorders = backend.findall(root, './/Disorder')
+        return len(disorders), sum(extract(backend, d) for d in disorders)
+    search = best_of(lookups, repeat)
+
+    def stream():
+        count = values = 0
+        for batch in backend.iter_batches(xml_file, 'Disorder', 100):
+            count += len(batch)
+            values += sum(extract(backend, d) for d in batch)
+        return count, values
+    streamed = best_of(stream, repeat)
+
+    if streamed['result'] != search['result']:
+        raise AssertionError(f"{backend.name}: streamed {streamed['result']} != tree {search['result']} in {xml_file}")
+
+    return {
+        'disorders': search['result'][0],
+        'values': search['result'][1],
+        'parse_ms': parse['ms'],
+        'lookups_ms': search['ms'],
+        'stream_ms': streamed['ms']
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    """Per file and backend timings, with the lxml speedup when both ran"""
+    print(f"\n⏱️  best of {report['repeat']}, backends: {', '.join(report['backends'])}")
+    print(f"  {'file':52s} {'backend':7s} {'disorders':>9s} {'parse ms':>9s} {'lookup ms':>10s} {'stream ms':>10s}")
+    for name, results in report['files'].items():
+        for backend, result in results.items():
+            print(f"  {name:52s} {backend:7s} {result['disorders']:9d} {result['parse_ms']:9.1f} "
+                  f"{result['lookups_ms']:10.1f} {result['stream_ms']:10.1f}")
+        if len(results) == 2:
+            ratios = [results['etree'][k] / max(results['lxml'][k], 1e-9) for k in ('parse_ms', 'lookups_ms', 'stream_ms')]
+            print(f"  {'':52s} {'speedup':7s} {'':9s} {ratios[0]:8.1f}x {ratios[1]:9.1f}x {ratios[2]:9.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the lxml and ElementTree XML backends')
+    parser.add_argument('--files', nargs='+', help='XML files (default: file/*_SM.txt)')
+    parser.add_argument('--disorders', type=int, default=FULL_SIZE_DISORDERS,
+                        help='Disorders in the synthetic full-size file (0 = skip it)')
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS, help='Only run these backends')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement (the fastest is kept)')
+    parser.add_argument('--output', '-o', default=DEFAULT_OUTPUT, help='JSON result file')
+    args = parser.parse_args()
+
+    backends = [b for b in (args.backends or BACKENDS) if b != 'lxml' or LXML_AVAILABLE]
+    if not LXML_AVAILABLE:
+        print("⚠️  lxml is not installed (pip install lxml) - benchmarking ElementTree only")
+
+    files = args.files or sorted(str(p) for p in (Path(__file__).parent / 'file').glob('*_SM.txt'))
+    synthetic = None
+    if args.disorders > 0:
+        synthetic = os.path.join(tempfile.mkdtemp(), f'synthetic_{args.disorders}_disorders.xml')
+        print(f"🧪 Writing synthetic full-size file ({args.disorders} disorders)...")
+        synthesize(synthetic, args.disorders)
+        files.append(synthetic)
+
+    report = {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'backends': backends,
+        'repeat': args.repeat,
+        'files': {}
+    }
+    try:
+        for xml_file in files:
+            name = os.path.basename(xml_file)
+            size_mb = os.path.getsize(xml_file) / 1e6
+            print(f"🏃 {name} ({size_mb:.1f} MB)...")
+            report['files'][name] = {b: bench_file(XMLBackend(b), xml_file, args.repeat) for b in backends}
+    finally:
+        if synthetic:
+            os.unlink(synthetic)
+            os.rmdir(os.path.dirname(synthetic))
+
+    print_report(report)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
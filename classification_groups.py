@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Classification Groups - Orphanet linearisation (preferential parent group) of each disorder
+Disorder -> group index array so posterior mass rolls up with a single bincount
+"""
+
+import logging
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from orphanet_data import load_dataset
+
+logger = logging.getLogger(__name__)
+
+LINEARISATION_PRODUCT = 'linearisation_of_rare_diseases'
+LINEARISATION_COLUMNS = ['orpha_code', 'target_disorder_code', 'target_disorder_name', 'association_type']
+
+# Disorders without a preferential parent are rolled up here (always the last group)
+UNCLASSIFIED_GROUP = 'Unclassified'
+
+
+def build_group_index(orpha_codes: Sequence[str], linearisation) -> Tuple[np.ndarray, List[str], List[str]]:
+    """
+    (group id per disorder, group names, group orpha codes) aligned with orpha_codes.
+    Groups are sorted by name; unclassified disorders map to the extra last group.
+    """
+    import pandas as pd
+
+    parents = linearisation.dropna(subset=['orpha_code', 'target_disorder_code', 'target_disorder_name'])
+    if 'association_type' in parents.columns:
+        parents = parents[parents['association_type'].fillna('Preferential parent') == 'Preferential parent']
+
+    parents = parents.assign(
+        orpha_code=parents['orpha_code'].astype(int).astype(str),
+        target_disorder_code=parents['target_disorder_code'].astype(int).astype(str)
+    ).drop_duplicates(subset=['orpha_code'])
+
+    group_codes, group_names = pd.factorize(parents['target_disorder_name'], sort=True)
+    n_groups = len(group_names)
+
+    code_to_group = dict(zip(parents['orpha_code'], group_codes))
+    group_ids = np.array([code_to_group.get(str(code), n_groups) for code in orpha_codes], dtype=np.int32)
+
+    name_to_code = dict(zip(parents['target_disorder_name'], parents['target_disorder_code']))
+    names = group_names.tolist() + [UNCLASSIFIED_GROUP]
+    codes = [name_to_code[name] for name in group_names] + ['']
+
+    logger.info(f"Built group index: {n_groups} groups, {int((group_ids == n_groups).sum())} unclassified disorders")
+    return group_ids, names, codes
+
+
+def load_group_index(orpha_codes: Sequence[str]) -> Optional[Tuple[np.ndarray, List[str], List[str]]]:
+    """Load the linearisation product and build the group index; None when the file is missing"""
+    try:
+        linearisation = load_dataset(LINEARISATION_PRODUCT, columns=LINEARISATION_COLUMNS)
+        if linearisation is None:
+            logger.warning("Linearisation data not found - group rollup disabled")
+            return None
+
+        return build_group_index(orpha_codes, linearisation)
+
+    except Exception as e:
+        logger.error(f"Error loading linearisation data: {e}")
+        return None
@@ -5,6 +5,7 @@ Loads clinical signs and symptoms data from CSV into Supabase database tables
 """
 
 import os
+import argparse
 import pandas as pd
 import logging
 from typing import Dict, List, Any, Optional
@@ -12,6 +13,9 @@ from supabase import create_client, Client
 import numpy as np
 from dotenv import load_dotenv
 
+from delta_ingest import FINGERPRINT_FILE, DisorderDelta, FingerprintStore, compute_delta, frame_fingerprints
+from materialized_views import DISORDER_SYMPTOMS_VIEW, create_view, execute_sql, refresh_view
+
 # Load environment variables
 load_dotenv()
 
@@ -22,6 +26,46 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Columns whose changes make a disorder's clinical signs rows an update
+FINGERPRINT_COLUMNS = ['disorder_name', 'disorder_type', 'hpo_id', 'hpo_term', 'hpo_frequency', 'diagnostic_criteria']
+FINGERPRINT_SCOPE = 'csv:clinical_signs'
+
+# Values per PostgREST in.() filter
+IN_CHUNK_SIZE = 100
+
+# Tables with rows per disorder (disorder_id -> disorders.id, see xmt4.py), cleared with the disorder
+DISORDER_TABLES = ['disorder_hpo_associations', 'disorder_gene_associations', 'prevalences',
+                   'disorder_age_of_onset', 'disorder_inheritance', 'disorder_synonyms']
+
+# Frequency text substrings -> numeric frequency, first match wins (anything else counts as 0.5)
+FREQUENCY_PATTERNS = [
+    (('Very frequent', '99-80'), 0.9),
+    (('Frequent', '79-30'), 0.55),
+    (('Occasional', '29-5'), 0.17),
+    (('Very rare', '<5'), 0.025),
+]
+DEFAULT_FREQUENCY = 0.5
+
+
+def frequency_numeric(frequency: pd.Series) -> pd.Series:
+    """Numeric frequency of each frequency text, stored at ingest so reads never match patterns"""
+    text = frequency.fillna('').astype(str)
+    conditions = [
+        np.logical_or.reduce([text.str.contains(pattern, regex=False).to_numpy() for pattern in patterns])
+        for patterns, _ in FREQUENCY_PATTERNS
+    ]
+    values = np.select(conditions, [value for _, value in FREQUENCY_PATTERNS], DEFAULT_FREQUENCY)
+    return pd.Series(values, index=frequency.index)
+
+
+def frequency_case_sql(column: str) -> str:
+    """The same mapping as a SQL CASE, for backfilling rows loaded before the numeric column existed"""
+    whens = ' '.join(
+        'WHEN ' + ' OR '.join(f"{column} LIKE '%{pattern}%'" for pattern in patterns) + f' THEN {value}'
+        for patterns, value in FREQUENCY_PATTERNS
+    )
+    return f"CASE {whens} ELSE {DEFAULT_FREQUENCY} END"
+
 
 class OrphanetCSVLoader:
     """Loads Orphanet CSV data into Supabase database"""
@@ -44,8 +88,19 @@ class OrphanetCSVLoader:
             return True  # Continue anyway
     
     def create_tables(self) -> bool:
-        """Create necessary database tables - assuming they already exist"""
+        """Create necessary database tables - assuming they already exist - and the numeric frequency column"""
         logger.info("Assuming database tables already exist")
+        
+        try:
+            execute_sql(self.supabase, "ALTER TABLE disorder_hpo_associations ADD COLUMN IF NOT EXISTS frequency_numeric REAL;")
+            execute_sql(self.supabase, f"""
+            UPDATE disorder_hpo_associations
+            SET frequency_numeric = {frequency_case_sql('frequency')}
+            WHERE frequency_numeric IS NULL;
+            """)
+            logger.info("frequency_numeric column in place")
+        except Exception as e:
+            logger.warning(f"Could not add the frequency_numeric column: {e}")
         return True
     
     def load_clinical_signs_csv(self, csv_file_path: str) -> Dict[str, List[Dict[str, Any]]]:
@@ -53,56 +108,64 @@ class OrphanetCSVLoader:
         logger.info(f"Loading CSV file: {csv_file_path}")
         
         try:
-            # Read CSV file
-            df = pd.read_csv(csv_file_path)
-            logger.info(f"Loaded {len(df)} records from CSV")
-            
-            # Clean the data
-            df = df.dropna(subset=['orpha_code', 'disorder_name', 'hpo_id', 'hpo_term'])
-            logger.info(f"After cleaning: {len(df)} records")
-            
-            # Extract unique disorders
-            disorders = df[['disorder_id', 'orpha_code', 'disorder_name', 'disorder_type']].drop_duplicates()
-            disorders_list = []
-            for _, row in disorders.iterrows():
-                disorders_list.append({
-                    'id': int(row['disorder_id']) if pd.notna(row['disorder_id']) else None,
-                    'orpha_code': str(row['orpha_code']),
-                    'name': str(row['disorder_name']),
-                    'disorder_type': str(row['disorder_type']) if pd.notna(row['disorder_type']) else None
-                })
-            
-            # Extract unique HPO terms
-            hpo_terms = df[['hpo_id', 'hpo_term']].drop_duplicates()
-            hpo_terms_list = []
-            for _, row in hpo_terms.iterrows():
-                hpo_terms_list.append({
-                    'hpo_id': str(row['hpo_id']),
-                    'term': str(row['hpo_term'])
-                })
-            
-            # Extract HPO associations
-            hpo_associations = []
-            for _, row in df.iterrows():
-                hpo_associations.append({
-                    'disorder_orpha_code': str(row['orpha_code']),
-                    'hpo_id': str(row['hpo_id']),
-                    'frequency': str(row['hpo_frequency']) if pd.notna(row['hpo_frequency']) else None,
-                    'diagnostic_criteria': str(row['diagnostic_criteria']) if pd.notna(row['diagnostic_criteria']) else None
-                })
-            
-            logger.info(f"Extracted {len(disorders_list)} disorders, {len(hpo_terms_list)} HPO terms, {len(hpo_associations)} associations")
-            
-            return {
-                'disorders': disorders_list,
-                'hpo_terms': hpo_terms_list,
-                'hpo_associations': hpo_associations
-            }
+            return self.build_records(self.read_clinical_signs_csv(csv_file_path))
             
         except Exception as e:
             logger.error(f"Error loading CSV file: {e}")
             raise
     
+    def read_clinical_signs_csv(self, csv_file_path: str) -> pd.DataFrame:
+        """Read the clinical signs CSV, keeping rows with a disorder and an HPO term"""
+        df = pd.read_csv(csv_file_path)
+        logger.info(f"Loaded {len(df)} records from CSV")
+        
+        # Clean the data
+        df = df.dropna(subset=['orpha_code', 'disorder_name', 'hpo_id', 'hpo_term'])
+        logger.info(f"After cleaning: {len(df)} records")
+        return df
+    
+    def build_records(self, df: pd.DataFrame) -> Dict[str, List[Dict[str, Any]]]:
+        """Disorders, HPO terms and HPO associations of clinical signs rows"""
+        # Extract unique disorders
+        disorders = df[['disorder_id', 'orpha_code', 'disorder_name', 'disorder_type']].drop_duplicates()
+        disorders_list = []
+        for _, row in disorders.iterrows():
+            disorders_list.append({
+                'id': int(row['disorder_id']) if pd.notna(row['disorder_id']) else None,
+                'orpha_code': str(row['orpha_code']),
+                'name': str(row['disorder_name']),
+                'disorder_type': str(row['disorder_type']) if pd.notna(row['disorder_type']) else None
+            })
+        
+        # Extract unique HPO terms
+        hpo_terms = df[['hpo_id', 'hpo_term']].drop_duplicates()
+        hpo_terms_list = []
+        for _, row in hpo_terms.iterrows():
+            hpo_terms_list.append({
+                'hpo_id': str(row['hpo_id']),
+                'term': str(row['hpo_term'])
+            })
+        
+        # Extract HPO associations, with the numeric frequency
+        df = df.assign(frequency_numeric=frequency_numeric(df['hpo_frequency']))
+        hpo_associations = []
+        for _, row in df.iterrows():
+            hpo_associations.append({
+                'disorder_orpha_code': str(row['orpha_code']),
+                'hpo_id': str(row['hpo_id']),
+                'frequency': str(row['hpo_frequency']) if pd.notna(row['hpo_frequency']) else None,
+                'frequency_numeric': float(row['frequency_numeric']),
+                'diagnostic_criteria': str(row['diagnostic_criteria']) if pd.notna(row['diagnostic_criteria']) else None
+            })
+        
+        logger.info(f"Extracted {len(disorders_list)} disorders, {len(hpo_terms_list)} HPO terms, {len(hpo_associations)} associations")
+        
+        return {
+            'disorders': disorders_list,
+            'hpo_terms': hpo_terms_list,
+            'hpo_associations': hpo_associations
+        }
+    
     def insert_disorders(self, disorders: List[Dict[str, Any]]) -> bool:
         """Insert disorders into the database"""
         logger.info(f"Inserting {len(disorders)} disorders...")
@@ -189,6 +252,7 @@ class OrphanetCSVLoader:
                         'disorder_id': disorder_result.data[0]['id'],
                         'hpo_term_id': hpo_result.data[0]['id'],
                         'frequency': assoc['frequency'],
+                        'frequency_numeric': assoc['frequency_numeric'],
                         'diagnostic_criteria': assoc['diagnostic_criteria']
                     })
                 
@@ -208,43 +272,89 @@ class OrphanetCSVLoader:
             logger.error(f"Error inserting HPO associations: {e}")
             return False
     
-    def create_disorder_symptoms_view(self) -> bool:
-        """Create or refresh the disorder_symptoms_view"""
-        logger.info("Creating disorder_symptoms_view...")
+    def disorder_ids(self, orpha_codes: List[str]) -> List[int]:
+        """Database ids of the given disorders"""
+        ids = []
+        for i in range(0, len(orpha_codes), IN_CHUNK_SIZE):
+            result = self.supabase.table('disorders').select('id').in_('orpha_code', orpha_codes[i:i + IN_CHUNK_SIZE]).execute()
+            ids.extend(row['id'] for row in result.data)
+        return ids
+    
+    def delete_hpo_associations(self, orpha_codes: List[str]) -> bool:
+        """Delete all HPO associations of the given disorders"""
+        logger.info(f"Deleting HPO associations of {len(orpha_codes)} disorders...")
+        
+        try:
+            ids = self.disorder_ids(orpha_codes)
+            for i in range(0, len(ids), IN_CHUNK_SIZE):
+                self.supabase.table('disorder_hpo_associations').delete().in_('disorder_id', ids[i:i + IN_CHUNK_SIZE]).execute()
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error deleting HPO associations: {e}")
+            return False
+    
+    def delete_disorders(self, orpha_codes: List[str]) -> bool:
+        """
+        Delete the given disorders with their rows in every DISORDER_TABLES table. A dependent table
+        that cannot be cleared (e.g. not created in this database) is logged and skipped; the disorders
+        delete then fails on any rows left behind, unless the foreign key cascades.
+        """
+        logger.info(f"Deleting {len(orpha_codes)} disorders...")
         
         try:
-            # Execute SQL to create the view
-            sql = """
-            CREATE OR REPLACE VIEW disorder_symptoms_view AS
-            SELECT 
-                d.id as disorder_id,
-                d.orpha_code,
-                d.name as disorder_name,
-                h.hpo_id,
-                h.term as symptom_name,
-                dha.frequency,
-                dha.diagnostic_criteria,
-                CASE 
-                    WHEN dha.frequency LIKE '%Very frequent%' OR dha.frequency LIKE '%99-80%' THEN 0.9
-                    WHEN dha.frequency LIKE '%Frequent%' OR dha.frequency LIKE '%79-30%' THEN 0.55
-                    WHEN dha.frequency LIKE '%Occasional%' OR dha.frequency LIKE '%29-5%' THEN 0.17
-                    WHEN dha.frequency LIKE '%Very rare%' OR dha.frequency LIKE '%<5%' THEN 0.025
-                    ELSE 0.5
-                END as frequency_numeric
-            FROM disorders d
-            JOIN disorder_hpo_associations dha ON d.id = dha.disorder_id
-            JOIN hpo_terms h ON dha.hpo_term_id = h.id
-            ORDER BY d.orpha_code, h.hpo_id;
-            """
+            ids = self.disorder_ids(orpha_codes)
+            for table in DISORDER_TABLES:
+                try:
+                    for i in range(0, len(ids), IN_CHUNK_SIZE):
+                        self.supabase.table(table).delete().in_('disorder_id', ids[i:i + IN_CHUNK_SIZE]).execute()
+                except Exception as e:
+                    logger.warning(f"Could not delete {table} rows: {e}")
             
-            result = self.supabase.rpc('execute_sql', {'sql': sql}).execute()
-            logger.info("disorder_symptoms_view created successfully!")
+            for i in range(0, len(ids), IN_CHUNK_SIZE):
+                self.supabase.table('disorders').delete().in_('id', ids[i:i + IN_CHUNK_SIZE]).execute()
             return True
             
         except Exception as e:
-            logger.error(f"Error creating disorder_symptoms_view: {e}")
+            logger.error(f"Error deleting disorders: {e}")
             return False
     
+    def load_delta(self, csv_file_path: str, store: FingerprintStore) -> DisorderDelta:
+        """
+        Write only the disorders inserted, updated or deleted since the last load: their fingerprints
+        are compared with the ones stored in store, which is updated once every write succeeded.
+        """
+        df = self.read_clinical_signs_csv(csv_file_path)
+        current = frame_fingerprints(df, 'orpha_code', FINGERPRINT_COLUMNS)
+        delta = compute_delta(store.get(FINGERPRINT_SCOPE), current)
+        logger.info(f"Delta since the last load: {delta.summary()}")
+        if not delta:
+            return delta
+        
+        # Updated disorders get their association set replaced; deleted ones are removed with all their rows
+        ok = not delta.updated or self.delete_hpo_associations(delta.updated)
+        ok = (not delta.deleted or self.delete_disorders(delta.deleted)) and ok
+        
+        if delta.changed:
+            changed = df[df['orpha_code'].astype(str).str.strip().isin(delta.changed)]
+            records = self.build_records(changed)
+            ok = (self.insert_disorders(records['disorders'])
+                  and self.insert_hpo_terms(records['hpo_terms'])
+                  and self.insert_hpo_associations(records['hpo_associations'])
+                  and ok)
+        
+        if not ok:
+            raise RuntimeError("Delta load failed - fingerprints not updated, rerun to retry")
+        
+        store.set(FINGERPRINT_SCOPE, current)
+        store.save()
+        return delta
+    
+    def create_disorder_symptoms_view(self) -> bool:
+        """Create the disorder_symptoms_view materialized view if needed and refresh it with the loaded data"""
+        logger.info("Refreshing disorder_symptoms_view...")
+        return create_view(self.supabase, DISORDER_SYMPTOMS_VIEW) and refresh_view(self.supabase, DISORDER_SYMPTOMS_VIEW)
+    
     def get_stats(self) -> Dict[str, int]:
         """Get database statistics"""
         stats = {}
@@ -278,6 +388,14 @@ def main():
     
     CSV_FILE = 'file/clinical_signs_and_symptoms_in_rare_diseases.csv'
     
+    parser = argparse.ArgumentParser(description='Load the clinical signs CSV into Supabase')
+    parser.add_argument('--csv', default=CSV_FILE, help=f'Clinical signs CSV (default: {CSV_FILE})')
+    parser.add_argument('--delta', action='store_true',
+                        help='Only write disorders inserted, updated or deleted since the last --delta load')
+    parser.add_argument('--fingerprints', default=FINGERPRINT_FILE,
+                        help=f'Fingerprints of the last load, for --delta (default: {FINGERPRINT_FILE})')
+    args = parser.parse_args()
+    
     try:
         # Initialize loader
         loader = OrphanetCSVLoader(SUPABASE_URL, SUPABASE_KEY)
@@ -288,20 +406,24 @@ def main():
         # Create tables (if needed)
         loader.create_tables()
         
-        # Load CSV data
-        data = loader.load_clinical_signs_csv(CSV_FILE)
-        
-        # Insert data step by step
-        if data['disorders']:
-            loader.insert_disorders(data['disorders'])
-        
-        if data['hpo_terms']:
-            loader.insert_hpo_terms(data['hpo_terms'])
-        
-        if data['hpo_associations']:
-            loader.insert_hpo_associations(data['hpo_associations'])
+        if args.delta:
+            # Only the disorders changed since the last load are written
+            loader.load_delta(args.csv, FingerprintStore(args.fingerprints))
+        else:
+            # Load CSV data
+            data = loader.load_clinical_signs_csv(args.csv)
+            
+            # Insert data step by step
+            if data['disorders']:
+                loader.insert_disorders(data['disorders'])
+            
+            if data['hpo_terms']:
+                loader.insert_hpo_terms(data['hpo_terms'])
+            
+            if data['hpo_associations']:
+                loader.insert_hpo_associations(data['hpo_associations'])
         
-        # Create view
+        # Refresh the materialized view with the loaded rows
         loader.create_disorder_symptoms_view()
         
         # Get final statistics
@@ -0,0 +1,494 @@
+#!/usr/bin/env python3
+"""
+Diagnosis Index - Vectorized scoring index for the local diagnosis engines
+Symptom-major CSR matrix of disorder frequencies plus per-disorder vectors (priors, counts)
+"""
+
+import os
+import hashlib
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from prevalence_priors import PRIOR_MODES, DEFAULT_PRIOR_MODE, prior_weights
+from disorder_filters import DisorderBitsets, unpack_mask
+from hpo_ontology import OntologyIndex
+
+logger = logging.getLogger(__name__)
+
+# Default on-disk location, next to diagnosis_cache.pkl
+INDEX_FILE = 'diagnosis_index.npz'
+
+# P(symptom | disease) for a symptom not annotated on the disease
+UNSEEN_SYMPTOM_LIKELIHOOD = 0.01
+
+# Symptom weighting of the additive (fast mode) score: every symptom counts the same, or by information content
+SYMPTOM_WEIGHTINGS = ('uniform', 'ic')
+DEFAULT_SYMPTOM_WEIGHTING = 'uniform'
+
+# Fast mode multiplies a disease score by (1 - ABSENT_PENALTY * frequency) per annotated absent symptom
+ABSENT_PENALTY = 0.3
+
+
+def _csr_shard(
+    symptom_codes: np.ndarray,
+    disease_codes: np.ndarray,
+    freqs: np.ndarray,
+    first: int,
+    n_rows: int,
+    n_diseases: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    CSR rows of the symptom ID range [first, first + n_rows) (runs in a worker process): row lengths,
+    disease ids, frequencies, annotated (non-excluded) disorders per row and symptoms per disease
+    """
+    order = np.lexsort((disease_codes, symptom_codes))
+    rows = symptom_codes - first
+    indices = disease_codes[order]
+    return (
+        np.bincount(rows, minlength=n_rows),
+        indices,
+        freqs[order],
+        np.bincount(rows[freqs > 0], minlength=n_rows),
+        np.bincount(indices, minlength=n_diseases)
+    )
+
+
+class DiagnosisIndex:
+    """Disorder/symptom index with integer IDs, CSR frequencies and log-space prior vectors"""
+
+    def __init__(
+        self,
+        disease_names: List[str],
+        orpha_codes: List[str],
+        symptom_names: List[str],
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        freqs: np.ndarray,
+        total_symptoms: Optional[np.ndarray] = None,
+        annotated_counts: Optional[np.ndarray] = None
+    ):
+        """
+        Wrap pre-built CSR arrays (row = symptom, column = disease). Per-disease symptom counts and
+        per-symptom annotated disorder counts are derived from them unless a sharded build passes them.
+        """
+        self.disease_names = list(disease_names)
+        self.orpha_codes = list(orpha_codes)
+        self.symptom_names = list(symptom_names)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.freqs = np.asarray(freqs, dtype=np.float32)
+
+        self.disease_ids = {name: i for i, name in enumerate(self.disease_names)}
+        self.symptom_ids = {name: i for i, name in enumerate(self.symptom_names)}
+
+        if total_symptoms is None:
+            total_symptoms = np.bincount(self.indices, minlength=self.n_diseases)
+        self.total_symptoms = np.asarray(total_symptoms).astype(np.int32)
+        self.symptom_ic = self._symptom_information_content(annotated_counts)
+        self.log_priors: Dict[str, np.ndarray] = {}
+        self.filters: Dict[str, DisorderBitsets] = {}  # constraint name -> disorder bitsets
+        
+        # Classification group of each disorder (linearisation), see set_groups
+        self.group_ids: Optional[np.ndarray] = None
+        self.group_names: List[str] = []
+        self.group_codes: List[str] = []
+        
+        # HPO closure joined to this index, for the ontology scoring modes
+        self.ontology: Optional[OntologyIndex] = None
+        
+        self._generation: Optional[str] = None
+
+    @property
+    def n_diseases(self) -> int:
+        return len(self.disease_names)
+
+    @property
+    def n_symptoms(self) -> int:
+        return len(self.symptom_names)
+
+    @classmethod
+    def from_dataframe(cls, disease_data, jobs: int = 1, executor=None) -> 'DiagnosisIndex':
+        """
+        Build from a cleaned clinical signs DataFrame with a frequency_numeric column. With an
+        executor and jobs > 1 the CSR rows are built in shards of contiguous symptom ID ranges,
+        which concatenate into the full CSR in order.
+        """
+        import pandas as pd
+
+        # Same disease/symptom pair listed twice: the last row wins, as in the dict maps
+        df = disease_data.drop_duplicates(subset=['disorder_name', 'hpo_term'], keep='last')
+
+        disease_codes, disease_names = pd.factorize(df['disorder_name'], sort=True)
+        symptom_codes, symptom_names = pd.factorize(df['hpo_term'], sort=True)
+
+        orpha_codes = (
+            disease_data.groupby('disorder_name')['orpha_code'].first()
+            .reindex(disease_names).astype(str).tolist()
+        )
+
+        freqs = df['frequency_numeric'].to_numpy(dtype=np.float32)
+        n_symptoms, n_diseases = len(symptom_names), len(disease_names)
+
+        n_shards = max(1, min(jobs, n_symptoms)) if executor is not None else 1
+        bounds = np.arange(n_shards + 1) * n_symptoms // n_shards
+        shard_of = np.searchsorted(bounds, symptom_codes, side='right') - 1
+        shards = []
+        for k in range(n_shards):
+            rows = shard_of == k
+            shards.append((symptom_codes[rows], disease_codes[rows], freqs[rows],
+                           int(bounds[k]), int(bounds[k + 1] - bounds[k]), n_diseases))
+        if n_shards > 1:
+            parts = list(executor.map(_csr_shard, *zip(*shards)))
+        else:
+            parts = [_csr_shard(*shards[0])]
+
+        counts, indices, freqs, annotated, totals = zip(*parts)
+        indptr = np.concatenate(([0], np.cumsum(np.concatenate(counts))))
+        return cls(disease_names.tolist(), orpha_codes, symptom_names.tolist(), indptr,
+                   np.concatenate(indices), np.concatenate(freqs),
+                   total_symptoms=np.sum(totals, axis=0), annotated_counts=np.concatenate(annotated))
+
+    def apply_delta(
+        self,
+        disease_data,
+        removed_codes: Iterable[str] = (),
+        prevalences: Optional[Dict[str, float]] = None
+    ) -> 'DiagnosisIndex':
+        """
+        Index with the disorders of disease_data (their complete clinical signs rows, with
+        frequency_numeric) added or replaced and removed_codes dropped. Postings of untouched
+        disorders are carried over and the new ones merged in, so the result equals from_dataframe
+        on the patched rows. Priors and the ontology join are recomputed; filters and groups are
+        kept when the disorder list is unchanged and must be re-attached otherwise.
+        """
+        df = disease_data.drop_duplicates(subset=['disorder_name', 'hpo_term'], keep='last')
+        affected = set(df['orpha_code'].astype(str)) | {str(code) for code in removed_codes}
+        added_codes = disease_data.groupby('disorder_name')['orpha_code'].first().astype(str)
+
+        old_names = np.array(self.disease_names, dtype=object)
+        keep_disease = ~np.isin(np.array(self.orpha_codes, dtype=object), list(affected))
+        keep_disease &= ~np.isin(old_names, added_codes.index.to_numpy(dtype=object))
+
+        # Postings of the untouched disorders, (symptom, disease) sorted as in the CSR
+        old_rows = np.repeat(np.arange(self.n_symptoms), np.diff(self.indptr))
+        kept = keep_disease[self.indices]
+        kept_rows, kept_diseases, kept_freqs = old_rows[kept], self.indices[kept], self.freqs[kept]
+
+        symptom_names = sorted(set(np.array(self.symptom_names, dtype=object)[np.unique(kept_rows)]) | set(df['hpo_term']))
+        disease_names = sorted(set(old_names[keep_disease]) | set(added_codes.index))
+        symptom_array = np.array(symptom_names, dtype=object)
+        disease_array = np.array(disease_names, dtype=object)
+
+        # Both name lists stay sorted, so remapping the kept postings keeps their order
+        symptom_map = np.searchsorted(symptom_array, np.array(self.symptom_names, dtype=object))
+        disease_map = np.searchsorted(disease_array, old_names)
+        n = len(disease_names)
+        kept_keys = symptom_map[kept_rows] * n + disease_map[kept_diseases]
+
+        new_keys = (np.searchsorted(symptom_array, df['hpo_term'].to_numpy(dtype=object)) * n
+                    + np.searchsorted(disease_array, df['disorder_name'].to_numpy(dtype=object)))
+        order = np.argsort(new_keys, kind='stable')
+        new_keys = new_keys[order]
+        new_freqs = df['frequency_numeric'].to_numpy(dtype=np.float32)[order]
+
+        positions = np.searchsorted(kept_keys, new_keys)
+        keys = np.insert(kept_keys, positions, new_keys)
+        freqs = np.insert(kept_freqs, positions, new_freqs)
+
+        orpha_codes = np.empty(n, dtype=object)
+        orpha_codes[disease_map[keep_disease]] = np.array(self.orpha_codes, dtype=object)[keep_disease]
+        orpha_codes[np.searchsorted(disease_array, added_codes.index.to_numpy(dtype=object))] = added_codes.to_numpy()
+
+        counts = np.bincount(keys // n, minlength=len(symptom_names))
+        index = type(self)(disease_names, orpha_codes.tolist(), symptom_names,
+                           np.concatenate(([0], np.cumsum(counts))), keys % n, freqs)
+
+        if self.log_priors:
+            index.set_priors(prevalences)
+        if index.disease_names == self.disease_names:
+            index.filters = dict(self.filters)
+            if self.group_ids is not None:
+                index.set_groups(self.group_ids, self.group_names, self.group_codes)
+        if self.ontology is not None:
+            index.ontology = OntologyIndex.from_index(self.ontology.closure, index)
+
+        logger.info(f"Patched diagnosis index: {len(affected)} disorders replaced or removed, "
+                    f"{len(new_keys)} postings merged into {len(kept_keys)}")
+        return index
+
+    def set_priors(self, prevalences: Optional[Dict[str, float]] = None):
+        """Pre-compute the log prior vector for every prior mode"""
+        for mode in PRIOR_MODES:
+            weights = prior_weights(
+                mode,
+                self.orpha_codes,
+                association_counts=self.total_symptoms,
+                prevalences=prevalences
+            )
+            with np.errstate(divide='ignore'):
+                self.log_priors[mode] = np.log(weights)
+
+        known = sum(1 for code in self.orpha_codes if prevalences and code in prevalences)
+        logger.info(f"Pre-computed priors ({', '.join(PRIOR_MODES)}); prevalence known for {known}/{self.n_diseases} disorders")
+
+    def set_groups(self, group_ids: np.ndarray, group_names: List[str], group_codes: List[str]):
+        """Attach the disorder -> classification group index array"""
+        self.group_ids = np.asarray(group_ids, dtype=np.int32)
+        self.group_names = list(group_names)
+        self.group_codes = list(group_codes)
+
+    def save(self, path: str = INDEX_FILE):
+        """Save the index as a single .npz file"""
+        arrays = {
+            'disease_names': np.array(self.disease_names, dtype=str),
+            'orpha_codes': np.array(self.orpha_codes, dtype=str),
+            'symptom_names': np.array(self.symptom_names, dtype=str),
+            'indptr': self.indptr,
+            'indices': self.indices,
+            'freqs': self.freqs
+        }
+        for mode, log_prior in self.log_priors.items():
+            arrays[f'log_prior_{mode}'] = log_prior
+        for name, bitsets in self.filters.items():
+            arrays.update(bitsets.to_arrays(f'filter_{name}'))
+        if self.group_ids is not None:
+            arrays['group_ids'] = self.group_ids
+            arrays['group_names'] = np.array(self.group_names, dtype=str)
+            arrays['group_codes'] = np.array(self.group_codes, dtype=str)
+        if self.ontology is not None:
+            arrays.update(self.ontology.to_arrays())
+
+        np.savez(path, **arrays)
+        logger.info(f"Saved diagnosis index to {path}")
+
+    @classmethod
+    def load(cls, path: str = INDEX_FILE) -> Optional['DiagnosisIndex']:
+        """Load an index saved with save(); None when the file does not exist"""
+        if not os.path.exists(path):
+            return None
+
+        with np.load(path, allow_pickle=False) as data:
+            index = cls(
+                data['disease_names'].tolist(),
+                data['orpha_codes'].tolist(),
+                data['symptom_names'].tolist(),
+                data['indptr'],
+                data['indices'],
+                data['freqs']
+            )
+            for mode in PRIOR_MODES:
+                key = f'log_prior_{mode}'
+                if key in data:
+                    index.log_priors[mode] = data[key]
+            for key in data.files:
+                if key.startswith('filter_') and key.endswith('_bits'):
+                    name = key[len('filter_'):-len('_bits')]
+                    index.filters[name] = DisorderBitsets.from_arrays(data, f'filter_{name}', index.n_diseases)
+            if 'group_ids' in data:
+                index.set_groups(data['group_ids'], data['group_names'].tolist(), data['group_codes'].tolist())
+            index.ontology = OntologyIndex.from_arrays(data, index=index)
+
+        logger.info(f"Loaded diagnosis index: {index.n_diseases} diseases, {index.n_symptoms} symptoms")
+        return index
+
+    def _symptom_information_content(self, counts: Optional[np.ndarray] = None) -> np.ndarray:
+        """-log(fraction of disorders annotated) per symptom; excluded (0%) annotations do not count"""
+        if counts is None:
+            rows = np.repeat(np.arange(self.n_symptoms), np.diff(self.indptr))
+            counts = np.bincount(rows[self.freqs > 0], minlength=self.n_symptoms)
+        return -np.log(np.maximum(counts, 1) / max(self.n_diseases, 1))
+
+    def generation(self) -> str:
+        """Short digest of the index contents, identifying which build a process is serving"""
+        if self._generation is None:
+            digest = hashlib.sha256()
+            for array in (self.indptr, self.indices, self.freqs):
+                digest.update(array.tobytes())
+            for names in (self.disease_names, self.symptom_names):
+                digest.update('\n'.join(names).encode())
+            self._generation = digest.hexdigest()[:12]
+        return self._generation
+
+    def symptom_row(self, symptom_id: int):
+        """(disease ids, frequencies) annotated with one symptom"""
+        start, end = self.indptr[symptom_id], self.indptr[symptom_id + 1]
+        return self.indices[start:end], self.freqs[start:end]
+
+    def log_likelihood(self, present_ids: List[int], absent_ids: List[int] = None) -> np.ndarray:
+        """log P(symptoms | disease) for every disease"""
+        unseen = np.log(UNSEEN_SYMPTOM_LIKELIHOOD)
+
+        # Every present symptom starts as unseen; annotated diseases swap in their frequency
+        log_lik = np.full(self.n_diseases, unseen * len(present_ids), dtype=np.float64)
+
+        with np.errstate(divide='ignore'):
+            for symptom_id in present_ids:
+                diseases, freqs = self.symptom_row(symptom_id)
+                log_lik[diseases] += np.log(freqs) - unseen
+
+            for symptom_id in absent_ids or []:
+                diseases, freqs = self.symptom_row(symptom_id)
+                log_lik[diseases] += np.log1p(-freqs)
+
+        return log_lik
+
+    def _postings(self, symptom_ids: List[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """(CSR positions, row lengths) of the given symptom rows laid end to end"""
+        symptom_ids = np.asarray(symptom_ids, dtype=np.int64)
+        starts = self.indptr[symptom_ids]
+        lengths = self.indptr[symptom_ids + 1] - starts
+        offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        return offsets + np.arange(lengths.sum()), lengths
+
+    def split_by_ic(self, symptom_ids: List[int], min_ic: float = 0.0) -> Tuple[List[int], List[int]]:
+        """
+        (candidate-generating, score-only) symptom ids: symptoms below min_ic only score
+        disorders reached by the others. All symptoms generate when none reaches min_ic.
+        """
+        generating = [s for s in symptom_ids if self.symptom_ic[s] >= min_ic]
+        if not generating:
+            return list(symptom_ids), []
+        return generating, [s for s in symptom_ids if self.symptom_ic[s] < min_ic]
+
+    def ic_weights(self, symptom_ids: List[int]) -> np.ndarray:
+        """IC of each symptom scaled to a mean of 1, so weighted scores stay on the uniform scale"""
+        ic = self.symptom_ic[np.asarray(symptom_ids, dtype=np.int64)]
+        mean = ic.mean() if len(ic) else 0.0
+        return ic / mean if mean > 0 else np.ones(len(ic))
+
+    def weighted_scores(
+        self,
+        present_ids: List[int],
+        absent_ids: List[int] = None,
+        weights: Optional[np.ndarray] = None,
+        min_ic: float = 0.0
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Fast-mode scores for every disease: sum of frequency * symptom weight over the present
+        symptoms (a column scale on the CSR rows), times (1 - ABSENT_PENALTY * frequency) per
+        annotated absent symptom. Returns (scores, matching symptom counts, touched mask), where
+        touched marks the disorders reached by a present symptom of IC >= min_ic.
+        """
+        present_ids = list(dict.fromkeys(present_ids))
+        if weights is None:
+            weights = np.ones(len(present_ids))
+
+        postings, lengths = self._postings(present_ids)
+        diseases = self.indices[postings]
+        scores = np.bincount(
+            diseases,
+            weights=self.freqs[postings] * np.repeat(weights, lengths),
+            minlength=self.n_diseases
+        )
+        matches = np.bincount(diseases, minlength=self.n_diseases)
+
+        generating, _ = self.split_by_ic(present_ids, min_ic)
+        touched = np.zeros(self.n_diseases, dtype=bool)
+        touched[diseases[np.isin(np.repeat(present_ids, lengths), generating)]] = True
+
+        if absent_ids:
+            postings, _ = self._postings(list(dict.fromkeys(absent_ids)))
+            scores *= np.exp(np.bincount(
+                self.indices[postings],
+                weights=np.log1p(-ABSENT_PENALTY * self.freqs[postings]),
+                minlength=self.n_diseases
+            ))
+
+        return scores, matches, touched
+
+    def candidate_mask(self, constraints: Dict[str, List[str]]) -> Tuple[Optional[np.ndarray], Dict[str, List[str]]]:
+        """
+        Boolean candidate mask for {filter name: allowed values}: the union of the
+        values within one filter, ANDed across filters on the packed bitsets.
+        None when no constraint is given; also returns the values that matched nothing.
+        """
+        packed = None
+        unknown = {}
+        for name, values in constraints.items():
+            if not values:
+                continue
+            if name not in self.filters:
+                raise ValueError(f"Filter '{name}' not available in the index")
+
+            allowed, unknown[name] = self.filters[name].packed_mask(values)
+            packed = allowed if packed is None else packed & allowed
+
+        if packed is None:
+            return None, unknown
+        return unpack_mask(packed, self.n_diseases), unknown
+
+    def posterior(
+        self,
+        present_ids: List[int],
+        absent_ids: List[int] = None,
+        prior: str = DEFAULT_PRIOR_MODE,
+        mask: Optional[np.ndarray] = None,
+        log_weights: Optional[np.ndarray] = None,
+        log_likelihood: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """
+        Normalized P(disease | symptoms) over all diseases, or over the candidates in mask.
+        A pre-computed log_likelihood (e.g. ontology-propagated) replaces the exact-match one.
+        """
+        if prior not in self.log_priors:
+            raise ValueError(f"Prior '{prior}' not available in the index")
+
+        if log_likelihood is None:
+            log_likelihood = self.log_likelihood(present_ids, absent_ids)
+        log_post = log_likelihood + self.log_priors[prior]
+        if log_weights is not None:
+            log_post += log_weights
+        if mask is not None:
+            log_post[~mask] = -np.inf
+
+        top = log_post.max()
+        if not np.isfinite(top):
+            return np.zeros(self.n_diseases)
+
+        post = np.exp(log_post - top)
+        return post / post.sum()
+
+    def matching_symptoms(self, disease_ids: np.ndarray, present_ids: List[int]) -> List[List[str]]:
+        """Present symptoms annotated on each of the given diseases"""
+        matches = [[] for _ in range(len(disease_ids))]
+        for symptom_id in present_ids:
+            diseases, _ = self.symptom_row(symptom_id)
+            for i in np.flatnonzero(np.isin(disease_ids, diseases)):
+                matches[i].append(self.symptom_names[symptom_id])
+        return matches
+
+    def group_rollup(
+        self,
+        posterior: np.ndarray,
+        top_groups: int = 5,
+        per_group: int = 3,
+        mask: Optional[np.ndarray] = None
+    ) -> List[Tuple[int, float, int, np.ndarray]]:
+        """
+        Posterior mass per classification group: (group id, mass, candidate count, top disorder ids)
+        for the top groups. Groups without candidates are skipped.
+        """
+        if self.group_ids is None:
+            raise ValueError("Group index not available")
+
+        n_groups = len(self.group_names)
+        mass = np.bincount(self.group_ids, weights=posterior, minlength=n_groups)
+        members = np.bincount(self.group_ids if mask is None else self.group_ids[mask], minlength=n_groups)
+
+        # Only groups with candidates compete for the top places
+        candidates = np.flatnonzero(members > 0)
+        top = candidates[np.argsort(-mass[candidates], kind='stable')][:top_groups]
+
+        # One sort lays the disorders out by group, then by decreasing posterior
+        order = np.lexsort((-posterior, self.group_ids))
+        starts = np.concatenate(([0], np.cumsum(np.bincount(self.group_ids, minlength=n_groups))))
+
+        rollup = []
+        for group_id in top:
+            disease_ids = order[starts[group_id]:starts[group_id + 1]]
+            if mask is not None:
+                disease_ids = disease_ids[mask[disease_ids]]
+            rollup.append((int(group_id), float(mass[group_id]), int(members[group_id]), disease_ids[:per_group]))
+        return rollup
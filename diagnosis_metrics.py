@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Diagnosis Metrics - In-process Prometheus metrics for the diagnosis API
+Histograms and counters rendered in the Prometheus text exposition format (no client library needed)
+"""
+
+import time
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Prometheus text exposition format served by /metrics
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; stages range from microseconds (sorting) to seconds (Supabase true mode)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Candidate disorders scored per request
+CANDIDATE_BUCKETS = (1, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """Monotonic counter with labels"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(str(labels.get(name, '')) for name in self.labelnames), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f'{self.name}_total{_format_labels(self.labelnames, key)} {_format_value(v)}' for key, v in items]
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List[float]] = {}  # label values -> bucket counts + [sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels) -> int:
+        series = self._series.get(tuple(str(labels.get(name, '')) for name in self.labelnames))
+        return int(series[-1]) if series else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+
+        lines = []
+        for key, series in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f'{self.name}_bucket{le} {_format_value(cumulative)}')
+            inf = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f'{self.name}_bucket{inf} {_format_value(series[-1])}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(series[-2])}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, key)} {_format_value(series[-1])}')
+        return lines
+
+
+class MetricsRegistry:
+    """Ordered set of metrics rendered together"""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+REQUEST_SECONDS = registry.register(Histogram(
+    'diagnosis_http_request_seconds', 'HTTP request latency by route', ['method', 'path', 'status']
+))
+STAGE_SECONDS = registry.register(Histogram(
+    'diagnosis_stage_seconds', 'Diagnosis pipeline time per stage', ['stage', 'engine', 'computation_mode']
+))
+DIAGNOSIS_REQUESTS = registry.register(Counter(
+    'diagnosis_requests', 'Diagnosis requests by engine and outcome', ['engine', 'computation_mode', 'status']
+))
+CANDIDATES = registry.register(Histogram(
+    'diagnosis_candidates', 'Candidate disorders evaluated per diagnosis', ['engine', 'computation_mode'], CANDIDATE_BUCKETS
+))
+CACHE_EVENTS = registry.register(Counter(
+    'diagnosis_cache_events', 'Cache lookups by cache and result (hit / miss)', ['cache', 'result']
+))
+SUPABASE_REQUESTS = registry.register(Counter(
+    'diagnosis_supabase_requests', 'Supabase REST requests by table and status', ['table', 'status']
+))
+SUPABASE_SECONDS = registry.register(Histogram(
+    'diagnosis_supabase_request_seconds', 'Supabase REST request latency by table', ['table']
+))
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_EVENTS.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+def record_supabase(table: str, status: str, seconds: float):
+    """One Supabase REST call; status is the HTTP code, or 'error' when no response arrived"""
+    SUPABASE_REQUESTS.inc(table=table, status=status)
+    SUPABASE_SECONDS.observe(seconds, table=table)
+
+
+class StageTimer:
+    """
+    Lap timer for one request: lap(stage) charges the time since the previous lap to that stage.
+    Timings are kept in ms for the debug response and observed into STAGE_SECONDS by observe().
+    """
+
+    def __init__(self):
+        self.timings_ms: Dict[str, float] = {}
+        self._last = time.perf_counter()
+
+    def lap(self, stage: str) -> float:
+        now = time.perf_counter()
+        elapsed_ms = (now - self._last) * 1000
+        self.timings_ms[stage] = self.timings_ms.get(stage, 0.0) + elapsed_ms
+        self._last = now
+        return elapsed_ms
+
+    def skip(self):
+        """Drop the time since the previous lap (work that belongs to no stage)"""
+        self._last = time.perf_counter()
+
+    def merge(self, timings_ms: Optional[Dict[str, float]]):
+        """Add stage timings measured elsewhere, e.g. inside an engine"""
+        for stage, elapsed_ms in (timings_ms or {}).items():
+            self.timings_ms[stage] = self.timings_ms.get(stage, 0.0) + elapsed_ms
+
+    def observe(self, engine: str, computation_mode: str):
+        for stage, elapsed_ms in self.timings_ms.items():
+            STAGE_SECONDS.observe(elapsed_ms / 1000, stage=stage, engine=engine, computation_mode=computation_mode)
+
+    def rounded(self) -> Dict[str, float]:
+        return {stage: round(elapsed_ms, 3) for stage, elapsed_ms in self.timings_ms.items()}
+
+
+def route_path(request) -> str:
+    """Route template of a Starlette request ('/diagnose', not the raw URL) to bound label cardinality"""
+    from starlette.routing import Match
+
+    for route in request.app.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return getattr(route, 'path', 'other')
+    return 'unmatched'
+
+
+async def track_requests(request, call_next):
+    """HTTP middleware observing REQUEST_SECONDS; register with app.middleware('http')(track_requests)"""
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - start, method=request.method, path=route_path(request), status=str(status)
+        )
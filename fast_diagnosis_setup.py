@@ -7,16 +7,82 @@ import os
 import pandas as pd
 import numpy as np
 import logging
-from typing import Dict, List, Any
+from typing import Dict, Iterator, List, Any
 from supabase import create_client, Client
 import json
 from collections import defaultdict
 import time
 
+from materialized_views import FAST_DIAGNOSIS_VIEW, create_view, refresh_view
+from fast_schema import FAST_DIAGNOSIS_SCHEMA
+from fast_dimensions import DimensionMap, assign_ids, fetch_all
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Orphanet frequency classes -> probability (unknown classes count as 0.5)
+FREQUENCY_MAPPING = {
+    'Very frequent (99-80%)': 0.9,
+    'Frequent (79-30%)': 0.55,
+    'Occasional (29-5%)': 0.17,
+    'Very rare (<5%)': 0.025,
+    'Excluded (0%)': 0.0
+}
+
+
+def disorder_table(disease_data: pd.DataFrame, disorder_ids: Dict[str, int]) -> pd.DataFrame:
+    """fast_disorders rows: one per orpha code, with its id and association count"""
+    disorders = disease_data[['orpha_code', 'disorder_name']].drop_duplicates('orpha_code')
+    orpha_codes = disorders['orpha_code'].astype(str)
+    counts = disease_data['orpha_code'].astype(str).value_counts()
+    return pd.DataFrame({
+        'id': orpha_codes.map(disorder_ids).astype(int),
+        'orpha_code': orpha_codes,
+        'name': disorders['disorder_name'],
+        'total_symptoms': orpha_codes.map(counts).astype(int)
+    })
+
+
+def symptom_table(disease_data: pd.DataFrame, symptom_ids: Dict[str, int]) -> pd.DataFrame:
+    """fast_symptoms rows: one per HPO term, with its id, HPO id and association count"""
+    symptoms = disease_data[['hpo_id', 'hpo_term']].drop_duplicates('hpo_term')
+    counts = disease_data['hpo_term'].value_counts()
+    return pd.DataFrame({
+        'id': symptoms['hpo_term'].map(symptom_ids).astype(int),
+        'hpo_id': symptoms['hpo_id'].astype(str).where(symptoms['hpo_id'].notna(), None),
+        'term': symptoms['hpo_term'],
+        'total_diseases': symptoms['hpo_term'].map(counts).astype(int)
+    })
+
+
+def probability_table(disease_data: pd.DataFrame, symptom_ids: Dict[str, int],
+                      disorder_ids: Dict[str, int]) -> pd.DataFrame:
+    """
+    symptom_disease_probs rows, grouped by symptom in order of first appearance; a repeated
+    (symptom, disorder) pair keeps its last frequency
+    """
+    # A stable sort on the first-appearance symptom code keeps the row order within each symptom
+    symptom_codes, _ = pd.factorize(disease_data['hpo_term'])
+    rows = disease_data.iloc[np.argsort(symptom_codes, kind='stable')]
+    frequency = rows['frequency_numeric'].astype(float)
+    table = pd.DataFrame({
+        'symptom_id': rows['hpo_term'].map(symptom_ids).astype(int),
+        'disorder_id': rows['orpha_code'].astype(str).map(disorder_ids).astype(int),
+        'probability': frequency,
+        'confidence': np.minimum(1.0, frequency * 1.2),  # Boost confidence for high frequency
+        'matching_score': 1  # Single symptom match
+    })
+    # One row per upsert conflict key
+    return table.drop_duplicates(['symptom_id', 'disorder_id'], keep='last')
+
+
+def iter_upload_batches(table: pd.DataFrame, batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+    """Upload-ready record batches; each slice is converted to dicts only when it is needed"""
+    for start in range(0, len(table), batch_size):
+        yield table.iloc[start:start + batch_size].to_dict('records')
+
+
 class FastDiagnosisSetup:
     """Setup optimized diagnosis system with Supabase"""
     
@@ -24,6 +90,8 @@ class FastDiagnosisSetup:
         """Initialize with Supabase connection"""
         self.supabase: Client = create_client(supabase_url, supabase_key)
         self.disease_data = None
+        self.symptoms: DimensionMap = None
+        self.disorders: DimensionMap = None
         logger.info("Connected to Supabase")
     
     def load_csv_data(self, csv_path: str) -> bool:
@@ -35,17 +103,9 @@ class FastDiagnosisSetup:
             # Clean the data
             self.disease_data = self.disease_data.dropna(subset=['orpha_code', 'disorder_name', 'hpo_term'])
             
-            # Add frequency mapping
-            frequency_mapping = {
-                'Very frequent (99-80%)': 0.9,
-                'Frequent (79-30%)': 0.55,
-                'Occasional (29-5%)': 0.17,
-                'Very rare (<5%)': 0.025,
-                'Excluded (0%)': 0.0
-            }
-            
-            self.disease_data['frequency_numeric'] = self.disease_data['hpo_frequency'].map(
-                lambda x: frequency_mapping.get(str(x).strip(), 0.5) if pd.notna(x) else 0.5
+            # Add frequency mapping (missing and unknown classes count as 0.5)
+            self.disease_data['frequency_numeric'] = (
+                self.disease_data['hpo_frequency'].astype(str).str.strip().map(FREQUENCY_MAPPING).fillna(0.5)
             )
             
             logger.info(f"Loaded {len(self.disease_data)} records")
@@ -59,81 +119,8 @@ class FastDiagnosisSetup:
         """Create optimized Supabase tables"""
         logger.info("Creating optimized Supabase tables...")
         
-        # SQL to create optimized tables
-        tables_sql = [
-            # Fast disorders lookup table
-            """
-            CREATE TABLE IF NOT EXISTS fast_disorders (
-                id SERIAL PRIMARY KEY,
-                orpha_code VARCHAR(10) UNIQUE NOT NULL,
-                name VARCHAR(200) NOT NULL,
-                total_symptoms INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-            """,
-            
-            # Fast symptoms lookup table  
-            """
-            CREATE TABLE IF NOT EXISTS fast_symptoms (
-                id SERIAL PRIMARY KEY,
-                hpo_id VARCHAR(15),
-                term VARCHAR(200) UNIQUE NOT NULL,
-                total_diseases INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-            """,
-            
-            # Pre-computed disease-symptom associations with probabilities
-            """
-            CREATE TABLE IF NOT EXISTS fast_disease_symptoms (
-                id SERIAL PRIMARY KEY,
-                disorder_id INTEGER REFERENCES fast_disorders(id) ON DELETE CASCADE,
-                symptom_id INTEGER REFERENCES fast_symptoms(id) ON DELETE CASCADE,
-                frequency_text VARCHAR(50),
-                frequency_numeric DECIMAL(5,4),
-                base_probability DECIMAL(8,6),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(disorder_id, symptom_id)
-            );
-            """,
-            
-            # Pre-computed symptom-disease probability matrix (for ultra-fast lookups)
-            """
-            CREATE TABLE IF NOT EXISTS symptom_disease_probs (
-                id SERIAL PRIMARY KEY,
-                symptom_term VARCHAR(200) NOT NULL,
-                disorder_name VARCHAR(200) NOT NULL,
-                orpha_code VARCHAR(10) NOT NULL,
-                probability DECIMAL(8,6) NOT NULL,
-                confidence DECIMAL(5,4) NOT NULL,
-                matching_score INTEGER NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                INDEX(symptom_term),
-                INDEX(disorder_name),
-                INDEX(probability DESC)
-            );
-            """,
-            
-            # Indexes for fast queries
-            """
-            CREATE INDEX IF NOT EXISTS idx_fast_disorders_orpha ON fast_disorders(orpha_code);
-            """,
-            """
-            CREATE INDEX IF NOT EXISTS idx_fast_symptoms_term ON fast_symptoms(term);
-            """,
-            """
-            CREATE INDEX IF NOT EXISTS idx_fast_disease_symptoms_disorder ON fast_disease_symptoms(disorder_id);
-            """,
-            """
-            CREATE INDEX IF NOT EXISTS idx_fast_disease_symptoms_symptom ON fast_disease_symptoms(symptom_id);
-            """,
-            """
-            CREATE INDEX IF NOT EXISTS idx_symptom_disease_probs_symptom ON symptom_disease_probs(symptom_term);
-            """,
-            """
-            CREATE INDEX IF NOT EXISTS idx_symptom_disease_probs_prob ON symptom_disease_probs(probability DESC);
-            """
-        ]
+        # Tables and the indexes of the read queries (the view is created after loading)
+        tables_sql = [sql for table in FAST_DIAGNOSIS_SCHEMA.tables for sql in table.ddl()]
         
         for sql in tables_sql:
             try:
@@ -144,66 +131,40 @@ class FastDiagnosisSetup:
         
         logger.info("Optimized tables creation completed")
     
+    def _upload(self, table_name: str, table: pd.DataFrame, batch_size: int, on_conflict: str):
+        """Upsert a table in batches, logging (not raising) failed batches"""
+        n_batches = (len(table) - 1) // batch_size + 1
+        for i, batch in enumerate(iter_upload_batches(table, batch_size), 1):
+            try:
+                self.supabase.table(table_name).upsert(batch, on_conflict=on_conflict).execute()
+                logger.info(f"Inserted {table_name} batch {i}/{n_batches}")
+            except Exception as e:
+                logger.error(f"Error inserting {table_name} batch: {e}")
+    
     def populate_fast_tables(self):
         """Populate the fast lookup tables"""
         logger.info("Populating fast lookup tables...")
         
-        # 1. Insert unique disorders
-        logger.info("Inserting disorders...")
-        disorders = self.disease_data[['orpha_code', 'disorder_name']].drop_duplicates()
+        # Ids already in the tables are kept, so reloads do not renumber the dimension rows
+        existing_disorders = {row['orpha_code']: row['id']
+                              for row in fetch_all(self.supabase, 'fast_disorders', 'id, orpha_code')}
+        existing_symptoms = {row['term']: row['id'] for row in fetch_all(self.supabase, 'fast_symptoms', 'id, term')}
         
-        disorder_data = []
-        for _, row in disorders.iterrows():
-            # Count symptoms for this disorder
-            symptom_count = len(self.disease_data[
-                self.disease_data['disorder_name'] == row['disorder_name']
-            ])
-            
-            disorder_data.append({
-                'orpha_code': str(row['orpha_code']),
-                'name': row['disorder_name'],
-                'total_symptoms': symptom_count
-            })
+        start_time = time.time()
+        disorder_ids = assign_ids(self.disease_data['orpha_code'].astype(str), existing_disorders)
+        symptom_ids = assign_ids(self.disease_data['hpo_term'], existing_symptoms)
+        disorders = disorder_table(self.disease_data, disorder_ids)
+        symptoms = symptom_table(self.disease_data, symptom_ids)
+        self.disorders = DimensionMap(disorders.to_dict('records'), 'orpha_code')
+        self.symptoms = DimensionMap(symptoms.to_dict('records'), 'term')
+        logger.info(f"Prepared {len(disorders)} disorders and {len(symptoms)} symptoms "
+                    f"in {time.time() - start_time:.3f} seconds")
         
-        # Insert in batches
-        batch_size = 100
-        for i in range(0, len(disorder_data), batch_size):
-            batch = disorder_data[i:i + batch_size]
-            try:
-                result = self.supabase.table('fast_disorders').upsert(
-                    batch, on_conflict='orpha_code'
-                ).execute()
-                logger.info(f"Inserted disorders batch {i//batch_size + 1}")
-            except Exception as e:
-                logger.error(f"Error inserting disorders batch: {e}")
+        logger.info("Inserting disorders...")
+        self._upload('fast_disorders', disorders, 100, 'orpha_code')
         
-        # 2. Insert unique symptoms
         logger.info("Inserting symptoms...")
-        symptoms = self.disease_data[['hpo_id', 'hpo_term']].drop_duplicates()
-        
-        symptom_data = []
-        for _, row in symptoms.iterrows():
-            # Count diseases for this symptom
-            disease_count = len(self.disease_data[
-                self.disease_data['hpo_term'] == row['hpo_term']
-            ])
-            
-            symptom_data.append({
-                'hpo_id': str(row['hpo_id']) if pd.notna(row['hpo_id']) else None,
-                'term': row['hpo_term'],
-                'total_diseases': disease_count
-            })
-        
-        # Insert in batches
-        for i in range(0, len(symptom_data), batch_size):
-            batch = symptom_data[i:i + batch_size]
-            try:
-                result = self.supabase.table('fast_symptoms').upsert(
-                    batch, on_conflict='term'
-                ).execute()
-                logger.info(f"Inserted symptoms batch {i//batch_size + 1}")
-            except Exception as e:
-                logger.error(f"Error inserting symptoms batch: {e}")
+        self._upload('fast_symptoms', symptoms, 100, 'term')
         
         logger.info("Fast lookup tables populated")
     
@@ -211,84 +172,21 @@ class FastDiagnosisSetup:
         """Pre-compute all symptom-disease probability combinations"""
         logger.info("Pre-computing symptom-disease probabilities...")
         
-        # Get all unique symptoms and diseases
-        symptoms = self.disease_data['hpo_term'].unique()
-        diseases = self.disease_data['disorder_name'].unique()
-        
-        logger.info(f"Computing probabilities for {len(symptoms)} symptoms x {len(diseases)} diseases")
-        
-        probability_data = []
-        
-        # For each symptom, find all diseases that have it
-        for i, symptom in enumerate(symptoms):
-            if i % 100 == 0:
-                logger.info(f"Processing symptom {i+1}/{len(symptoms)}: {symptom}")
-            
-            # Get all diseases that have this symptom
-            symptom_diseases = self.disease_data[
-                self.disease_data['hpo_term'] == symptom
-            ]
-            
-            for _, row in symptom_diseases.iterrows():
-                # Calculate base probability for this symptom-disease pair
-                frequency = row['frequency_numeric']
-                
-                # Enhanced probability calculation
-                base_prob = frequency
-                confidence = min(1.0, frequency * 1.2)  # Boost confidence for high frequency
-                matching_score = 1  # Single symptom match
-                
-                probability_data.append({
-                    'symptom_term': symptom,
-                    'disorder_name': row['disorder_name'],
-                    'orpha_code': str(row['orpha_code']),
-                    'probability': float(base_prob),
-                    'confidence': float(confidence),
-                    'matching_score': matching_score
-                })
-        
-        logger.info(f"Generated {len(probability_data)} probability records")
+        start_time = time.time()
+        probabilities = probability_table(self.disease_data, self.symptoms.ids, self.disorders.ids)
+        logger.info(f"Generated {len(probabilities)} probability records for "
+                    f"{self.disease_data['hpo_term'].nunique()} symptoms x {self.disease_data['disorder_name'].nunique()} diseases "
+                    f"in {time.time() - start_time:.3f} seconds")
         
-        # Insert pre-computed probabilities in batches
-        batch_size = 500
-        for i in range(0, len(probability_data), batch_size):
-            batch = probability_data[i:i + batch_size]
-            try:
-                result = self.supabase.table('symptom_disease_probs').upsert(
-                    batch, on_conflict='symptom_term,disorder_name'
-                ).execute()
-                logger.info(f"Inserted probability batch {i//batch_size + 1}/{(len(probability_data)-1)//batch_size + 1}")
-            except Exception as e:
-                logger.error(f"Error inserting probability batch: {e}")
+        self._upload('symptom_disease_probs', probabilities, 500, 'symptom_id,disorder_id')
         
         logger.info("Pre-computed probabilities inserted successfully!")
     
     def create_fast_diagnosis_view(self):
-        """Create a materialized view for ultra-fast diagnosis"""
-        logger.info("Creating fast diagnosis view...")
-        
-        view_sql = """
-        CREATE OR REPLACE VIEW fast_diagnosis_view AS
-        SELECT 
-            sdp.symptom_term,
-            sdp.disorder_name,
-            sdp.orpha_code,
-            sdp.probability,
-            sdp.confidence,
-            sdp.matching_score,
-            fd.total_symptoms,
-            fs.total_diseases
-        FROM symptom_disease_probs sdp
-        JOIN fast_disorders fd ON sdp.orpha_code = fd.orpha_code
-        JOIN fast_symptoms fs ON sdp.symptom_term = fs.term
-        ORDER BY sdp.probability DESC;
-        """
-        
-        try:
-            result = self.supabase.rpc('execute_sql', {'sql': view_sql}).execute()
-            logger.info("Fast diagnosis view created successfully!")
-        except Exception as e:
-            logger.warning(f"View creation note: {e}")
+        """Create the fast_diagnosis_view materialized view if needed and refresh it with the loaded tables"""
+        logger.info("Refreshing fast diagnosis view...")
+        if create_view(self.supabase, FAST_DIAGNOSIS_VIEW) and refresh_view(self.supabase, FAST_DIAGNOSIS_VIEW):
+            logger.info("Fast diagnosis view refreshed successfully!")
     
     def test_fast_lookup(self, test_symptoms: List[str]):
         """Test the fast lookup performance"""
@@ -297,12 +195,12 @@ class FastDiagnosisSetup:
         start_time = time.time()
         
         try:
-            # Query pre-computed probabilities
+            # Query the materialized view (answered from its symptom_id, probability index)
             results = []
-            for symptom in test_symptoms:
-                result = self.supabase.table('symptom_disease_probs').select(
-                    'disorder_name, orpha_code, probability, confidence'
-                ).eq('symptom_term', symptom).order('probability', desc=True).limit(10).execute()
+            for symptom_id in self.symptoms.ids_of(test_symptoms):
+                result = self.supabase.table(FAST_DIAGNOSIS_VIEW.name).select(
+                    'disorder_id, probability, confidence'
+                ).eq('symptom_id', symptom_id).order('probability', desc=True).limit(10).execute()
                 
                 if result.data:
                     results.extend(result.data)
@@ -311,11 +209,12 @@ class FastDiagnosisSetup:
             disease_scores = defaultdict(lambda: {'probability': 0, 'confidence': 0, 'matches': 0})
             
             for result in results:
-                disease = result['disorder_name']
+                disorder = self.disorders.rows[result['disorder_id']]
+                disease = disorder['name']
                 disease_scores[disease]['probability'] += result['probability']
                 disease_scores[disease]['confidence'] += result['confidence']
                 disease_scores[disease]['matches'] += 1
-                disease_scores[disease]['orpha_code'] = result['orpha_code']
+                disease_scores[disease]['orpha_code'] = disorder['orpha_code']
             
             # Sort by combined score
             sorted_diseases = sorted(
@@ -370,7 +269,7 @@ def main():
         # Pre-compute probabilities
         setup.precompute_probabilities()
         
-        # Create fast diagnosis view
+        # Refresh the materialized fast diagnosis view with the new rows
         setup.create_fast_diagnosis_view()
         
         # Test the fast lookup
@@ -382,8 +281,8 @@ def main():
         print("  • fast_disorders - Optimized disorder lookup")
         print("  • fast_symptoms - Optimized symptom lookup") 
         print("  • fast_disease_symptoms - Disease-symptom associations")
-        print("  • symptom_disease_probs - Pre-computed probabilities")
-        print("  • fast_diagnosis_view - Ultra-fast diagnosis view")
+        print("  • symptom_disease_probs - Pre-computed probabilities (symptom_id, disorder_id)")
+        print("  • fast_diagnosis_view - Materialized diagnosis view with covering index")
         print("\n🚀 Expected performance improvement:")
         print("  • Diagnosis time: ~100ms (vs 5-10 seconds)")
         print("  • Database lookups instead of CSV parsing")
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Fast Dimensions - Integer surrogate keys for the fast diagnosis tables
+
+symptom_disease_probs stores (symptom_id, disorder_id) pairs instead of names; fast_symptoms and
+fast_disorders are the small dimension tables holding the names. Loaders keep the ids already in
+the database and number new entries after them, and the API keeps both dimensions in memory to
+translate names to ids for its queries and ids back to names for its responses.
+"""
+
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+
+def assign_ids(keys: Iterable[Hashable], existing: Dict[Hashable, int]) -> Dict[Hashable, int]:
+    """
+    Id for every key: keys already in the database keep their id, new keys are numbered after the
+    largest existing id in order of first appearance
+    """
+    ids = {}
+    next_id = max(existing.values(), default=0) + 1
+    for key in pd.unique(pd.Series(list(keys), dtype=object)):
+        if key in existing:
+            ids[key] = existing[key]
+        else:
+            ids[key] = next_id
+            next_id += 1
+    return ids
+
+
+# Rows per request when paging; PostgREST caps a single response at its max-rows setting (1000 on Supabase)
+PAGE_SIZE = 1000
+
+
+def keyset_filter(order: Tuple[str, ...], last: Dict[str, Any]) -> str:
+    """
+    PostgREST or= filter for the rows after `last` in `order` (integer key columns):
+    a > x, or a = x and b > y, ... for a composite key
+    """
+    terms = []
+    for i, column in enumerate(order):
+        conditions = [f"{key}.eq.{last[key]}" for key in order[:i]] + [f"{column}.gt.{last[column]}"]
+        terms.append(conditions[0] if len(conditions) == 1 else f"and({','.join(conditions)})")
+    return ','.join(terms)
+
+
+def fetch_all(
+    supabase,
+    table: str,
+    columns: str,
+    order: Tuple[str, ...] = ('id',),
+    in_: Optional[Tuple[str, List[Any]]] = None,
+    page_size: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    Every matching row of a table, paged in a stable order. `order` must be a key of the table and
+    be among the selected columns: each page starts after the last row of the previous one (keyset
+    paging), so the server reads every row once instead of skipping an ever longer OFFSET.
+    `in_` is an optional (column, values) filter.
+    """
+    missing = set(order) - {column.strip() for column in columns.split(',')}
+    if missing:
+        raise ValueError(f"Paging key columns {sorted(missing)} must be selected from {table}")
+
+    page_size = page_size or PAGE_SIZE
+    rows = []
+    while True:
+        query = supabase.table(table).select(columns)
+        if in_ is not None:
+            query = query.in_(*in_)
+        if rows and len(order) == 1:
+            query = query.gt(order[0], rows[-1][order[0]])
+        elif rows:
+            query = query.or_(keyset_filter(order, rows[-1]))
+        for column in order:
+            query = query.order(column)
+        result = query.limit(page_size).execute()
+        rows.extend(result.data or [])
+        if not result.data or len(result.data) < page_size:
+            return rows
+
+
+class DimensionMap:
+    """In-memory rows of a dimension table, looked up by id or by their name column"""
+
+    def __init__(self, rows: List[Dict[str, Any]], name_column: str):
+        self.name_column = name_column
+        self.rows = {row['id']: row for row in rows}
+        self.ids = {row[name_column]: row['id'] for row in rows}
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def id_of(self, name: str) -> Optional[int]:
+        return self.ids.get(name)
+
+    def ids_of(self, names: Iterable[str]) -> List[int]:
+        """Ids of the known names, in order and without duplicates"""
+        return list(dict.fromkeys(self.ids[name] for name in names if name in self.ids))
+
+    def name_of(self, id_: int) -> str:
+        return self.rows[id_][self.name_column]
+
+    def names(self) -> List[str]:
+        return list(self.ids)
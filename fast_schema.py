@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Fast Schema - Postgres DDL for the fast diagnosis tables, generated from one definition
+
+Each schema lists its tables, the indexes matching the read queries that hit them, and those hot
+queries themselves. Unique keys are unique indexes named like the constraints Postgres would create,
+so the DDL is idempotent on databases created by the older scripts and upserts can target them.
+verify_plans() runs EXPLAIN on a Postgres server and checks every hot query is an index-only scan.
+"""
+
+import sys
+import json
+import argparse
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+from materialized_views import FAST_DIAGNOSIS_VIEW, MaterializedView
+
+try:
+    import psycopg2
+    PSYCOPG2_AVAILABLE = True
+except ImportError:
+    PSYCOPG2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Index:
+    """B-tree index: key columns (may carry DESC) and non-key columns stored for index-only scans"""
+    name: str
+    columns: Tuple[str, ...]
+    include: Tuple[str, ...] = ()
+    unique: bool = False
+
+    def ddl(self, table: str) -> str:
+        include = f" INCLUDE ({', '.join(self.include)})" if self.include else ''
+        unique = 'UNIQUE ' if self.unique else ''
+        return f"CREATE {unique}INDEX IF NOT EXISTS {self.name} ON {table} ({', '.join(self.columns)}){include};"
+
+
+@dataclass(frozen=True)
+class Table:
+    """
+    Table columns, indexes, and indexes of older DDL that the new ones supersede. A table still
+    having one of its legacy columns is dropped (with the views over it) and recreated; only
+    tables holding derived data, which the loaders rebuild, declare legacy columns.
+    """
+    name: str
+    columns: Tuple[str, ...]
+    indexes: Tuple[Index, ...] = ()
+    replaces: Tuple[str, ...] = ()
+    legacy_columns: Tuple[str, ...] = ()
+
+    def ddl(self) -> List[str]:
+        statements = []
+        if self.legacy_columns:
+            legacy = ', '.join(f"'{column}'" for column in self.legacy_columns)
+            statements.append(f"""
+            DO $$
+            BEGIN
+                IF EXISTS (SELECT 1 FROM information_schema.columns WHERE table_schema = current_schema()
+                           AND table_name = '{self.name}' AND column_name IN ({legacy})) THEN
+                    EXECUTE 'DROP TABLE {self.name} CASCADE';
+                END IF;
+            END $$;
+            """)
+        columns = ',\n    '.join(self.columns)
+        statements.append(f"CREATE TABLE IF NOT EXISTS {self.name} (\n    {columns}\n);")
+        statements += [index.ddl(self.name) for index in self.indexes]
+        statements += [f"DROP INDEX IF EXISTS {name};" for name in self.replaces]
+        return statements
+
+
+@dataclass(frozen=True)
+class HotQuery:
+    """A read query of the API and the index that must answer it on its own"""
+    name: str
+    sql: str
+    index: str
+
+
+@dataclass(frozen=True)
+class Schema:
+    name: str
+    tables: Tuple[Table, ...]
+    views: Tuple[MaterializedView, ...] = ()
+    queries: Tuple[HotQuery, ...] = ()
+
+    def statements(self) -> List[str]:
+        """Every DDL statement, tables before the views that join them"""
+        statements = [sql for table in self.tables for sql in table.ddl()]
+        return statements + [sql for view in self.views for sql in view.create_statements()]
+
+    def sql(self) -> str:
+        return '\n\n'.join(statement.strip() for statement in self.statements()) + '\n'
+
+
+# Tables of fast_diagnosis_setup.py, read by main_fast.py
+FAST_DIAGNOSIS_SCHEMA = Schema(
+    name='fast_diagnosis',
+    tables=(
+        Table(
+            name='fast_disorders',
+            columns=(
+                'id SERIAL PRIMARY KEY',
+                'orpha_code VARCHAR(10) NOT NULL',
+                'name VARCHAR(200) NOT NULL',
+                'total_symptoms INTEGER DEFAULT 0',
+                'created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP'
+            ),
+            # The API reads the whole table once at startup and keeps it in memory
+            indexes=(Index('fast_disorders_orpha_code_key', ('orpha_code',), unique=True),),
+            replaces=('idx_fast_disorders_orpha', 'fast_disorders_name')
+        ),
+        Table(
+            name='fast_symptoms',
+            columns=(
+                'id SERIAL PRIMARY KEY',
+                'hpo_id VARCHAR(15)',
+                'term VARCHAR(200) NOT NULL',
+                'total_diseases INTEGER DEFAULT 0',
+                'created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP'
+            ),
+            indexes=(Index('fast_symptoms_term_key', ('term',), unique=True),),
+            replaces=('idx_fast_symptoms_term',)
+        ),
+        Table(
+            name='fast_disease_symptoms',
+            columns=(
+                'id SERIAL PRIMARY KEY',
+                'disorder_id INTEGER REFERENCES fast_disorders(id) ON DELETE CASCADE',
+                'symptom_id INTEGER REFERENCES fast_symptoms(id) ON DELETE CASCADE',
+                'frequency_text VARCHAR(50)',
+                'frequency_numeric DECIMAL(5,4)',
+                'base_probability DECIMAL(8,6)',
+                'created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP'
+            ),
+            indexes=(
+                Index('fast_disease_symptoms_disorder_id_symptom_id_key', ('disorder_id', 'symptom_id'), unique=True),
+                Index('fast_disease_symptoms_symptom', ('symptom_id',), ('disorder_id', 'base_probability')),
+            ),
+            replaces=('idx_fast_disease_symptoms_disorder', 'idx_fast_disease_symptoms_symptom')
+        ),
+        Table(
+            name='symptom_disease_probs',
+            columns=(
+                'symptom_id INTEGER NOT NULL REFERENCES fast_symptoms(id) ON DELETE CASCADE',
+                'disorder_id INTEGER NOT NULL REFERENCES fast_disorders(id) ON DELETE CASCADE',
+                'probability DECIMAL(8,6) NOT NULL',
+                'confidence DECIMAL(5,4) NOT NULL',
+                'matching_score INTEGER NOT NULL',
+                'PRIMARY KEY (symptom_id, disorder_id)'
+            ),
+            # main_fast pages through the rows of its symptom ids in key order: the key plus the
+            # values it reads answers every page from the index alone, already in that order
+            indexes=(
+                Index('symptom_disease_probs_symptom_disorder', ('symptom_id', 'disorder_id'),
+                      ('probability', 'confidence')),
+            ),
+            replaces=('idx_symptom_disease_probs_symptom', 'idx_symptom_disease_probs_prob',
+                      'symptom_disease_probs_symptom_probability'),
+            # Name-keyed rows of the older DDL; the loader recomputes every row
+            legacy_columns=('symptom_term', 'disorder_name')
+        ),
+    ),
+    views=(FAST_DIAGNOSIS_VIEW,),
+    queries=(
+        # fast_dimensions.fetch_all pages: in_ -> = ANY, keyset_filter -> the OR after the first page
+        HotQuery(
+            'symptom_probabilities',
+            "SELECT symptom_id, disorder_id, probability, confidence FROM symptom_disease_probs "
+            "WHERE symptom_id = ANY('{1,2}'::integer[]) ORDER BY symptom_id, disorder_id LIMIT 1000",
+            'symptom_disease_probs_symptom_disorder'
+        ),
+        HotQuery(
+            'symptom_probabilities_next_page',
+            "SELECT symptom_id, disorder_id, probability, confidence FROM symptom_disease_probs "
+            "WHERE symptom_id = ANY('{1,2}'::integer[]) AND (symptom_id > 1 OR (symptom_id = 1 AND disorder_id > 500)) "
+            "ORDER BY symptom_id, disorder_id LIMIT 1000",
+            'symptom_disease_probs_symptom_disorder'
+        ),
+        HotQuery(
+            'absent_symptom_penalties',
+            "SELECT symptom_id, disorder_id, probability FROM symptom_disease_probs "
+            "WHERE symptom_id = ANY('{3,4}'::integer[]) ORDER BY symptom_id, disorder_id LIMIT 1000",
+            'symptom_disease_probs_symptom_disorder'
+        ),
+        HotQuery(
+            'view_top_disorders',
+            "SELECT disorder_id, probability, confidence FROM fast_diagnosis_view "
+            "WHERE symptom_id = 1 ORDER BY probability DESC LIMIT 10",
+            'fast_diagnosis_view_symptom_probability'
+        ),
+    )
+)
+# Tables of supabase_fast_diagnosis.py / setup_supabase_tables.py
+FAST_PROBABILITIES_SCHEMA = Schema(
+    name='fast_probabilities',
+    tables=(
+        Table(
+            name='fast_symptoms',
+            columns=(
+                'id SERIAL PRIMARY KEY',
+                'symptom_name TEXT NOT NULL',
+                'symptom_count INTEGER DEFAULT 0',
+                'created_at TIMESTAMP DEFAULT NOW()'
+            ),
+            indexes=(
+                Index('fast_symptoms_symptom_name_key', ('symptom_name',), unique=True),
+                Index('fast_symptoms_count', ('symptom_count DESC',), ('symptom_name',)),
+            ),
+            replaces=('idx_fast_symptoms_name',)
+        ),
+        Table(
+            name='fast_diseases',
+            columns=(
+                'id SERIAL PRIMARY KEY',
+                'disease_name TEXT NOT NULL',
+                'orpha_code TEXT',
+                'symptom_count INTEGER DEFAULT 0',
+                'created_at TIMESTAMP DEFAULT NOW()'
+            ),
+            indexes=(
+                Index('fast_diseases_disease_name_key', ('disease_name',), unique=True),
+                Index('fast_diseases_count', ('symptom_count DESC',), ('disease_name', 'orpha_code')),
+            ),
+            replaces=('idx_fast_diseases_name',)
+        ),
+        Table(
+            name='fast_probabilities',
+            columns=(
+                'id SERIAL PRIMARY KEY',
+                'symptom_name TEXT NOT NULL',
+                'disease_name TEXT NOT NULL',
+                'orpha_code TEXT',
+                'probability FLOAT NOT NULL',
+                'frequency FLOAT NOT NULL',
+                'confidence_score FLOAT NOT NULL',
+                'created_at TIMESTAMP DEFAULT NOW()'
+            ),
+            indexes=(
+                Index('fast_probabilities_symptom_name_disease_name_key', ('symptom_name', 'disease_name'), unique=True),
+                Index('fast_probabilities_symptom', ('symptom_name',),
+                      ('disease_name', 'orpha_code', 'probability', 'frequency', 'confidence_score')),
+            ),
+            replaces=('idx_fast_probabilities_symptom', 'idx_fast_probabilities_disease',
+                      'idx_fast_probabilities_probability')
+        ),
+    ),
+    queries=(
+        HotQuery(
+            'present_symptom_probabilities',
+            "SELECT disease_name, orpha_code, probability, frequency, confidence_score, symptom_name "
+            "FROM fast_probabilities WHERE symptom_name IN ('Seizure', 'Fever')",
+            'fast_probabilities_symptom'
+        ),
+        HotQuery(
+            'top_symptoms',
+            "SELECT symptom_name FROM fast_symptoms ORDER BY symptom_count DESC LIMIT 50",
+            'fast_symptoms_count'
+        ),
+        HotQuery(
+            'top_diseases',
+            "SELECT disease_name, orpha_code, symptom_count FROM fast_diseases ORDER BY symptom_count DESC LIMIT 50",
+            'fast_diseases_count'
+        ),
+    )
+)
+
+SCHEMAS = {schema.name: schema for schema in (FAST_DIAGNOSIS_SCHEMA, FAST_PROBABILITIES_SCHEMA)}
+
+
+def plan_scans(plan: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """(node type, index name) of every scan node in an EXPLAIN (FORMAT JSON) plan"""
+    scans = []
+    if 'Scan' in plan['Node Type']:
+        scans.append((plan['Node Type'], plan.get('Index Name', '')))
+    for child in plan.get('Plans', []):
+        scans.extend(plan_scans(child))
+    return scans
+
+
+def is_index_only(plan: Dict[str, Any], index: str) -> bool:
+    """Whether the plan reads through the given index only, never touching the table"""
+    return plan_scans(plan) == [('Index Only Scan', index)]
+
+
+def verify_plans(dsn: str, schema: Schema) -> Dict[str, bool]:
+    """
+    Create the schema in a scratch Postgres schema, EXPLAIN every hot query and report whether it is
+    an index-only scan on its index. Sequential and bitmap scans are disabled, as the empty tables
+    would otherwise always be read sequentially. Everything is rolled back afterwards.
+    """
+    if not PSYCOPG2_AVAILABLE:
+        raise ImportError("psycopg2 is required to verify query plans")
+
+    results = {}
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("CREATE SCHEMA fast_schema_check; SET LOCAL search_path TO fast_schema_check;")
+            for statement in schema.statements():
+                cursor.execute(statement)
+            for view in schema.views:
+                cursor.execute(view.refresh_statement(concurrently=False))
+            cursor.execute("ANALYZE; SET LOCAL enable_seqscan = off; SET LOCAL enable_bitmapscan = off;")
+
+            for query in schema.queries:
+                cursor.execute(f"EXPLAIN (FORMAT JSON) {query.sql}")
+                plan = cursor.fetchone()[0]
+                plan = (json.loads(plan) if isinstance(plan, str) else plan)[0]['Plan']
+                results[query.name] = is_index_only(plan, query.index)
+                status = '✅' if results[query.name] else '❌'
+                logger.info(f"{status} {query.name}: {plan_scans(plan)}")
+    finally:
+        conn.rollback()
+        conn.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Print the fast table DDL or verify its query plans')
+    parser.add_argument('schema', nargs='?', default=FAST_DIAGNOSIS_SCHEMA.name, choices=sorted(SCHEMAS),
+                        help=f'Schema (default: {FAST_DIAGNOSIS_SCHEMA.name})')
+    parser.add_argument('--verify', metavar='DSN',
+                        help='EXPLAIN the hot queries on this Postgres server instead of printing the DDL')
+    args = parser.parse_args()
+
+    schema = SCHEMAS[args.schema]
+    if not args.verify:
+        print(schema.sql(), end='')
+        return
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    results = verify_plans(args.verify, schema)
+    print(f"\n{sum(results.values())}/{len(results)} hot queries are index-only scans")
+    sys.exit(0 if all(results.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
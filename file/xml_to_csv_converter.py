@@ -4,334 +4,285 @@ XML to CSV Converter for Orphanet Rare Disease Database Files
 Converts various Orphanet XML files to CSV format while preserving structure
 """
 
-import xml.etree.ElementTree as ET
 import csv
 import os
+from collections import defaultdict
 from typing import Dict, List, Any
 import argparse
 
+from orphanet_extract import OrphanetExtractor
+
+# Optional columnar output (Parquet / Arrow IPC)
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.ipc as pa_ipc
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+COLUMNAR_EXTENSIONS = {
+    'parquet': '.parquet',
+    'arrow': '.arrow'
+}
+
 
 class OrphanetXMLtoCSV:
     """Base class for converting Orphanet XML files to CSV"""
 
+    fieldnames: List[str] = []
+
     def __init__(self, xml_file: str, csv_file: str = None):
         self.xml_file = xml_file
         self.csv_file = csv_file or xml_file.replace('.xml', '.csv').replace('.txt', '.csv')
-        self.tree = None
-        self.root = None
-
-    def parse_xml(self):
-        """Parse the XML file"""
-        self.tree = ET.parse(self.xml_file)
-        self.root = self.tree.getroot()
+        self.extractor = OrphanetExtractor()
 
-    def get_disorder_base_info(self, disorder) -> Dict[str, str]:
+    def get_disorder_base_info(self, records: Dict[str, List[Dict[str, Any]]]) -> Dict[str, str]:
         """Extract common disorder information"""
+        disorder = records['disorders'][0]
         info = {
-            'disorder_id': disorder.get('id', ''),
-            'orpha_code': disorder.findtext('.//OrphaCode', ''),
-            'name': disorder.findtext('.//Name[@lang="en"]', ''),
-            'disorder_type': disorder.findtext('.//DisorderType/Name[@lang="en"]', ''),
-            'disorder_group': disorder.findtext('.//DisorderGroup/Name[@lang="en"]', ''),
-            'expert_link': disorder.findtext('.//ExpertLink[@lang="en"]', '')
+            'disorder_id': disorder['external_id'] or '',
+            'orpha_code': disorder['orpha_code'] or '',
+            'name': disorder['name'] or '',
+            'disorder_type': disorder['disorder_type'] or '',
+            'disorder_group': disorder['disorder_group'] or '',
+            'expert_link': disorder['expert_link'] or ''
         }
         return info
 
-
-class NaturalHistoryConverter(OrphanetXMLtoCSV):
-    """Converter for natural_history_of_rare_diseases files"""
+    def rows(self, records: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """CSV rows of one disorder's records"""
+        raise NotImplementedError
 
     def convert(self):
-        self.parse_xml()
-
+        """Stream the disorders of the XML file (one pass, bounded memory) into the CSV file"""
         with open(self.csv_file, 'w', newline='', encoding='utf-8') as csvfile:
-            fieldnames = ['disorder_id', 'orpha_code', 'name', 'disorder_type', 'disorder_group',
-                         'expert_link', 'age_of_onset', 'type_of_inheritance']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+            writer = csv.DictWriter(csvfile, fieldnames=self.fieldnames)
             writer.writeheader()
 
-            for disorder in self.root.findall('.//Disorder'):
-                base_info = self.get_disorder_base_info(disorder)
+            for records in self.extractor.iter_disorders(self.xml_file):
+                writer.writerows(self.rows(records))
 
-                # Get age of onset
-                age_onsets = []
-                for onset in disorder.findall('.//AverageAgeOfOnset'):
-                    age_onsets.append(onset.findtext('Name[@lang="en"]', ''))
 
-                # Get inheritance types
-                inheritances = []
-                for inheritance in disorder.findall('.//TypeOfInheritance'):
-                    inheritances.append(inheritance.findtext('Name[@lang="en"]', ''))
+class NaturalHistoryConverter(OrphanetXMLtoCSV):
+    """Converter for natural_history_of_rare_diseases files"""
 
-                row = base_info.copy()
-                row['age_of_onset'] = '|'.join(age_onsets)
-                row['type_of_inheritance'] = '|'.join(inheritances)
+    fieldnames = ['disorder_id', 'orpha_code', 'name', 'disorder_type', 'disorder_group',
+                  'expert_link', 'age_of_onset', 'type_of_inheritance']
 
-                writer.writerow(row)
+    def rows(self, records):
+        row = self.get_disorder_base_info(records)
+        row['age_of_onset'] = '|'.join(onset['onset_name'] or '' for onset in records['age_of_onset'])
+        row['type_of_inheritance'] = '|'.join(
+            inheritance['inheritance_name'] or '' for inheritance in records['inheritance']
+        )
+        return [row]
 
 
 class LinearisationConverter(OrphanetXMLtoCSV):
     """Converter for linearisation_of_rare_diseases files"""
 
-    def convert(self):
-        self.parse_xml()
+    fieldnames = ['disorder_id', 'orpha_code', 'name', 'target_disorder_code',
+                  'target_disorder_name', 'association_type']
 
-        with open(self.csv_file, 'w', newline='', encoding='utf-8') as csvfile:
-            fieldnames = ['disorder_id', 'orpha_code', 'name', 'target_disorder_code',
-                         'target_disorder_name', 'association_type']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
+    def rows(self, records):
+        base_info = self.get_disorder_base_info(records)
+        base = {key: base_info[key] for key in ('disorder_id', 'orpha_code', 'name')}
+
+        # Get disorder associations
+        rows = [
+            dict(base,
+                 target_disorder_code=assoc['parent_orpha_code'],
+                 target_disorder_name=assoc['parent_name'],
+                 association_type=assoc['association_type'])
+            for assoc in records['classifications']
+        ]
 
-            for disorder in self.root.findall('.//Disorder'):
-                base_info = self.get_disorder_base_info(disorder)
-
-                # Get disorder associations
-                for assoc in disorder.findall('.//DisorderDisorderAssociation'):
-                    row = {
-                        'disorder_id': base_info['disorder_id'],
-                        'orpha_code': base_info['orpha_code'],
-                        'name': base_info['name'],
-                        'target_disorder_code': assoc.findtext('.//TargetDisorder/OrphaCode', ''),
-                        'target_disorder_name': assoc.findtext('.//TargetDisorder/Name[@lang="en"]', ''),
-                        'association_type': assoc.findtext('.//DisorderDisorderAssociationType/Name[@lang="en"]', '')
-                    }
-                    writer.writerow(row)
-
-                # If no associations, write basic info
-                if not disorder.findall('.//DisorderDisorderAssociation'):
-                    row = {
-                        'disorder_id': base_info['disorder_id'],
-                        'orpha_code': base_info['orpha_code'],
-                        'name': base_info['name'],
-                        'target_disorder_code': '',
-                        'target_disorder_name': '',
-                        'association_type': ''
-                    }
-                    writer.writerow(row)
+        # If no associations, write basic info
+        return rows or [base]
 
 
 class EpidemiologyConverter(OrphanetXMLtoCSV):
     """Converter for epidemiology_of_rare_diseases files"""
 
-    def convert(self):
-        self.parse_xml()
+    fieldnames = ['disorder_id', 'orpha_code', 'name', 'disorder_type', 'disorder_group',
+                  'prevalence_type', 'prevalence_qualification', 'prevalence_class',
+                  'val_moy', 'prevalence_geographic', 'prevalence_validation_status', 'source']
 
-        with open(self.csv_file, 'w', newline='', encoding='utf-8') as csvfile:
-            fieldnames = ['disorder_id', 'orpha_code', 'name', 'disorder_type', 'disorder_group',
-                         'prevalence_type', 'prevalence_qualification', 'prevalence_class',
-                         'val_moy', 'prevalence_geographic', 'prevalence_validation_status', 'source']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
+    def rows(self, records):
+        base_info = self.get_disorder_base_info(records)
+        base = {key: base_info[key] for key in ('disorder_id', 'orpha_code', 'name', 'disorder_type', 'disorder_group')}
 
-            for disorder in self.root.findall('.//Disorder'):
-                base_info = self.get_disorder_base_info(disorder)
-
-                # Get prevalence data
-                for prev in disorder.findall('.//Prevalence'):
-                    row = {
-                        'disorder_id': base_info['disorder_id'],
-                        'orpha_code': base_info['orpha_code'],
-                        'name': base_info['name'],
-                        'disorder_type': base_info['disorder_type'],
-                        'disorder_group': base_info['disorder_group'],
-                        'prevalence_type': prev.findtext('.//PrevalenceType/Name[@lang="en"]', ''),
-                        'prevalence_qualification': prev.findtext('.//PrevalenceQualification/Name[@lang="en"]', ''),
-                        'prevalence_class': prev.findtext('.//PrevalenceClass/Name[@lang="en"]', ''),
-                        'val_moy': prev.findtext('ValMoy', ''),
-                        'prevalence_geographic': prev.findtext('.//PrevalenceGeographic/Name[@lang="en"]', ''),
-                        'prevalence_validation_status': prev.findtext('.//PrevalenceValidationStatus/Name[@lang="en"]', ''),
-                        'source': prev.findtext('Source', '')
-                    }
-                    writer.writerow(row)
-
-                # If no prevalence data, write basic info
-                if not disorder.findall('.//Prevalence'):
-                    row = {
-                        'disorder_id': base_info['disorder_id'],
-                        'orpha_code': base_info['orpha_code'],
-                        'name': base_info['name'],
-                        'disorder_type': base_info['disorder_type'],
-                        'disorder_group': base_info['disorder_group']
-                    }
-                    writer.writerow(row)
+        # Get prevalence data
+        rows = [
+            dict(base,
+                 prevalence_type=prev['prevalence_type'],
+                 prevalence_qualification=prev['prevalence_qualification'],
+                 prevalence_class=prev['prevalence_class'],
+                 val_moy=prev['val_moy'],
+                 prevalence_geographic=prev['geographic_area'],
+                 prevalence_validation_status=prev['validation_status'],
+                 source=prev['source'])
+            for prev in records['prevalences']
+        ]
+
+        # If no prevalence data, write basic info
+        return rows or [base]
 
 
 class GenesConverter(OrphanetXMLtoCSV):
     """Converter for genes_associated_with_rare_diseases files"""
 
-    def convert(self):
-        self.parse_xml()
-
-        with open(self.csv_file, 'w', newline='', encoding='utf-8') as csvfile:
-            fieldnames = ['disorder_id', 'orpha_code', 'disorder_name', 'gene_symbol',
-                         'gene_name', 'gene_type', 'gene_locus', 'association_type',
-                         'association_status', 'source_of_validation']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-
-            for disorder in self.root.findall('.//Disorder'):
-                base_info = self.get_disorder_base_info(disorder)
-
-                # Get gene associations
-                for gene_assoc in disorder.findall('.//DisorderGeneAssociation'):
-                    gene = gene_assoc.find('Gene')
-                    if gene is not None:
-                        row = {
-                            'disorder_id': base_info['disorder_id'],
-                            'orpha_code': base_info['orpha_code'],
-                            'disorder_name': base_info['name'],
-                            'gene_symbol': gene.findtext('Symbol', ''),
-                            'gene_name': gene.findtext('Name[@lang="en"]', ''),
-                            'gene_type': gene.findtext('.//GeneType/Name[@lang="en"]', ''),
-                            'gene_locus': gene.findtext('.//GeneLocus', ''),
-                            'association_type': gene_assoc.findtext('.//DisorderGeneAssociationType/Name[@lang="en"]', ''),
-                            'association_status': gene_assoc.findtext('.//DisorderGeneAssociationStatus/Name[@lang="en"]', ''),
-                            'source_of_validation': gene_assoc.findtext('SourceOfValidation', '')
-                        }
-                        writer.writerow(row)
-
-                # If no gene associations, write basic info
-                if not disorder.findall('.//DisorderGeneAssociation'):
-                    row = {
-                        'disorder_id': base_info['disorder_id'],
-                        'orpha_code': base_info['orpha_code'],
-                        'disorder_name': base_info['name']
-                    }
-                    writer.writerow(row)
+    fieldnames = ['disorder_id', 'orpha_code', 'disorder_name', 'gene_symbol',
+                  'gene_name', 'gene_type', 'gene_locus', 'association_type',
+                  'association_status', 'source_of_validation', 'gene_synonyms']
+
+    def rows(self, records):
+        base_info = self.get_disorder_base_info(records)
+        base = {'disorder_id': base_info['disorder_id'], 'orpha_code': base_info['orpha_code'],
+                'disorder_name': base_info['name']}
+
+        # Gene records are in the same order as the associations
+        synonyms = defaultdict(list)
+        for synonym in records['gene_synonyms']:
+            synonyms[synonym['gene_symbol']].append(synonym['synonym'])
+
+        rows = [
+            dict(base,
+                 gene_symbol=gene['symbol'],
+                 gene_name=gene['name'],
+                 gene_type=gene['gene_type'],
+                 gene_locus=gene['locus'],
+                 association_type=assoc['association_type'],
+                 association_status=assoc['association_status'],
+                 source_of_validation=assoc['source_of_validation'],
+                 gene_synonyms='|'.join(synonyms[gene['symbol']]))
+            for gene, assoc in zip(records['genes'], records['gene_associations'])
+        ]
+
+        # If no gene associations, write basic info
+        return rows or [base]
 
 
 class FunctionalConsequencesConverter(OrphanetXMLtoCSV):
     """Converter for rare_diseases_and_functional_consequences files"""
 
-    def convert(self):
-        self.parse_xml()
+    fieldnames = ['disorder_id', 'orpha_code', 'disorder_name', 'disorder_type',
+                  'disability_name', 'frequency', 'temporality', 'severity',
+                  'loss_of_ability', 'type', 'defined']
 
-        with open(self.csv_file, 'w', newline='', encoding='utf-8') as csvfile:
-            fieldnames = ['disorder_id', 'orpha_code', 'disorder_name', 'disorder_type',
-                         'disability_name', 'frequency', 'temporality', 'severity',
-                         'loss_of_ability', 'type', 'defined']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
+    def rows(self, records):
+        base_info = self.get_disorder_base_info(records)
 
-            for disorder_disability in self.root.findall('.//DisorderDisabilityRelevance'):
-                disorder = disorder_disability.find('Disorder')
-                if disorder is not None:
-                    base_info = self.get_disorder_base_info(disorder)
-
-                    # Get disability associations
-                    for disability_assoc in disorder_disability.findall('.//DisabilityDisorderAssociation'):
-                        row = {
-                            'disorder_id': base_info['disorder_id'],
-                            'orpha_code': base_info['orpha_code'],
-                            'disorder_name': base_info['name'],
-                            'disorder_type': base_info['disorder_type'],
-                            'disability_name': disability_assoc.findtext('.//Disability/Name[@lang="en"]', ''),
-                            'frequency': disability_assoc.findtext('.//FrequenceDisability/Name[@lang="en"]', ''),
-                            'temporality': disability_assoc.findtext('.//TemporalityDisability/Name[@lang="en"]', ''),
-                            'severity': disability_assoc.findtext('.//SeverityDisability/Name[@lang="en"]', ''),
-                            'loss_of_ability': disability_assoc.findtext('LossOfAbility', ''),
-                            'type': disability_assoc.findtext('Type', ''),
-                            'defined': disability_assoc.findtext('Defined', '')
-                        }
-                        writer.writerow(row)
+        # Get disability associations
+        return [
+            {
+                'disorder_id': base_info['disorder_id'],
+                'orpha_code': base_info['orpha_code'],
+                'disorder_name': base_info['name'],
+                'disorder_type': base_info['disorder_type'],
+                **{key: assoc[key] for key in ('disability_name', 'frequency', 'temporality', 'severity',
+                                               'loss_of_ability', 'type', 'defined')}
+            }
+            for assoc in records['disability_associations']
+        ]
 
 
 class TerminologyAlignmentConverter(OrphanetXMLtoCSV):
     """Converter for rare_disease_alignment_with_terminology files"""
 
-    def convert(self):
-        self.parse_xml()
+    fieldnames = ['disorder_id', 'orpha_code', 'disorder_name', 'disorder_type',
+                  'synonym', 'external_source', 'external_reference', 'mapping_relation',
+                  'mapping_validation_status', 'definition']
+
+    def rows(self, records):
+        base_info = self.get_disorder_base_info(records)
+        texts = records['disorder_texts']
+        base = {
+            'disorder_id': base_info['disorder_id'],
+            'orpha_code': base_info['orpha_code'],
+            'disorder_name': base_info['name'],
+            'disorder_type': base_info['disorder_type'],
+            'synonym': '|'.join(synonym['synonym'] for synonym in records['disorder_synonyms']),
+            'definition': (texts[0]['content'] or '') if texts else ''
+        }
 
-        with open(self.csv_file, 'w', newline='', encoding='utf-8') as csvfile:
-            fieldnames = ['disorder_id', 'orpha_code', 'disorder_name', 'disorder_type',
-                         'synonym', 'external_source', 'external_reference', 'mapping_relation',
-                         'mapping_validation_status', 'definition']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
+        # Get external references
+        rows = [
+            dict(base,
+                 external_source=ref['source'],
+                 external_reference=ref['reference'],
+                 mapping_relation=ref['mapping_relation'],
+                 mapping_validation_status=ref['mapping_validation_status'])
+            for ref in records['external_references']
+        ]
 
-            for disorder in self.root.findall('.//Disorder'):
-                base_info = self.get_disorder_base_info(disorder)
-
-                # Get synonyms
-                synonyms = []
-                for synonym in disorder.findall('.//Synonym[@lang="en"]'):
-                    synonyms.append(synonym.text)
-                synonym_str = '|'.join(synonyms) if synonyms else ''
-
-                # Get definition
-                definition = disorder.findtext('.//TextSection[@lang="en"]/Contents', '')
-
-                # Get external references
-                has_refs = False
-                for ext_ref in disorder.findall('.//ExternalReference'):
-                    has_refs = True
-                    row = {
-                        'disorder_id': base_info['disorder_id'],
-                        'orpha_code': base_info['orpha_code'],
-                        'disorder_name': base_info['name'],
-                        'disorder_type': base_info['disorder_type'],
-                        'synonym': synonym_str,
-                        'external_source': ext_ref.findtext('Source', ''),
-                        'external_reference': ext_ref.findtext('Reference', ''),
-                        'mapping_relation': ext_ref.findtext('.//DisorderMappingRelation/Name[@lang="en"]', ''),
-                        'mapping_validation_status': ext_ref.findtext('.//DisorderMappingValidationStatus/Name[@lang="en"]', ''),
-                        'definition': definition
-                    }
-                    writer.writerow(row)
-
-                # If no external references, write basic info
-                if not has_refs:
-                    row = {
-                        'disorder_id': base_info['disorder_id'],
-                        'orpha_code': base_info['orpha_code'],
-                        'disorder_name': base_info['name'],
-                        'disorder_type': base_info['disorder_type'],
-                        'synonym': synonym_str,
-                        'definition': definition
-                    }
-                    writer.writerow(row)
+        # If no external references, write basic info
+        return rows or [base]
 
 
 class ClinicalSignsConverter(OrphanetXMLtoCSV):
     """Converter for clinical_signs_and_symptoms_in_rare_diseases files"""
 
-    def convert(self):
-        self.parse_xml()
+    fieldnames = ['disorder_id', 'orpha_code', 'disorder_name', 'disorder_type',
+                  'hpo_id', 'hpo_term', 'hpo_frequency', 'diagnostic_criteria']
 
-        with open(self.csv_file, 'w', newline='', encoding='utf-8') as csvfile:
-            fieldnames = ['disorder_id', 'orpha_code', 'disorder_name', 'disorder_type',
-                         'hpo_id', 'hpo_term', 'hpo_frequency', 'diagnostic_criteria']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
+    def rows(self, records):
+        base_info = self.get_disorder_base_info(records)
+        base = {
+            'disorder_id': base_info['disorder_id'],
+            'orpha_code': base_info['orpha_code'],
+            'disorder_name': base_info['name'],
+            'disorder_type': base_info['disorder_type']
+        }
 
-            for hpo_disorder in self.root.findall('.//HPODisorderSetStatus'):
-                disorder = hpo_disorder.find('Disorder')
-                if disorder is not None:
-                    base_info = self.get_disorder_base_info(disorder)
-
-                    # Get HPO associations
-                    for hpo_assoc in disorder.findall('.//HPODisorderAssociation'):
-                        row = {
-                            'disorder_id': base_info['disorder_id'],
-                            'orpha_code': base_info['orpha_code'],
-                            'disorder_name': base_info['name'],
-                            'disorder_type': base_info['disorder_type'],
-                            'hpo_id': hpo_assoc.findtext('.//HPOId', ''),
-                            'hpo_term': hpo_assoc.findtext('.//HPOTerm', ''),
-                            'hpo_frequency': hpo_assoc.findtext('.//HPOFrequency/Name[@lang="en"]', ''),
-                            'diagnostic_criteria': hpo_assoc.findtext('DiagnosticCriteria', '')
-                        }
-                        writer.writerow(row)
-
-                    # If no HPO associations, write basic info
-                    if not disorder.findall('.//HPODisorderAssociation'):
-                        row = {
-                            'disorder_id': base_info['disorder_id'],
-                            'orpha_code': base_info['orpha_code'],
-                            'disorder_name': base_info['name'],
-                            'disorder_type': base_info['disorder_type']
-                        }
-                        writer.writerow(row)
+        # Get HPO associations (HPO term records are in the same order)
+        rows = [
+            dict(base,
+                 hpo_id=assoc['hpo_id'],
+                 hpo_term=term['term'],
+                 hpo_frequency=assoc['frequency'],
+                 diagnostic_criteria=assoc['diagnostic_criteria'])
+            for term, assoc in zip(records['hpo_terms'], records['hpo_associations'])
+        ]
+
+        # If no HPO associations, write basic info
+        return rows or [base]
+
+
+def write_columnar(csv_file: str, fmt: str = 'parquet', output_file: str = None) -> str:
+    """Write a converted CSV as Parquet or Arrow IPC with dictionary-encoded string columns"""
+    if not PYARROW_AVAILABLE:
+        raise ImportError("pyarrow is required for columnar output (pip install pyarrow)")
+
+    if fmt not in COLUMNAR_EXTENSIONS:
+        raise ValueError(f"Unknown columnar format: {fmt}")
+
+    output_file = output_file or os.path.splitext(csv_file)[0] + COLUMNAR_EXTENSIONS[fmt]
+
+    # Empty fields must stay null so the loaders see the same values as pd.read_csv
+    table = pa_csv.read_csv(
+        csv_file,
+        convert_options=pa_csv.ConvertOptions(strings_can_be_null=True)
+    )
+
+    # Orphanet products repeat the same names, types and terms on every row,
+    # so dictionary encoding keeps the files small and the loaders fast
+    columns = []
+    for column in table.columns:
+        if pa.types.is_string(column.type):
+            column = column.dictionary_encode()
+        columns.append(column)
+    table = pa.Table.from_arrays(columns, names=table.column_names)
+
+    if fmt == 'parquet':
+        pq.write_table(table, output_file, compression='zstd')
+    else:
+        with pa_ipc.new_file(output_file, table.schema) as writer:
+            writer.write_table(table)
+
+    return output_file
 
 
 def get_converter_for_file(filename: str) -> OrphanetXMLtoCSV:
@@ -360,6 +311,8 @@ def main():
     parser = argparse.ArgumentParser(description='Convert Orphanet XML files to CSV format')
     parser.add_argument('input_files', nargs='+', help='Input XML file(s) to convert')
     parser.add_argument('--output-dir', '-o', help='Output directory for CSV files (default: same as input)')
+    parser.add_argument('--columnar', choices=sorted(COLUMNAR_EXTENSIONS),
+                        help='Also write a Parquet or Arrow IPC copy next to each CSV')
 
     args = parser.parse_args()
 
@@ -367,6 +320,19 @@ def main():
         try:
             print(f"Processing: {input_file}")
 
+            # Already-converted CSVs only need the columnar copy
+            if input_file.endswith('.csv'):
+                if not args.columnar:
+                    print("  ✗ CSV input requires --columnar")
+                    continue
+                output_file = None
+                if args.output_dir:
+                    basename = os.path.splitext(os.path.basename(input_file))[0]
+                    output_file = os.path.join(args.output_dir, basename + COLUMNAR_EXTENSIONS[args.columnar])
+                columnar_name = write_columnar(input_file, args.columnar, output_file)
+                print(f"  ✓ Wrote columnar copy: {columnar_name}")
+                continue
+
             # Get appropriate converter
             converter_class = get_converter_for_file(input_file)
 
@@ -385,6 +351,10 @@ def main():
             output_name = output_file or input_file.replace('.xml', '.csv').replace('.txt', '.csv')
             print(f"  ✓ Converted to: {output_name}")
 
+            if args.columnar:
+                columnar_name = write_columnar(output_name, args.columnar)
+                print(f"  ✓ Wrote columnar copy: {columnar_name}")
+
         except Exception as e:
             print(f"  ✗ Error processing {input_file}: {str(e)}")
 
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Import Audit - Cold-start profile of an API entry point
+Imports a module in a fresh interpreter under -X importtime, optionally runs its startup (lifespan),
+and reports the slowest packages and which heavy dependencies were loaded
+"""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+from typing import Any, Dict, List, Optional
+
+# Dependencies the serving path should only load on fallback and loader paths
+HEAVY_MODULES = ('pandas', 'pyarrow', 'scipy', 'supabase', 'requests', 'lxml')
+
+RESULT_MARKER = '__IMPORT_AUDIT__'
+
+# Runs in the child interpreter
+CHILD_CODE = '''
+import sys, json, time, asyncio, importlib
+start = time.perf_counter()
+module = importlib.import_module({module!r})
+import_seconds = time.perf_counter() - start
+loaded_after_import = sorted(name for name in sys.modules if '.' not in name)
+
+startup_seconds = None
+if {startup!r}:
+    async def run():
+        async with module.app.router.lifespan_context(module.app):
+            pass
+    start = time.perf_counter()
+    asyncio.run(run())
+    startup_seconds = time.perf_counter() - start
+
+print({marker!r} + json.dumps({{
+    'import_seconds': import_seconds,
+    'startup_seconds': startup_seconds,
+    'after_import': loaded_after_import,
+    'after_startup': sorted(name for name in sys.modules if '.' not in name)
+}}))
+'''
+
+
+def parse_importtime(stderr: str) -> List[Dict[str, Any]]:
+    """Top-level packages with their cumulative import time in ms, slowest first"""
+    packages = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, self_us, cumulative_us, name = [part.strip() for part in line.replace('import time:', '|', 1).split('|')]
+        if '.' not in name:
+            packages.append({'module': name, 'cumulative_ms': int(cumulative_us) / 1000, 'self_ms': int(self_us) / 1000})
+    packages.sort(key=lambda row: row['cumulative_ms'], reverse=True)
+    return packages
+
+
+def audit(module: str, startup: bool = False, cwd: Optional[str] = None) -> Dict[str, Any]:
+    """Import `module` (and run its app lifespan when startup is set) in a fresh interpreter"""
+    code = CHILD_CODE.format(module=module, startup=startup, marker=RESULT_MARKER)
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [os.path.dirname(os.path.abspath(__file__)), env.get('PYTHONPATH')]))
+
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        capture_output=True, text=True, cwd=cwd, env=env
+    )
+    lines = [line for line in proc.stdout.splitlines() if line.startswith(RESULT_MARKER)]
+    if proc.returncode != 0 or not lines:
+        raise RuntimeError(f"Importing {module} failed:\n{proc.stderr[-2000:]}")
+
+    result = json.loads(lines[-1][len(RESULT_MARKER):])
+    result['module'] = module
+    result['packages'] = parse_importtime(proc.stderr)
+    result['heavy_after_import'] = [name for name in HEAVY_MODULES if name in result['after_import']]
+    result['heavy_after_startup'] = [name for name in HEAVY_MODULES if name in result['after_startup']]
+    return result
+
+
+def print_report(result: Dict[str, Any], top: int = 15):
+    """Human-readable summary"""
+    print(f"\n📦 import {result['module']}: {result['import_seconds'] * 1000:.0f}ms")
+    if result['startup_seconds'] is not None:
+        print(f"🚀 startup (lifespan): {result['startup_seconds'] * 1000:.0f}ms")
+
+    print(f"  {'package':30s} {'cumulative ms':>14s}")
+    for row in result['packages'][:top]:
+        print(f"  {row['module']:30s} {row['cumulative_ms']:14.1f}")
+
+    print(f"\n  heavy modules after import:  {', '.join(result['heavy_after_import']) or 'none'}")
+    if result['startup_seconds'] is not None:
+        print(f"  heavy modules after startup: {', '.join(result['heavy_after_startup']) or 'none'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cold-start import profile of an API entry point')
+    parser.add_argument('module', nargs='?', default='main', help='Module to import (default: main)')
+    parser.add_argument('--startup', action='store_true', help='Also run the app lifespan (data load and warm-up)')
+    parser.add_argument('--cwd', help='Working directory of the child process (where the data files are)')
+    parser.add_argument('--top', type=int, default=15, help='Number of packages to list')
+    parser.add_argument('--forbid', nargs='+', default=[],
+                        help='Exit non-zero if any of these modules is loaded (e.g. --forbid pandas)')
+    parser.add_argument('--json', action='store_true', help='Print the raw result as JSON')
+    args = parser.parse_args()
+
+    result = audit(args.module, args.startup, args.cwd)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result, args.top)
+
+    loaded = result['after_startup'] if args.startup else result['after_import']
+    forbidden = [name for name in args.forbid if name in loaded]
+    if forbidden:
+        print(f"❌ Forbidden modules loaded: {', '.join(forbidden)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Load Test - Concurrent load generator for the diagnosis HTTP API
+Replays a weighted request mix against /diagnose, /symptoms and /diseases at a target RPS
+and records latency histograms and error rates per scenario (diagnose per computation_mode)
+"""
+
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_URL = 'http://localhost:8000'
+DEFAULT_OUTPUT = 'load_test_results.json'
+
+# Scenario -> relative weight in the request mix
+DEFAULT_MIX = {'diagnose_fast': 6, 'diagnose_true': 1, 'symptoms': 2, 'diseases': 1}
+SCENARIOS = ('diagnose_fast', 'diagnose_true', 'symptoms', 'diseases')
+
+# Latency histogram bucket upper bounds in ms (the last bucket is open-ended)
+HISTOGRAM_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000)
+
+PERCENTILES = (50, 95, 99)
+
+
+class ScenarioStats:
+    """Latencies and outcomes of one scenario"""
+
+    def __init__(self):
+        self.latencies_ms: List[float] = []
+        self.status_counts: Dict[str, int] = {}
+
+    def record(self, latency_ms: float, outcome: str):
+        """outcome is the HTTP status code, or the exception name for transport errors"""
+        self.latencies_ms.append(latency_ms)
+        self.status_counts[outcome] = self.status_counts.get(outcome, 0) + 1
+
+    @property
+    def errors(self) -> int:
+        return sum(count for outcome, count in self.status_counts.items() if not outcome.startswith('2'))
+
+    def summary(self, elapsed_seconds: float) -> Dict[str, Any]:
+        """Counts, error rate, percentiles and histogram"""
+        calls = len(self.latencies_ms)
+        result = {
+            'requests': calls,
+            'errors': self.errors,
+            'error_rate': self.errors / calls if calls else 0.0,
+            'achieved_rps': calls / elapsed_seconds if elapsed_seconds > 0 else 0.0,
+            'status_counts': dict(sorted(self.status_counts.items())),
+            'histogram_ms': latency_histogram(self.latencies_ms)
+        }
+        if calls:
+            latencies = np.asarray(self.latencies_ms)
+            result['mean_ms'] = float(latencies.mean())
+            for p in PERCENTILES:
+                result[f'p{p}_ms'] = float(np.percentile(latencies, p))
+        return result
+
+
+def latency_histogram(latencies_ms: List[float]) -> Dict[str, int]:
+    """Request counts per latency bucket, keyed by upper bound ('le_<ms>', then 'inf')"""
+    edges = np.asarray(HISTOGRAM_BUCKETS_MS, dtype=np.float64)
+    counts = np.bincount(np.searchsorted(edges, latencies_ms, side='left'), minlength=len(edges) + 1)
+    labels = [f'le_{edge}' for edge in HISTOGRAM_BUCKETS_MS] + ['inf']
+    return dict(zip(labels, counts.tolist()))
+
+
+def parse_mix(text: Optional[str]) -> Dict[str, float]:
+    """'diagnose_fast=6,symptoms=2' -> weights; unlisted scenarios are not sent"""
+    if not text:
+        return dict(DEFAULT_MIX)
+
+    mix = {}
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario '{name}' (expected one of {', '.join(SCENARIOS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def load_profiles(path: str) -> List[Dict[str, List[str]]]:
+    """Symptom profiles from JSON: a list of symptom lists or of {'present': [...], 'absent': [...]}"""
+    with open(path) as f:
+        data = json.load(f)
+    return [
+        {'present': list(item), 'absent': []} if isinstance(item, list)
+        else {'present': item['present'], 'absent': item.get('absent', [])}
+        for item in data
+    ]
+
+
+def random_profiles(symptoms: List[str], count: int, max_symptoms: int, seed: int) -> List[Dict[str, List[str]]]:
+    """Seeded profiles of 1..max_symptoms present symptoms drawn from the API's symptom list"""
+    rng = random.Random(seed)
+    return [
+        {'present': rng.sample(symptoms, min(rng.randint(1, max_symptoms), len(symptoms))), 'absent': []}
+        for _ in range(count)
+    ]
+
+
+def build_request(scenario: str, profile: Dict[str, List[str]], rng: random.Random, top_n: int = 10):
+    """(method, path, params, json body) for one request of a scenario"""
+    if scenario.startswith('diagnose_'):
+        body = {
+            'present_symptoms': profile['present'],
+            'absent_symptoms': profile['absent'],
+            'top_n': top_n,
+            'computation_mode': scenario[len('diagnose_'):]
+        }
+        return 'POST', '/diagnose', None, body
+
+    # Search with a fragment of a known symptom half of the time
+    params = {'limit': 50}
+    if rng.random() < 0.5 and profile['present']:
+        params['search'] = profile['present'][0][:4]
+    return 'GET', f'/{scenario}', params, None
+
+
+class LoadGenerator:
+    """Open-loop load generator: requests start on a fixed schedule whether or not earlier ones finished"""
+
+    def __init__(
+        self,
+        base_url: str,
+        profiles: List[Dict[str, List[str]]],
+        mix: Dict[str, float],
+        rps: float,
+        duration: float,
+        max_in_flight: int = 256,
+        timeout: float = 60.0,
+        poisson: bool = False,
+        seed: int = 42
+    ):
+        self.base_url = base_url.rstrip('/')
+        self.profiles = profiles
+        self.mix = mix
+        self.rps = rps
+        self.duration = duration
+        self.timeout = timeout
+        self.poisson = poisson
+        self.rng = random.Random(seed)
+        self.semaphore = asyncio.Semaphore(max_in_flight)
+        self.stats = {name: ScenarioStats() for name in mix}
+        self.max_lag_ms = 0.0  # how late the generator started a request (client saturation)
+
+    async def _send(self, client, scenario: str, request):
+        method, path, params, body = request
+        async with self.semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, params=params, json=body)
+                outcome = str(response.status_code)
+            except Exception as e:
+                outcome = type(e).__name__
+            self.stats[scenario].record((time.perf_counter() - start) * 1000, outcome)
+
+    async def run(self) -> float:
+        """Send the load; returns the elapsed seconds"""
+        names = list(self.mix)
+        weights = [self.mix[name] for name in names]
+        tasks = []
+
+        async with httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout) as client:
+            start = time.perf_counter()
+            next_at = 0.0
+            while next_at < self.duration:
+                lag = time.perf_counter() - start - next_at
+                if lag < 0:
+                    await asyncio.sleep(-lag)
+                else:
+                    self.max_lag_ms = max(self.max_lag_ms, lag * 1000)
+
+                scenario = self.rng.choices(names, weights)[0]
+                request = build_request(scenario, self.rng.choice(self.profiles), self.rng)
+                tasks.append(asyncio.create_task(self._send(client, scenario, request)))
+
+                next_at += self.rng.expovariate(self.rps) if self.poisson else 1.0 / self.rps
+
+            await asyncio.gather(*tasks)
+            return time.perf_counter() - start
+
+    def report(self, elapsed_seconds: float) -> Dict[str, Any]:
+        """JSON-serializable results"""
+        scenarios = {name: stats.summary(elapsed_seconds) for name, stats in self.stats.items()}
+        total = sum(s['requests'] for s in scenarios.values())
+        errors = sum(s['errors'] for s in scenarios.values())
+        return {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'base_url': self.base_url,
+            'target_rps': self.rps,
+            'duration_s': self.duration,
+            'elapsed_s': elapsed_seconds,
+            'arrivals': 'poisson' if self.poisson else 'constant',
+            'mix': self.mix,
+            'requests': total,
+            'error_rate': errors / total if total else 0.0,
+            'achieved_rps': total / elapsed_seconds if elapsed_seconds > 0 else 0.0,
+            'max_schedule_lag_ms': self.max_lag_ms,
+            'scenarios': scenarios
+        }
+
+
+def print_report(report: Dict[str, Any]):
+    """Human-readable per-scenario table"""
+    print(f"\n📊 {report['requests']} requests in {report['elapsed_s']:.1f}s "
+          f"({report['achieved_rps']:.1f} req/s, target {report['target_rps']}), "
+          f"error rate {report['error_rate']:.1%}")
+    print(f"  {'scenario':15s} {'reqs':>6s} {'errors':>7s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s}")
+    for name, s in report['scenarios'].items():
+        if not s['requests']:
+            continue
+        print(f"  {name:15s} {s['requests']:6d} {s['errors']:7d} {s['p50_ms']:9.1f} {s['p95_ms']:9.1f} {s['p99_ms']:9.1f}")
+    if report['max_schedule_lag_ms'] > 100:
+        print(f"⚠️  Generator fell {report['max_schedule_lag_ms']:.0f}ms behind schedule - results understate the target RPS")
+
+
+async def fetch_symptoms(base_url: str, limit: int = 2000) -> List[str]:
+    """Symptom names served by the API under test"""
+    async with httpx.AsyncClient(base_url=base_url.rstrip('/'), timeout=60) as client:
+        response = await client.get('/symptoms', params={'limit': limit})
+        response.raise_for_status()
+        return response.json()['symptoms']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent load test of the diagnosis API')
+    parser.add_argument('--url', default=DEFAULT_URL, help='Base URL of the API under test')
+    parser.add_argument('--rps', type=float, default=20.0, help='Target requests per second')
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds of load')
+    parser.add_argument('--mix', help=f"Scenario weights, e.g. {','.join(f'{k}={v}' for k, v in DEFAULT_MIX.items())}")
+    parser.add_argument('--profiles', help='JSON symptom profiles (default: random symptoms from /symptoms)')
+    parser.add_argument('--max-symptoms', type=int, default=8, help='Max present symptoms of random profiles')
+    parser.add_argument('--max-in-flight', type=int, default=256, help='Cap on concurrent requests')
+    parser.add_argument('--timeout', type=float, default=60.0, help='Per-request timeout in seconds')
+    parser.add_argument('--poisson', action='store_true', help='Poisson arrivals instead of a constant rate')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', '-o', default=DEFAULT_OUTPUT, help='JSON result file')
+    args = parser.parse_args()
+
+    if not HTTPX_AVAILABLE:
+        print("❌ httpx is required: pip install httpx")
+        return
+
+    mix = parse_mix(args.mix)
+    if args.profiles:
+        profiles = load_profiles(args.profiles)
+    else:
+        profiles = random_profiles(asyncio.run(fetch_symptoms(args.url)), 500, args.max_symptoms, args.seed)
+
+    print(f"🚀 {args.rps} req/s for {args.duration}s against {args.url} ({len(profiles)} profiles)")
+    generator = LoadGenerator(
+        args.url, profiles, mix, args.rps, args.duration,
+        args.max_in_flight, args.timeout, args.poisson, args.seed
+    )
+    elapsed = asyncio.run(generator.run())
+
+    report = generator.report(elapsed)
+    print_report(report)
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
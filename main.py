@@ -6,20 +6,24 @@ A FastAPI application for rare disease diagnosis using Bayesian inference
 
 import os
 import logging
-from typing import List, Dict, Any, Optional, Union
+from datetime import datetime
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Tuple, Union, Callable
 from contextlib import asynccontextmanager
 
-import pandas as pd
 import numpy as np
-from fastapi import FastAPI, HTTPException, Query, UploadFile, File
+from fastapi import FastAPI, HTTPException, Query, Request, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi.responses import JSONResponse, HTMLResponse, Response
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel, Field, ConfigDict
-import uvicorn
 
 # Import local fast diagnosis
-from local_fast_diagnosis import fast_diagnosis, initialize_fast_diagnosis
+from local_fast_diagnosis import fast_diagnosis, initialize_fast_diagnosis, CLINICAL_SIGNS_PRODUCT, CLINICAL_SIGNS_COLUMNS
+from orphanet_data import find_dataset, read_dataset_file
+from diagnosis_metrics import registry, CONTENT_TYPE, DIAGNOSIS_REQUESTS, CANDIDATES, StageTimer, track_requests
+from request_profiler import PROFILING_ENABLED, profiler, slow_requests, profile_requests
+from readiness import service_state, run_warmup, representative_symptoms
+from response_encoding import diagnosis_payload, encode_json, encoded_response, score_vector_response, disorder_table_response
 
 # Configure logging
 logging.basicConfig(
@@ -28,8 +32,12 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# pandas is only imported by the CSV fallback; the fast path serves from the prebuilt index
+if TYPE_CHECKING:
+    import pandas as pd
+
 # Global variable to store the loaded data
-disease_data: Optional[pd.DataFrame] = None
+disease_data: Optional['pd.DataFrame'] = None
 symptoms_list: List[str] = []
 diseases_list: List[str] = []
 
@@ -41,7 +49,14 @@ class DiagnosisRequest(BaseModel):
             "example": {
                 "present_symptoms": ["Seizure", "Intellectual disability"],
                 "absent_symptoms": ["Fever"],
-                "top_n": 10
+                "top_n": 10,
+                "computation_mode": "fast",
+                "prior": "association",
+                "genes": [],
+                "gene_mode": "restrict",
+                "onset": ["Infancy", "Childhood"],
+                "inheritance": ["Autosomal recessive"],
+                "include_unannotated": True
             }
         }
     )
@@ -61,6 +76,68 @@ class DiagnosisRequest(BaseModel):
         ge=1,
         le=50
     )
+    computation_mode: str = Field(
+        default="fast",
+        description="Computation mode: 'fast' (pre-computed) or 'true' (full Bayesian)",
+        pattern="^(fast|true)$"
+    )
+    prior: str = Field(
+        default="association",
+        description="Disease prior for 'true' mode: 'uniform', 'association' (annotation count) or 'prevalence' (Orphanet epidemiology)",
+        pattern="^(uniform|association|prevalence)$"
+    )
+    genes: List[str] = Field(
+        default_factory=list,
+        description="Gene symbols (or synonyms) from a sequencing result, e.g. ['KIF7']"
+    )
+    gene_mode: str = Field(
+        default="restrict",
+        description="How genes constrain candidates: 'restrict' (only associated disorders) or 'boost' (rank them higher)",
+        pattern="^(restrict|boost)$"
+    )
+    onset: List[str] = Field(
+        default_factory=list,
+        description="Allowed ages of onset (Orphanet natural history), e.g. ['Neonatal', 'Infancy']"
+    )
+    inheritance: List[str] = Field(
+        default_factory=list,
+        description="Allowed types of inheritance (Orphanet natural history), e.g. ['Autosomal recessive']"
+    )
+    include_unannotated: bool = Field(
+        default=True,
+        description="Keep disorders without onset/inheritance data when those filters are used"
+    )
+    top_groups: int = Field(
+        default=0,
+        description="Roll posterior mass up into this many classification groups ('true' mode only, 0 = off)",
+        ge=0,
+        le=40
+    )
+    disorders_per_group: int = Field(
+        default=3,
+        description="Number of top disorders returned within each group",
+        ge=1,
+        le=20
+    )
+    scoring: str = Field(
+        default="exact",
+        description="Symptom matching for 'true' mode: 'exact', 'propagate' (HPO ancestors also match) or 'ic_similarity' (information-content similarity)",
+        pattern="^(exact|propagate|ic_similarity)$"
+    )
+    weighting: str = Field(
+        default="uniform",
+        description="Symptom weighting for 'fast' mode: 'uniform' or 'ic' (rare symptoms weigh more, by information content)",
+        pattern="^(uniform|ic)$"
+    )
+    min_ic: float = Field(
+        default=0.0,
+        description="'fast' mode: symptoms with lower information content only score disorders found by the others (0 = off)",
+        ge=0.0
+    )
+    debug: bool = Field(
+        default=False,
+        description="Include per-stage timings (stage_timings_ms) in the response"
+    )
 
 
 class DiagnosisResult(BaseModel):
@@ -73,6 +150,15 @@ class DiagnosisResult(BaseModel):
     confidence_score: float = Field(..., description="Confidence score based on symptom coverage")
 
 
+class GroupResult(BaseModel):
+    """Posterior mass of one classification group (Orphanet linearisation)"""
+    group_name: str = Field(..., description="Classification group, e.g. 'Rare neurologic disease'")
+    group_code: str = Field(..., description="Orphanet code of the group (empty for unclassified disorders)")
+    probability: float = Field(..., description="Summed posterior probability of the group's disorders")
+    disorders_evaluated: int = Field(..., description="Number of candidate disorders in the group")
+    top_disorders: List[DiagnosisResult] = Field(..., description="Most probable disorders within the group")
+
+
 class DiagnosisResponse(BaseModel):
     """Complete response model for diagnosis endpoint"""
     success: bool = Field(..., description="Whether the diagnosis was successful")
@@ -80,6 +166,11 @@ class DiagnosisResponse(BaseModel):
     total_diseases_evaluated: int = Field(..., description="Total number of diseases evaluated")
     input_symptoms: List[str] = Field(..., description="Input symptoms that were processed")
     processing_time_ms: float = Field(..., description="Processing time in milliseconds")
+    computation_mode: str = Field(..., description="Computation mode used: 'fast' or 'true'")
+    unmatched_genes: List[str] = Field(default_factory=list, description="Requested genes not associated with any disorder")
+    groups: List[GroupResult] = Field(default_factory=list, description="Top classification groups when top_groups > 0")
+    scoring: str = Field(default="exact", description="Symptom matching used: 'exact', 'propagate' or 'ic_similarity'")
+    stage_timings_ms: Optional[Dict[str, float]] = Field(default=None, description="Time per pipeline stage (debug requests only)")
 
 
 class SystemInfo(BaseModel):
@@ -91,27 +182,24 @@ class SystemInfo(BaseModel):
     status: str
 
 
-def load_disease_data() -> bool:
-    """Load disease data from CSV file"""
+def load_disease_data(data_path: Optional[str] = None) -> bool:
+    """Load disease data from the clinical signs dataset (Parquet/Arrow copy preferred over CSV)"""
     global disease_data, symptoms_list, diseases_list
     
-    csv_file = "clinical_signs_and_symptoms_in_rare_diseases.csv"
-    
     try:
-        logger.info(f"Loading disease data from {csv_file}")
+        # Try current directory first, then file/ directory
+        if data_path is None:
+            data_path = find_dataset(CLINICAL_SIGNS_PRODUCT)
         
-        # Try to load from current directory first, then from file/ directory
-        if os.path.exists(csv_file):
-            data_path = csv_file
-        elif os.path.exists(f"file/{csv_file}"):
-            data_path = f"file/{csv_file}"
-        else:
-            logger.error(f"CSV file not found: {csv_file}")
+        if data_path is None:
+            logger.error(f"Dataset not found: {CLINICAL_SIGNS_PRODUCT}")
             return False
         
-        # Load CSV data
-        disease_data = pd.read_csv(data_path)
-        logger.info(f"Loaded {len(disease_data)} records from CSV")
+        logger.info(f"Loading disease data from {data_path}")
+        
+        # Only the columns used for diagnosis are read
+        disease_data = read_dataset_file(data_path, columns=CLINICAL_SIGNS_COLUMNS)
+        logger.info(f"Loaded {len(disease_data)} records from {data_path}")
         
         # Clean the data
         disease_data = disease_data.dropna(subset=['orpha_code', 'disorder_name', 'hpo_term'])
@@ -128,7 +216,7 @@ def load_disease_data() -> bool:
         
         # Add numeric frequency column
         disease_data['frequency_numeric'] = disease_data['hpo_frequency'].map(
-            lambda x: frequency_mapping.get(str(x).strip(), 0.5) if pd.notna(x) else 0.5
+            lambda x: frequency_mapping.get(str(x).strip(), 0.5) if isinstance(x, str) else 0.5
         )
         
         # Extract unique symptoms and diseases
@@ -206,23 +294,67 @@ def calculate_bayesian_probability(
     }
 
 
+def warmup_tasks() -> Dict[str, Callable[[], Any]]:
+    """Representative diagnoses through every available engine, serialized like /diagnose responses"""
+    if fast_diagnosis.is_ready and fast_diagnosis.index is not None:
+        index = fast_diagnosis.index
+        profiles = representative_symptoms(index)
+        
+        def task(engine, computation_mode, **options):
+            def run():
+                for symptoms in profiles.values():
+                    result = engine(symptoms, [], 10, **options)
+                    encode_json(diagnosis_payload(result, symptoms, computation_mode))
+            return run
+        
+        tasks = {
+            'local_precomputed': task(fast_diagnosis.ultra_fast_diagnosis, 'fast'),
+            'local_ic_weighted': task(fast_diagnosis.ultra_fast_diagnosis, 'fast', weighting='ic'),
+            'local_bayesian': task(fast_diagnosis.bayesian_diagnosis, 'true')
+        }
+        if index.group_ids is not None:
+            tasks['local_bayesian_groups'] = task(fast_diagnosis.bayesian_diagnosis, 'true', top_groups=5)
+        if index.ontology is not None:
+            tasks['local_bayesian_propagate'] = task(fast_diagnosis.bayesian_diagnosis, 'true', scoring='propagate')
+            tasks['local_bayesian_ic_similarity'] = task(fast_diagnosis.bayesian_diagnosis, 'true', scoring='ic_similarity')
+        return tasks
+    
+    if disease_data is not None and diseases_list:
+        symptoms = disease_data['hpo_term'].value_counts().index[:5].tolist()
+        return {'regular': lambda: [calculate_bayesian_probability(d, symptoms, []) for d in diseases_list[:20]]}
+    
+    return {}
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan manager"""
     # Startup
     logger.info("Starting Enhanced Bayesian Disease Diagnosis API...")
+    service_state.set_phase('loading')
     
     # Try fast diagnosis first
     if initialize_fast_diagnosis():
         logger.info("✅ Fast diagnosis system ready!")
+        engine = "local_index"
     else:
         # Fallback to regular CSV loading
         logger.info("Falling back to regular CSV loading...")
         success = load_disease_data()
         if not success:
             logger.error("Failed to load disease data")
+            engine = None
         else:
             logger.info("Disease data loaded successfully")
+            engine = "regular"
+    
+    # Only report ready once the first requests no longer pay lazy costs
+    if engine:
+        generation = fast_diagnosis.index.generation() if fast_diagnosis.index is not None else None
+        service_state.set_phase('warming', engine=engine, index_generation=generation)
+        service_state.set_phase('ready', warmup=run_warmup(warmup_tasks()))
+    else:
+        service_state.set_phase('failed', error="Disease data not loaded")
     
     yield
     
@@ -247,6 +379,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request latency per route for /metrics
+app.middleware("http")(track_requests)
+
+# Request IDs and opt-in profiling (DIAGNOSIS_PROFILING)
+app.middleware("http")(profile_requests)
+
 
 @app.get("/", response_class=HTMLResponse)
 async def root():
@@ -308,6 +446,8 @@ async def api_info():
         "version": "1.0.0",
         "docs": "/docs",
         "health": "/health",
+        "live": "/live",
+        "ready": "/ready",
         "selector": "/selector"
     }
 
@@ -317,15 +457,55 @@ async def health_check():
     """Health check endpoint"""
     global disease_data
     
-    is_healthy = disease_data is not None and not disease_data.empty
+    # The fast path serves from its cache and leaves disease_data unset
+    is_healthy = fast_diagnosis.is_ready or (disease_data is not None and not disease_data.empty)
     
     return {
         "status": "healthy" if is_healthy else "unhealthy",
         "data_loaded": is_healthy,
-        "timestamp": pd.Timestamp.now().isoformat()
+        "ready": service_state.is_ready,
+        "timestamp": datetime.now().isoformat()
     }
 
 
+@app.get("/live")
+async def liveness():
+    """Liveness probe: the process is up and serving"""
+    return service_state.live_report()
+
+
+@app.get("/ready")
+async def readiness():
+    """Readiness probe: 200 with the active engine and index generation once warmed up, 503 before"""
+    return JSONResponse(service_state.ready_report(), status_code=200 if service_state.is_ready else 503)
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: request and per-stage latency, candidate counts, cache events"""
+    return Response(registry.render(), media_type=CONTENT_TYPE)
+
+
+@app.get("/debug/profiles/{request_id}")
+async def get_profile(request_id: str):
+    """Top frames and artifact path of a profiled request"""
+    if not PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    
+    summary = profiler.get(request_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail=f"No profile for request {request_id}")
+    return summary
+
+
+@app.get("/debug/slow-requests")
+async def get_slow_requests(limit: int = Query(default=20, ge=1, le=500)):
+    """Slowest diagnoses since startup with their inputs (replay with benchmark_diagnosis.py --replay)"""
+    if not PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    return {'requests': slow_requests.slowest(limit)}
+
+
 @app.get("/info", response_model=SystemInfo)
 async def system_info():
     """Get system information"""
@@ -412,8 +592,75 @@ async def get_diseases(
     }
 
 
+def validated_index_symptoms(request: DiagnosisRequest) -> Tuple[List[str], List[str]]:
+    """(present, absent) symptoms known to the local engines; HTTPException when the options do not combine"""
+    # Ontology scoring modes only run on the vectorized index
+    ontology = fast_diagnosis.index.ontology if fast_diagnosis.index is not None else None
+    if request.scoring != "exact":
+        if request.computation_mode != "true":
+            raise HTTPException(status_code=400, detail=f"Scoring '{request.scoring}' requires computation_mode 'true'")
+        if ontology is None:
+            raise HTTPException(status_code=503, detail="HPO ontology not loaded")
+        if request.scoring == "ic_similarity" and request.top_groups > 0:
+            raise HTTPException(status_code=400, detail="Group rollup is not available with ic_similarity scoring")
+    
+    # Gene / onset / inheritance filters are built from optional Orphanet datasets
+    filters = fast_diagnosis.index.filters if fast_diagnosis.index is not None else {}
+    if request.genes and 'gene' not in filters:
+        raise HTTPException(status_code=503, detail="Gene association data not loaded")
+    if (request.onset and 'onset' not in filters) or (request.inheritance and 'inheritance' not in filters):
+        raise HTTPException(status_code=503, detail="Natural history data not loaded")
+    
+    # Validate symptoms using fast diagnosis; ontology modes also accept any HPO term
+    valid_present_symptoms = [
+        symptom for symptom in request.present_symptoms
+        if symptom in fast_diagnosis.symptoms_list
+        or (request.scoring != "exact" and ontology.closure.resolve(symptom) is not None)
+    ]
+    
+    if not valid_present_symptoms:
+        raise HTTPException(
+            status_code=400,
+            detail="None of the provided symptoms are found in the database"
+        )
+    
+    valid_absent_symptoms = [
+        symptom for symptom in request.absent_symptoms
+        if symptom in fast_diagnosis.symptoms_list
+    ]
+    
+    # Symptom weighting and IC pruning apply to the additive fast-mode score
+    if request.computation_mode == "true" and (request.weighting != "uniform" or request.min_ic > 0):
+        raise HTTPException(status_code=400, detail="weighting and min_ic apply to computation_mode 'fast' only")
+    
+    # Group rollup needs the normalized posterior over all candidates
+    if request.top_groups > 0:
+        if request.computation_mode != "true":
+            raise HTTPException(status_code=400, detail="Group rollup requires computation_mode 'true'")
+        if fast_diagnosis.index is None or fast_diagnosis.index.group_ids is None:
+            raise HTTPException(status_code=503, detail="Classification groups not loaded")
+    
+    return valid_present_symptoms, valid_absent_symptoms
+
+
+def check_unmatched(request: DiagnosisRequest, unmatched: Dict[str, List[str]]):
+    """Reject constraint values that matched no disorder"""
+    if request.genes and len(unmatched['gene']) == len(request.genes):
+        raise HTTPException(
+            status_code=400,
+            detail="None of the provided genes are associated with any disorder"
+        )
+    
+    for name in ('onset', 'inheritance'):
+        if unmatched.get(name):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown {name} value(s): {', '.join(unmatched[name])}"
+            )
+
+
 @app.post("/diagnose", response_model=DiagnosisResponse)
-async def diagnose_disease(request: DiagnosisRequest):
+async def diagnose_disease(request: DiagnosisRequest, raw_request: Request):
     """
     Perform ultra-fast Bayesian disease diagnosis using local pre-computed probabilities
     """
@@ -421,64 +668,74 @@ async def diagnose_disease(request: DiagnosisRequest):
     
     import time
     start_time = time.time()
+    timer = StageTimer()
+    engine = "local_precomputed" if fast_diagnosis.is_ready else "regular"
+    computation_mode = request.computation_mode
     
     try:
         # Try ultra-fast diagnosis first
         if fast_diagnosis.is_ready:
             logger.info(f"🚀 Using ultra-fast diagnosis for symptoms: {request.present_symptoms}")
             
-            # Validate symptoms using fast diagnosis
-            valid_present_symptoms = [
-                symptom for symptom in request.present_symptoms
-                if symptom in fast_diagnosis.symptoms_list
-            ]
+            valid_present_symptoms, valid_absent_symptoms = validated_index_symptoms(request)
             
-            if not valid_present_symptoms:
-                raise HTTPException(
-                    status_code=400,
-                    detail="None of the provided symptoms are found in the database"
-                )
+            timer.lap('validation')
             
-            valid_absent_symptoms = [
-                symptom for symptom in request.absent_symptoms
-                if symptom in fast_diagnosis.symptoms_list
-            ]
+            # True Bayesian mode uses the vectorized index with the requested prior
+            if request.computation_mode == "true" and fast_diagnosis.index is not None:
+                computation_mode = "true"
+                result = fast_diagnosis.bayesian_diagnosis(
+                    valid_present_symptoms,
+                    valid_absent_symptoms,
+                    request.top_n,
+                    prior=request.prior,
+                    genes=request.genes,
+                    gene_mode=request.gene_mode,
+                    onset=request.onset,
+                    inheritance=request.inheritance,
+                    include_unannotated=request.include_unannotated,
+                    top_groups=request.top_groups,
+                    disorders_per_group=request.disorders_per_group,
+                    scoring=request.scoring
+                )
+            else:
+                # Use ultra-fast diagnosis
+                computation_mode = "fast"
+                result = fast_diagnosis.ultra_fast_diagnosis(
+                    valid_present_symptoms,
+                    valid_absent_symptoms,
+                    request.top_n,
+                    genes=request.genes,
+                    gene_mode=request.gene_mode,
+                    onset=request.onset,
+                    inheritance=request.inheritance,
+                    include_unannotated=request.include_unannotated,
+                    weighting=request.weighting,
+                    min_ic=request.min_ic
+                )
             
-            # Use ultra-fast diagnosis
-            result = fast_diagnosis.ultra_fast_diagnosis(
-                valid_present_symptoms,
-                valid_absent_symptoms,
-                request.top_n
-            )
+            engine = result['method']
+            timer.merge(result.get('stage_timings_ms'))
+            timer.skip()
             
-            # Convert to API format
-            api_results = []
-            for res in result['results']:
-                api_results.append(DiagnosisResult(
-                    disorder_name=res['disorder_name'],
-                    orpha_code=res['orpha_code'],
-                    probability=res['probability'],
-                    matching_symptoms=res['matching_symptoms'],
-                    total_symptoms=res['total_symptoms'],
-                    confidence_score=res['confidence_score']
-                ))
+            unmatched = result['unmatched']
+            check_unmatched(request, unmatched)
             
             processing_time = result['processing_time_ms']
             
-            logger.info(f"⚡ Ultra-fast diagnosis completed in {processing_time:.1f}ms")
+            logger.info(f"⚡ {result['method']} diagnosis completed in {processing_time:.1f}ms")
             
-            return DiagnosisResponse(
-                success=True,
-                results=api_results,
-                total_diseases_evaluated=result['total_diseases_evaluated'],
-                input_symptoms=valid_present_symptoms,
-                processing_time_ms=processing_time
-            )
+            # Serialized straight from the engine output; the shape is DiagnosisResponse
+            payload = diagnosis_payload(result, valid_present_symptoms, computation_mode, unmatched.get('gene', []))
+            candidates = result['total_diseases_evaluated']
         
         # Fallback to regular diagnosis
         else:
             logger.info("Using regular diagnosis method")
             
+            if request.genes or request.onset or request.inheritance:
+                logger.warning("⚠️ Gene/onset/inheritance constraints are not applied by the regular diagnosis method")
+            
             if disease_data is None or not diseases_list:
                 raise HTTPException(status_code=503, detail="Disease data not loaded")
             
@@ -498,6 +755,7 @@ async def diagnose_disease(request: DiagnosisRequest):
                 symptom for symptom in request.absent_symptoms
                 if symptom in symptoms_list
             ]
+            timer.lap('validation')
             
             # Pre-filter diseases that have at least one matching symptom for better performance
             logger.info(f"Filtering diseases with matching symptoms from {valid_present_symptoms}")
@@ -514,6 +772,7 @@ async def diagnose_disease(request: DiagnosisRequest):
                 logger.warning("No diseases found with matching symptoms, checking top 100 diseases")
             else:
                 logger.info(f"Found {len(relevant_diseases)} diseases with matching symptoms")
+            timer.lap('candidates')
             
             # Calculate probabilities only for relevant diseases
             results = []
@@ -530,41 +789,143 @@ async def diagnose_disease(request: DiagnosisRequest):
                         # Get orpha code for this disease
                         disease_info = disease_data[disease_data['disorder_name'] == disease].iloc[0]
                         
-                        results.append(DiagnosisResult(
-                            disorder_name=disease,
-                            orpha_code=str(disease_info['orpha_code']),
-                            probability=result['probability'],
-                            matching_symptoms=result['matching_symptoms'],
-                            total_symptoms=result['total_symptoms'],
-                            confidence_score=result['confidence_score']
-                        ))
+                        results.append({
+                            'disorder_name': disease,
+                            'orpha_code': str(disease_info['orpha_code']),
+                            'probability': result['probability'],
+                            'matching_symptoms': result['matching_symptoms'],
+                            'total_symptoms': result['total_symptoms'],
+                            'confidence_score': result['confidence_score']
+                        })
                 except Exception as e:
                     logger.warning(f"Error calculating probability for {disease}: {e}")
                     continue
             
             logger.info(f"Calculated probabilities for {len(results)} diseases")
+            timer.lap('scoring')
             
             # Sort by probability and confidence score
-            results.sort(key=lambda x: (x.probability, x.confidence_score), reverse=True)
+            results.sort(key=lambda x: (x['probability'], x['confidence_score']), reverse=True)
             
             # Return top N results
             top_results = results[:request.top_n]
+            timer.lap('sorting')
             
             processing_time = (time.time() - start_time) * 1000  # Convert to milliseconds
             
-            return DiagnosisResponse(
-                success=True,
-                results=top_results,
-                total_diseases_evaluated=len(results),
-                input_symptoms=valid_present_symptoms,
-                processing_time_ms=processing_time
-            )
+            computation_mode = "fast"
+            payload = diagnosis_payload({
+                'results': top_results,
+                'total_diseases_evaluated': len(results),
+                'processing_time_ms': processing_time
+            }, valid_present_symptoms, computation_mode)
+            candidates = len(relevant_diseases)
         
+        # Timings up to serialization go into the payload before its one encode
+        if request.debug:
+            payload['stage_timings_ms'] = timer.rounded()
+        response = encoded_response(payload, raw_request.headers.get('accept'))
+        timer.lap('serialization')
+        timer.observe(engine, computation_mode)
+        slow_requests.record((time.time() - start_time) * 1000, request.model_dump(), engine, computation_mode, timer.rounded())
+        CANDIDATES.observe(candidates, engine=engine, computation_mode=computation_mode)
+        DIAGNOSIS_REQUESTS.inc(engine=engine, computation_mode=computation_mode, status='200')
+        return response
+        
+    except HTTPException as e:
+        DIAGNOSIS_REQUESTS.inc(engine=engine, computation_mode=computation_mode, status=str(e.status_code))
+        raise
     except Exception as e:
+        DIAGNOSIS_REQUESTS.inc(engine=engine, computation_mode=computation_mode, status='500')
         logger.error(f"Error in diagnosis: {e}")
         raise HTTPException(status_code=500, detail=f"Diagnosis failed: {str(e)}")
 
 
+@app.get("/diagnose/disorders")
+async def disorder_table(
+    raw_request: Request,
+    format: str = Query("json", description="'json' (columnar) or 'arrow' (Arrow IPC stream)", pattern="^(json|arrow)$")
+):
+    """
+    Disorder table of the diagnosis index: position i is entry i of every /diagnose/scores vector.
+    Cacheable - the ETag is the index generation, so If-None-Match answers 304 while it is unchanged.
+    """
+    index = fast_diagnosis.index
+    if not fast_diagnosis.is_ready or index is None:
+        raise HTTPException(status_code=503, detail="Diagnosis index not loaded")
+    
+    try:
+        return disorder_table_response(
+            index.orpha_codes, index.disease_names, format, index.generation(), raw_request.headers.get('if-none-match')
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/diagnose/scores")
+async def diagnose_scores(
+    request: DiagnosisRequest,
+    format: str = Query("float32", description="'float32' (raw little-endian buffer) or 'arrow' (Arrow IPC stream)", pattern="^(float32|arrow)$")
+):
+    """
+    Score of every disorder for bulk analytics: the posterior ('true' mode) or the fast-mode score,
+    in /diagnose/disorders order. top_n, top_groups and disorders_per_group are not used.
+    """
+    import time
+    start_time = time.time()
+    timer = StageTimer()
+    engine = "local_score_vector"
+    computation_mode = request.computation_mode
+    
+    try:
+        index = fast_diagnosis.index
+        if not fast_diagnosis.is_ready or index is None:
+            raise HTTPException(status_code=503, detail="Diagnosis index not loaded")
+        
+        valid_present_symptoms, valid_absent_symptoms = validated_index_symptoms(request)
+        timer.lap('validation')
+        
+        result = fast_diagnosis.score_vector(
+            valid_present_symptoms,
+            valid_absent_symptoms,
+            computation_mode,
+            prior=request.prior,
+            genes=request.genes,
+            gene_mode=request.gene_mode,
+            onset=request.onset,
+            inheritance=request.inheritance,
+            include_unannotated=request.include_unannotated,
+            scoring=request.scoring,
+            weighting=request.weighting,
+            min_ic=request.min_ic
+        )
+        timer.merge(result['stage_timings_ms'])
+        timer.skip()
+        check_unmatched(request, result['unmatched'])
+        
+        response = score_vector_response(result['scores'], format, index.generation(), {
+            'X-Total-Diseases-Evaluated': str(result['total_diseases_evaluated']),
+            'X-Processing-Time-Ms': f"{result['processing_time_ms']:.3f}"
+        })
+        timer.lap('serialization')
+        timer.observe(engine, computation_mode)
+        slow_requests.record((time.time() - start_time) * 1000, request.model_dump(), engine, computation_mode, timer.rounded())
+        CANDIDATES.observe(result['total_diseases_evaluated'], engine=engine, computation_mode=computation_mode)
+        DIAGNOSIS_REQUESTS.inc(engine=engine, computation_mode=computation_mode, status='200')
+        return response
+    
+    except HTTPException as e:
+        DIAGNOSIS_REQUESTS.inc(engine=engine, computation_mode=computation_mode, status=str(e.status_code))
+        raise
+    except ValueError as e:
+        DIAGNOSIS_REQUESTS.inc(engine=engine, computation_mode=computation_mode, status='400')
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        DIAGNOSIS_REQUESTS.inc(engine=engine, computation_mode=computation_mode, status='500')
+        logger.error(f"Error in score vector: {e}")
+        raise HTTPException(status_code=500, detail=f"Scoring failed: {str(e)}")
+
+
 @app.post("/upload-data")
 async def upload_data(file: UploadFile = File(...)):
     """Upload a new dataset CSV file"""
@@ -576,18 +937,25 @@ async def upload_data(file: UploadFile = File(...)):
     try:
         # Save uploaded file
         content = await file.read()
-        with open("clinical_signs_and_symptoms_in_rare_diseases.csv", "wb") as f:
+        upload_path = f"{CLINICAL_SIGNS_PRODUCT}.csv"
+        with open(upload_path, "wb") as f:
             f.write(content)
         
-        # Reload data
-        success = load_disease_data()
+        # Reload data from the uploaded CSV, not an older columnar copy
+        success = load_disease_data(upload_path)
+        
+        # The fast system is patched with the changed disorders only, not rebuilt
+        delta = None
+        if success and fast_diagnosis.is_ready:
+            delta = fast_diagnosis.update_from(upload_path)
         
         if success:
             return {
                 "success": True,
                 "message": "Dataset uploaded and loaded successfully",
                 "total_diseases": len(diseases_list),
-                "total_symptoms": len(symptoms_list)
+                "total_symptoms": len(symptoms_list),
+                "delta": delta.summary() if delta is not None else None
             }
         else:
             raise HTTPException(status_code=500, detail="Failed to load uploaded dataset")
@@ -606,6 +974,7 @@ if __name__ == "__main__":
     
     logger.info(f"Starting server on {host}:{port}")
     
+    import uvicorn
     uvicorn.run(
         "main:app",
         host=host,
@@ -18,6 +18,8 @@ from pydantic import BaseModel, Field, ConfigDict
 import uvicorn
 from supabase import create_client, Client
 
+from fast_dimensions import DimensionMap, fetch_all
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -28,6 +30,12 @@ logger = logging.getLogger(__name__)
 # Global Supabase client
 supabase_client: Optional[Client] = None
 symptoms_cache: List[str] = []
+# fast_symptoms / fast_disorders rows, translating names to the ids of symptom_disease_probs and back
+symptom_map: Optional[DimensionMap] = None
+disorder_map: Optional[DimensionMap] = None
+
+# Primary key of symptom_disease_probs, the stable order for paging through it
+PROBABILITY_KEY = ('symptom_id', 'disorder_id')
 
 
 class DiagnosisRequest(BaseModel):
@@ -91,7 +99,7 @@ class SystemInfo(BaseModel):
 
 async def initialize_supabase():
     """Initialize Supabase connection and cache symptoms"""
-    global supabase_client, symptoms_cache
+    global supabase_client, symptoms_cache, symptom_map, disorder_map
     
     try:
         # Supabase configuration
@@ -101,13 +109,16 @@ async def initialize_supabase():
         supabase_client = create_client(SUPABASE_URL, SUPABASE_KEY)
         logger.info("Connected to Supabase")
         
-        # Cache all symptoms for fast search
+        # Cache the symptom and disorder dimensions for search and name <-> id translation
         logger.info("Loading symptoms cache...")
-        result = supabase_client.table('fast_symptoms').select('term').execute()
+        symptom_map = DimensionMap(fetch_all(supabase_client, 'fast_symptoms', 'id, term'), 'term')
+        disorder_map = DimensionMap(
+            fetch_all(supabase_client, 'fast_disorders', 'id, orpha_code, name, total_symptoms'), 'orpha_code'
+        )
         
-        if result.data:
-            symptoms_cache = [row['term'] for row in result.data]
-            logger.info(f"Cached {len(symptoms_cache)} symptoms")
+        if len(symptom_map):
+            symptoms_cache = symptom_map.names()
+            logger.info(f"Cached {len(symptoms_cache)} symptoms and {len(disorder_map)} disorders")
         else:
             logger.warning("No symptoms found in fast_symptoms table")
             # Fallback to CSV loading if needed
@@ -127,14 +138,15 @@ async def fallback_csv_loading():
     
     try:
         logger.info("Falling back to CSV data loading...")
-        import pandas as pd
+        from orphanet_data import find_dataset, read_dataset_file
         
-        csv_file = "file/clinical_signs_and_symptoms_in_rare_diseases.csv"
-        if os.path.exists(csv_file):
-            df = pd.read_csv(csv_file)
+        data_path = find_dataset('clinical_signs_and_symptoms_in_rare_diseases', ['file'])
+        if data_path:
+            # Only the symptom column is needed for the cache
+            df = read_dataset_file(data_path, columns=['hpo_term'])
             df = df.dropna(subset=['hpo_term'])
             symptoms_cache = sorted(df['hpo_term'].unique().tolist())
-            logger.info(f"Loaded {len(symptoms_cache)} symptoms from CSV")
+            logger.info(f"Loaded {len(symptoms_cache)} symptoms from {data_path}")
             return True
         else:
             logger.error("CSV file not found")
@@ -151,7 +163,7 @@ async def fast_diagnosis(
     top_n: int = 10
 ) -> Dict[str, Any]:
     """Ultra-fast diagnosis using pre-computed Supabase probabilities"""
-    global supabase_client
+    global supabase_client, symptom_map, disorder_map
     
     if absent_symptoms is None:
         absent_symptoms = []
@@ -166,50 +178,48 @@ async def fast_diagnosis(
             'probability': 0.0,
             'matching_symptoms': [],
             'total_symptoms': 0,
+            'disorder_name': '',
             'orpha_code': '',
             'confidence': 0.0
         })
         
-        # Query pre-computed probabilities for each present symptom
-        for symptom in present_symptoms:
-            result = supabase_client.table('symptom_disease_probs').select(
-                'disorder_name, orpha_code, probability, confidence'
-            ).eq('symptom_term', symptom).order('probability', desc=True).execute()
-            
-            if result.data:
-                for row in result.data:
-                    disease = row['disorder_name']
-                    disease_scores[disease]['probability'] += row['probability']
-                    disease_scores[disease]['matching_symptoms'].append(symptom)
-                    disease_scores[disease]['orpha_code'] = row['orpha_code']
-                    disease_scores[disease]['confidence'] += row['confidence']
+        # All present symptoms by id, paged past the response row cap in key order (index-only, see fast_schema)
+        present_ids = symptom_map.ids_of(present_symptoms)
+        rows = fetch_all(
+            supabase_client, 'symptom_disease_probs', 'symptom_id, disorder_id, probability, confidence',
+            order=PROBABILITY_KEY, in_=('symptom_id', present_ids)
+        ) if present_ids else []
+        
+        for row in rows:
+            scores = disease_scores[row['disorder_id']]
+            scores['probability'] += row['probability']
+            scores['matching_symptoms'].append(symptom_map.name_of(row['symptom_id']))
+            scores['confidence'] += row['confidence']
         
-        # Step 2: Get total symptoms for each disease
-        for disease in disease_scores.keys():
-            try:
-                result = supabase_client.table('fast_disorders').select(
-                    'total_symptoms'
-                ).eq('name', disease).execute()
-                
-                if result.data:
-                    disease_scores[disease]['total_symptoms'] = result.data[0]['total_symptoms']
-            except:
-                disease_scores[disease]['total_symptoms'] = len(disease_scores[disease]['matching_symptoms'])
+        # Step 2: Names, orpha codes and symptom totals come from the in-memory disorder rows
+        for disorder_id, scores in disease_scores.items():
+            disorder = disorder_map.rows.get(disorder_id)
+            if disorder:
+                scores['disorder_name'] = disorder['name']
+                scores['orpha_code'] = disorder['orpha_code']
+                scores['total_symptoms'] = disorder['total_symptoms']
+            else:
+                scores['disorder_name'] = str(disorder_id)
+                scores['total_symptoms'] = len(scores['matching_symptoms'])
         
         # Step 3: Apply absent symptom penalties (if any)
-        if absent_symptoms:
-            for symptom in absent_symptoms:
-                result = supabase_client.table('symptom_disease_probs').select(
-                    'disorder_name, probability'
-                ).eq('symptom_term', symptom).execute()
-                
-                if result.data:
-                    for row in result.data:
-                        disease = row['disorder_name']
-                        if disease in disease_scores:
-                            # Reduce probability if absent symptom is frequent in disease
-                            penalty = row['probability'] * 0.5
-                            disease_scores[disease]['probability'] *= (1 - penalty)
+        absent_ids = symptom_map.ids_of(absent_symptoms)
+        if absent_ids:
+            rows = fetch_all(
+                supabase_client, 'symptom_disease_probs', 'symptom_id, disorder_id, probability',
+                order=PROBABILITY_KEY, in_=('symptom_id', absent_ids)
+            )
+            
+            for row in rows:
+                if row['disorder_id'] in disease_scores:
+                    # Reduce probability if absent symptom is frequent in disease
+                    penalty = row['probability'] * 0.5
+                    disease_scores[row['disorder_id']]['probability'] *= (1 - penalty)
         
         # Step 4: Calculate final confidence scores
         for disease, scores in disease_scores.items():
@@ -225,9 +235,9 @@ async def fast_diagnosis(
         )
         
         results = []
-        for disease, scores in sorted_diseases[:top_n]:
+        for _, scores in sorted_diseases[:top_n]:
             results.append(DiagnosisResult(
-                disorder_name=disease,
+                disorder_name=scores['disorder_name'],
                 orpha_code=scores['orpha_code'],
                 probability=min(scores['probability'], 1.0),
                 matching_symptoms=list(set(scores['matching_symptoms'])),
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Materialized Views - Precomputed read views over the Supabase tables, with covering indexes
+
+Each view stores its join once per load instead of re-running it on every read. A unique index
+lets REFRESH MATERIALIZED VIEW CONCURRENTLY swap in new data without blocking readers, and the
+covering indexes (INCLUDE) answer the read queries from the index alone.
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class MaterializedView:
+    """A materialized view, its unique key and its (name, key columns, included columns) indexes"""
+    name: str
+    query: str
+    unique_columns: Tuple[str, ...]
+    indexes: Tuple[Tuple[str, Tuple[str, ...], Tuple[str, ...]], ...] = ()
+
+    def create_statements(self) -> List[str]:
+        """
+        Idempotent DDL: replaces a plain view of the same name, creates the view unpopulated (the
+        first refresh fills it) and its indexes
+        """
+        statements = [
+            f"""
+            DO $$
+            BEGIN
+                IF EXISTS (SELECT 1 FROM pg_views WHERE schemaname = current_schema() AND viewname = '{self.name}') THEN
+                    EXECUTE 'DROP VIEW {self.name}';
+                END IF;
+            END $$;
+            """,
+            f"CREATE MATERIALIZED VIEW IF NOT EXISTS {self.name} AS {self.query.strip()} WITH NO DATA;",
+            f"CREATE UNIQUE INDEX IF NOT EXISTS {self.name}_key ON {self.name} ({', '.join(self.unique_columns)});"
+        ]
+        for suffix, columns, included in self.indexes:
+            include = f" INCLUDE ({', '.join(included)})" if included else ''
+            statements.append(
+                f"CREATE INDEX IF NOT EXISTS {self.name}_{suffix} ON {self.name} ({', '.join(columns)}){include};"
+            )
+        return statements
+
+    def refresh_statement(self, concurrently: bool = True) -> str:
+        return f"REFRESH MATERIALIZED VIEW {'CONCURRENTLY ' if concurrently else ''}{self.name};"
+
+
+# Disorder -> HPO associations for the Supabase diagnosis clients, which filter on hpo_term
+DISORDER_SYMPTOMS_VIEW = MaterializedView(
+    name='disorder_symptoms_view',
+    query="""
+        SELECT
+            d.id AS disorder_id,
+            d.orpha_code,
+            d.name AS disorder_name,
+            h.id AS hpo_term_id,
+            h.hpo_id,
+            h.term AS hpo_term,
+            dha.frequency AS hpo_frequency,
+            dha.frequency_numeric,
+            dha.diagnostic_criteria
+        FROM disorders d
+        JOIN disorder_hpo_associations dha ON d.id = dha.disorder_id
+        JOIN hpo_terms h ON dha.hpo_term_id = h.id
+    """,
+    unique_columns=('disorder_id', 'hpo_term_id'),
+    indexes=(
+        ('hpo_term', ('hpo_term',), ('disorder_name', 'orpha_code', 'hpo_frequency', 'frequency_numeric')),
+        ('orpha_code', ('orpha_code',), ('hpo_term', 'frequency_numeric')),
+    )
+)
+
+# Pre-computed symptom -> disorder probabilities with the disorder / symptom totals, keyed by the
+# fast table ids (the API translates names with its in-memory dimension maps)
+FAST_DIAGNOSIS_VIEW = MaterializedView(
+    name='fast_diagnosis_view',
+    query="""
+        SELECT
+            sdp.symptom_id,
+            sdp.disorder_id,
+            sdp.probability,
+            sdp.confidence,
+            sdp.matching_score,
+            fd.total_symptoms,
+            fs.total_diseases
+        FROM symptom_disease_probs sdp
+        JOIN fast_disorders fd ON sdp.disorder_id = fd.id
+        JOIN fast_symptoms fs ON sdp.symptom_id = fs.id
+    """,
+    unique_columns=('symptom_id', 'disorder_id'),
+    indexes=(
+        # Top disorders for a symptom: WHERE symptom_id = ? ORDER BY probability DESC LIMIT n
+        ('symptom_probability', ('symptom_id', 'probability DESC'),
+         ('disorder_id', 'confidence', 'matching_score', 'total_symptoms')),
+    )
+)
+
+
+def execute_sql(supabase, sql: str):
+    """Run SQL through the execute_sql RPC function"""
+    return supabase.rpc('execute_sql', {'sql': sql}).execute()
+
+
+def create_view(supabase, view: MaterializedView) -> bool:
+    """Create the view and its indexes if they do not exist yet"""
+    try:
+        for sql in view.create_statements():
+            execute_sql(supabase, sql)
+        logger.info(f"✅ Materialized view {view.name} and its indexes are in place")
+        return True
+    except Exception as e:
+        logger.error(f"❌ Failed to create materialized view {view.name}: {e}")
+        return False
+
+
+def refresh_view(supabase, view: MaterializedView) -> bool:
+    """
+    Refresh the view with the current table contents. A concurrent refresh keeps the old rows
+    readable meanwhile; it needs populated data, so a newly created view is refreshed plainly.
+    """
+    try:
+        execute_sql(supabase, view.refresh_statement(concurrently=True))
+        logger.info(f"🔄 Refreshed {view.name} concurrently")
+        return True
+    except Exception as e:
+        logger.info(f"Concurrent refresh of {view.name} not possible ({e}) - refreshing plainly")
+
+    try:
+        execute_sql(supabase, view.refresh_statement(concurrently=False))
+        logger.info(f"🔄 Refreshed {view.name}")
+        return True
+    except Exception as e:
+        logger.error(f"❌ Failed to refresh {view.name}: {e}")
+        return False
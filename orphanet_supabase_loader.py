@@ -6,22 +6,22 @@ Parses complete Orphanet XML files and loads data into Supabase database using t
 This version handles both complete XML files and truncated SM files (head -500 extracts)
 """
 
-import xml.etree.ElementTree as ET
 import os
 import sys
-import re
 from datetime import datetime, timezone
-from typing import Dict, List, Any, Optional, Union
+from typing import Dict, List, Any, Iterable, Iterator, Optional, Tuple, Union
 import logging
 from dataclasses import dataclass
 import argparse
 import json
 from pathlib import Path
 
-# Required packages (install with: pip install supabase python-dotenv tqdm)
+# Required packages (install with: pip install supabase python-dotenv)
 from supabase import create_client, Client
 from dotenv import load_dotenv
-from tqdm import tqdm
+from orphanet_extract import PRODUCT_KINDS, RecordBatch, run_extraction
+from delta_ingest import FINGERPRINT_FILE, DeltaTracker, FingerprintStore
+from xml_backend import xml_parser, find_cut_point
 
 # Load environment variables
 load_dotenv()
@@ -33,6 +33,22 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Per-disorder table of each record kind (rows reference disorders.id through disorder_id)
+DISORDER_TABLES = {
+    'disorder_synonyms': 'disorder_synonyms',
+    'age_of_onset': 'age_of_onset',
+    'inheritance': 'inheritance_types',
+    'gene_associations': 'disorder_gene_associations',
+    'hpo_associations': 'disorder_hpo_associations',
+    'prevalences': 'prevalence_data',
+    'classifications': 'disorder_classifications',
+    'external_references': 'external_references',
+    'disorder_texts': 'disorder_texts',
+    'disability_associations': 'disorder_disability_associations'
+}
+
+# Values per PostgREST in.() filter
+IN_CHUNK_SIZE = 100
 
 @dataclass
 class SupabaseConfig:
@@ -44,8 +60,12 @@ class SupabaseConfig:
 class OrphanetXMLLoader:
     """Main class for loading Orphanet XML files to Supabase"""
     
-    def __init__(self, config: SupabaseConfig):
+    def __init__(self, config: SupabaseConfig, fingerprints: Optional[FingerprintStore] = None):
         self.config = config
+        self.fingerprints = fingerprints  # Delta mode: fingerprints of the last load
+        self._tracker: Optional[DeltaTracker] = None
+        self._delta_tables: List[str] = []
+        self._write_failures = 0  # Failed writes of the current load_file pass
         self.supabase: Optional[Client] = None
         self.disorder_cache = {}  # Cache for disorder UUID lookups
         self.gene_cache = {}  # Cache for gene UUID lookups
@@ -64,605 +84,404 @@ class OrphanetXMLLoader:
             logger.error(f"Failed to connect to Supabase: {e}")
             return False
     
-    def fix_truncated_xml(self, xml_file: str) -> str:
-        """Fix truncated XML files (head -500 extracts) by adding proper closing tags"""
-        try:
-            with open(xml_file, 'r', encoding='utf-8') as f:
-                content = f.read()
-        except UnicodeDecodeError:
-            # Try with ISO-8859-1 encoding if UTF-8 fails
-            with open(xml_file, 'r', encoding='iso-8859-1') as f:
-                content = f.read()
-        
-        # If the file is already complete XML, return as is
-        if content.strip().endswith('</JDBOR>'):
-            return content
-        
-        # Track open tags using a more robust approach
-        tag_stack = []
-        
-        # Find all tags in the content
-        all_tags = re.findall(r'<[^>]+>', content)
-        
-        for tag_match in all_tags:
-            tag = tag_match.strip('<>')
-            
-            # Skip XML declarations, comments, and CDATA
-            if tag.startswith('?') or tag.startswith('!'):
-                continue
-            
-            # Handle closing tags
-            if tag.startswith('/'):
-                tag_name = tag[1:]
-                # Remove from stack if it matches
-                if tag_stack and tag_stack[-1] == tag_name:
-                    tag_stack.pop()
-                continue
-            
-            # Handle self-closing tags
-            if tag.endswith('/'):
-                continue
-            
-            # Extract tag name (everything before first space or attribute)
-            tag_name = tag.split()[0] if ' ' in tag else tag
-            tag_stack.append(tag_name)
-        
-        # Add missing closing tags in reverse order
-        fixed_content = content.rstrip()
-        
-        # Close any incomplete tags that might be cut off in the middle
-        if not fixed_content.endswith('>'):
-            # Find the last complete tag
-            last_tag_start = fixed_content.rfind('<')
-            if last_tag_start != -1:
-                # Remove the incomplete tag
-                fixed_content = fixed_content[:last_tag_start].rstrip()
-        
-        # Add missing closing tags
-        while tag_stack:
-            tag = tag_stack.pop()
-            fixed_content += f"\n</{tag}>"
-        
-        return fixed_content
+    def find_cut_point(self, xml_file: str) -> int:
+        """Byte offset just past the last complete tag; only the tail of the file is read"""
+        return find_cut_point(xml_file)
+    
+    def iter_xml_events(self, xml_file: str) -> Iterator[Tuple[str, Any]]:
+        """('start' | 'end', element) events of an XML file, truncated files (head -500 extracts) repaired"""
+        return xml_parser.iterparse(xml_file, events=('start', 'end'))
     
-    def parse_xml(self, xml_file: str) -> ET.Element:
+    def parse_xml(self, xml_file: str) -> Any:
         """Parse XML file and return root element, handling truncated files"""
         try:
-            # First try to parse as-is
-            tree = ET.parse(xml_file)
-            return tree.getroot()
-        except ET.ParseError as e:
-            logger.warning(f"XML parse error for {xml_file}: {e}. Attempting to fix truncated XML...")
-            try:
-                # Fix truncated XML and parse from string
-                fixed_content = self.fix_truncated_xml(xml_file)
-                root = ET.fromstring(fixed_content)
-                logger.info(f"Successfully fixed and parsed truncated XML: {xml_file}")
-                return root
-            except Exception as fix_error:
-                logger.error(f"Failed to fix and parse {xml_file}: {fix_error}")
-                raise
+            return xml_parser.parse(xml_file)
         except Exception as e:
             logger.error(f"Failed to parse {xml_file}: {e}")
             raise
     
-    def get_or_create_disorder(self, disorder_elem: ET.Element) -> Optional[str]:
-        """Get or create disorder and return UUID"""
-        orpha_code = disorder_elem.findtext('.//OrphaCode', '')
-        
-        if orpha_code in self.disorder_cache:
-            return self.disorder_cache[orpha_code]
-        
-        disorder_data = {
-            'disorder_id': int(disorder_elem.get('id', 0)),
-            'orpha_code': orpha_code,
-            'name': disorder_elem.findtext('.//Name[@lang="en"]', ''),
-            'disorder_type': disorder_elem.findtext('.//DisorderType/Name[@lang="en"]', ''),
-            'disorder_group': disorder_elem.findtext('.//DisorderGroup/Name[@lang="en"]', ''),
-            'expert_link': disorder_elem.findtext('.//ExpertLink[@lang="en"]', ''),
-            'created_at': datetime.now(timezone.utc).isoformat(),
-            'updated_at': datetime.now(timezone.utc).isoformat()
-        }
+    def iter_batches(self, xml_file: str, tag: str, batch_size: int) -> Iterator[List[Any]]:
+        """Complete <tag> elements in lists of up to batch_size, freed once the caller asks for the next batch"""
+        return xml_parser.iter_batches(xml_file, tag, batch_size)
+    
+    # Record sink interface (see orphanet_extract.RecordSink)
+    
+    name = 'supabase'
+    
+    def write(self, batch: RecordBatch):
+        """Load one record batch; kinds without a table here are ignored"""
+        handler = getattr(self, f"_write_{batch.kind}", None)
+        if handler is not None:
+            handler(batch.rows)
+    
+    def close(self):
+        pass
+    
+    def load_file(self, xml_file: str, product: str) -> Dict[str, Any]:
+        """
+        Stream one XML file of an Orphanet product (a PRODUCT_KINDS key) into Supabase in a single pass.
+        In delta mode only disorders whose records changed since the last load are written: updated
+        disorders have their rows of this product replaced, deleted ones have them removed.
+        """
+        kinds = PRODUCT_KINDS[product]
+        scope = f"{self.name}:{product}"
+        if self.fingerprints is not None:
+            self._tracker = DeltaTracker(self.fingerprints.get(scope), kinds)
+            self._delta_tables = [DISORDER_TABLES[kind] for kind in kinds if kind in DISORDER_TABLES]
+        self._write_failures = 0
         
         try:
-            # Try to get existing disorder
-            existing = self.supabase.table('disorders').select('id').eq('orpha_code', orpha_code).execute()
-            
-            if existing.data:
-                disorder_uuid = existing.data[0]['id']
-                # Update existing disorder
-                self.supabase.table('disorders').update({
-                    'name': disorder_data['name'],
-                    'disorder_type': disorder_data['disorder_type'],
-                    'disorder_group': disorder_data['disorder_group'],
-                    'updated_at': datetime.now(timezone.utc).isoformat()
-                }).eq('id', disorder_uuid).execute()
-            else:
-                # Create new disorder
-                result = self.supabase.table('disorders').insert(disorder_data).execute()
-                disorder_uuid = result.data[0]['id']
-            
-            self.disorder_cache[orpha_code] = disorder_uuid
-            
-            # Add synonyms
-            for synonym in disorder_elem.findall('.//Synonym[@lang="en"]'):
-                if synonym.text:
-                    synonym_data = {
-                        'disorder_id': disorder_uuid,
-                        'synonym': synonym.text,
-                        'created_at': datetime.now(timezone.utc).isoformat()
-                    }
-                    try:
-                        self.supabase.table('disorder_synonyms').insert(synonym_data).execute()
-                    except Exception as e:
-                        # Ignore duplicate synonyms
-                        if 'duplicate' not in str(e).lower():
-                            logger.warning(f"Failed to insert synonym: {e}")
-            
-            return disorder_uuid
-            
-        except Exception as e:
-            logger.error(f"Failed to get/create disorder {orpha_code}: {e}")
-            return None
+            report = run_extraction([xml_file], [self], kinds=kinds, batch_size=100, select=self._tracker)
+            counts = ', '.join(f"{count} {kind}" for kind, count in report['rows'].items())
+            logger.info(f"Loaded {xml_file}: {counts or 'no records'} "
+                        f"(extract {report['extract_seconds']}s, supabase {report['sinks'][self.name]['seconds']}s)")
+            
+            if self._tracker is not None:
+                delta = self._tracker.delta()
+                self._delete_disorder_rows(self._disorder_uuids(delta.deleted))
+                # A failed batch must not be recorded as loaded, or the next delta would skip it
+                if self._write_failures:
+                    raise RuntimeError(f"Delta load of {product} had {self._write_failures} failed writes - "
+                                       f"fingerprints not updated, rerun to retry")
+                self.fingerprints.set(scope, self._tracker.current)
+                self.fingerprints.save()
+                report['delta'] = {'inserted': len(delta.inserted), 'updated': len(delta.updated),
+                                   'deleted': len(delta.deleted), 'unchanged': delta.unchanged}
+                logger.info(f"🔁 Delta for {product}: {delta.summary()}")
+            return report
+        finally:
+            self._tracker = None
     
-    def load_natural_history(self, xml_file: str):
-        """Load natural history data from XML file"""
-        logger.info(f"Loading natural history from {xml_file}")
-        root = self.parse_xml(xml_file)
-        
-        disorders = root.findall('.//Disorder')
-        batch_size = 100
-        
-        for i in tqdm(range(0, len(disorders), batch_size), desc="Processing natural history"):
-            batch_disorders = disorders[i:i + batch_size]
-            
-            onset_data = []
-            inheritance_data = []
-            
-            for disorder in batch_disorders:
-                disorder_uuid = self.get_or_create_disorder(disorder)
-                
-                if not disorder_uuid:
-                    continue
-                
-                # Collect age of onset data
-                for onset in disorder.findall('.//AverageAgeOfOnset'):
-                    onset_data.append({
-                        'disorder_id': disorder_uuid,
-                        'onset_name': onset.findtext('Name[@lang="en"]', ''),
-                        'onset_id': int(onset.get('id', 0)),
-                        'created_at': datetime.now(timezone.utc).isoformat()
-                    })
-                
-                # Collect inheritance types
-                for inheritance in disorder.findall('.//TypeOfInheritance'):
-                    inheritance_data.append({
-                        'disorder_id': disorder_uuid,
-                        'inheritance_name': inheritance.findtext('Name[@lang="en"]', ''),
-                        'inheritance_id': int(inheritance.get('id', 0)),
-                        'created_at': datetime.now(timezone.utc).isoformat()
-                    })
-            
-            # Batch insert data
-            if onset_data:
-                try:
-                    self.supabase.table('age_of_onset').insert(onset_data).execute()
-                except Exception as e:
-                    logger.error(f"Failed to insert onset data batch: {e}")
-            
-            if inheritance_data:
+    def _disorder_uuids(self, orpha_codes: List[str]) -> List[str]:
+        """UUIDs of the given disorders (cached or looked up)"""
+        uuids = [self.disorder_cache[code] for code in orpha_codes if code in self.disorder_cache]
+        missing = [code for code in orpha_codes if code not in self.disorder_cache]
+        for i in range(0, len(missing), IN_CHUNK_SIZE):
+            result = self.supabase.table('disorders').select('id').in_('orpha_code', missing[i:i + IN_CHUNK_SIZE]).execute()
+            uuids.extend(row['id'] for row in result.data)
+        return uuids
+    
+    def _delete_disorder_rows(self, disorder_uuids: List[str]):
+        """Remove the rows of the product being loaded for the given disorders"""
+        for table in self._delta_tables:
+            for i in range(0, len(disorder_uuids), IN_CHUNK_SIZE):
                 try:
-                    self.supabase.table('inheritance_types').insert(inheritance_data).execute()
+                    self.supabase.table(table).delete().in_('disorder_id', disorder_uuids[i:i + IN_CHUNK_SIZE]).execute()
                 except Exception as e:
-                    logger.error(f"Failed to insert inheritance data batch: {e}")
-        
-        logger.info(f"Loaded natural history for {len(disorders)} disorders")
+                    self._write_failed(f"Failed to delete {table} rows: {e}")
+    
+    def _write_failed(self, message: str):
+        """Log a failed write; the pass continues but its delta fingerprints are not saved"""
+        self._write_failures += 1
+        logger.error(message)
+    
+    def load_natural_history(self, xml_file: str):
+        """Load natural history data from XML file"""
+        return self.load_file(xml_file, 'natural_history')
     
     def load_genes(self, xml_file: str):
         """Load gene association data from XML file"""
-        logger.info(f"Loading genes from {xml_file}")
-        root = self.parse_xml(xml_file)
-        
-        disorders = root.findall('.//Disorder')
-        batch_size = 50
-        
-        for i in tqdm(range(0, len(disorders), batch_size), desc="Processing gene associations"):
-            batch_disorders = disorders[i:i + batch_size]
-            
-            associations_data = []
-            external_refs_data = []
-            
-            for disorder in batch_disorders:
-                disorder_uuid = self.get_or_create_disorder(disorder)
-                
-                if not disorder_uuid:
-                    continue
-                
-                for gene_assoc in disorder.findall('.//DisorderGeneAssociation'):
-                    gene_elem = gene_assoc.find('Gene')
-                    if gene_elem is None:
-                        continue
-                    
-                    gene_symbol = gene_elem.findtext('Symbol', '')
-                    
-                    # Get or create gene
-                    if gene_symbol not in self.gene_cache:
-                        gene_data = {
-                            'gene_symbol': gene_symbol,
-                            'gene_name': gene_elem.findtext('Name[@lang="en"]', ''),
-                            'gene_type': gene_elem.findtext('.//GeneType/Name[@lang="en"]', ''),
-                            'chromosomal_location': gene_elem.findtext('.//GeneLocus', ''),
-                            'created_at': datetime.now(timezone.utc).isoformat(),
-                            'updated_at': datetime.now(timezone.utc).isoformat()
-                        }
-                        
-                        try:
-                            # Try to get existing gene
-                            existing = self.supabase.table('genes').select('id').eq('gene_symbol', gene_symbol).execute()
-                            
-                            if existing.data:
-                                gene_uuid = existing.data[0]['id']
-                                # Update existing gene
-                                self.supabase.table('genes').update({
-                                    'gene_name': gene_data['gene_name'],
-                                    'updated_at': gene_data['updated_at']
-                                }).eq('id', gene_uuid).execute()
-                            else:
-                                # Create new gene
-                                result = self.supabase.table('genes').insert(gene_data).execute()
-                                gene_uuid = result.data[0]['id']
-                            
-                            self.gene_cache[gene_symbol] = gene_uuid
-                            
-                            # Collect external references
-                            for ext_ref in gene_elem.findall('.//ExternalReference'):
-                                external_refs_data.append({
-                                    'gene_id': gene_uuid,
-                                    'source': ext_ref.findtext('Source', ''),
-                                    'reference': ext_ref.findtext('Reference', ''),
-                                    'created_at': datetime.now(timezone.utc).isoformat()
-                                })
-                        except Exception as e:
-                            logger.error(f"Failed to process gene {gene_symbol}: {e}")
-                            continue
-                    else:
-                        gene_uuid = self.gene_cache[gene_symbol]
-                    
-                    # Create association
-                    associations_data.append({
-                        'disorder_id': disorder_uuid,
-                        'gene_id': gene_uuid,
-                        'association_type': gene_assoc.findtext('.//DisorderGeneAssociationType/Name[@lang="en"]', ''),
-                        'association_status': gene_assoc.findtext('.//DisorderGeneAssociationStatus/Name[@lang="en"]', ''),
-                        'source_of_validation': gene_assoc.findtext('SourceOfValidation', ''),
-                        'created_at': datetime.now(timezone.utc).isoformat()
-                    })
-            
-            # Batch insert associations
-            if associations_data:
-                try:
-                    self.supabase.table('disorder_gene_associations').insert(associations_data).execute()
-                except Exception as e:
-                    logger.error(f"Failed to insert gene associations batch: {e}")
-            
-            # Batch insert external references
-            if external_refs_data:
-                try:
-                    self.supabase.table('gene_external_refs').insert(external_refs_data).execute()
-                except Exception as e:
-                    logger.error(f"Failed to insert gene external refs batch: {e}")
-        
-        logger.info(f"Loaded gene associations for {len(disorders)} disorders")
+        return self.load_file(xml_file, 'genes_associated')
     
     def load_clinical_signs(self, xml_file: str):
         """Load clinical signs and symptoms (HPO terms) from XML file"""
-        logger.info(f"Loading clinical signs from {xml_file}")
-        root = self.parse_xml(xml_file)
-        
-        hpo_disorders = root.findall('.//HPODisorderSetStatus')
-        batch_size = 100
-        
-        for i in tqdm(range(0, len(hpo_disorders), batch_size), desc="Processing clinical signs"):
-            batch_disorders = hpo_disorders[i:i + batch_size]
-            
-            associations_data = []
-            
-            for hpo_disorder in batch_disorders:
-                disorder = hpo_disorder.find('Disorder')
-                if disorder is None:
-                    continue
-                
-                disorder_uuid = self.get_or_create_disorder(disorder)
-                if not disorder_uuid:
-                    continue
-                
-                for hpo_assoc in disorder.findall('.//HPODisorderAssociation'):
-                    hpo_id = hpo_assoc.findtext('.//HPOId', '')
-                    
-                    # Get or create HPO term
-                    if hpo_id not in self.hpo_cache:
-                        hpo_data = {
-                            'hpo_id': hpo_id,
-                            'term': hpo_assoc.findtext('.//HPOTerm', ''),
-                            'created_at': datetime.now(timezone.utc).isoformat()
-                        }
-                        
-                        try:
-                            # Try to get existing HPO term
-                            existing = self.supabase.table('hpo_terms').select('id').eq('hpo_id', hpo_id).execute()
-                            
-                            if existing.data:
-                                hpo_uuid = existing.data[0]['id']
-                                # Update existing HPO term
-                                self.supabase.table('hpo_terms').update({
-                                    'term': hpo_data['term']
-                                }).eq('id', hpo_uuid).execute()
-                            else:
-                                # Create new HPO term
-                                result = self.supabase.table('hpo_terms').insert(hpo_data).execute()
-                                hpo_uuid = result.data[0]['id']
-                            
-                            self.hpo_cache[hpo_id] = hpo_uuid
-                        except Exception as e:
-                            logger.error(f"Failed to process HPO term {hpo_id}: {e}")
-                            continue
-                    else:
-                        hpo_uuid = self.hpo_cache[hpo_id]
-                    
-                    # Create association
-                    frequency = hpo_assoc.findtext('.//HPOFrequency/Name[@lang="en"]', '')
-                    
-                    # Parse frequency category
-                    frequency_category = None
-                    if '99-80%' in frequency:
-                        frequency_category = 'Very frequent'
-                    elif '79-30%' in frequency:
-                        frequency_category = 'Frequent'
-                    elif '29-5%' in frequency:
-                        frequency_category = 'Occasional'
-                    elif '4-1%' in frequency:
-                        frequency_category = 'Very rare'
-                    
-                    associations_data.append({
-                        'disorder_id': disorder_uuid,
-                        'hpo_term_id': hpo_uuid,
-                        'frequency': frequency,
-                        'frequency_category': frequency_category,
-                        'diagnostic_criteria': bool(hpo_assoc.findtext('DiagnosticCriteria', '')),
-                        'created_at': datetime.now(timezone.utc).isoformat()
-                    })
-            
-            # Batch insert associations
-            if associations_data:
-                try:
-                    self.supabase.table('disorder_hpo_associations').insert(associations_data).execute()
-                except Exception as e:
-                    logger.error(f"Failed to insert HPO associations batch: {e}")
-        
-        logger.info(f"Loaded clinical signs for {len(hpo_disorders)} disorders")
+        return self.load_file(xml_file, 'clinical_signs')
     
     def load_epidemiology(self, xml_file: str):
         """Load epidemiology data from XML file"""
-        logger.info(f"Loading epidemiology from {xml_file}")
-        root = self.parse_xml(xml_file)
-        
-        disorders = root.findall('.//Disorder')
-        batch_size = 100
-        
-        for i in tqdm(range(0, len(disorders), batch_size), desc="Processing epidemiology"):
-            batch_disorders = disorders[i:i + batch_size]
-            
-            prevalence_data = []
-            
-            for disorder in batch_disorders:
-                disorder_uuid = self.get_or_create_disorder(disorder)
-                
-                if not disorder_uuid:
-                    continue
-                
-                for prevalence in disorder.findall('.//Prevalence'):
-                    val_moy = prevalence.findtext('ValMoy', '0')
-                    try:
-                        val_moy = float(val_moy) if val_moy else 0.0
-                    except ValueError:
-                        val_moy = 0.0
-                    
-                    prevalence_data.append({
-                        'disorder_id': disorder_uuid,
-                        'prevalence_type': prevalence.findtext('.//PrevalenceType/Name[@lang="en"]', ''),
-                        'prevalence_qualification': prevalence.findtext('.//PrevalenceQualification/Name[@lang="en"]', ''),
-                        'prevalence_class': prevalence.findtext('.//PrevalenceClass/Name[@lang="en"]', ''),
-                        'val_moy': val_moy,
-                        'geographic_area': prevalence.findtext('.//PrevalenceGeographic/Name[@lang="en"]', ''),
-                        'validation_status': prevalence.findtext('.//PrevalenceValidationStatus/Name[@lang="en"]', ''),
-                        'source': prevalence.findtext('Source', ''),
-                        'created_at': datetime.now(timezone.utc).isoformat()
-                    })
-            
-            # Batch insert data
-            if prevalence_data:
-                try:
-                    self.supabase.table('prevalence_data').insert(prevalence_data).execute()
-                except Exception as e:
-                    logger.error(f"Failed to insert prevalence data batch: {e}")
-        
-        logger.info(f"Loaded epidemiology for {len(disorders)} disorders")
+        return self.load_file(xml_file, 'epidemiology')
     
     def load_classifications(self, xml_file: str):
         """Load disorder classifications/linearisation from XML file"""
-        logger.info(f"Loading classifications from {xml_file}")
-        root = self.parse_xml(xml_file)
-        
-        disorders = root.findall('.//Disorder')
-        batch_size = 100
-        
-        for i in tqdm(range(0, len(disorders), batch_size), desc="Processing classifications"):
-            batch_disorders = disorders[i:i + batch_size]
-            
-            classification_data = []
-            
-            for disorder in batch_disorders:
-                disorder_uuid = self.get_or_create_disorder(disorder)
-                
-                if not disorder_uuid:
-                    continue
-                
-                for assoc in disorder.findall('.//DisorderDisorderAssociation'):
-                    classification_data.append({
-                        'disorder_id': disorder_uuid,
-                        'parent_disorder_orpha_code': assoc.findtext('.//TargetDisorder/OrphaCode', ''),
-                        'parent_disorder_name': assoc.findtext('.//TargetDisorder/Name[@lang="en"]', ''),
-                        'association_type': assoc.findtext('.//DisorderDisorderAssociationType/Name[@lang="en"]', ''),
-                        'created_at': datetime.now(timezone.utc).isoformat()
-                    })
-            
-            # Batch insert data
-            if classification_data:
-                try:
-                    self.supabase.table('disorder_classifications').insert(classification_data).execute()
-                except Exception as e:
-                    logger.error(f"Failed to insert classification data batch: {e}")
-        
-        logger.info(f"Loaded classifications for {len(disorders)} disorders")
+        return self.load_file(xml_file, 'linearisation')
     
     def load_external_references(self, xml_file: str):
         """Load external references and terminology alignments from XML file"""
-        logger.info(f"Loading external references from {xml_file}")
-        root = self.parse_xml(xml_file)
-        
-        disorders = root.findall('.//Disorder')
-        batch_size = 50
-        
-        for i in tqdm(range(0, len(disorders), batch_size), desc="Processing external references"):
-            batch_disorders = disorders[i:i + batch_size]
-            
-            references_data = []
-            texts_data = []
-            
-            for disorder in batch_disorders:
-                disorder_uuid = self.get_or_create_disorder(disorder)
-                
-                if not disorder_uuid:
-                    continue
-                
-                # Load external references
-                for ext_ref in disorder.findall('.//ExternalReference'):
-                    references_data.append({
-                        'disorder_id': disorder_uuid,
-                        'source': ext_ref.findtext('Source', ''),
-                        'reference': ext_ref.findtext('Reference', ''),
-                        'mapping_relation': ext_ref.findtext('.//DisorderMappingRelation/Name[@lang="en"]', ''),
-                        'mapping_validation_status': ext_ref.findtext('.//DisorderMappingValidationStatus/Name[@lang="en"]', ''),
-                        'created_at': datetime.now(timezone.utc).isoformat()
-                    })
-                
-                # Load disorder texts (definitions)
-                for text_section in disorder.findall('.//TextSection[@lang="en"]'):
-                    text_type = text_section.findtext('.//TextSectionType/Name[@lang="en"]', 'definition')
-                    content = text_section.findtext('Contents', '')
-                    
-                    if content:
-                        texts_data.append({
-                            'disorder_id': disorder_uuid,
-                            'text_type': text_type,
-                            'content': content,
-                            'created_at': datetime.now(timezone.utc).isoformat()
-                        })
-            
-            # Batch insert data
-            if references_data:
-                try:
-                    self.supabase.table('external_references').insert(references_data).execute()
-                except Exception as e:
-                    logger.error(f"Failed to insert external references batch: {e}")
-            
-            if texts_data:
-                try:
-                    self.supabase.table('disorder_texts').insert(texts_data).execute()
-                except Exception as e:
-                    logger.error(f"Failed to insert disorder texts batch: {e}")
-        
-        logger.info(f"Loaded external references for {len(disorders)} disorders")
+        return self.load_file(xml_file, 'alignment_with_terminology')
     
     def load_functional_consequences(self, xml_file: str):
         """Load functional consequences and disabilities from XML file"""
-        logger.info(f"Loading functional consequences from {xml_file}")
-        root = self.parse_xml(xml_file)
-        
-        disorder_disabilities = root.findall('.//DisorderDisabilityRelevance')
-        batch_size = 100
+        return self.load_file(xml_file, 'functional_consequences')
+    
+    def _insert(self, table: str, rows: List[Dict[str, Any]], description: str):
+        """Batch insert, logging failures"""
+        if not rows:
+            return
+        try:
+            self.supabase.table(table).insert(rows).execute()
+        except Exception as e:
+            self._write_failed(f"Failed to insert {description} batch: {e}")
+    
+    def _get_or_create(self, table: str, key_column: str, data: Dict[str, Any],
+                       update: Dict[str, Any], cache: Dict[Any, str]) -> Optional[str]:
+        """UUID of the row whose key_column matches data, updated with update or created from data"""
+        key = data[key_column]
+        if key in cache:
+            return cache[key]
+        
+        existing = self.supabase.table(table).select('id').eq(key_column, key).execute()
+        if existing.data:
+            row_uuid = existing.data[0]['id']
+            self.supabase.table(table).update(update).eq('id', row_uuid).execute()
+        else:
+            result = self.supabase.table(table).insert(data).execute()
+            row_uuid = result.data[0]['id']
+        
+        cache[key] = row_uuid
+        return row_uuid
+    
+    def get_or_create_disorder(self, disorder: Dict[str, Any]) -> Optional[str]:
+        """Get or create disorder (a 'disorders' record) and return UUID"""
+        orpha_code = disorder['orpha_code'] or ''
+        now = datetime.now(timezone.utc).isoformat()
+        disorder_data = {
+            'disorder_id': int(disorder['external_id'] or 0),
+            'orpha_code': orpha_code,
+            'name': disorder['name'] or '',
+            'disorder_type': disorder['disorder_type'] or '',
+            'disorder_group': disorder['disorder_group'] or '',
+            'expert_link': disorder['expert_link'] or '',
+            'created_at': now,
+            'updated_at': now
+        }
+        update = {key: disorder_data[key] for key in ('name', 'disorder_type', 'disorder_group', 'updated_at')}
         
-        for i in tqdm(range(0, len(disorder_disabilities), batch_size), desc="Processing disabilities"):
-            batch_disabilities = disorder_disabilities[i:i + batch_size]
-            
-            associations_data = []
-            
-            for disorder_disability in batch_disabilities:
-                disorder = disorder_disability.find('Disorder')
-                if disorder is None:
-                    continue
-                
-                disorder_uuid = self.get_or_create_disorder(disorder)
-                if not disorder_uuid:
-                    continue
-                
-                for disability_assoc in disorder_disability.findall('.//DisabilityDisorderAssociation'):
-                    disability_elem = disability_assoc.find('Disability')
-                    if disability_elem is None:
-                        continue
-                    
-                    disability_id = int(disability_elem.get('id', 0))
-                    disability_name = disability_elem.findtext('Name[@lang="en"]', '')
-                    
-                    # Get or create disability
-                    if disability_id not in self.disability_cache:
-                        disability_data = {
-                            'disability_id': disability_id,
-                            'name': disability_name,
-                            'created_at': datetime.now(timezone.utc).isoformat()
-                        }
-                        
-                        try:
-                            # Try to get existing disability
-                            existing = self.supabase.table('disabilities').select('id').eq('disability_id', disability_id).execute()
-                            
-                            if existing.data:
-                                disability_uuid = existing.data[0]['id']
-                                # Update existing disability
-                                self.supabase.table('disabilities').update({
-                                    'name': disability_data['name']
-                                }).eq('id', disability_uuid).execute()
-                            else:
-                                # Create new disability
-                                result = self.supabase.table('disabilities').insert(disability_data).execute()
-                                disability_uuid = result.data[0]['id']
-                            
-                            self.disability_cache[disability_id] = disability_uuid
-                        except Exception as e:
-                            logger.error(f"Failed to process disability {disability_id}: {e}")
-                            continue
-                    else:
-                        disability_uuid = self.disability_cache[disability_id]
-                    
-                    # Create association
-                    associations_data.append({
-                        'disorder_id': disorder_uuid,
-                        'disability_id': disability_uuid,
-                        'frequency': disability_assoc.findtext('.//FrequenceDisability/Name[@lang="en"]', ''),
-                        'temporality': disability_assoc.findtext('.//TemporalityDisability/Name[@lang="en"]', ''),
-                        'severity': disability_assoc.findtext('.//SeverityDisability/Name[@lang="en"]', ''),
-                        'loss_of_ability': disability_assoc.findtext('LossOfAbility', '') == 'y',
-                        'created_at': datetime.now(timezone.utc).isoformat()
-                    })
+        try:
+            return self._get_or_create('disorders', 'orpha_code', disorder_data, update, self.disorder_cache)
+        except Exception as e:
+            self._write_failed(f"Failed to get/create disorder {orpha_code}: {e}")
+            return None
+    
+    def _write_disorders(self, rows: List[Dict[str, Any]]):
+        updated = []
+        for disorder in rows:
+            disorder_uuid = self.get_or_create_disorder(disorder)
+            if disorder_uuid and self._tracker is not None and self._tracker.is_update(disorder['orpha_code']):
+                updated.append(disorder_uuid)
+        
+        # Updated disorders get their rows of this product replaced by the ones that follow
+        if updated:
+            self._delete_disorder_rows(updated)
+    
+    def _write_disorder_synonyms(self, rows: List[Dict[str, Any]]):
+        for synonym in rows:
+            disorder_uuid = self.disorder_cache.get(synonym['disorder_orpha_code'])
+            if not disorder_uuid:
+                continue
+            try:
+                self.supabase.table('disorder_synonyms').insert({
+                    'disorder_id': disorder_uuid,
+                    'synonym': synonym['synonym'],
+                    'created_at': datetime.now(timezone.utc).isoformat()
+                }).execute()
+            except Exception as e:
+                # Ignore duplicate synonyms
+                if 'duplicate' not in str(e).lower():
+                    self._write_failed(f"Failed to insert synonym: {e}")
+    
+    def _write_age_of_onset(self, rows: List[Dict[str, Any]]):
+        now = datetime.now(timezone.utc).isoformat()
+        self._insert('age_of_onset', [
+            {
+                'disorder_id': self.disorder_cache[onset['disorder_orpha_code']],
+                'onset_name': onset['onset_name'] or '',
+                'onset_id': int(onset['onset_id'] or 0),
+                'created_at': now
+            }
+            for onset in rows if onset['disorder_orpha_code'] in self.disorder_cache
+        ], 'onset data')
+    
+    def _write_inheritance(self, rows: List[Dict[str, Any]]):
+        now = datetime.now(timezone.utc).isoformat()
+        self._insert('inheritance_types', [
+            {
+                'disorder_id': self.disorder_cache[inheritance['disorder_orpha_code']],
+                'inheritance_name': inheritance['inheritance_name'] or '',
+                'inheritance_id': int(inheritance['inheritance_id'] or 0),
+                'created_at': now
+            }
+            for inheritance in rows if inheritance['disorder_orpha_code'] in self.disorder_cache
+        ], 'inheritance data')
+    
+    def _write_genes(self, rows: List[Dict[str, Any]]):
+        for gene in rows:
+            now = datetime.now(timezone.utc).isoformat()
+            gene_data = {
+                'gene_symbol': gene['symbol'] or '',
+                'gene_name': gene['name'] or '',
+                'gene_type': gene['gene_type'] or '',
+                'chromosomal_location': gene['locus'] or '',
+                'created_at': now,
+                'updated_at': now
+            }
+            try:
+                self._get_or_create('genes', 'gene_symbol', gene_data,
+                                    {'gene_name': gene_data['gene_name'], 'updated_at': now}, self.gene_cache)
+            except Exception as e:
+                self._write_failed(f"Failed to process gene {gene['symbol']}: {e}")
+    
+    def _write_gene_external_refs(self, rows: List[Dict[str, Any]]):
+        now = datetime.now(timezone.utc).isoformat()
+        self._insert('gene_external_refs', [
+            {
+                'gene_id': self.gene_cache[ref['gene_symbol']],
+                'source': ref['source'] or '',
+                'reference': ref['reference'] or '',
+                'created_at': now
+            }
+            for ref in rows if ref['gene_symbol'] in self.gene_cache
+        ], 'gene external refs')
+    
+    def _write_gene_associations(self, rows: List[Dict[str, Any]]):
+        now = datetime.now(timezone.utc).isoformat()
+        self._insert('disorder_gene_associations', [
+            {
+                'disorder_id': self.disorder_cache[assoc['disorder_orpha_code']],
+                'gene_id': self.gene_cache[assoc['gene_symbol']],
+                'association_type': assoc['association_type'] or '',
+                'association_status': assoc['association_status'] or '',
+                'source_of_validation': assoc['source_of_validation'] or '',
+                'created_at': now
+            }
+            for assoc in rows
+            if assoc['disorder_orpha_code'] in self.disorder_cache and assoc['gene_symbol'] in self.gene_cache
+        ], 'gene associations')
+    
+    def _write_hpo_terms(self, rows: List[Dict[str, Any]]):
+        for term in rows:
+            hpo_data = {
+                'hpo_id': term['hpo_id'] or '',
+                'term': term['term'] or '',
+                'created_at': datetime.now(timezone.utc).isoformat()
+            }
+            try:
+                self._get_or_create('hpo_terms', 'hpo_id', hpo_data, {'term': hpo_data['term']}, self.hpo_cache)
+            except Exception as e:
+                self._write_failed(f"Failed to process HPO term {term['hpo_id']}: {e}")
+    
+    def _write_hpo_associations(self, rows: List[Dict[str, Any]]):
+        associations_data = []
+        for assoc in rows:
+            disorder_uuid = self.disorder_cache.get(assoc['disorder_orpha_code'])
+            hpo_uuid = self.hpo_cache.get(assoc['hpo_id'])
+            if not disorder_uuid or not hpo_uuid:
+                continue
             
-            # Batch insert associations
-            if associations_data:
-                try:
-                    self.supabase.table('disorder_disability_associations').insert(associations_data).execute()
-                except Exception as e:
-                    logger.error(f"Failed to insert disability associations batch: {e}")
-        
-        logger.info(f"Loaded disabilities for {len(disorder_disabilities)} disorders")
+            # Parse frequency category
+            frequency = assoc['frequency'] or ''
+            frequency_category = None
+            if '99-80%' in frequency:
+                frequency_category = 'Very frequent'
+            elif '79-30%' in frequency:
+                frequency_category = 'Frequent'
+            elif '29-5%' in frequency:
+                frequency_category = 'Occasional'
+            elif '4-1%' in frequency:
+                frequency_category = 'Very rare'
+            
+            associations_data.append({
+                'disorder_id': disorder_uuid,
+                'hpo_term_id': hpo_uuid,
+                'frequency': frequency,
+                'frequency_category': frequency_category,
+                'diagnostic_criteria': bool(assoc['diagnostic_criteria']),
+                'created_at': datetime.now(timezone.utc).isoformat()
+            })
+        self._insert('disorder_hpo_associations', associations_data, 'HPO associations')
+    
+    def _write_prevalences(self, rows: List[Dict[str, Any]]):
+        prevalence_data = []
+        for prevalence in rows:
+            disorder_uuid = self.disorder_cache.get(prevalence['disorder_orpha_code'])
+            if not disorder_uuid:
+                continue
+            try:
+                val_moy = float(prevalence['val_moy']) if prevalence['val_moy'] else 0.0
+            except ValueError:
+                val_moy = 0.0
+            
+            prevalence_data.append({
+                'disorder_id': disorder_uuid,
+                'prevalence_type': prevalence['prevalence_type'] or '',
+                'prevalence_qualification': prevalence['prevalence_qualification'] or '',
+                'prevalence_class': prevalence['prevalence_class'] or '',
+                'val_moy': val_moy,
+                'geographic_area': prevalence['geographic_area'] or '',
+                'validation_status': prevalence['validation_status'] or '',
+                'source': prevalence['source'] or '',
+                'created_at': datetime.now(timezone.utc).isoformat()
+            })
+        self._insert('prevalence_data', prevalence_data, 'prevalence data')
+    
+    def _write_classifications(self, rows: List[Dict[str, Any]]):
+        now = datetime.now(timezone.utc).isoformat()
+        self._insert('disorder_classifications', [
+            {
+                'disorder_id': self.disorder_cache[assoc['disorder_orpha_code']],
+                'parent_disorder_orpha_code': assoc['parent_orpha_code'] or '',
+                'parent_disorder_name': assoc['parent_name'] or '',
+                'association_type': assoc['association_type'] or '',
+                'created_at': now
+            }
+            for assoc in rows if assoc['disorder_orpha_code'] in self.disorder_cache
+        ], 'classification data')
+    
+    def _write_external_references(self, rows: List[Dict[str, Any]]):
+        now = datetime.now(timezone.utc).isoformat()
+        self._insert('external_references', [
+            {
+                'disorder_id': self.disorder_cache[ref['disorder_orpha_code']],
+                'source': ref['source'] or '',
+                'reference': ref['reference'] or '',
+                'mapping_relation': ref['mapping_relation'] or '',
+                'mapping_validation_status': ref['mapping_validation_status'] or '',
+                'created_at': now
+            }
+            for ref in rows if ref['disorder_orpha_code'] in self.disorder_cache
+        ], 'external references')
+    
+    def _write_disorder_texts(self, rows: List[Dict[str, Any]]):
+        now = datetime.now(timezone.utc).isoformat()
+        self._insert('disorder_texts', [
+            {
+                'disorder_id': self.disorder_cache[text['disorder_orpha_code']],
+                'text_type': text['text_type'],
+                'content': text['content'],
+                'created_at': now
+            }
+            for text in rows if text['content'] and text['disorder_orpha_code'] in self.disorder_cache
+        ], 'disorder texts')
+    
+    def _write_disabilities(self, rows: List[Dict[str, Any]]):
+        for disability in rows:
+            disability_id = int(disability['external_id'] or 0)
+            disability_data = {
+                'disability_id': disability_id,
+                'name': disability['name'] or '',
+                'created_at': datetime.now(timezone.utc).isoformat()
+            }
+            try:
+                self._get_or_create('disabilities', 'disability_id', disability_data,
+                                    {'name': disability_data['name']}, self.disability_cache)
+            except Exception as e:
+                self._write_failed(f"Failed to process disability {disability_id}: {e}")
+    
+    def _write_disability_associations(self, rows: List[Dict[str, Any]]):
+        now = datetime.now(timezone.utc).isoformat()
+        self._insert('disorder_disability_associations', [
+            {
+                'disorder_id': self.disorder_cache[assoc['disorder_orpha_code']],
+                'disability_id': self.disability_cache[int(assoc['disability_id'] or 0)],
+                'frequency': assoc['frequency'] or '',
+                'temporality': assoc['temporality'] or '',
+                'severity': assoc['severity'] or '',
+                'loss_of_ability': assoc['loss_of_ability'] == 'y',
+                'created_at': now
+            }
+            for assoc in rows
+            if assoc['disorder_orpha_code'] in self.disorder_cache
+            and int(assoc['disability_id'] or 0) in self.disability_cache
+        ], 'disability associations')
     
     def load_all_xml_files(self, file_directory: str):
         """Load all XML files from a directory"""
@@ -751,6 +570,10 @@ def main():
     parser.add_argument('--url', '-u', help='Supabase URL (or use SUPABASE_URL env var)')
     parser.add_argument('--key', '-k', help='Supabase anonymous key (or use SUPABASE_KEY env var)')
     parser.add_argument('--stats', '-s', action='store_true', help='Show statistics after loading')
+    parser.add_argument('--delta', action='store_true',
+                        help='Only write disorders inserted, updated or deleted since the last load')
+    parser.add_argument('--fingerprints', default=FINGERPRINT_FILE,
+                        help=f'Fingerprints of the last load, for --delta (default: {FINGERPRINT_FILE})')
     
     args = parser.parse_args()
     
@@ -769,7 +592,7 @@ def main():
     )
     
     # Create loader and process files
-    loader = OrphanetXMLLoader(config)
+    loader = OrphanetXMLLoader(config, FingerprintStore(args.fingerprints) if args.delta else None)
     
     try:
         # Connect to Supabase
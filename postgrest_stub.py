@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+PostgREST Stub - Local, in-memory stand-in for the Supabase REST API
+Serves the tables read by railway-deploy/supabase_diagnosis.py and simple_supabase_diagnosis.py
+from the clinical signs dataset, so the Supabase-backed paths can be load-tested offline
+"""
+
+import re
+import asyncio
+import operator
+import logging
+import argparse
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+import uvicorn
+
+from orphanet_data import find_dataset, read_dataset_file
+
+logger = logging.getLogger(__name__)
+
+CLINICAL_SIGNS_PRODUCT = 'clinical_signs_and_symptoms_in_rare_diseases'
+CLINICAL_SIGNS_COLUMNS = ['orpha_code', 'disorder_name', 'hpo_term', 'hpo_frequency']
+
+DEFAULT_PORT = 54321
+
+# create_client() only accepts JWT-shaped keys; the stub itself never checks it
+STUB_SERVICE_KEY = 'stub.service.key'
+
+# Embedded resources: table -> {embedded table: foreign key column}
+FOREIGN_KEYS = {
+    'disorder_hpo_associations': {'disorders': 'disorder_id', 'hpo_terms': 'hpo_term_id'}
+}
+
+FILTER_OPERATORS = ('eq', 'neq', 'gt', 'gte', 'lt', 'lte', 'like', 'ilike', 'in', 'is')
+
+COMPARISONS = {
+    'eq': operator.eq, 'neq': operator.ne,
+    'gt': operator.gt, 'gte': operator.ge,
+    'lt': operator.lt, 'lte': operator.le
+}
+
+# Query parameters that are not column filters
+RESERVED_PARAMS = {'select', 'order', 'limit', 'offset'}
+
+
+class PostgRESTError(Exception):
+    """Request error reported with PostgREST's JSON error shape"""
+
+    def __init__(self, message: str, status_code: int = 400, code: str = 'PGRST100'):
+        super().__init__(message)
+        self.status_code = status_code
+        self.code = code
+
+
+def build_tables(disease_data: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    """The Supabase tables and views the diagnosis clients query, built from clinical signs rows"""
+    frequency_mapping = {
+        'Very frequent (99-80%)': 0.9,
+        'Frequent (79-30%)': 0.55,
+        'Occasional (29-5%)': 0.17,
+        'Very rare (<5%)': 0.025,
+        'Excluded (0%)': 0.0
+    }
+
+    df = disease_data.dropna(subset=['orpha_code', 'disorder_name', 'hpo_term']).copy()
+    df['orpha_code'] = df['orpha_code'].astype(int).astype(str)
+    df['hpo_frequency'] = df['hpo_frequency'].fillna('Unknown').astype(str)
+    df['frequency_numeric'] = df['hpo_frequency'].map(lambda x: frequency_mapping.get(x.strip(), 0.5))
+
+    disorders = df.groupby('disorder_name', sort=True)['orpha_code'].first().reset_index()
+    disorders = disorders.rename(columns={'disorder_name': 'name'})
+    disorders.insert(0, 'id', range(1, len(disorders) + 1))
+
+    terms = pd.DataFrame({'term': sorted(df['hpo_term'].unique())})
+    terms.insert(0, 'id', range(1, len(terms) + 1))
+    terms['hpo_term'] = terms['term']
+
+    disorder_ids = dict(zip(disorders['name'], disorders['id']))
+    term_ids = dict(zip(terms['term'], terms['id']))
+    associations = pd.DataFrame({
+        'id': range(1, len(df) + 1),
+        'disorder_id': df['disorder_name'].map(disorder_ids).to_numpy(),
+        'hpo_term_id': df['hpo_term'].map(term_ids).to_numpy(),
+        'frequency': df['hpo_frequency'].to_numpy()
+    })
+
+    fast_symptoms = df.groupby('hpo_term').size().reset_index(name='symptom_count')
+    fast_symptoms = fast_symptoms.rename(columns={'hpo_term': 'symptom_name'})
+    fast_symptoms.insert(0, 'id', range(1, len(fast_symptoms) + 1))
+
+    fast_diseases = df.groupby('disorder_name').agg(orpha_code=('orpha_code', 'first'), symptom_count=('hpo_term', 'count'))
+    fast_diseases = fast_diseases.reset_index().rename(columns={'disorder_name': 'disease_name'})
+    fast_diseases.insert(0, 'id', range(1, len(fast_diseases) + 1))
+
+    # Same derivation as supabase_fast_diagnosis.py populates it
+    fast_probabilities = pd.DataFrame({
+        'id': range(1, len(df) + 1),
+        'symptom_name': df['hpo_term'].to_numpy(),
+        'disease_name': df['disorder_name'].to_numpy(),
+        'orpha_code': df['orpha_code'].to_numpy(),
+        'probability': (df['frequency_numeric'] * 1.2).clip(upper=1.0).to_numpy(),
+        'frequency': df['frequency_numeric'].to_numpy(),
+        'confidence_score': df['frequency_numeric'].to_numpy()
+    })
+
+    return {
+        'disorders': disorders,
+        'hpo_terms': terms,
+        'disorder_hpo_associations': associations,
+        'disorder_symptoms_view': df[['disorder_name', 'orpha_code', 'hpo_term', 'hpo_frequency']].reset_index(drop=True),
+        'fast_symptoms': fast_symptoms,
+        'fast_diseases': fast_diseases,
+        'fast_probabilities': fast_probabilities
+    }
+
+
+def _split_top_level(text: str) -> List[str]:
+    """Split on commas outside parentheses and double quotes"""
+    parts, depth, quoted, current = [], 0, False, ''
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif char == '(' and not quoted:
+            depth += 1
+        elif char == ')' and not quoted:
+            depth -= 1
+        elif char == ',' and depth == 0 and not quoted:
+            parts.append(current)
+            current = ''
+            continue
+        current += char
+    if current:
+        parts.append(current)
+    return parts
+
+
+def parse_in_list(operand: str) -> List[str]:
+    """
+    Values of an in.(...) filter. Double-quoted values are PostgREST syntax; single quotes
+    are stripped too, as simple_supabase_diagnosis.py sends in.(''a','b'').
+    """
+    if not (operand.startswith('(') and operand.endswith(')')):
+        raise PostgRESTError(f'"failed to parse filter (in.{operand})"')
+    return [value.strip().strip('"').strip("'") for value in _split_top_level(operand[1:-1])]
+
+
+def _like_pattern(operand: str) -> str:
+    """Anchored regex for a PostgREST like pattern (* and % are wildcards)"""
+    return '^' + '.*'.join(re.escape(part) for part in re.split(r'[*%]', operand)) + '$'
+
+
+def apply_filter(table: pd.DataFrame, column: str, expression: str) -> pd.DataFrame:
+    """Rows of table matching one column=operator.operand query parameter"""
+    if column not in table.columns:
+        raise PostgRESTError(f'column {column} does not exist', code='42703')
+
+    name, _, operand = expression.partition('.')
+    if name not in FILTER_OPERATORS:
+        raise PostgRESTError(f'"failed to parse filter ({expression})"')
+
+    values = table[column]
+    if name == 'in':
+        return table[values.astype(str).isin(parse_in_list(operand))]
+    if name in ('like', 'ilike'):
+        mask = values.astype(str).str.contains(_like_pattern(operand), case=name == 'like', regex=True)
+        return table[mask]
+    if name == 'is':
+        if operand.lower() != 'null':
+            raise PostgRESTError(f'"failed to parse filter ({expression})"')
+        return table[values.isna()]
+
+    if pd.api.types.is_numeric_dtype(values):
+        try:
+            operand = float(operand)
+        except ValueError:
+            raise PostgRESTError(f'invalid input syntax: "{operand}"', code='22P02')
+    else:
+        values = values.astype(str)
+
+    return table[COMPARISONS[name](values, operand)]
+
+
+def parse_select(select: str) -> List[Tuple[str, Optional[List[str]]]]:
+    """(column, None) or (embedded table, its columns) items of a select parameter"""
+    items = []
+    for part in _split_top_level(re.sub(r'\s+', '', select or '*')):
+        if '(' in part:
+            name, _, columns = part.partition('(')
+            items.append((name, [c for c in columns.rstrip(')').split(',') if c]))
+        else:
+            items.append((part, None))
+    return items
+
+
+def select_rows(
+    tables: Dict[str, pd.DataFrame],
+    name: str,
+    rows: pd.DataFrame,
+    select: str
+) -> List[Dict[str, Any]]:
+    """JSON rows for the selected columns and embedded resources"""
+    items = parse_select(select)
+    if items == [('count', None)]:
+        return [{'count': len(rows)}]
+
+    columns = [c for column, embedded in items if embedded is None for c in (rows.columns if column == '*' else [column])]
+    missing = [c for c in columns if c not in rows.columns]
+    if missing:
+        raise PostgRESTError(f'column {name}.{missing[0]} does not exist', code='42703')
+
+    records = rows[columns].to_dict('records')
+
+    for column, embedded in items:
+        if embedded is None:
+            continue
+        foreign_key = FOREIGN_KEYS.get(name, {}).get(column)
+        if foreign_key is None:
+            raise PostgRESTError(f"Could not find a relationship between '{name}' and '{column}'", code='PGRST200')
+
+        target = tables[column].set_index('id', drop=False)
+        if embedded and embedded != ['*']:
+            missing = [c for c in embedded if c not in target.columns]
+            if missing:
+                raise PostgRESTError(f'column {column}.{missing[0]} does not exist', code='42703')
+            target = target[embedded]
+
+        lookup = target.to_dict('index')
+        for record, key in zip(records, rows[foreign_key].tolist()):
+            record[column] = lookup.get(key)
+
+    return records
+
+
+def query_table(tables: Dict[str, pd.DataFrame], name: str, params: List[Tuple[str, str]], range_header: Optional[str] = None):
+    """(JSON rows, total matching rows, offset) for one GET /rest/v1/<table> request"""
+    if name not in tables:
+        raise PostgRESTError(f'relation "public.{name}" does not exist', status_code=404, code='42P01')
+
+    rows = tables[name]
+    options = {}
+    for key, value in params:
+        if key in RESERVED_PARAMS:
+            options[key] = value
+        else:
+            rows = apply_filter(rows, key, value)
+
+    if 'order' in options:
+        by, ascending = [], []
+        for term in options['order'].split(','):
+            column, _, direction = term.partition('.')
+            by.append(column)
+            ascending.append(not direction.startswith('desc'))
+        missing = [c for c in by if c not in rows.columns]
+        if missing:
+            raise PostgRESTError(f'column {name}.{missing[0]} does not exist', code='42703')
+        rows = rows.sort_values(by, ascending=ascending, kind='stable')
+
+    offset = int(options.get('offset', 0))
+    limit = int(options['limit']) if 'limit' in options else None
+    if range_header:
+        start, _, end = range_header.partition('-')
+        offset = int(start)
+        if end:
+            limit = int(end) - offset + 1
+
+    total = len(rows)
+    if parse_select(options.get('select', '*')) == [('count', None)]:
+        return select_rows(tables, name, rows, 'count'), total, 0
+
+    window = rows.iloc[offset:offset + limit if limit is not None else None]
+    return select_rows(tables, name, window, options.get('select', '*')), total, offset
+
+
+def create_app(tables: Dict[str, pd.DataFrame], latency_ms: float = 0.0, max_rows: Optional[int] = None) -> FastAPI:
+    """Read-only PostgREST-compatible app over the given tables"""
+    app = FastAPI(title="PostgREST stub", docs_url=None, redoc_url=None)
+
+    @app.get("/rest/v1/")
+    async def list_tables():
+        return {name: list(table.columns) for name, table in tables.items()}
+
+    @app.get("/rest/v1/{name}")
+    async def get_table(name: str, request: Request):
+        # Simulated network / database round trip
+        if latency_ms:
+            await asyncio.sleep(latency_ms / 1000)
+
+        try:
+            records, total, offset = query_table(
+                tables, name, list(request.query_params.multi_items()), request.headers.get('range')
+            )
+        except PostgRESTError as e:
+            return JSONResponse(
+                status_code=e.status_code,
+                content={'code': e.code, 'message': str(e), 'details': None, 'hint': None}
+            )
+        except ValueError as e:
+            return JSONResponse(status_code=400, content={'code': 'PGRST103', 'message': str(e), 'details': None, 'hint': None})
+
+        # Supabase projects cap responses at max-rows (1000 by default)
+        if max_rows is not None:
+            records = records[:max_rows]
+
+        end = offset + len(records) - 1
+        content_range = f"{offset}-{end}" if records else '*'
+        count = total if 'count=exact' in request.headers.get('prefer', '') else '*'
+        return JSONResponse(content=records, headers={'Content-Range': f"{content_range}/{count}"})
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the clinical signs dataset through a PostgREST-compatible API')
+    parser.add_argument('--data', help='Clinical signs dataset (default: file/ lookup)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Delay added to every request')
+    parser.add_argument('--max-rows', type=int, help='Cap rows per response, like the Supabase max-rows setting')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    data_path = args.data or find_dataset(CLINICAL_SIGNS_PRODUCT)
+    if data_path is None:
+        print(f"❌ Dataset not found: {CLINICAL_SIGNS_PRODUCT}")
+        return
+
+    tables = build_tables(read_dataset_file(data_path, columns=CLINICAL_SIGNS_COLUMNS))
+    for name, table in tables.items():
+        logger.info(f"📋 {name}: {len(table)} rows")
+
+    print(f"🧪 PostgREST stub on http://{args.host}:{args.port}/rest/v1")
+    print(f"   SUPABASE_URL=http://{args.host}:{args.port} SUPABASE_SERVICE_KEY={STUB_SERVICE_KEY}")
+    uvicorn.run(create_app(tables, args.latency_ms, args.max_rows), host=args.host, port=args.port, log_level='warning')
+
+
+if __name__ == "__main__":
+    main()
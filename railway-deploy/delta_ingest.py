@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Delta Ingest - Per-disorder fingerprints for incremental loads between Orphanet releases
+
+Each disorder's record set (its normalized associations) is hashed into a fingerprint. The
+fingerprints of the last successful load are stored per scope (loader and product), so the next
+release is reduced to the disorders inserted, updated and deleted since then.
+"""
+
+import os
+import json
+import hashlib
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Default on-disk location of the fingerprints of the last load
+FINGERPRINT_FILE = 'orphanet_fingerprints.json'
+
+# Record kinds that are shared lookups rather than a disorder's own data
+SHARED_KINDS = ('disorder_types', 'disorder_groups', 'age_of_onset_types', 'inheritance_types')
+
+
+def _normalize(value: Any) -> str:
+    """Value as compared between releases: surrounding whitespace and missing values do not count"""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return ''
+    return str(value).strip()
+
+
+def records_fingerprint(records: Dict[str, List[Dict[str, Any]]], kinds: Optional[Iterable[str]] = None) -> str:
+    """Fingerprint of one disorder's records (as produced by OrphanetExtractor.extract_disorder)"""
+    wanted = None if kinds is None else set(kinds)
+    normalized = {
+        kind: sorted(json.dumps([[key, _normalize(row[key])] for key in sorted(row)]) for row in rows)
+        for kind, rows in records.items()
+        if rows and kind not in SHARED_KINDS and (wanted is None or kind in wanted)
+    }
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def frame_fingerprints(df, key: str, columns: Sequence[str]) -> Dict[str, str]:
+    """
+    Fingerprint of every key's rows in a DataFrame, over the given columns. Rows are hashed
+    vectorized and summed per key, so the fingerprint does not depend on row order.
+    """
+    import pandas as pd
+
+    normalized = pd.DataFrame({c: df[c].map(_normalize) for c in columns})
+    row_hashes = pd.util.hash_pandas_object(normalized, index=False).to_numpy(dtype=np.uint64)
+    codes, keys = pd.factorize(df[key].map(_normalize))
+
+    # Sum per key with uint64 wrap-around (np.add.at keeps the dtype, unlike bincount)
+    sums = np.zeros(len(keys), dtype=np.uint64)
+    np.add.at(sums, codes, row_hashes)
+    return {str(k): f"{s:016x}" for k, s in zip(keys, sums.tolist())}
+
+
+@dataclass
+class DisorderDelta:
+    """Disorders inserted, updated and deleted between two loads (sorted orpha codes)"""
+    inserted: List[str] = field(default_factory=list)
+    updated: List[str] = field(default_factory=list)
+    deleted: List[str] = field(default_factory=list)
+    unchanged: int = 0
+
+    @property
+    def changed(self) -> List[str]:
+        """Disorders whose records have to be written"""
+        return sorted(self.inserted + self.updated)
+
+    def __bool__(self) -> bool:
+        return bool(self.inserted or self.updated or self.deleted)
+
+    def summary(self) -> str:
+        return (f"{len(self.inserted)} inserted, {len(self.updated)} updated, "
+                f"{len(self.deleted)} deleted, {self.unchanged} unchanged")
+
+
+def compute_delta(previous: Dict[str, str], current: Dict[str, str]) -> DisorderDelta:
+    """Compare the fingerprints of the last load with the current ones"""
+    inserted = sorted(code for code in current if code not in previous)
+    updated = sorted(code for code, fp in current.items() if code in previous and previous[code] != fp)
+    deleted = sorted(code for code in previous if code not in current)
+    unchanged = len(current) - len(inserted) - len(updated)
+    return DisorderDelta(inserted, updated, deleted, unchanged)
+
+
+class FingerprintStore:
+    """Fingerprints of the last successful load, by scope (e.g. 'supabase:clinical_signs'), in a JSON file"""
+
+    def __init__(self, path: str = FINGERPRINT_FILE):
+        self.path = path
+        self.scopes: Dict[str, Dict[str, str]] = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.scopes = json.load(f)
+
+    def get(self, scope: str) -> Dict[str, str]:
+        return self.scopes.get(scope, {})
+
+    def set(self, scope: str, fingerprints: Dict[str, str]):
+        self.scopes[scope] = dict(fingerprints)
+
+    def save(self):
+        """Write atomically, so an interrupted save keeps the previous fingerprints"""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.scopes, f, sort_keys=True)
+        os.replace(tmp_path, self.path)
+        logger.info(f"💾 Saved fingerprints of {sum(len(s) for s in self.scopes.values())} disorders to {self.path}")
+
+
+class DeltaTracker:
+    """
+    Selection predicate for OrphanetExtractor.iter_batches: fingerprints every disorder it sees
+    and only lets through the ones that are new or changed since the previous fingerprints.
+    """
+
+    def __init__(self, previous: Dict[str, str], kinds: Optional[Iterable[str]] = None):
+        self.previous = previous
+        self.kinds = None if kinds is None else tuple(kinds)
+        self.current: Dict[str, str] = {}
+
+    def __call__(self, records: Dict[str, List[Dict[str, Any]]]) -> bool:
+        disorders = records.get('disorders')
+        if not disorders or not disorders[0]['orpha_code']:
+            return True
+        code = disorders[0]['orpha_code']
+        fingerprint = records_fingerprint(records, self.kinds)
+        self.current[code] = fingerprint
+        return self.previous.get(code) != fingerprint
+
+    def is_update(self, code: str) -> bool:
+        """Whether a selected disorder was loaded before (its old rows must be replaced)"""
+        return code in self.previous
+
+    def delta(self) -> DisorderDelta:
+        return compute_delta(self.previous, self.current)
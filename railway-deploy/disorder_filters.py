@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Disorder Filters - Pre-computed disorder bitsets for constraining diagnosis candidates
+One packed bitset per value (gene symbol, age of onset, inheritance) so a constraint is a bitwise AND over the candidate mask
+"""
+
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from orphanet_data import load_dataset
+
+logger = logging.getLogger(__name__)
+
+GENES_PRODUCT = 'genes_associated_with_rare_diseases'
+GENE_COLUMNS = ['orpha_code', 'gene_symbol']
+
+# Pipe-delimited Gene/SynonymList written by file/xml_to_csv_converter.py
+GENE_SYNONYMS_COLUMN = 'gene_synonyms'
+
+# Gene constraint modes
+GENE_MODES = ('restrict', 'boost')
+DEFAULT_GENE_MODE = 'restrict'
+
+# Likelihood ratio applied to disorders associated with a requested gene in boost mode
+GENE_BOOST = 10.0
+
+NATURAL_HISTORY_PRODUCT = 'natural_history_of_rare_diseases'
+
+# Pipe-delimited natural history columns -> filter name in the index
+NATURAL_HISTORY_FILTERS = {
+    'age_of_onset': 'onset',
+    'type_of_inheritance': 'inheritance'
+}
+
+# Disorders without an informative value share one bitset so they can be kept or dropped
+UNANNOTATED = 'Unannotated'
+UNINFORMATIVE_VALUES = {'No data available', 'Unknown', 'Not yet documented'}
+
+# Values compatible with any requested value of the same filter
+WILDCARD_VALUES = {'onset': ['All ages']}
+
+
+def _normalize(value: str) -> str:
+    return str(value).strip().upper()
+
+
+class DisorderBitsets:
+    """Value -> packed disorder bitset, with aliases (e.g. gene synonyms) resolving to the same rows"""
+
+    def __init__(
+        self,
+        values: List[str],
+        bits: np.ndarray,
+        n_diseases: int,
+        alias_names: Optional[Sequence[str]] = None,
+        alias_targets: Optional[Sequence[int]] = None
+    ):
+        """Wrap a (n_values, ceil(n_diseases / 8)) uint8 matrix as written by np.packbits"""
+        self.values = list(values)
+        self.bits = np.asarray(bits, dtype=np.uint8)
+        self.n_diseases = int(n_diseases)
+        self.alias_names = list(alias_names) if alias_names is not None else []
+        self.alias_targets = np.asarray(alias_targets if alias_targets is not None else [], dtype=np.int32)
+
+        # Case-insensitive lookup; values win over aliases with the same spelling
+        self.lookup: Dict[str, List[int]] = defaultdict(list)
+        for alias, target in zip(self.alias_names, self.alias_targets.tolist()):
+            self.lookup[_normalize(alias)].append(target)
+        for i, value in enumerate(self.values):
+            self.lookup[_normalize(value)] = [i]
+        self.lookup = dict(self.lookup)
+
+    @property
+    def n_values(self) -> int:
+        return len(self.values)
+
+    @classmethod
+    def from_pairs(
+        cls,
+        values: Sequence[str],
+        disease_ids: Sequence[int],
+        n_diseases: int,
+        aliases: Optional[Iterable[Tuple[str, str]]] = None
+    ) -> 'DisorderBitsets':
+        """Build from parallel (value, disease id) arrays plus optional (alias, value) pairs"""
+        import pandas as pd
+
+        value_codes, unique_values = pd.factorize(pd.Series(values, dtype=object), sort=True)
+        disease_ids = np.asarray(disease_ids, dtype=np.int64)
+
+        # Set bit (value, disease) directly in packed big-endian layout, as np.packbits does
+        bits = np.zeros((len(unique_values), (n_diseases + 7) // 8), dtype=np.uint8)
+        np.bitwise_or.at(
+            bits,
+            (value_codes, disease_ids >> 3),
+            (128 >> (disease_ids & 7)).astype(np.uint8)
+        )
+
+        value_ids = {value: i for i, value in enumerate(unique_values)}
+        alias_names, alias_targets = [], []
+        for alias, value in aliases or []:
+            if value in value_ids and alias != value:
+                alias_names.append(alias)
+                alias_targets.append(value_ids[value])
+
+        return cls(unique_values.tolist(), bits, n_diseases, alias_names, alias_targets)
+
+    def resolve(self, names: Iterable[str]) -> Tuple[List[int], List[str]]:
+        """Row ids for the given values or aliases, plus the names that matched nothing"""
+        ids, unknown = [], []
+        for name in names:
+            matched = self.lookup.get(_normalize(name))
+            if matched:
+                ids.extend(matched)
+            else:
+                unknown.append(name)
+        return sorted(set(ids)), unknown
+
+    def packed_mask(self, names: Iterable[str]) -> Tuple[np.ndarray, List[str]]:
+        """Packed union of the bitsets of the given values, plus the names that matched nothing"""
+        ids, unknown = self.resolve(names)
+        if not ids:
+            return np.zeros(self.bits.shape[1], dtype=np.uint8), unknown
+        return np.bitwise_or.reduce(self.bits[ids], axis=0), unknown
+
+    def mask(self, names: Iterable[str]) -> np.ndarray:
+        """Boolean disorder mask for the union of the given values"""
+        packed, _ = self.packed_mask(names)
+        return unpack_mask(packed, self.n_diseases)
+
+    def to_arrays(self, prefix: str) -> Dict[str, np.ndarray]:
+        """Arrays for np.savez, keyed under prefix"""
+        return {
+            f'{prefix}_values': np.array(self.values, dtype=str),
+            f'{prefix}_bits': self.bits,
+            f'{prefix}_alias_names': np.array(self.alias_names, dtype=str),
+            f'{prefix}_alias_targets': self.alias_targets
+        }
+
+    @classmethod
+    def from_arrays(cls, data, prefix: str, n_diseases: int) -> Optional['DisorderBitsets']:
+        """Rebuild from an np.load() mapping; None when the prefix was never saved"""
+        if f'{prefix}_bits' not in data:
+            return None
+        return cls(
+            data[f'{prefix}_values'].tolist(),
+            data[f'{prefix}_bits'],
+            n_diseases,
+            data[f'{prefix}_alias_names'].tolist(),
+            data[f'{prefix}_alias_targets']
+        )
+
+
+def unpack_mask(packed: np.ndarray, n_diseases: int) -> np.ndarray:
+    """Boolean vector from a packed disorder mask"""
+    return np.unpackbits(packed, count=n_diseases).astype(bool)
+
+
+def constrained_codes(
+    bitsets: DisorderBitsets,
+    orpha_codes: Sequence[str],
+    names: Iterable[str]
+) -> Tuple[Set[str], List[str]]:
+    """Orpha codes set in the union of the given values, plus the names that matched nothing"""
+    packed, unknown = bitsets.packed_mask(names)
+    disease_ids = np.flatnonzero(unpack_mask(packed, bitsets.n_diseases))
+    return {str(orpha_codes[i]) for i in disease_ids}, unknown
+
+
+def gene_synonym_pairs(gene_synonyms: Iterable[Dict[str, str]]) -> List[Tuple[str, str]]:
+    """(synonym, symbol) pairs from records shaped like xmt4.parse_genes_xml_enhanced output"""
+    return [(record['synonym'], record['gene_symbol']) for record in gene_synonyms
+            if record.get('synonym') and record.get('gene_symbol')]
+
+
+def build_gene_bitsets(
+    orpha_codes: Sequence[str],
+    genes,
+    gene_synonyms: Optional[Iterable[Dict[str, str]]] = None
+) -> DisorderBitsets:
+    """
+    Gene symbol -> disorder bitset aligned with orpha_codes.
+    Synonyms come from the gene_synonyms column of the genes product and/or
+    records as loaded by xmt4.insert_genes_complete ({'gene_symbol', 'synonym'}).
+    """
+    disease_ids = {str(code): i for i, code in enumerate(orpha_codes)}
+
+    genes = genes.dropna(subset=['orpha_code', 'gene_symbol'])
+    codes = genes['orpha_code'].astype(int).astype(str)
+    ids = codes.map(disease_ids)
+    known = ids.notna()
+
+    aliases = gene_synonym_pairs(gene_synonyms or [])
+    if GENE_SYNONYMS_COLUMN in genes.columns:
+        synonyms = genes[['gene_symbol', GENE_SYNONYMS_COLUMN]].dropna().drop_duplicates()
+        for symbol, joined in zip(synonyms['gene_symbol'], synonyms[GENE_SYNONYMS_COLUMN]):
+            aliases.extend((synonym, symbol) for synonym in str(joined).split('|') if synonym)
+
+    bitsets = DisorderBitsets.from_pairs(
+        genes.loc[known, 'gene_symbol'].tolist(),
+        ids[known].astype(np.int64).to_numpy(),
+        len(orpha_codes),
+        aliases
+    )
+    logger.info(f"Built gene bitsets: {bitsets.n_values} genes, {len(bitsets.alias_names)} synonyms")
+    return bitsets
+
+
+def load_gene_bitsets(
+    orpha_codes: Sequence[str],
+    gene_synonyms: Optional[Iterable[Dict[str, str]]] = None
+) -> Optional[DisorderBitsets]:
+    """Load the genes product and build gene bitsets; None when the file is missing"""
+    try:
+        # Files converted before the synonyms column existed only have the base columns
+        try:
+            genes = load_dataset(GENES_PRODUCT, columns=GENE_COLUMNS + [GENE_SYNONYMS_COLUMN])
+        except (ValueError, KeyError):
+            genes = load_dataset(GENES_PRODUCT, columns=GENE_COLUMNS)
+
+        if genes is None:
+            logger.warning("Gene association data not found - gene filters disabled")
+            return None
+
+        return build_gene_bitsets(orpha_codes, genes, gene_synonyms)
+
+    except Exception as e:
+        logger.error(f"Error loading gene association data: {e}")
+        return None
+
+
+def build_split_bitsets(orpha_codes: Sequence[str], data, column: str) -> DisorderBitsets:
+    """
+    Value -> disorder bitset for a pipe-delimited column, aligned with orpha_codes.
+    Disorders with no row, an empty cell or only uninformative values are set under UNANNOTATED.
+    """
+    disease_ids = {str(code): i for i, code in enumerate(orpha_codes)}
+
+    values = data[['orpha_code', column]].dropna(subset=['orpha_code'])
+    values = values.assign(
+        orpha_code=values['orpha_code'].astype(int).astype(str),
+        value=values[column].fillna('').astype(str).str.split('|')
+    ).explode('value')
+    values['value'] = values['value'].str.strip()
+    values = values[(values['value'] != '') & ~values['value'].isin(UNINFORMATIVE_VALUES)]
+
+    ids = values['orpha_code'].map(disease_ids)
+    known = ids.notna()
+    value_names = values.loc[known, 'value'].tolist()
+    value_ids = ids[known].astype(np.int64).to_numpy()
+
+    annotated = np.zeros(len(orpha_codes), dtype=bool)
+    annotated[value_ids] = True
+    unannotated = np.flatnonzero(~annotated)
+
+    return DisorderBitsets.from_pairs(
+        value_names + [UNANNOTATED] * len(unannotated),
+        np.concatenate([value_ids, unannotated]),
+        len(orpha_codes)
+    )
+
+
+def load_natural_history_bitsets(orpha_codes: Sequence[str]) -> Dict[str, DisorderBitsets]:
+    """Onset and inheritance bitsets keyed by filter name; empty when the file is missing"""
+    try:
+        natural_history = load_dataset(NATURAL_HISTORY_PRODUCT, columns=['orpha_code'] + list(NATURAL_HISTORY_FILTERS))
+        if natural_history is None:
+            logger.warning("Natural history data not found - onset/inheritance filters disabled")
+            return {}
+
+        filters = {}
+        for column, name in NATURAL_HISTORY_FILTERS.items():
+            filters[name] = build_split_bitsets(orpha_codes, natural_history, column)
+            logger.info(f"Built {name} bitsets: {', '.join(filters[name].values)}")
+        return filters
+
+    except Exception as e:
+        logger.error(f"Error loading natural history data: {e}")
+        return {}
+
+
+def expand_constraint(name: str, values: List[str], include_unannotated: bool = True) -> List[str]:
+    """Requested values plus the wildcard values (and UNANNOTATED) that cannot be ruled out"""
+    if not values:
+        return []
+    expanded = list(values) + WILDCARD_VALUES.get(name, [])
+    if include_unannotated:
+        expanded.append(UNANNOTATED)
+    return expanded
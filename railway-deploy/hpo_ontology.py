@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""
+HPO Ontology - Ancestor closure of the Human Phenotype Ontology (is-a) as a CSR matrix
+Pre-computed once from a local hp.obo so per-request scoring is a sparse walk over a few rows
+"""
+
+import os
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Local ontology file (https://hpo.jax.org/), searched like the Orphanet products
+HPO_FILE = 'hp.obo'
+HPO_DATA_DIRS = ['.', 'file']
+
+# Symptom scoring modes
+SCORING_MODES = ('exact', 'propagate', 'ic_similarity')
+DEFAULT_SCORING_MODE = 'exact'
+
+
+def find_ontology(data_dirs: Optional[List[str]] = None) -> Optional[str]:
+    """Path of the local hp.obo, or None"""
+    for data_dir in data_dirs or HPO_DATA_DIRS:
+        path = os.path.join(data_dir, HPO_FILE)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def parse_obo(path: str) -> Tuple[List[str], List[str], List[List[str]], List[Tuple[str, str]]]:
+    """
+    (term ids, names, is_a parent ids, (alias, term id) pairs) for the non-obsolete [Term] stanzas.
+    Aliases are EXACT synonyms and alt_ids.
+    """
+    term_ids, names, parents, aliases = [], [], [], []
+
+    def flush(term):
+        if term and term.get('id') and not term.get('obsolete'):
+            term_ids.append(term['id'])
+            names.append(term.get('name', term['id']))
+            parents.append(term['is_a'])
+            aliases.extend((alias, term['id']) for alias in term['aliases'])
+
+    term = None
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith('['):
+                flush(term)
+                term = {'is_a': [], 'aliases': []} if line == '[Term]' else None
+                continue
+            if term is None or ': ' not in line:
+                continue
+
+            tag, value = line.split(': ', 1)
+            if tag == 'id':
+                term['id'] = value
+            elif tag == 'name':
+                term['name'] = value
+            elif tag == 'is_a':
+                term['is_a'].append(value.split(' ! ')[0].strip())
+            elif tag == 'alt_id':
+                term['aliases'].append(value)
+            elif tag == 'synonym' and ' EXACT' in value and value.startswith('"'):
+                term['aliases'].append(value[1:value.index('"', 1)])
+            elif tag == 'is_obsolete' and value == 'true':
+                term['obsolete'] = True
+        flush(term)
+
+    return term_ids, names, parents, aliases
+
+
+def _normalize(name: str) -> str:
+    return str(name).strip().lower()
+
+
+def _row_positions(indptr: np.ndarray, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(CSR positions, row lengths) of the given rows laid end to end"""
+    starts = indptr[rows]
+    lengths = indptr[rows + 1] - starts
+    offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+    return offsets + np.arange(lengths.sum()), lengths
+
+
+class HPOClosure:
+    """Term ids/names plus the ancestor-or-self closure as CSR (row = term, columns = its ancestors)"""
+
+    def __init__(
+        self,
+        term_ids: List[str],
+        term_names: List[str],
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        alias_names: Optional[Sequence[str]] = None,
+        alias_targets: Optional[Sequence[int]] = None
+    ):
+        """Wrap pre-built closure arrays"""
+        self.term_ids = list(term_ids)
+        self.term_names = list(term_names)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.alias_names = list(alias_names) if alias_names is not None else []
+        self.alias_targets = np.asarray(alias_targets if alias_targets is not None else [], dtype=np.int32)
+
+        # Names, ids and aliases all resolve case-insensitively; names win over aliases
+        self.lookup: Dict[str, int] = {}
+        for alias, target in zip(self.alias_names, self.alias_targets.tolist()):
+            self.lookup.setdefault(_normalize(alias), target)
+        for i, (term_id, name) in enumerate(zip(self.term_ids, self.term_names)):
+            self.lookup[_normalize(term_id)] = i
+            self.lookup[_normalize(name)] = i
+
+    @property
+    def n_terms(self) -> int:
+        return len(self.term_ids)
+
+    @classmethod
+    def from_parents(
+        cls,
+        term_ids: List[str],
+        names: List[str],
+        parents: List[List[str]],
+        aliases: Optional[List[Tuple[str, str]]] = None
+    ) -> 'HPOClosure':
+        """Compute the transitive is-a closure (each term is its own ancestor)"""
+        ids = {term_id: i for i, term_id in enumerate(term_ids)}
+        parent_ids = [[ids[p] for p in term_parents if p in ids] for term_parents in parents]
+
+        closure: List[Optional[frozenset]] = [None] * len(term_ids)
+        for root in range(len(term_ids)):
+            # Iterative post-order so deep chains never hit the recursion limit
+            stack = [root]
+            while stack:
+                term = stack[-1]
+                if closure[term] is not None:
+                    stack.pop()
+                    continue
+                pending = [p for p in parent_ids[term] if closure[p] is None]
+                if pending:
+                    stack.extend(pending)
+                    continue
+                ancestors = {term}
+                for p in parent_ids[term]:
+                    ancestors |= closure[p]
+                closure[term] = frozenset(ancestors)
+                stack.pop()
+
+        counts = np.array([len(ancestors) for ancestors in closure], dtype=np.int64)
+        indptr = np.concatenate(([0], np.cumsum(counts)))
+        indices = np.fromiter(
+            (a for ancestors in closure for a in sorted(ancestors)),
+            dtype=np.int32, count=int(counts.sum())
+        )
+
+        alias_names, alias_targets = [], []
+        for alias, term_id in aliases or []:
+            if term_id in ids:
+                alias_names.append(alias)
+                alias_targets.append(ids[term_id])
+
+        return cls(term_ids, names, indptr, indices, alias_names, alias_targets)
+
+    @classmethod
+    def from_obo(cls, path: str) -> 'HPOClosure':
+        """Parse hp.obo and compute the closure"""
+        closure = cls.from_parents(*parse_obo(path))
+        logger.info(f"Built HPO closure from {path}: {closure.n_terms} terms, {len(closure.indices)} ancestor links")
+        return closure
+
+    def resolve(self, name: str) -> Optional[int]:
+        """Term index for a name, HP id or exact synonym"""
+        return self.lookup.get(_normalize(name))
+
+    def ancestors(self, term: int) -> np.ndarray:
+        """Ancestor-or-self term indices of one term"""
+        return self.indices[self.indptr[term]:self.indptr[term + 1]]
+
+    def to_arrays(self, prefix: str = 'hpo') -> Dict[str, np.ndarray]:
+        """Arrays for np.savez, keyed under prefix"""
+        return {
+            f'{prefix}_term_ids': np.array(self.term_ids, dtype=str),
+            f'{prefix}_term_names': np.array(self.term_names, dtype=str),
+            f'{prefix}_indptr': self.indptr,
+            f'{prefix}_indices': self.indices,
+            f'{prefix}_alias_names': np.array(self.alias_names, dtype=str),
+            f'{prefix}_alias_targets': self.alias_targets
+        }
+
+    @classmethod
+    def from_arrays(cls, data, prefix: str = 'hpo') -> Optional['HPOClosure']:
+        """Rebuild from an np.load() mapping; None when the prefix was never saved"""
+        if f'{prefix}_indptr' not in data:
+            return None
+        return cls(
+            data[f'{prefix}_term_ids'].tolist(),
+            data[f'{prefix}_term_names'].tolist(),
+            data[f'{prefix}_indptr'],
+            data[f'{prefix}_indices'],
+            data[f'{prefix}_alias_names'].tolist(),
+            data[f'{prefix}_alias_targets']
+        )
+
+
+class OntologyIndex:
+    """
+    HPO closure joined to a DiagnosisIndex: term <-> symptom ids, term -> disease postings, term IC
+    and the term -> disease propagation CSR (the frequency a present term scores for each disease)
+    """
+
+    def __init__(
+        self,
+        closure: HPOClosure,
+        term_symptoms: np.ndarray,
+        term_indptr: np.ndarray,
+        term_indices: np.ndarray,
+        term_ic: np.ndarray,
+        prop_indptr: np.ndarray,
+        prop_indices: np.ndarray,
+        prop_freqs: np.ndarray
+    ):
+        """Wrap pre-built arrays (see from_index)"""
+        self.closure = closure
+        self.term_symptoms = np.asarray(term_symptoms, dtype=np.int32)
+        self.term_indptr = np.asarray(term_indptr, dtype=np.int64)
+        self.term_indices = np.asarray(term_indices, dtype=np.int32)
+        self.term_ic = np.asarray(term_ic, dtype=np.float64)
+        self.prop_indptr = np.asarray(prop_indptr, dtype=np.int64)
+        self.prop_indices = np.asarray(prop_indices, dtype=np.int32)
+        self.prop_freqs = np.asarray(prop_freqs, dtype=np.float32)
+
+    @classmethod
+    def from_index(cls, closure: HPOClosure, index) -> 'OntologyIndex':
+        """
+        Map index symptoms onto ontology terms and propagate every disease annotation
+        to all ancestors (excluded annotations are not propagated).
+        """
+        term_symptoms = np.full(closure.n_terms, -1, dtype=np.int32)
+        symptom_terms = np.full(index.n_symptoms, -1, dtype=np.int64)
+        for symptom_id, name in enumerate(index.symptom_names):
+            term = closure.resolve(name)
+            if term is not None:
+                symptom_terms[symptom_id] = term
+                if term_symptoms[term] < 0 or closure.term_names[term] == name:
+                    term_symptoms[term] = symptom_id
+
+        # (symptom, disease) postings of the symptom-major CSR, restricted to mapped, non-excluded symptoms
+        posting_symptoms = np.repeat(np.arange(index.n_symptoms), np.diff(index.indptr))
+        keep = (symptom_terms[posting_symptoms] >= 0) & (index.freqs > 0)
+        terms = symptom_terms[posting_symptoms[keep]]
+        diseases = index.indices[keep].astype(np.int64)
+
+        # Expand each annotation to all ancestors of its term, then dedupe (term, disease)
+        positions, lengths = _row_positions(closure.indptr, terms)
+        ancestor_terms = closure.indices[positions].astype(np.int64)
+        pairs = np.unique(ancestor_terms * index.n_diseases + np.repeat(diseases, lengths))
+
+        pair_terms = pairs // index.n_diseases
+        term_counts = np.bincount(pair_terms, minlength=closure.n_terms)
+        term_indptr = np.concatenate(([0], np.cumsum(term_counts)))
+        term_indices = (pairs % index.n_diseases).astype(np.int32)
+
+        # IC = -log(fraction of disorders annotated with the term or a descendant)
+        with np.errstate(divide='ignore'):
+            term_ic = np.where(term_counts > 0, -np.log(term_counts / max(index.n_diseases, 1)), 0.0)
+
+        prop_indptr, prop_indices, prop_freqs = cls._propagation(closure, term_symptoms, index)
+
+        mapped = int((symptom_terms >= 0).sum())
+        logger.info(f"Mapped {mapped}/{index.n_symptoms} symptoms onto HPO terms; {len(term_indices)} propagated annotations, "
+                    f"{len(prop_indices)} term -> disease likelihoods")
+        return cls(closure, term_symptoms, term_indptr, term_indices, term_ic, prop_indptr, prop_indices, prop_freqs)
+
+    @staticmethod
+    def _propagation(closure: HPOClosure, term_symptoms: np.ndarray, index) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Term -> disease CSR of the frequency a present term scores: the disease's own annotation
+        of the term, otherwise its most frequent annotation among the term's ancestors.
+        """
+        # (term, ancestor symptom) pairs, then every annotation of that symptom
+        term_rows = np.repeat(np.arange(closure.n_terms, dtype=np.int64), np.diff(closure.indptr))
+        symptoms = term_symptoms[closure.indices]
+        keep = symptoms >= 0
+        term_rows, symptoms = term_rows[keep], symptoms[keep].astype(np.int64)
+        own = symptoms == term_symptoms[term_rows]
+
+        positions, lengths = _row_positions(index.indptr, symptoms)
+        keys = np.repeat(term_rows, lengths) * index.n_diseases + index.indices[positions]
+        # Own annotations are lifted above every ancestor frequency so the per-pair max picks them
+        freqs = index.freqs[positions].astype(np.float64) + np.repeat(own, lengths) * 2.0
+
+        order = np.argsort(keys, kind='stable')
+        pairs, first = np.unique(keys[order], return_index=True)
+        best = np.maximum.reduceat(freqs[order], first) if len(pairs) else np.zeros(0)
+        best = np.where(best >= 2.0, best - 2.0, best)
+
+        n_diseases = max(index.n_diseases, 1)
+        indptr = np.concatenate(([0], np.cumsum(np.bincount(pairs // n_diseases, minlength=closure.n_terms))))
+        return indptr, (pairs % n_diseases).astype(np.int32), best.astype(np.float32)
+
+    def resolve(self, names: Sequence[str]) -> Tuple[List[int], List[str]]:
+        """Ontology term indices for symptom names / HP ids, plus the names that matched nothing"""
+        terms, unknown = [], []
+        for name in names:
+            term = self.closure.resolve(name)
+            if term is None:
+                unknown.append(name)
+            else:
+                terms.append(term)
+        return terms, unknown
+
+    def term_diseases(self, term: int) -> np.ndarray:
+        """Diseases annotated with the term or one of its descendants"""
+        return self.term_indices[self.term_indptr[term]:self.term_indptr[term + 1]]
+
+    def propagated_log_likelihood(
+        self,
+        index,
+        present_terms: List[int],
+        absent_ids: List[int] = None,
+        unseen: float = 0.01
+    ) -> np.ndarray:
+        """
+        log P(symptoms | disease) where a present term is also explained by annotations
+        of its ancestors: the disease's own annotation wins, otherwise the most frequent
+        annotated ancestor, otherwise the unseen likelihood. Absent symptoms match exactly.
+        """
+        log_unseen = np.log(unseen)
+
+        # Every present term starts as unseen; one gather over its propagation rows swaps in the likelihoods
+        log_lik = np.full(index.n_diseases, log_unseen * len(present_terms), dtype=np.float64)
+
+        with np.errstate(divide='ignore'):
+            positions, _ = _row_positions(self.prop_indptr, np.asarray(present_terms, dtype=np.int64))
+            log_lik += np.bincount(
+                self.prop_indices[positions],
+                weights=np.log(self.prop_freqs[positions].astype(np.float64)) - log_unseen,
+                minlength=index.n_diseases
+            )
+
+            if absent_ids:
+                positions, _ = _row_positions(index.indptr, np.asarray(absent_ids, dtype=np.int64))
+                log_lik += np.bincount(
+                    index.indices[positions],
+                    weights=np.log1p(-index.freqs[positions].astype(np.float64)),
+                    minlength=index.n_diseases
+                )
+
+        return log_lik
+
+    def ic_similarity(self, present_terms: List[int], n_diseases: int) -> np.ndarray:
+        """
+        Best-match-average Resnik similarity in [0, 1]: for each present term the IC of the
+        most informative ancestor shared with the disease, averaged and divided by the
+        average IC of the present terms themselves.
+        """
+        scores = np.zeros(n_diseases, dtype=np.float64)
+        max_ic = 0.0
+        for term in present_terms:
+            best = np.zeros(n_diseases, dtype=np.float64)
+            for ancestor in self.closure.ancestors(term):
+                ic = self.term_ic[ancestor]
+                if ic > 0:
+                    diseases = self.term_diseases(ancestor)
+                    best[diseases] = np.maximum(best[diseases], ic)
+            scores += best
+            max_ic += self.term_ic[term] if self.term_ic[term] > 0 else best.max(initial=0.0)
+
+        return scores / max_ic if max_ic > 0 else scores
+
+    def to_arrays(self, prefix: str = 'hpo') -> Dict[str, np.ndarray]:
+        """Arrays for np.savez, keyed under prefix"""
+        arrays = self.closure.to_arrays(prefix)
+        arrays.update({
+            f'{prefix}_term_symptoms': self.term_symptoms,
+            f'{prefix}_term_indptr': self.term_indptr,
+            f'{prefix}_term_indices': self.term_indices,
+            f'{prefix}_term_ic': self.term_ic,
+            f'{prefix}_prop_indptr': self.prop_indptr,
+            f'{prefix}_prop_indices': self.prop_indices,
+            f'{prefix}_prop_freqs': self.prop_freqs
+        })
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, data, prefix: str = 'hpo', index=None) -> Optional['OntologyIndex']:
+        """
+        Rebuild from an np.load() mapping; None when no ontology was saved. Files saved before the
+        propagation CSR existed are joined to index again (None without one).
+        """
+        closure = HPOClosure.from_arrays(data, prefix)
+        if closure is None:
+            return None
+        if f'{prefix}_prop_indptr' not in data:
+            return cls.from_index(closure, index) if index is not None else None
+        return cls(
+            closure,
+            data[f'{prefix}_term_symptoms'],
+            data[f'{prefix}_term_indptr'],
+            data[f'{prefix}_term_indices'],
+            data[f'{prefix}_term_ic'],
+            data[f'{prefix}_prop_indptr'],
+            data[f'{prefix}_prop_indices'],
+            data[f'{prefix}_prop_freqs']
+        )
+
+
+def load_ontology_closure(data_dirs: Optional[List[str]] = None) -> Optional[HPOClosure]:
+    """Parse the local hp.obo into its ancestor closure; None when missing"""
+    path = find_ontology(data_dirs)
+    if path is None:
+        logger.warning(f"{HPO_FILE} not found - ontology scoring modes disabled")
+        return None
+
+    try:
+        return HPOClosure.from_obo(path)
+    except Exception as e:
+        logger.error(f"Error parsing {path}: {e}")
+        return None
+
+
+def load_ontology_index(
+    index,
+    data_dirs: Optional[List[str]] = None,
+    closure: Optional[HPOClosure] = None
+) -> Optional[OntologyIndex]:
+    """
+    Build the ontology index for a DiagnosisIndex from the local hp.obo, or from a closure already
+    parsed with load_ontology_closure (e.g. in a worker process); None when missing
+    """
+    if closure is None:
+        closure = load_ontology_closure(data_dirs)
+    if closure is None:
+        return None
+
+    try:
+        return OntologyIndex.from_index(closure, index)
+    except Exception as e:
+        logger.error(f"Error building HPO ontology index: {e}")
+        return None
@@ -5,18 +5,169 @@ No external database required - uses local caching and optimization
 """
 
 import os
-import pandas as pd
 import numpy as np
 import pickle
 import logging
 from typing import Dict, List, Any, Optional
 from collections import defaultdict
 import time
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from orphanet_data import find_dataset, read_dataset_file
+from diagnosis_index import (
+    DiagnosisIndex, INDEX_FILE, SYMPTOM_WEIGHTINGS, DEFAULT_SYMPTOM_WEIGHTING, ABSENT_PENALTY
+)
+from prevalence_priors import load_prevalence_table, DEFAULT_PRIOR_MODE
+from classification_groups import load_group_index
+from hpo_ontology import load_ontology_closure, load_ontology_index, HPO_FILE, DEFAULT_SCORING_MODE
+from diagnosis_metrics import StageTimer, record_cache
+from delta_ingest import DisorderDelta, compute_delta, frame_fingerprints
+from disorder_filters import (
+    load_gene_bitsets, load_natural_history_bitsets, expand_constraint, unpack_mask,
+    GENE_MODES, DEFAULT_GENE_MODE, GENE_BOOST
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Clinical signs product and the columns the diagnosis engines read from it
+CLINICAL_SIGNS_PRODUCT = 'clinical_signs_and_symptoms_in_rare_diseases'
+CLINICAL_SIGNS_COLUMNS = ['orpha_code', 'disorder_name', 'hpo_term', 'hpo_frequency']
+
+# Orphanet frequency classes -> probability (unknown classes count as 0.5)
+FREQUENCY_MAPPING = {
+    'Very frequent (99-80%)': 0.9,
+    'Frequent (79-30%)': 0.55,
+    'Occasional (29-5%)': 0.17,
+    'Very rare (<5%)': 0.025,
+    'Excluded (0%)': 0.0
+}
+
+# Columns whose changes between releases make a disorder's rows be re-indexed
+FINGERPRINT_COLUMNS = ['disorder_name', 'hpo_term', 'hpo_frequency']
+
+# Worker processes for the sharded build (0 = one per core, 1 = build in this process)
+BUILD_JOBS = int(os.getenv('DIAGNOSIS_BUILD_JOBS', '0'))
+
+# Symptoms lower-cased per autocomplete shard, at least (smaller lists are not worth a worker)
+AUTOCOMPLETE_SHARD_SIZE = 20000
+
+
+def read_clinical_signs(data_path: str):
+    """Clinical signs dataset (CSV, Parquet or Arrow), cleaned and with a frequency_numeric column"""
+    disease_data = read_dataset_file(data_path, columns=CLINICAL_SIGNS_COLUMNS)
+    logger.info(f"Loaded {len(disease_data)} records")
+    
+    disease_data = disease_data.dropna(subset=['orpha_code', 'disorder_name', 'hpo_term'])
+    disease_data['frequency_numeric'] = disease_data['hpo_frequency'].map(
+        lambda x: FREQUENCY_MAPPING.get(str(x).strip(), 0.5) if isinstance(x, str) else 0.5
+    )
+    return disease_data
+
+
+def _disease_map_shard(rows) -> Dict[str, Dict[str, Any]]:
+    """Disease -> symptoms mapping of the rows of a disease ID range (runs in a worker process)"""
+    disease_map = {}
+    for disease, code, symptom, frequency in zip(
+        rows['disorder_name'], rows['orpha_code'], rows['hpo_term'], rows['frequency_numeric']
+    ):
+        info = disease_map.get(disease)
+        if info is None:
+            info = disease_map[disease] = {'symptoms': {}, 'orpha_code': str(code), 'total_symptoms': 0}
+        info['symptoms'][symptom] = frequency
+        info['total_symptoms'] += 1
+    return {disease: disease_map[disease] for disease in sorted(disease_map)}
+
+
+def _symptom_map_shard(rows):
+    """Symptom -> diseases mapping and probability matrix of the rows of a symptom ID range (runs in a worker process)"""
+    symptom_map = {}
+    for symptom, disease, code, frequency in zip(
+        rows['hpo_term'], rows['disorder_name'], rows['orpha_code'], rows['frequency_numeric']
+    ):
+        symptom_map.setdefault(symptom, {})[disease] = {'frequency': frequency, 'orpha_code': str(code)}
+    
+    symptom_map = {symptom: symptom_map[symptom] for symptom in sorted(symptom_map)}
+    matrix = {
+        symptom: {
+            disease: {
+                'probability': info['frequency'],
+                'orpha_code': info['orpha_code'],
+                'confidence': min(1.0, info['frequency'] * 1.2)
+            }
+            for disease, info in diseases.items()
+        }
+        for symptom, diseases in symptom_map.items()
+    }
+    return symptom_map, matrix
+
+
+def _shards(rows, column: str, n_shards: int) -> list:
+    """Rows split into n_shards contiguous ranges of the column's sorted IDs (row order kept in each)"""
+    import pandas as pd
+    
+    ids, uniques = pd.factorize(rows[column], sort=True)
+    shard_of = ids * n_shards // max(len(uniques), 1)
+    return [rows[shard_of == k] for k in range(n_shards)]
+
+
+def _lower_shard(symptoms: List[str]) -> List[str]:
+    """Lower-cased symptom names of one autocomplete shard (runs in a worker process)"""
+    return [symptom.lower() for symptom in symptoms]
+
+
+def load_disorder_data(orpha_codes: List[str]):
+    """
+    (gene bitsets, natural history bitsets, group index) laid out by the given disorder order;
+    reads only the Orphanet products, so it runs in a worker alongside the index build
+    """
+    return load_gene_bitsets(orpha_codes), load_natural_history_bitsets(orpha_codes), load_group_index(orpha_codes)
+
+
+def build_jobs(jobs: Optional[int] = None) -> int:
+    """Worker processes for a build: BUILD_JOBS by default, 0 = one per core"""
+    jobs = BUILD_JOBS if jobs is None else jobs
+    return jobs or os.cpu_count() or 1
+
+
+def submit(executor: Optional[ProcessPoolExecutor], fn, *args) -> Future:
+    """fn(*args) in a worker process, or right away in this process without an executor"""
+    if executor is not None:
+        return executor.submit(fn, *args)
+    future = Future()
+    future.set_result(fn(*args))
+    return future
+
+
+def build_maps(disease_data, jobs: int = 1, executor: Optional[ProcessPoolExecutor] = None):
+    """
+    (disease_symptoms_map, symptom_diseases_map, symptom_disease_matrix) of the clinical signs rows,
+    keyed in sorted order. jobs > 1 shards the rows by disease and by symptom ID ranges and builds
+    the shards in worker processes (the given executor, or a pool of its own); shards cover
+    disjoint key ranges, so merging keeps the order.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    rows = disease_data[['disorder_name', 'orpha_code', 'hpo_term', 'frequency_numeric']]
+    
+    if jobs > 1 and executor is None:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            return build_maps(disease_data, jobs, executor)
+    if jobs > 1:
+        disease_parts = executor.map(_disease_map_shard, _shards(rows, 'disorder_name', jobs))
+        symptom_parts = executor.map(_symptom_map_shard, _shards(rows, 'hpo_term', jobs))
+        disease_parts, symptom_parts = list(disease_parts), list(symptom_parts)
+    else:
+        disease_parts, symptom_parts = [_disease_map_shard(rows)], [_symptom_map_shard(rows)]
+    
+    disease_map, symptom_map, matrix = {}, {}, {}
+    for part in disease_parts:
+        disease_map.update(part)
+    for part_map, part_matrix in symptom_parts:
+        symptom_map.update(part_map)
+        matrix.update(part_matrix)
+    return disease_map, symptom_map, matrix
+
 
 class LocalFastDiagnosis:
     """Local fast diagnosis with pre-computed probabilities"""
@@ -29,78 +180,76 @@ class LocalFastDiagnosis:
         self.symptom_diseases_map = {}    # Symptom -> diseases mapping
         self.symptoms_list = []
         self.diseases_list = []
+        self.index: Optional[DiagnosisIndex] = None  # Vectorized index for Bayesian scoring
+        self.fingerprints: Dict[str, str] = {}    # Orpha code -> fingerprint of its rows, for update_from
+        self.symptom_search: List[str] = []       # Lower-cased symptoms_list for autocomplete
+        self.build_timings_ms: Dict[str, float] = {}
         self.is_ready = False
     
-    def load_and_precompute(self, csv_path: str) -> bool:
-        """Load CSV data and pre-compute all probabilities"""
+    def load_and_precompute(self, data_path: str, jobs: Optional[int] = None) -> bool:
+        """
+        Load the clinical signs dataset (CSV, Parquet or Arrow) and pre-compute all probabilities.
+        jobs: worker processes for the build (default BUILD_JOBS, 0 = one per core). With more than
+        one, the maps, the CSR index and autocomplete are built in shards, and the prevalence table,
+        hp.obo closure and disorder filters are read in workers while the shards are built.
+        """
+        jobs = build_jobs(jobs)
+        executor = ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else None
         try:
-            logger.info(f"Loading and pre-computing from {csv_path}")
+            logger.info(f"Loading and pre-computing from {data_path} ({jobs} build jobs)")
             start_time = time.time()
+            timer = StageTimer()
             
-            # Load CSV data
-            self.disease_data = pd.read_csv(csv_path)
-            logger.info(f"Loaded {len(self.disease_data)} records")
+            # Stages that only read their own files start first and overlap the shard builds
+            prevalences = submit(executor, load_prevalence_table)
+            closure = submit(executor, load_ontology_closure)
             
-            # Clean the data
-            self.disease_data = self.disease_data.dropna(subset=['orpha_code', 'disorder_name', 'hpo_term'])
+            # Load only the columns used for diagnosis, cleaned and with numeric frequencies
+            self.disease_data = read_clinical_signs(data_path)
+            self.fingerprints = frame_fingerprints(self.disease_data, 'orpha_code', FINGERPRINT_COLUMNS)
+            timer.lap('read')
             
-            # Add frequency mapping
-            frequency_mapping = {
-                'Very frequent (99-80%)': 0.9,
-                'Frequent (79-30%)': 0.55,
-                'Occasional (29-5%)': 0.17,
-                'Very rare (<5%)': 0.025,
-                'Excluded (0%)': 0.0
-            }
-            
-            self.disease_data['frequency_numeric'] = self.disease_data['hpo_frequency'].map(
-                lambda x: frequency_mapping.get(str(x).strip(), 0.5) if pd.notna(x) else 0.5
-            )
-            
-            # Extract unique lists
+            # Symptom and disease IDs: positions in the sorted lists, as in the index
             self.symptoms_list = sorted(self.disease_data['hpo_term'].unique().tolist())
             self.diseases_list = sorted(self.disease_data['disorder_name'].unique().tolist())
+            timer.lap('ids')
             
             logger.info(f"Found {len(self.diseases_list)} diseases and {len(self.symptoms_list)} symptoms")
             
-            # Pre-compute disease -> symptoms mapping
-            logger.info("Pre-computing disease-symptom mappings...")
-            for disease in self.diseases_list:
-                disease_data = self.disease_data[self.disease_data['disorder_name'] == disease]
-                self.disease_symptoms_map[disease] = {
-                    'symptoms': {},
-                    'orpha_code': str(disease_data.iloc[0]['orpha_code']),
-                    'total_symptoms': len(disease_data)
-                }
-                
-                for _, row in disease_data.iterrows():
-                    symptom = row['hpo_term']
-                    frequency = row['frequency_numeric']
-                    self.disease_symptoms_map[disease]['symptoms'][symptom] = frequency
+            # Disease -> symptom and symptom -> disease mappings plus the probability matrix
+            logger.info("Pre-computing disease-symptom mappings and probability matrix...")
+            self.disease_symptoms_map, self.symptom_diseases_map, self.symptom_disease_matrix = build_maps(
+                self.disease_data, jobs, executor
+            )
+            timer.lap('maps')
+            
+            # Build the vectorized index (CSR arrays and symptom IC vector) with prior vectors
+            logger.info("Building vectorized diagnosis index...")
+            self.index = DiagnosisIndex.from_dataframe(self.disease_data, jobs, executor)
+            disorder_data = submit(executor, load_disorder_data, self.index.orpha_codes)
+            timer.lap('index')
+            self.index.set_priors(prevalences.result())
+            timer.lap('priors')
+            self._attach_disorder_data(disorder_data.result())
+            timer.lap('filters')
             
-            # Pre-compute symptom -> diseases mapping
-            logger.info("Pre-computing symptom-disease mappings...")
-            for symptom in self.symptoms_list:
-                symptom_data = self.disease_data[self.disease_data['hpo_term'] == symptom]
-                self.symptom_diseases_map[symptom] = {}
-                
-                for _, row in symptom_data.iterrows():
-                    disease = row['disorder_name']
-                    frequency = row['frequency_numeric']
-                    self.symptom_diseases_map[symptom][disease] = {
-                        'frequency': frequency,
-                        'orpha_code': str(row['orpha_code'])
-                    }
+            # HPO ancestor closure for the ontology scoring modes (needs a local hp.obo)
+            hpo_closure = closure.result()
+            if hpo_closure is not None:
+                self.index.ontology = load_ontology_index(self.index, closure=hpo_closure)
+            timer.lap('ontology')
             
-            # Pre-compute probability matrix for common combinations
-            logger.info("Pre-computing probability combinations...")
-            self._precompute_probability_matrix()
+            self._build_autocomplete(jobs, executor)
+            timer.lap('autocomplete')
             
             # Cache to disk for faster future loading
             self._save_cache()
+            timer.lap('save')
             
+            self.build_timings_ms = timer.rounded()
             end_time = time.time()
-            logger.info(f"Pre-computation completed in {end_time - start_time:.2f} seconds")
+            logger.info(f"Pre-computation completed in {end_time - start_time:.2f} seconds "
+                        f"({', '.join(f'{stage} {ms:.0f}ms' for stage, ms in self.build_timings_ms.items())})")
             
             self.is_ready = True
             return True
@@ -108,30 +257,103 @@ class LocalFastDiagnosis:
         except Exception as e:
             logger.error(f"Error in load_and_precompute: {e}")
             return False
+        
+        finally:
+            if executor is not None:
+                executor.shutdown()
     
-    def _precompute_probability_matrix(self):
-        """Pre-compute probability combinations for faster lookup"""
-        logger.info("Building probability matrix...")
-        
-        # For each symptom, pre-compute probabilities for all associated diseases
-        for symptom in self.symptoms_list:
-            if symptom not in self.symptom_disease_matrix:
-                self.symptom_disease_matrix[symptom] = {}
-            
-            # Get all diseases that have this symptom
-            if symptom in self.symptom_diseases_map:
-                for disease, info in self.symptom_diseases_map[symptom].items():
-                    # Calculate base probability
-                    base_prob = info['frequency']
-                    
-                    # Store pre-computed result
-                    self.symptom_disease_matrix[symptom][disease] = {
-                        'probability': base_prob,
-                        'orpha_code': info['orpha_code'],
-                        'confidence': min(1.0, base_prob * 1.2)
-                    }
-        
-        logger.info(f"Pre-computed matrix for {len(self.symptom_disease_matrix)} symptoms")
+    def update_from(self, data_path: str) -> Optional[DisorderDelta]:
+        """
+        Bring a loaded system up to a new release of the clinical signs dataset: only the disorders
+        whose rows changed are re-mapped and patched into the index. Without fingerprints of the
+        current data (caches written before they existed) everything is rebuilt and None is returned.
+        """
+        if self.index is None or not self.fingerprints:
+            logger.info("No fingerprints of the loaded data - rebuilding everything")
+            self.load_and_precompute(data_path)
+            return None
+        
+        start_time = time.time()
+        disease_data = read_clinical_signs(data_path)
+        fingerprints = frame_fingerprints(disease_data, 'orpha_code', FINGERPRINT_COLUMNS)
+        delta = compute_delta(self.fingerprints, fingerprints)
+        if not delta:
+            logger.info(f"No changes in {data_path} ({delta.unchanged} disorders unchanged)")
+            return delta
+        
+        replaced = set(delta.updated) | set(delta.deleted)
+        changed_rows = disease_data[disease_data['orpha_code'].astype(str).str.strip().isin(delta.changed)]
+        
+        # Dict maps: drop the old rows of updated and deleted disorders, then add the changed ones
+        self._remove_diseases([d for d, info in self.disease_symptoms_map.items() if info['orpha_code'] in replaced])
+        self._add_disease_rows(changed_rows)
+        
+        old_names = self.index.disease_names
+        self.index = self.index.apply_delta(
+            changed_rows, delta.deleted,
+            prevalences=load_prevalence_table() if self.index.log_priors else None
+        )
+        if self.index.disease_names != old_names:
+            self._attach_disorder_data()
+        
+        self.disease_data = disease_data
+        self.fingerprints = fingerprints
+        self.symptoms_list = sorted(self.symptom_diseases_map)
+        self.diseases_list = sorted(self.disease_symptoms_map)
+        self._build_autocomplete()
+        self._save_cache()
+        
+        logger.info(f"Updated from {data_path} in {time.time() - start_time:.2f} seconds: {delta.summary()}")
+        return delta
+    
+    def _attach_disorder_data(self, disorder_data=None):
+        """
+        Attach the per-disorder filters and groups, which are laid out by the index's disorder order
+        (disorder_data: load_disorder_data of the index's orpha codes, read here when not given)
+        """
+        gene_bitsets, natural_history, group_index = disorder_data or load_disorder_data(self.index.orpha_codes)
+        
+        # Gene -> disorder bitsets for gene-constrained diagnosis
+        if gene_bitsets is not None:
+            self.index.filters['gene'] = gene_bitsets
+        
+        # Onset / inheritance bitsets for natural history constraints
+        self.index.filters.update(natural_history)
+        
+        # Disorder -> classification group for rolled-up results
+        if group_index is not None:
+            self.index.set_groups(*group_index)
+    
+    def _add_disease_rows(self, rows):
+        """Add the mappings and probability matrix entries of the given rows"""
+        disease_map, symptom_map, matrix = build_maps(rows)
+        self.disease_symptoms_map.update(disease_map)
+        for symptom, diseases in symptom_map.items():
+            self.symptom_diseases_map.setdefault(symptom, {}).update(diseases)
+            self.symptom_disease_matrix.setdefault(symptom, {}).update(matrix[symptom])
+    
+    def _remove_diseases(self, diseases: List[str]):
+        """Drop diseases from the mappings and the probability matrix"""
+        for disease in diseases:
+            info = self.disease_symptoms_map.pop(disease, None)
+            if info is None:
+                continue
+            for symptom in info['symptoms']:
+                for mapping in (self.symptom_diseases_map, self.symptom_disease_matrix):
+                    if symptom in mapping:
+                        mapping[symptom].pop(disease, None)
+                        if not mapping[symptom]:
+                            del mapping[symptom]
+    
+    def _build_autocomplete(self, jobs: int = 1, executor: Optional[ProcessPoolExecutor] = None):
+        """Lower-case the symptom list once instead of on every search, in shards when it is large"""
+        n_shards = min(jobs, len(self.symptoms_list) // AUTOCOMPLETE_SHARD_SIZE) if executor is not None else 1
+        if n_shards <= 1:
+            self.symptom_search = _lower_shard(self.symptoms_list)
+            return
+        bounds = [len(self.symptoms_list) * k // n_shards for k in range(n_shards + 1)]
+        shards = [self.symptoms_list[start:end] for start, end in zip(bounds, bounds[1:])]
+        self.symptom_search = [symptom for part in executor.map(_lower_shard, shards) for symptom in part]
     
     def _save_cache(self):
         """Save pre-computed data to disk cache"""
@@ -141,12 +363,16 @@ class LocalFastDiagnosis:
                 'symptom_diseases_map': self.symptom_diseases_map,
                 'symptom_disease_matrix': self.symptom_disease_matrix,
                 'symptoms_list': self.symptoms_list,
-                'diseases_list': self.diseases_list
+                'diseases_list': self.diseases_list,
+                'fingerprints': self.fingerprints
             }
             
             with open('diagnosis_cache.pkl', 'wb') as f:
                 pickle.dump(cache_data, f)
             
+            if self.index is not None:
+                self.index.save(INDEX_FILE)
+            
             logger.info("Cached pre-computed data to diagnosis_cache.pkl")
             
         except Exception as e:
@@ -156,6 +382,13 @@ class LocalFastDiagnosis:
         """Load pre-computed data from disk cache"""
         try:
             if not os.path.exists('diagnosis_cache.pkl'):
+                record_cache('disk', False)
+                return False
+            
+            # Caches written before the index existed are rebuilt
+            if not os.path.exists(INDEX_FILE):
+                logger.info(f"{INDEX_FILE} missing - cache will be rebuilt")
+                record_cache('disk', False)
                 return False
             
             logger.info("Loading from cache...")
@@ -167,8 +400,12 @@ class LocalFastDiagnosis:
             self.symptom_disease_matrix = cache_data['symptom_disease_matrix']
             self.symptoms_list = cache_data['symptoms_list']
             self.diseases_list = cache_data['diseases_list']
+            self.fingerprints = cache_data.get('fingerprints', {})
+            self.index = DiagnosisIndex.load(INDEX_FILE)
+            self._build_autocomplete()
             
             self.is_ready = True
+            record_cache('disk', True)
             logger.info(f"Loaded cache: {len(self.diseases_list)} diseases, {len(self.symptoms_list)} symptoms")
             return True
             
@@ -176,21 +413,109 @@ class LocalFastDiagnosis:
             logger.error(f"Failed to load cache: {e}")
             return False
     
+    def _candidate_constraints(
+        self,
+        genes: Optional[List[str]] = None,
+        gene_mode: str = DEFAULT_GENE_MODE,
+        onset: Optional[List[str]] = None,
+        inheritance: Optional[List[str]] = None,
+        include_unannotated: bool = True
+    ):
+        """(candidate mask, log weight vector, unmatched values per filter) for the requested constraints"""
+        requested = {'gene': genes or [], 'onset': onset or [], 'inheritance': inheritance or []}
+        if not any(requested.values()):
+            return None, None, {}
+        
+        for name, values in requested.items():
+            if values and (self.index is None or name not in self.index.filters):
+                raise ValueError(f"The {name} filter is not available - its Orphanet dataset was not loaded")
+        
+        if gene_mode not in GENE_MODES:
+            raise ValueError(f"Unknown gene mode: {gene_mode}")
+        
+        # Onset / inheritance keep wildcard and unannotated disorders, which cannot be ruled out
+        constraints = {
+            name: expand_constraint(name, requested[name], include_unannotated)
+            for name in ('onset', 'inheritance')
+        }
+        
+        log_weights = None
+        unknown_genes = []
+        if gene_mode == 'restrict':
+            constraints['gene'] = requested['gene']
+        elif requested['gene']:
+            packed, unknown_genes = self.index.filters['gene'].packed_mask(requested['gene'])
+            log_weights = np.where(unpack_mask(packed, self.index.n_diseases), np.log(GENE_BOOST), 0.0)
+        
+        mask, unknown = self.index.candidate_mask(constraints)
+        unknown.setdefault('gene', unknown_genes)
+        
+        unmatched = {
+            name: [value for value in unknown.get(name, []) if value in values]
+            for name, values in requested.items()
+        }
+        return mask, log_weights, unmatched
+    
     def ultra_fast_diagnosis(
         self,
         present_symptoms: List[str],
         absent_symptoms: List[str] = None,
-        top_n: int = 10
+        top_n: int = 10,
+        genes: Optional[List[str]] = None,
+        gene_mode: str = DEFAULT_GENE_MODE,
+        onset: Optional[List[str]] = None,
+        inheritance: Optional[List[str]] = None,
+        include_unannotated: bool = True,
+        weighting: str = DEFAULT_SYMPTOM_WEIGHTING,
+        min_ic: float = 0.0
     ) -> Dict[str, Any]:
-        """Ultra-fast diagnosis using pre-computed probabilities"""
+        """
+        Ultra-fast diagnosis using pre-computed probabilities, optionally constrained by gene, onset and inheritance.
+        weighting: 'uniform' (every symptom counts the same) or 'ic' (symptoms weighted by information content).
+        min_ic: present symptoms below this IC only score disorders reached by the more specific ones.
+        """
         
         if not self.is_ready:
             raise Exception("System not ready - run load_and_precompute first")
         
+        if weighting not in SYMPTOM_WEIGHTINGS:
+            raise ValueError(f"Unknown symptom weighting: {weighting}")
+        
+        if (weighting != 'uniform' or min_ic > 0) and self.index is None:
+            raise ValueError("IC weighting and pruning need the diagnosis index")
+        
         if absent_symptoms is None:
             absent_symptoms = []
         
         start_time = time.time()
+        timer = StageTimer()
+        
+        mask, log_weights, unmatched = self._candidate_constraints(
+            genes, gene_mode, onset, inheritance, include_unannotated
+        )
+        
+        if weighting == 'ic':
+            timer.lap('candidates')
+            result = self._weighted_diagnosis(present_symptoms, absent_symptoms, top_n, mask, log_weights, min_ic, timer)
+            result['processing_time_ms'] = (time.time() - start_time) * 1000
+            result['unmatched'] = unmatched
+            result['stage_timings_ms'] = timer.timings_ms
+            return result
+        
+        # Pruned disorders are skipped before any scoring work
+        candidates = None
+        if mask is not None:
+            candidates = {self.index.disease_names[i] for i in np.flatnonzero(mask)}
+        
+        # Low-IC symptoms do not bring in new disorders, only score the ones already reached
+        generating, score_only = present_symptoms, set()
+        if min_ic > 0:
+            symptom_ids = self.index.symptom_ids
+            known = [s for s in present_symptoms if s in symptom_ids]
+            generating_ids, score_only_ids = self.index.split_by_ic([symptom_ids[s] for s in known], min_ic)
+            score_only = {self.index.symptom_names[s] for s in score_only_ids}
+            generating = [s for s in present_symptoms if s not in score_only]
+        timer.lap('candidates')
         
         # Use pre-computed probability matrix for instant lookup
         disease_scores = defaultdict(lambda: {
@@ -202,9 +527,13 @@ class LocalFastDiagnosis:
         })
         
         # Process present symptoms using pre-computed matrix
-        for symptom in present_symptoms:
+        for symptom in generating + [s for s in present_symptoms if s in score_only]:
             if symptom in self.symptom_disease_matrix:
                 for disease, prob_info in self.symptom_disease_matrix[symptom].items():
+                    if candidates is not None and disease not in candidates:
+                        continue
+                    if symptom in score_only and disease not in disease_scores:
+                        continue
                     disease_scores[disease]['probability'] += prob_info['probability']
                     disease_scores[disease]['matching_symptoms'].append(symptom)
                     disease_scores[disease]['orpha_code'] = prob_info['orpha_code']
@@ -221,9 +550,18 @@ class LocalFastDiagnosis:
                 for disease, prob_info in self.symptom_disease_matrix[symptom].items():
                     if disease in disease_scores:
                         # Reduce probability for absent symptoms
-                        penalty = prob_info['probability'] * 0.3
+                        penalty = prob_info['probability'] * ABSENT_PENALTY
                         disease_scores[disease]['probability'] *= (1 - penalty)
         
+        # Gene boost for disorders associated with a requested gene
+        if log_weights is not None:
+            disease_ids = self.index.disease_ids
+            for disease in disease_scores:
+                if log_weights[disease_ids[disease]] > 0:
+                    disease_scores[disease]['probability'] *= GENE_BOOST
+        
+        timer.lap('scoring')
+        
         # Calculate final confidence scores
         for disease, scores in disease_scores.items():
             matching_count = len(set(scores['matching_symptoms']))
@@ -237,6 +575,7 @@ class LocalFastDiagnosis:
             key=lambda x: (x[1]['probability'], x[1]['confidence_score']),
             reverse=True
         )
+        timer.lap('sorting')
         
         # Format results
         results = []
@@ -250,6 +589,8 @@ class LocalFastDiagnosis:
                 'confidence_score': scores['confidence_score']
             })
         
+        timer.lap('formatting')
+        
         processing_time = (time.time() - start_time) * 1000
         
         return {
@@ -257,9 +598,257 @@ class LocalFastDiagnosis:
             'results': results,
             'total_diseases_evaluated': len(disease_scores),
             'processing_time_ms': processing_time,
-            'method': 'local_precomputed'
+            'method': 'local_precomputed',
+            'unmatched': unmatched,
+            'stage_timings_ms': timer.timings_ms
+        }
+    
+    def _weighted_diagnosis(
+        self,
+        present_symptoms: List[str],
+        absent_symptoms: List[str],
+        top_n: int,
+        mask: Optional[np.ndarray],
+        log_weights: Optional[np.ndarray],
+        min_ic: float,
+        timer: StageTimer
+    ) -> Dict[str, Any]:
+        """IC-weighted fast-mode scores computed on the vectorized index"""
+        index = self.index
+        present_ids = list(dict.fromkeys(index.symptom_ids[s] for s in present_symptoms if s in index.symptom_ids))
+        absent_ids = [index.symptom_ids[s] for s in absent_symptoms if s in index.symptom_ids]
+        
+        scores, matches, touched = index.weighted_scores(
+            present_ids, absent_ids, index.ic_weights(present_ids), min_ic
+        )
+        if mask is not None:
+            touched &= mask
+        if log_weights is not None:
+            scores *= np.exp(log_weights)
+        
+        timer.lap('scoring')
+        
+        confidence = matches / max(len(present_symptoms), 1)
+        candidate_ids = np.flatnonzero(touched)
+        order = np.lexsort((-confidence[candidate_ids], -scores[candidate_ids]))
+        top_ids = candidate_ids[order[:top_n]]
+        timer.lap('sorting')
+        
+        # Scores are additive like the uniform mode, so they are capped at 1 for display
+        results = self._index_results(top_ids, np.minimum(scores, 1.0), present_ids, len(present_symptoms))
+        timer.lap('formatting')
+        
+        return {
+            'success': True,
+            'results': results,
+            'total_diseases_evaluated': len(candidate_ids),
+            'method': 'local_ic_weighted'
+        }
+    
+    def bayesian_diagnosis(
+        self,
+        present_symptoms: List[str],
+        absent_symptoms: List[str] = None,
+        top_n: int = 10,
+        prior: str = DEFAULT_PRIOR_MODE,
+        genes: Optional[List[str]] = None,
+        gene_mode: str = DEFAULT_GENE_MODE,
+        onset: Optional[List[str]] = None,
+        inheritance: Optional[List[str]] = None,
+        include_unannotated: bool = True,
+        top_groups: int = 0,
+        disorders_per_group: int = 3,
+        scoring: str = DEFAULT_SCORING_MODE
+    ) -> Dict[str, Any]:
+        """
+        True Bayesian diagnosis over all (or constrained) diseases using the vectorized index.
+        scoring: 'exact' symptom matches, 'propagate' (present symptoms also match annotated
+        HPO ancestors) or 'ic_similarity' (Resnik best-match average; priors and gene boost unused).
+        """
+        
+        if not self.is_ready or self.index is None:
+            raise Exception("System not ready - run load_and_precompute first")
+        
+        if absent_symptoms is None:
+            absent_symptoms = []
+        
+        start_time = time.time()
+        timer = StageTimer()
+        
+        index = self.index
+        present_ids = [index.symptom_ids[s] for s in present_symptoms if s in index.symptom_ids]
+        absent_ids = [index.symptom_ids[s] for s in absent_symptoms if s in index.symptom_ids]
+        
+        mask, log_weights, unmatched = self._candidate_constraints(
+            genes, gene_mode, onset, inheritance, include_unannotated
+        )
+        candidate_ids = np.arange(index.n_diseases) if mask is None else np.flatnonzero(mask)
+        n_candidates = len(candidate_ids)
+        timer.lap('candidates')
+        
+        posterior = self._posterior(present_symptoms, present_ids, absent_ids, prior, mask, log_weights, scoring, top_groups)
+        timer.lap('scoring')
+        
+        # Top N candidates without sorting all diseases
+        top_n = min(top_n, n_candidates)
+        if top_n > 0:
+            top_ids = candidate_ids[np.argpartition(-posterior[candidate_ids], top_n - 1)[:top_n]]
+            top_ids = top_ids[np.argsort(-posterior[top_ids], kind='stable')]
+        else:
+            top_ids = candidate_ids
+        timer.lap('sorting')
+        
+        results = self._index_results(top_ids, posterior, present_ids, len(present_symptoms))
+        timer.lap('formatting')
+        
+        # Posterior mass rolled up by classification group
+        groups = []
+        if top_groups > 0:
+            for group_id, mass, count, disease_ids in index.group_rollup(posterior, top_groups, disorders_per_group, mask):
+                groups.append({
+                    'group_name': index.group_names[group_id],
+                    'group_code': index.group_codes[group_id],
+                    'probability': mass,
+                    'disorders_evaluated': count,
+                    'top_disorders': self._index_results(disease_ids, posterior, present_ids, len(present_symptoms))
+                })
+            timer.lap('group_rollup')
+        
+        processing_time = (time.time() - start_time) * 1000
+        
+        return {
+            'success': True,
+            'results': results,
+            'groups': groups,
+            'total_diseases_evaluated': n_candidates,
+            'processing_time_ms': processing_time,
+            'method': 'local_bayesian',
+            'prior': prior,
+            'scoring': scoring,
+            'unmatched': unmatched,
+            'stage_timings_ms': timer.timings_ms
+        }
+    
+    def score_vector(
+        self,
+        present_symptoms: List[str],
+        absent_symptoms: List[str] = None,
+        computation_mode: str = 'true',
+        prior: str = DEFAULT_PRIOR_MODE,
+        genes: Optional[List[str]] = None,
+        gene_mode: str = DEFAULT_GENE_MODE,
+        onset: Optional[List[str]] = None,
+        inheritance: Optional[List[str]] = None,
+        include_unannotated: bool = True,
+        scoring: str = DEFAULT_SCORING_MODE,
+        weighting: str = DEFAULT_SYMPTOM_WEIGHTING,
+        min_ic: float = 0.0
+    ) -> Dict[str, Any]:
+        """
+        Score of every disorder in index order, as float32: the posterior in 'true' mode, the
+        uncapped fast-mode score in 'fast' mode. Disorders outside the candidates score 0.
+        """
+        
+        if not self.is_ready or self.index is None:
+            raise Exception("System not ready - run load_and_precompute first")
+        
+        if weighting not in SYMPTOM_WEIGHTINGS:
+            raise ValueError(f"Unknown symptom weighting: {weighting}")
+        
+        start_time = time.time()
+        timer = StageTimer()
+        
+        index = self.index
+        present_ids = list(dict.fromkeys(index.symptom_ids[s] for s in present_symptoms if s in index.symptom_ids))
+        absent_ids = [index.symptom_ids[s] for s in absent_symptoms or [] if s in index.symptom_ids]
+        
+        mask, log_weights, unmatched = self._candidate_constraints(
+            genes, gene_mode, onset, inheritance, include_unannotated
+        )
+        timer.lap('candidates')
+        
+        if computation_mode == 'true':
+            scores = self._posterior(present_symptoms, present_ids, absent_ids, prior, mask, log_weights, scoring)
+            n_candidates = index.n_diseases if mask is None else int(mask.sum())
+        else:
+            weights = index.ic_weights(present_ids) if weighting == 'ic' else None
+            scores, _, touched = index.weighted_scores(present_ids, absent_ids, weights, min_ic)
+            if mask is not None:
+                touched &= mask
+            if log_weights is not None:
+                scores *= np.exp(log_weights)
+            scores[~touched] = 0.0
+            n_candidates = int(touched.sum())
+        timer.lap('scoring')
+        
+        return {
+            'scores': scores.astype(np.float32),
+            'total_diseases_evaluated': n_candidates,
+            'processing_time_ms': (time.time() - start_time) * 1000,
+            'unmatched': unmatched,
+            'stage_timings_ms': timer.timings_ms
         }
     
+    def _posterior(
+        self,
+        present_symptoms: List[str],
+        present_ids: List[int],
+        absent_ids: List[int],
+        prior: str,
+        mask: Optional[np.ndarray],
+        log_weights: Optional[np.ndarray],
+        scoring: str,
+        top_groups: int = 0
+    ) -> np.ndarray:
+        """Posterior over every disorder (zero outside mask) for a scoring mode"""
+        index = self.index
+        
+        if scoring != 'exact' and index.ontology is None:
+            raise ValueError(f"Scoring mode '{scoring}' needs the HPO ontology ({HPO_FILE})")
+        
+        if scoring == 'exact':
+            # Posterior over every candidate: log-likelihood plus log prior, normalized
+            posterior = index.posterior(present_ids, absent_ids, prior, mask=mask, log_weights=log_weights)
+        elif scoring == 'propagate':
+            present_terms, _ = index.ontology.resolve(present_symptoms)
+            log_likelihood = index.ontology.propagated_log_likelihood(index, present_terms, absent_ids)
+            posterior = index.posterior(
+                present_ids, absent_ids, prior, mask=mask, log_weights=log_weights, log_likelihood=log_likelihood
+            )
+        elif scoring == 'ic_similarity':
+            if top_groups > 0:
+                raise ValueError("Group rollup needs a posterior - not available with ic_similarity scoring")
+            present_terms, _ = index.ontology.resolve(present_symptoms)
+            posterior = index.ontology.ic_similarity(present_terms, index.n_diseases)
+            if mask is not None:
+                posterior[~mask] = 0.0
+        else:
+            raise ValueError(f"Unknown scoring mode: {scoring}")
+        return posterior
+    
+    def _index_results(
+        self,
+        disease_ids: np.ndarray,
+        posterior: np.ndarray,
+        present_ids: List[int],
+        n_present: int
+    ) -> List[Dict[str, Any]]:
+        """Result dicts for the given disease ids, in order"""
+        index = self.index
+        matching = index.matching_symptoms(disease_ids, present_ids)
+        
+        results = []
+        for disease_id, matching_symptoms in zip(disease_ids, matching):
+            results.append({
+                'disorder_name': index.disease_names[disease_id],
+                'orpha_code': index.orpha_codes[disease_id],
+                'probability': float(posterior[disease_id]),
+                'matching_symptoms': matching_symptoms,
+                'total_symptoms': int(index.total_symptoms[disease_id]),
+                'confidence_score': len(matching_symptoms) / max(n_present, 1)
+            })
+        return results
+    
     def get_symptoms(self, search: str = None, limit: int = 50) -> List[str]:
         """Get symptoms with optional search filter"""
         if not self.is_ready:
@@ -267,7 +856,7 @@ class LocalFastDiagnosis:
         
         if search:
             search_lower = search.lower()
-            filtered = [s for s in self.symptoms_list if search_lower in s.lower()]
+            filtered = [s for s, lower in zip(self.symptoms_list, self.symptom_search) if search_lower in lower]
             return filtered[:limit]
         
         return self.symptoms_list[:limit]
@@ -277,21 +866,25 @@ class LocalFastDiagnosis:
 fast_diagnosis = LocalFastDiagnosis()
 
 
-def initialize_fast_diagnosis(force_rebuild: bool = False) -> bool:
-    """Initialize the fast diagnosis system"""
+def initialize_fast_diagnosis(force_rebuild: bool = False, jobs: Optional[int] = None) -> bool:
+    """Initialize the fast diagnosis system (jobs: worker processes for a rebuild, default BUILD_JOBS = one per core)"""
     global fast_diagnosis
     
-    # Try to load from cache first
+    data_path = find_dataset(CLINICAL_SIGNS_PRODUCT, ['file'])
+    
+    # Try to load from cache first; a dataset newer than the cache is patched in as a delta
     if not force_rebuild and fast_diagnosis.load_from_cache():
+        if data_path and os.path.getmtime(data_path) > os.path.getmtime('diagnosis_cache.pkl'):
+            logger.info(f"{data_path} is newer than the cache - applying its changes")
+            fast_diagnosis.update_from(data_path)
         logger.info("Fast diagnosis ready from cache!")
         return True
     
-    # Otherwise, build from CSV
-    csv_path = "file/clinical_signs_and_symptoms_in_rare_diseases.csv"
-    if os.path.exists(csv_path):
-        return fast_diagnosis.load_and_precompute(csv_path)
+    # Otherwise, build from the dataset (columnar copy preferred)
+    if data_path:
+        return fast_diagnosis.load_and_precompute(data_path, jobs)
     else:
-        logger.error(f"CSV file not found: {csv_path}")
+        logger.error(f"Dataset not found: file/{CLINICAL_SIGNS_PRODUCT}")
         return False
 
 
@@ -353,5 +946,10 @@ if __name__ == "__main__":
         print(f"  • Pre-computed probability matrix")
         print(f"  • Cached to disk for future use")
         
+        if fast_diagnosis.build_timings_ms:
+            print(f"\n⏱️  Build stages:")
+            for stage, elapsed_ms in fast_diagnosis.build_timings_ms.items():
+                print(f"  • {stage}: {elapsed_ms:.1f}ms")
+        
     else:
         print("❌ Failed to initialize fast diagnosis system")
\ No newline at end of file
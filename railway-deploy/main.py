@@ -6,18 +6,28 @@ A FastAPI application for rare disease diagnosis using Bayesian inference
 
 import os
 import sys
+import time
 import logging
-from typing import List, Dict, Any, Optional, Union
+from datetime import datetime
+from typing import TYPE_CHECKING, List, Dict, Any, Iterable, Optional, Set, Tuple, Union, Callable
 from contextlib import asynccontextmanager
 
-import pandas as pd
 import numpy as np
-from fastapi import FastAPI, HTTPException, Query, UploadFile, File
+from fastapi import FastAPI, HTTPException, Query, Request, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi.responses import JSONResponse, HTMLResponse, Response
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel, Field, ConfigDict
-import uvicorn
+
+from orphanet_data import find_dataset, load_dataset, read_dataset_file
+from prevalence_priors import build_disease_priors, load_prevalence_table, DEFAULT_PRIOR_MODE
+from disorder_filters import (
+    DisorderBitsets, GENE_BOOST, load_gene_bitsets, load_natural_history_bitsets, constrained_codes, expand_constraint
+)
+from diagnosis_metrics import registry, CONTENT_TYPE, DIAGNOSIS_REQUESTS, CANDIDATES, StageTimer, track_requests
+from request_profiler import PROFILING_ENABLED, profiler, slow_requests, profile_requests
+from readiness import service_state, run_warmup
+from response_encoding import diagnosis_payload, encoded_response
 
 # Configure logging first
 logging.basicConfig(
@@ -26,18 +36,48 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Import Supabase diagnosis with fallback
-try:
-    from supabase_diagnosis import supabase_diagnosis, initialize_supabase_diagnosis
-    logger.info("✅ Using full Supabase client")
-except Exception as e:
-    logger.warning(f"⚠️ Full Supabase client failed, using simple version: {e}")
-    from simple_supabase_diagnosis import simple_supabase_diagnosis as supabase_diagnosis, initialize_simple_supabase_diagnosis as initialize_supabase_diagnosis
+# pandas is only imported by the CSV fallback and the Supabase true mode
+if TYPE_CHECKING:
+    import pandas as pd
+
+# The Supabase backend is imported and its client created in lifespan, not at import
+supabase_diagnosis = None
+
+
+def initialize_supabase_backend() -> Optional[str]:
+    """Import the Supabase backend (supabase-py, else plain HTTP) and bind its client; returns its name when ready"""
+    global supabase_diagnosis
+    
+    try:
+        import supabase_diagnosis as backend
+        initialize, instance = backend.initialize_supabase_diagnosis, 'supabase_diagnosis'
+        logger.info("✅ Using full Supabase client")
+    except Exception as e:
+        logger.warning(f"⚠️ Full Supabase client failed, using simple version: {e}")
+        import simple_supabase_diagnosis as backend
+        initialize, instance = backend.initialize_simple_supabase_diagnosis, 'simple_supabase_diagnosis'
+    
+    ready = initialize()
+    supabase_diagnosis = getattr(backend, instance)
+    return instance if ready else None
+
+
+# Clinical signs product and the columns the diagnosis engines read from it
+CLINICAL_SIGNS_PRODUCT = 'clinical_signs_and_symptoms_in_rare_diseases'
+CLINICAL_SIGNS_COLUMNS = ['orpha_code', 'disorder_name', 'hpo_term', 'hpo_frequency']
 
 # Global variable to store the loaded data
-disease_data: Optional[pd.DataFrame] = None
+disease_data: Optional['pd.DataFrame'] = None
 symptoms_list: List[str] = []
 diseases_list: List[str] = []
+disease_priors: Dict[str, Dict[str, float]] = {}  # prior mode -> disease name -> prior
+prevalences: Optional[Dict[str, float]] = None  # orpha code -> prevalence, loaded once
+# Last dataset scored by calculate_true_bayesian_probability with its priors and frequency maps
+dataset_tables: Optional[Tuple['pd.DataFrame', Dict[str, Dict[str, float]], Dict[str, Dict[str, float]]]] = None
+disease_orpha_codes: List[str] = []  # disorder axis of gene_bitsets
+disease_codes: Dict[str, str] = {}  # disease name -> orpha code (CSV fallback)
+gene_bitsets: Optional[DisorderBitsets] = None  # gene symbol -> disorder bitset
+natural_history_bitsets: Dict[str, DisorderBitsets] = {}  # 'onset' / 'inheritance' -> value -> disorder bitset
 
 
 class DiagnosisRequest(BaseModel):
@@ -48,7 +88,13 @@ class DiagnosisRequest(BaseModel):
                 "present_symptoms": ["Seizure", "Intellectual disability"],
                 "absent_symptoms": ["Fever"],
                 "top_n": 10,
-                "computation_mode": "fast"
+                "computation_mode": "fast",
+                "prior": "association",
+                "genes": [],
+                "gene_mode": "restrict",
+                "onset": ["Infancy", "Childhood"],
+                "inheritance": ["Autosomal recessive"],
+                "include_unannotated": True
             }
         }
     )
@@ -73,6 +119,36 @@ class DiagnosisRequest(BaseModel):
         description="Computation mode: 'fast' (pre-computed) or 'true' (full Bayesian)",
         pattern="^(fast|true)$"
     )
+    prior: str = Field(
+        default="association",
+        description="Disease prior for 'true' mode: 'uniform', 'association' (annotation count) or 'prevalence' (Orphanet epidemiology)",
+        pattern="^(uniform|association|prevalence)$"
+    )
+    genes: List[str] = Field(
+        default_factory=list,
+        description="Gene symbols (or synonyms) from a sequencing result, e.g. ['KIF7']"
+    )
+    gene_mode: str = Field(
+        default="restrict",
+        description="How genes constrain candidates: 'restrict' (only associated disorders) or 'boost' (rank them higher)",
+        pattern="^(restrict|boost)$"
+    )
+    onset: List[str] = Field(
+        default_factory=list,
+        description="Allowed ages of onset (Orphanet natural history), e.g. ['Neonatal', 'Infancy']"
+    )
+    inheritance: List[str] = Field(
+        default_factory=list,
+        description="Allowed types of inheritance (Orphanet natural history), e.g. ['Autosomal recessive']"
+    )
+    include_unannotated: bool = Field(
+        default=True,
+        description="Keep disorders without onset/inheritance data when those filters are used"
+    )
+    debug: bool = Field(
+        default=False,
+        description="Include per-stage timings (stage_timings_ms) in the response"
+    )
 
 
 class DiagnosisResult(BaseModel):
@@ -93,6 +169,8 @@ class DiagnosisResponse(BaseModel):
     input_symptoms: List[str] = Field(..., description="Input symptoms that were processed")
     processing_time_ms: float = Field(..., description="Processing time in milliseconds")
     computation_mode: str = Field(..., description="Computation mode used: 'fast' or 'true'")
+    unmatched_genes: List[str] = Field(default_factory=list, description="Requested genes not associated with any disorder")
+    stage_timings_ms: Optional[Dict[str, float]] = Field(default=None, description="Time per pipeline stage (debug requests only)")
 
 
 class SystemInfo(BaseModel):
@@ -104,38 +182,35 @@ class SystemInfo(BaseModel):
     status: str
 
 
-def load_disease_data() -> bool:
-    """Load disease data from CSV file"""
-    global disease_data, symptoms_list, diseases_list
-    
-    csv_file = "clinical_signs_and_symptoms_in_rare_diseases.csv"
+def load_disease_data(data_path: Optional[str] = None) -> bool:
+    """Load disease data from the clinical signs dataset (Parquet/Arrow copy preferred over CSV)"""
+    global disease_data, symptoms_list, diseases_list, disease_priors, disease_codes, prevalences
     
     try:
-        logger.info(f"Loading disease data from {csv_file}")
+        logger.info(f"Loading disease data for {CLINICAL_SIGNS_PRODUCT}")
         logger.info(f"Current working directory: {os.getcwd()}")
         logger.info(f"Directory contents: {os.listdir('.')}")
         
         # Try to load from current directory first, then from file/ directory
-        if os.path.exists(csv_file):
-            data_path = csv_file
-            logger.info(f"Found CSV file in current directory: {data_path}")
-        elif os.path.exists(f"file/{csv_file}"):
-            data_path = f"file/{csv_file}"
-            logger.info(f"Found CSV file in file/ directory: {data_path}")
+        if data_path is None:
+            data_path = find_dataset(CLINICAL_SIGNS_PRODUCT)
+        
+        if data_path:
+            logger.info(f"Found dataset file: {data_path}")
         else:
             # Check if file/ directory exists
             if os.path.exists("file/"):
                 logger.info(f"file/ directory contents: {os.listdir('file/')}")
-            logger.error(f"CSV file not found: {csv_file}")
+            logger.error(f"Dataset not found: {CLINICAL_SIGNS_PRODUCT}")
             logger.error("Available files in current directory:")
             for f in os.listdir('.'):
-                if f.endswith('.csv'):
+                if f.endswith(('.csv', '.parquet', '.arrow')):
                     logger.error(f"  - {f}")
             return False
         
-        # Load CSV data
-        disease_data = pd.read_csv(data_path)
-        logger.info(f"Loaded {len(disease_data)} records from CSV")
+        # Only the columns used for diagnosis are read
+        disease_data = read_dataset_file(data_path, columns=CLINICAL_SIGNS_COLUMNS)
+        logger.info(f"Loaded {len(disease_data)} records from {data_path}")
         
         # Clean the data
         disease_data = disease_data.dropna(subset=['orpha_code', 'disorder_name', 'hpo_term'])
@@ -152,7 +227,7 @@ def load_disease_data() -> bool:
         
         # Add numeric frequency column
         disease_data['frequency_numeric'] = disease_data['hpo_frequency'].map(
-            lambda x: frequency_mapping.get(str(x).strip(), 0.5) if pd.notna(x) else 0.5
+            lambda x: frequency_mapping.get(str(x).strip(), 0.5) if isinstance(x, str) else 0.5
         )
         
         # Extract unique symptoms and diseases
@@ -160,6 +235,16 @@ def load_disease_data() -> bool:
         diseases_list = sorted(disease_data['disorder_name'].dropna().unique().tolist())
         
         logger.info(f"Loaded {len(diseases_list)} unique diseases and {len(symptoms_list)} unique symptoms")
+        
+        # Priors are computed once here instead of on every request
+        if prevalences is None:
+            prevalences = load_prevalence_table()
+        disease_priors = build_disease_priors(disease_data, prevalences)
+        
+        # Gene / natural history bitsets over the loaded orpha codes
+        codes = disease_data.drop_duplicates('disorder_name')
+        disease_codes = dict(zip(codes['disorder_name'], codes['orpha_code'].astype(int).astype(str)))
+        load_disorder_filters(disease_data['orpha_code'])
         return True
         
     except Exception as e:
@@ -167,11 +252,70 @@ def load_disease_data() -> bool:
         return False
 
 
+def load_disorder_filters(orpha_codes: Optional['pd.Series'] = None) -> bool:
+    """
+    Gene and natural history bitsets over the disorder orpha codes. The Supabase engines hold no
+    disease data, so their disorder axis is read from the clinical signs product's orpha_code column.
+    """
+    global disease_orpha_codes, gene_bitsets, natural_history_bitsets
+    
+    if orpha_codes is None:
+        data = load_dataset(CLINICAL_SIGNS_PRODUCT, columns=['orpha_code'])
+        if data is None:
+            logger.warning("⚠️ Clinical signs data not found - gene/onset/inheritance constraints disabled")
+            return False
+        orpha_codes = data['orpha_code']
+    
+    disease_orpha_codes = sorted(orpha_codes.dropna().astype(int).astype(str).unique().tolist())
+    gene_bitsets = load_gene_bitsets(disease_orpha_codes)
+    natural_history_bitsets = load_natural_history_bitsets(disease_orpha_codes)
+    logger.info(f"🔎 Disorder constraints over {len(disease_orpha_codes)} disorders: "
+                f"genes {'on' if gene_bitsets is not None else 'off'}, "
+                f"natural history {', '.join(natural_history_bitsets) or 'off'}")
+    return True
+
+
+def constrain_diseases(diseases: Iterable[str], candidate_codes: Optional[Set[str]]) -> List[str]:
+    """CSV fallback diseases allowed by the gene / natural history constraints, in order"""
+    if candidate_codes is None:
+        return list(diseases)
+    return [disease for disease in diseases if disease_codes.get(disease) in candidate_codes]
+
+
+def boosted_probability(disease: str, probability: float, boosted_codes: Optional[Set[str]]) -> float:
+    """Probability with the gene boost applied (CSV fallback), capped at 1"""
+    if boosted_codes and disease_codes.get(disease) in boosted_codes:
+        return min(probability * GENE_BOOST, 1.0)
+    return probability
+
+
+def disease_tables(data: 'pd.DataFrame') -> Tuple[Dict[str, Dict[str, float]], Dict[str, Dict[str, float]]]:
+    """Priors per mode and symptom -> frequency maps per disease for a dataset, built once and cached"""
+    global dataset_tables, prevalences
+    
+    if dataset_tables is None or dataset_tables[0] is not data:
+        if data is disease_data and disease_priors:
+            priors = disease_priors
+        else:
+            if prevalences is None:
+                prevalences = load_prevalence_table()
+            priors = build_disease_priors(data, prevalences)
+        
+        frequency_maps = {
+            disease: dict(zip(rows['hpo_term'], rows['frequency_numeric']))
+            for disease, rows in data.groupby('disorder_name', sort=False)
+        }
+        dataset_tables = (data, priors, frequency_maps)
+    
+    return dataset_tables[1], dataset_tables[2]
+
+
 def calculate_true_bayesian_probability(
     disease_name: str,
     present_symptoms: List[str],
     absent_symptoms: List[str] = None,
-    all_diseases_data: pd.DataFrame = None
+    all_diseases_data: 'pd.DataFrame' = None,
+    prior_mode: str = DEFAULT_PRIOR_MODE
 ) -> Dict[str, Any]:
     """
     Calculate true Bayesian probability using full dataset normalization
@@ -185,6 +329,10 @@ def calculate_true_bayesian_probability(
     if all_diseases_data is None:
         all_diseases_data = disease_data
     
+    # Priors and frequency maps are built once per dataset, not per call
+    all_priors, frequency_maps = disease_tables(all_diseases_data)
+    priors = all_priors[prior_mode]
+    
     # Get disease-specific data
     disease_symptoms = all_diseases_data[all_diseases_data['disorder_name'] == disease_name]
     
@@ -196,13 +344,8 @@ def calculate_true_bayesian_probability(
             'confidence_score': 0.0
         }
     
-    # Calculate prior probability based on disease prevalence/frequency in dataset
-    total_diseases = len(all_diseases_data['disorder_name'].unique())
-    disease_associations = len(disease_symptoms)
-    total_associations = len(all_diseases_data)
-    
-    # Prior: How common is this disease in our dataset
-    prior = disease_associations / total_associations
+    # Prior: uniform, annotation count or Orphanet prevalence (pre-computed)
+    prior = priors.get(disease_name, 0.0)
     
     # Calculate likelihood P(symptoms|disease)
     symptom_freq_map = dict(zip(disease_symptoms['hpo_term'], disease_symptoms['frequency_numeric']))
@@ -228,12 +371,9 @@ def calculate_true_bayesian_probability(
     
     # Calculate evidence P(symptoms) by summing over all diseases
     evidence = 0.0
-    for other_disease in all_diseases_data['disorder_name'].unique():
-        other_disease_symptoms = all_diseases_data[all_diseases_data['disorder_name'] == other_disease]
-        other_symptom_freq_map = dict(zip(other_disease_symptoms['hpo_term'], other_disease_symptoms['frequency_numeric']))
-        
+    for other_disease, other_symptom_freq_map in frequency_maps.items():
         # Prior for this other disease
-        other_prior = len(other_disease_symptoms) / total_associations
+        other_prior = priors.get(other_disease, 0.0)
         
         # Likelihood for this other disease
         other_likelihood = 1.0
@@ -334,23 +474,54 @@ def calculate_bayesian_probability(
     }
 
 
+def warmup_tasks() -> Dict[str, Callable[[], Any]]:
+    """Representative diagnoses through the active engine (Supabase connections, priors cache, CSV lookups)"""
+    if supabase_diagnosis and supabase_diagnosis.is_ready:
+        symptoms = supabase_diagnosis.get_symptoms(limit=5)
+        if not symptoms:
+            return {}
+        return {
+            'supabase_fast': lambda: supabase_diagnosis.fast_diagnosis(symptoms, [], 10),
+            'supabase_true': lambda: supabase_diagnosis.true_bayesian_diagnosis(symptoms, [], 10)
+        }
+    
+    if disease_data is not None and diseases_list:
+        symptoms = disease_data['hpo_term'].value_counts().index[:5].tolist()
+        return {'csv_fallback': lambda: [calculate_bayesian_probability(d, symptoms, []) for d in diseases_list[:20]]}
+    
+    return {}
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan manager"""
     # Startup
     logger.info("Starting Enhanced Bayesian Disease Diagnosis API...")
+    service_state.set_phase('loading')
     
     # Try Supabase diagnosis first
-    if initialize_supabase_diagnosis():
+    engine = initialize_supabase_backend()
+    if engine:
         logger.info("✅ Supabase diagnosis system ready!")
+        # The CSV path builds these from its loaded data
+        load_disorder_filters()
     else:
         # Fallback to regular CSV loading
         logger.info("Falling back to regular CSV loading...")
         success = load_disease_data()
         if not success:
             logger.error("Failed to load disease data")
+            engine = None
         else:
             logger.info("Disease data loaded successfully")
+            engine = "csv_fallback"
+    
+    # Only report ready once the first requests no longer pay lazy costs
+    if engine:
+        service_state.set_phase('warming', engine=engine)
+        service_state.set_phase('ready', warmup=run_warmup(warmup_tasks()))
+    else:
+        service_state.set_phase('failed', error="Neither Supabase nor CSV data available")
     
     yield
     
@@ -375,6 +546,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request latency per route for /metrics
+app.middleware("http")(track_requests)
+
+# Request IDs and opt-in profiling (DIAGNOSIS_PROFILING)
+app.middleware("http")(profile_requests)
+
 
 @app.get("/", response_class=HTMLResponse)
 async def root():
@@ -436,6 +613,8 @@ async def api_info():
         "version": "1.0.0",
         "docs": "/docs",
         "health": "/health",
+        "live": "/live",
+        "ready": "/ready",
         "selector": "/selector"
     }
 
@@ -445,15 +624,55 @@ async def health_check():
     """Health check endpoint"""
     global disease_data
     
-    is_healthy = disease_data is not None and not disease_data.empty
+    # The Supabase engines leave disease_data unset
+    is_healthy = bool(supabase_diagnosis and supabase_diagnosis.is_ready) or (disease_data is not None and not disease_data.empty)
     
     return {
         "status": "healthy" if is_healthy else "unhealthy",
         "data_loaded": is_healthy,
-        "timestamp": pd.Timestamp.now().isoformat()
+        "ready": service_state.is_ready,
+        "timestamp": datetime.now().isoformat()
     }
 
 
+@app.get("/live")
+async def liveness():
+    """Liveness probe: the process is up and serving"""
+    return service_state.live_report()
+
+
+@app.get("/ready")
+async def readiness():
+    """Readiness probe: 200 with the active engine once warmed up, 503 before"""
+    return JSONResponse(service_state.ready_report(), status_code=200 if service_state.is_ready else 503)
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: request and per-stage latency, candidate counts, Supabase calls, cache events"""
+    return Response(registry.render(), media_type=CONTENT_TYPE)
+
+
+@app.get("/debug/profiles/{request_id}")
+async def get_profile(request_id: str):
+    """Top frames and artifact path of a profiled request"""
+    if not PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    
+    summary = profiler.get(request_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail=f"No profile for request {request_id}")
+    return summary
+
+
+@app.get("/debug/slow-requests")
+async def get_slow_requests(limit: int = Query(default=20, ge=1, le=500)):
+    """Slowest diagnoses since startup with their inputs (replay with benchmark_diagnosis.py --replay)"""
+    if not PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    return {'requests': slow_requests.slowest(limit)}
+
+
 @app.get("/info", response_model=SystemInfo)
 async def system_info():
     """Get system information"""
@@ -540,8 +759,43 @@ async def get_diseases(
     }
 
 
+# Fields of DiagnosisResponse, picked from the shared payload builder (which also knows group rollups)
+RESPONSE_FIELDS = tuple(DiagnosisResponse.model_fields)
+
+
+def finish_diagnosis(
+    result: Dict[str, Any],
+    input_symptoms: List[str],
+    computation_mode: str,
+    unmatched_genes: List[str],
+    timer: StageTimer,
+    engine: str,
+    request: DiagnosisRequest,
+    start_time: float,
+    accept: Optional[str] = None
+) -> Response:
+    """
+    Encode a successful diagnosis straight from engine output (JSON, or MessagePack when accepted),
+    without building pydantic models; debug requests get the stage timings up to serialization.
+    Records the request's metrics.
+    """
+    payload = diagnosis_payload(result, input_symptoms, computation_mode, unmatched_genes)
+    payload = {field: payload[field] for field in RESPONSE_FIELDS}
+    if request.debug:
+        payload['stage_timings_ms'] = timer.rounded()
+    encoded = encoded_response(payload, accept)
+    timer.lap('serialization')
+    timer.observe(engine, computation_mode)
+    slow_requests.record(
+        (time.time() - start_time) * 1000, request.model_dump(), engine, computation_mode, timer.rounded()
+    )
+    CANDIDATES.observe(payload['total_diseases_evaluated'], engine=engine, computation_mode=computation_mode)
+    DIAGNOSIS_REQUESTS.inc(engine=engine, computation_mode=computation_mode, status='200')
+    return encoded
+
+
 @app.post("/diagnose", response_model=DiagnosisResponse)
-async def diagnose_disease(request: DiagnosisRequest):
+async def diagnose_disease(request: DiagnosisRequest, raw_request: Request):
     """
     Perform Bayesian disease diagnosis with choice between fast and true computation modes
     - fast: Uses pre-computed probabilities (faster, ~100ms)
@@ -549,12 +803,49 @@ async def diagnose_disease(request: DiagnosisRequest):
     """
     global disease_data, diseases_list, symptoms_list
     
-    import time
     start_time = time.time()
+    timer = StageTimer()
+    engine = "supabase" if supabase_diagnosis and supabase_diagnosis.is_ready else "csv_fallback"
     
     logger.info(f"🎯 Diagnosis request: mode={request.computation_mode}, symptoms={request.present_symptoms}")
     
     try:
+        # Gene constraints resolve to orpha codes through the pre-computed bitsets
+        candidate_codes, boosted_codes, unmatched_genes = None, None, []
+        if request.genes:
+            if gene_bitsets is None:
+                raise HTTPException(status_code=503, detail="Gene association data not loaded")
+            
+            gene_codes, unmatched_genes = constrained_codes(gene_bitsets, disease_orpha_codes, request.genes)
+            if len(unmatched_genes) == len(request.genes):
+                raise HTTPException(
+                    status_code=400,
+                    detail="None of the provided genes are associated with any disorder"
+                )
+            
+            if request.gene_mode == "restrict":
+                candidate_codes = gene_codes
+            else:
+                boosted_codes = gene_codes
+            logger.info(f"🧬 Gene constraint ({request.gene_mode}): {len(gene_codes)} disorders for {request.genes}")
+        
+        # Onset / inheritance constraints narrow the candidate set further
+        for name, values in (('onset', request.onset), ('inheritance', request.inheritance)):
+            if not values:
+                continue
+            if name not in natural_history_bitsets:
+                raise HTTPException(status_code=503, detail="Natural history data not loaded")
+            
+            allowed = expand_constraint(name, values, request.include_unannotated)
+            codes, unknown = constrained_codes(natural_history_bitsets[name], disease_orpha_codes, allowed)
+            unknown = [value for value in unknown if value in values]
+            if unknown:
+                raise HTTPException(status_code=400, detail=f"Unknown {name} value(s): {', '.join(unknown)}")
+            
+            candidate_codes = codes if candidate_codes is None else candidate_codes & codes
+            logger.info(f"🔎 {name} constraint {values}: {len(candidate_codes)} candidate disorders")
+        timer.lap('constraints')
+        
         # True Bayesian mode - use Supabase full computation
         if request.computation_mode == "true":
             logger.info("🧮 Using TRUE Bayesian computation with Supabase (full normalization)")
@@ -566,23 +857,25 @@ async def diagnose_disease(request: DiagnosisRequest):
                     raise HTTPException(status_code=503, detail="Neither Supabase nor CSV data available")
                 
                 # Use CSV-based true Bayesian computation
-            valid_present_symptoms = [
-                symptom for symptom in request.present_symptoms
+                valid_present_symptoms = [
+                    symptom for symptom in request.present_symptoms
                     if symptom in symptoms_list
-            ]
-            
-            if not valid_present_symptoms:
-                raise HTTPException(
-                    status_code=400,
-                    detail="None of the provided symptoms are found in the database"
-                )
-            
+                ]
+                
+                if not valid_present_symptoms:
+                    raise HTTPException(
+                        status_code=400,
+                        detail="None of the provided symptoms are found in the database"
+                    )
+                
                 valid_absent_symptoms = [
                     symptom for symptom in request.absent_symptoms
                     if symptom in symptoms_list
                 ]
+                engine = "csv_fallback"
+                timer.lap('validation')
                 
-                # Ultra-fast simplified Bayesian computation (CSV fallback)
+                # True Bayesian computation over the CSV data with the requested prior
                 results = []
                 # Limit to diseases that have at least one matching symptom for efficiency
                 relevant_diseases = set()
@@ -590,147 +883,86 @@ async def diagnose_disease(request: DiagnosisRequest):
                     matching_diseases = disease_data[disease_data["hpo_term"] == symptom]["disorder_name"].unique()
                     relevant_diseases.update(matching_diseases)
                 
-                # Limit to top 5 most relevant diseases to prevent timeout
-                relevant_diseases = list(relevant_diseases)[:5]
-                logger.info(f"Computing for {len(relevant_diseases)} relevant diseases (CSV fallback - ultra fast)")
+                # Limit to top 5 most relevant (constraint-compatible) diseases to prevent timeout
+                relevant_diseases = constrain_diseases(relevant_diseases, candidate_codes)[:5]
+                logger.info(f"Computing for {len(relevant_diseases)} relevant diseases (CSV fallback)")
+                timer.lap('candidates')
                 
-                # Fast scoring without full Bayesian normalization
-                for i, disease in enumerate(relevant_diseases):
+                # Posterior with full normalization, using the per-dataset prior and frequency tables
+                for disease in relevant_diseases:
                     try:
-                        # Get disease-specific data
-                        disease_symptoms = disease_data[disease_data['disorder_name'] == disease]
-                        
-                        if disease_symptoms.empty:
-                            continue
-                        
-                        # Create symptom frequency map
-                        symptom_freq_map = dict(zip(disease_symptoms['hpo_term'], disease_symptoms['frequency_numeric']))
-                        
-                        # Calculate simple score based on matching symptoms
-                        score = 0.0
-                        matching_symptoms = []
-                        
-                        # Score present symptoms
-                        for symptom in valid_present_symptoms:
-                            if symptom in symptom_freq_map:
-                                freq = symptom_freq_map[symptom]
-                                score += freq  # Add frequency directly
-                                matching_symptoms.append(symptom)
-                        
-                        # Penalize for absent symptoms that should be present
-                        for symptom in valid_absent_symptoms:
-                            if symptom in symptom_freq_map:
-                                freq = symptom_freq_map[symptom]
-                                score -= freq * 0.5  # Subtract half the frequency
-                        
-                        # Normalize by number of present symptoms to get average
-                        if len(valid_present_symptoms) > 0:
-                            normalized_score = score / len(valid_present_symptoms)
-                        else:
-                            normalized_score = 0.0
+                        scored = calculate_true_bayesian_probability(
+                            disease, valid_present_symptoms, valid_absent_symptoms, prior_mode=request.prior
+                        )
                         
                         # Only include if we have matches
-                        if len(matching_symptoms) > 0:
-                            disease_info = disease_symptoms.iloc[0]
-                            
-                            results.append(DiagnosisResult(
-                                disorder_name=disease,
-                                orpha_code=str(disease_info['orpha_code']),
-                                probability=max(0.0, min(1.0, normalized_score)),  # Clamp to [0,1]
-                                matching_symptoms=matching_symptoms,
-                                total_symptoms=len(disease_symptoms),
-                                confidence_score=len(matching_symptoms) / len(valid_present_symptoms) if valid_present_symptoms else 0.0
-                            ))
+                        if scored['matching_symptoms']:
+                            results.append({
+                                'disorder_name': disease,
+                                'orpha_code': disease_codes.get(disease, ''),
+                                **scored,
+                                'probability': boosted_probability(disease, scored['probability'], boosted_codes)
+                            })
                             
                     except Exception as e:
                         logger.warning(f"Error calculating for {disease}: {e}")
                         continue
                 
-                results.sort(key=lambda x: x.probability, reverse=True)
+                timer.lap('scoring')
+                
+                results.sort(key=lambda x: x['probability'], reverse=True)
                 top_results = results[:request.top_n]
+                timer.lap('sorting')
                 
                 processing_time = (time.time() - start_time) * 1000
                 
-                return DiagnosisResponse(
-                    success=True,
-                    results=top_results,
-                    total_diseases_evaluated=len(relevant_diseases),
-                    input_symptoms=valid_present_symptoms,
-                    processing_time_ms=processing_time,
-                    computation_mode="true"
-                )
+                return finish_diagnosis({
+                    'results': top_results,
+                    'total_diseases_evaluated': len(relevant_diseases),
+                    'processing_time_ms': processing_time
+                }, valid_present_symptoms, "true", unmatched_genes,
+                    timer, engine, request, start_time, raw_request.headers.get('accept'))
             
             try:
                 # Use Supabase true Bayesian diagnosis
+                engine = "supabase_true"
                 result = supabase_diagnosis.true_bayesian_diagnosis(
                     request.present_symptoms,
                     request.absent_symptoms,
-                    request.top_n
+                    request.top_n,
+                    prior_mode=request.prior,
+                    candidate_codes=candidate_codes,
+                    boosted_codes=boosted_codes
                 )
             except Exception as e:
                 logger.error(f"Supabase true Bayesian failed: {e}")
                 raise HTTPException(status_code=500, detail=f"True Bayesian computation failed: {str(e)}")
+            timer.lap('supabase')
             
-            # Convert to API format
-            api_results = []
-            for res in result['results']:
-                api_results.append(DiagnosisResult(
-                    disorder_name=res['disorder_name'],
-                    orpha_code=res['orpha_code'],
-                    probability=res['probability'],
-                    matching_symptoms=res['matching_symptoms'],
-                    total_symptoms=res['total_symptoms'],
-                    confidence_score=res['confidence_score']
-                ))
-            
-            processing_time = result['processing_time_ms']
-            
-            logger.info(f"🧮 True Bayesian computation completed in {processing_time:.1f}ms")
+            logger.info(f"🧮 True Bayesian computation completed in {result['processing_time_ms']:.1f}ms")
             
-            return DiagnosisResponse(
-                success=True,
-                results=api_results,
-                total_diseases_evaluated=result['total_diseases_evaluated'],
-                input_symptoms=request.present_symptoms,
-                processing_time_ms=processing_time,
-                computation_mode="true"
-            )
+            return finish_diagnosis(result, request.present_symptoms, "true", unmatched_genes,
+                                    timer, engine, request, start_time, raw_request.headers.get('accept'))
         
         # Fast mode - use Supabase fast/pre-computed diagnosis
         elif supabase_diagnosis and supabase_diagnosis.is_ready:
             logger.info(f"🚀 Using FAST mode (pre-computed/optimized) for symptoms: {request.present_symptoms}")
             
             # Use Supabase fast diagnosis (pre-computed probabilities)
+            engine = "supabase_fast"
             result = supabase_diagnosis.fast_diagnosis(
                 request.present_symptoms,
                 request.absent_symptoms,
-                request.top_n
+                request.top_n,
+                candidate_codes=candidate_codes,
+                boosted_codes=boosted_codes
             )
+            timer.lap('supabase')
             
-            # Convert to API format
-            api_results = []
-            for res in result['results']:
-                api_results.append(DiagnosisResult(
-                    disorder_name=res['disorder_name'],
-                    orpha_code=res['orpha_code'],
-                    probability=res['probability'],
-                    matching_symptoms=res['matching_symptoms'],
-                    total_symptoms=res['total_symptoms'],
-                    confidence_score=res['confidence_score']
-                ))
-            
-            processing_time = result['processing_time_ms']
+            logger.info(f"⚡ FAST mode (pre-computed) completed in {result['processing_time_ms']:.1f}ms")
             
-            logger.info(f"⚡ FAST mode (pre-computed) completed in {processing_time:.1f}ms")
-            
-            return DiagnosisResponse(
-                success=True,
-                results=api_results,
-                total_diseases_evaluated=result['total_diseases_evaluated'],
-                input_symptoms=request.present_symptoms,
-                processing_time_ms=processing_time,
-                computation_mode="fast"
-            )
+            return finish_diagnosis(result, request.present_symptoms, "fast", unmatched_genes,
+                                    timer, engine, request, start_time, raw_request.headers.get('accept'))
         
         # Fallback to regular diagnosis
         else:
@@ -755,6 +987,8 @@ async def diagnose_disease(request: DiagnosisRequest):
                 symptom for symptom in request.absent_symptoms
                 if symptom in symptoms_list
             ]
+            engine = "csv_fallback"
+            timer.lap('validation')
             
             # Pre-filter diseases that have at least one matching symptom for better performance
             logger.info(f"Filtering diseases with matching symptoms from {valid_present_symptoms}")
@@ -765,12 +999,15 @@ async def diagnose_disease(request: DiagnosisRequest):
                 matching_diseases = disease_data[disease_data['hpo_term'] == symptom]['disorder_name'].unique()
                 relevant_diseases.update(matching_diseases)
             
+            relevant_diseases = constrain_diseases(relevant_diseases, candidate_codes)
+            
             # If no diseases match any symptoms, check all diseases (fallback)
             if not relevant_diseases:
-                relevant_diseases = set(diseases_list[:100])  # Limit to top 100 for performance
+                relevant_diseases = constrain_diseases(diseases_list, candidate_codes)[:100]  # Limit to top 100 for performance
                 logger.warning("No diseases found with matching symptoms, checking top 100 diseases")
             else:
                 logger.info(f"Found {len(relevant_diseases)} diseases with matching symptoms")
+            timer.lap('candidates')
             
             # Calculate probabilities only for relevant diseases
             results = []
@@ -787,38 +1024,42 @@ async def diagnose_disease(request: DiagnosisRequest):
                         # Get orpha code for this disease
                         disease_info = disease_data[disease_data['disorder_name'] == disease].iloc[0]
                         
-                        results.append(DiagnosisResult(
-                            disorder_name=disease,
-                            orpha_code=str(disease_info['orpha_code']),
-                            probability=result['probability'],
-                            matching_symptoms=result['matching_symptoms'],
-                            total_symptoms=result['total_symptoms'],
-                            confidence_score=result['confidence_score']
-                        ))
+                        results.append({
+                            'disorder_name': disease,
+                            'orpha_code': str(disease_info['orpha_code']),
+                            'probability': boosted_probability(disease, result['probability'], boosted_codes),
+                            'matching_symptoms': result['matching_symptoms'],
+                            'total_symptoms': result['total_symptoms'],
+                            'confidence_score': result['confidence_score']
+                        })
                 except Exception as e:
                     logger.warning(f"Error calculating probability for {disease}: {e}")
                     continue
             
             logger.info(f"Calculated probabilities for {len(results)} diseases")
+            timer.lap('scoring')
             
             # Sort by probability and confidence score
-            results.sort(key=lambda x: (x.probability, x.confidence_score), reverse=True)
+            results.sort(key=lambda x: (x['probability'], x['confidence_score']), reverse=True)
             
             # Return top N results
             top_results = results[:request.top_n]
+            timer.lap('sorting')
             
             processing_time = (time.time() - start_time) * 1000  # Convert to milliseconds
             
-            return DiagnosisResponse(
-                success=True,
-                results=top_results,
-                total_diseases_evaluated=len(results),
-                input_symptoms=valid_present_symptoms,
-                processing_time_ms=processing_time,
-                computation_mode="fast"
-            )
+            return finish_diagnosis({
+                'results': top_results,
+                'total_diseases_evaluated': len(results),
+                'processing_time_ms': processing_time
+            }, valid_present_symptoms, "fast", unmatched_genes,
+                timer, engine, request, start_time, raw_request.headers.get('accept'))
         
+    except HTTPException as e:
+        DIAGNOSIS_REQUESTS.inc(engine=engine, computation_mode=request.computation_mode, status=str(e.status_code))
+        raise
     except Exception as e:
+        DIAGNOSIS_REQUESTS.inc(engine=engine, computation_mode=request.computation_mode, status='500')
         logger.error(f"Error in diagnosis: {e}")
         raise HTTPException(status_code=500, detail=f"Diagnosis failed: {str(e)}")
 
@@ -834,11 +1075,12 @@ async def upload_data(file: UploadFile = File(...)):
     try:
         # Save uploaded file
         content = await file.read()
-        with open("clinical_signs_and_symptoms_in_rare_diseases.csv", "wb") as f:
+        upload_path = f"{CLINICAL_SIGNS_PRODUCT}.csv"
+        with open(upload_path, "wb") as f:
             f.write(content)
         
-        # Reload data
-        success = load_disease_data()
+        # Reload data from the uploaded CSV, not an older columnar copy
+        success = load_disease_data(upload_path)
         
         if success:
             return {
@@ -866,6 +1108,7 @@ if __name__ == "__main__":
     logger.info(f"📁 Working directory: {os.getcwd()}")
     logger.info(f"🌐 Starting server on {host}:{port}")
     
+    import uvicorn
     uvicorn.run(
         app,  # Pass app directly instead of string
         host=host,
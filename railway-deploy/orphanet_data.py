@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Orphanet Data - Shared loader for the Orphanet CSV products
+Prefers the Parquet / Arrow IPC copies written by file/xml_to_csv_converter.py --columnar
+"""
+
+import os
+import logging
+import importlib.util
+from typing import TYPE_CHECKING, List, Optional
+
+# pandas and pyarrow are imported on first read, so serving from a prebuilt index never loads them
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Optional columnar backend
+PYARROW_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+
+logger = logging.getLogger(__name__)
+
+# Directories searched for dataset files, in order
+DATA_DIRS = ['.', 'file']
+
+# File formats in order of preference
+COLUMNAR_FORMATS = ['.parquet', '.arrow']
+
+
+def find_dataset(product: str, data_dirs: Optional[List[str]] = None) -> Optional[str]:
+    """
+    Find the best available file for an Orphanet product (e.g. 'genes_associated_with_rare_diseases').
+    A columnar copy is only used while it is at least as new as the CSV next to it, so a CSV
+    regenerated without --columnar is never shadowed by a stale Parquet / Arrow file.
+    """
+    extensions = COLUMNAR_FORMATS if PYARROW_AVAILABLE else []
+
+    for data_dir in data_dirs or DATA_DIRS:
+        csv_path = os.path.join(data_dir, product + '.csv')
+        csv_mtime = os.path.getmtime(csv_path) if os.path.exists(csv_path) else None
+
+        for extension in extensions:
+            path = os.path.join(data_dir, product + extension)
+            if not os.path.exists(path):
+                continue
+            if csv_mtime is None or os.path.getmtime(path) >= csv_mtime:
+                return path
+            logger.warning(f"Ignoring {path}: older than {csv_path}")
+
+        if csv_mtime is not None:
+            return csv_path
+
+    return None
+
+
+def load_dataset(
+    product: str,
+    columns: Optional[List[str]] = None,
+    data_dirs: Optional[List[str]] = None,
+    categorical: bool = False
+) -> Optional['pd.DataFrame']:
+    """
+    Load an Orphanet product as a DataFrame, reading only the requested columns.
+    Dictionary-encoded columns come back as plain strings unless categorical=True.
+    Returns None when no file is found for the product.
+    """
+    path = find_dataset(product, data_dirs)
+
+    if path is None:
+        logger.error(f"No dataset file found for {product}")
+        return None
+
+    return read_dataset_file(path, columns, categorical)
+
+
+def read_dataset_file(
+    path: str,
+    columns: Optional[List[str]] = None,
+    categorical: bool = False
+) -> 'pd.DataFrame':
+    """Read a single CSV, Parquet or Arrow IPC dataset file"""
+    import pandas as pd
+
+    logger.info(f"Reading dataset {path}" + (f" (columns: {', '.join(columns)})" if columns else ""))
+
+    if path.endswith('.csv'):
+        return pd.read_csv(path, usecols=columns)
+
+    if not PYARROW_AVAILABLE:
+        raise ImportError(f"pyarrow is required to read {path}")
+
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+    import pyarrow.parquet as pq
+
+    if path.endswith('.parquet'):
+        df = pq.read_table(path, columns=columns).to_pandas()
+    else:
+        # Memory-map the IPC file so unused columns are never paged in
+        with pa.memory_map(path, 'r') as source:
+            table = pa_ipc.open_file(source).read_all()
+            if columns:
+                table = table.select(columns)
+            df = table.to_pandas()
+
+    if not categorical:
+        for column in df.columns:
+            if isinstance(df[column].dtype, pd.CategoricalDtype):
+                df[column] = df[column].astype(object)
+
+    return df
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Prevalence Priors - Disorder priors for Bayesian diagnosis
+Built once from epidemiology_of_rare_diseases (val_moy / prevalence_class) instead of per request
+"""
+
+import logging
+import os
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from orphanet_data import load_dataset
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+EPIDEMIOLOGY_PRODUCT = 'epidemiology_of_rare_diseases'
+EPIDEMIOLOGY_COLUMNS = ['orpha_code', 'prevalence_type', 'prevalence_qualification',
+                        'prevalence_class', 'val_moy', 'prevalence_geographic']
+
+# Selectable prior modes
+PRIOR_MODES = ('uniform', 'association', 'prevalence')
+DEFAULT_PRIOR_MODE = 'association'
+
+# Class midpoints as a fraction of the population
+PREVALENCE_CLASS_VALUES = {
+    '>1 / 1000': 1.5e-3,
+    '6-9 / 10 000': 7.5e-4,
+    '1-5 / 10 000': 3e-4,
+    '1-9 / 100 000': 5e-5,
+    '1-9 / 1 000 000': 5e-6,
+    '<1 / 1 000 000': 5e-7
+}
+
+# Prevalence types in order of preference; val_moy is per 100 000 for all of them
+DEFAULT_PREVALENCE_TYPES = ['Point prevalence', 'Prevalence at birth', 'Lifetime Prevalence',
+                            'Annual incidence', 'Cases/families']
+DEFAULT_GEOGRAPHIC = ['Worldwide']
+
+
+def env_list(name: str, default: List[str]) -> List[str]:
+    """Comma-separated list from the environment, the default when unset"""
+    value = os.getenv(name, '')
+    items = [item.strip() for item in value.split(',') if item.strip()]
+    return items or list(default)
+
+
+# Filters used by load_prevalence_table when the caller passes none
+PREVALENCE_GEOGRAPHIC = env_list('DIAGNOSIS_PREVALENCE_GEOGRAPHIC', DEFAULT_GEOGRAPHIC)
+PREVALENCE_TYPES = env_list('DIAGNOSIS_PREVALENCE_TYPES', DEFAULT_PREVALENCE_TYPES)
+PREVALENCE_GEOGRAPHIC_FALLBACK = os.getenv('DIAGNOSIS_PREVALENCE_GEOGRAPHIC_FALLBACK', 'true').lower() in ('1', 'true', 'yes')
+
+# Only case reports exist: treat as the rarest class
+CASES_PREVALENCE = PREVALENCE_CLASS_VALUES['<1 / 1 000 000']
+
+# Disorders without any usable epidemiology data
+FALLBACK_PREVALENCE = PREVALENCE_CLASS_VALUES['1-9 / 1 000 000']
+
+
+def estimate_prevalences(
+    epidemiology: 'pd.DataFrame',
+    geographic: Optional[List[str]] = None,
+    prevalence_types: Optional[List[str]] = None,
+    geographic_fallback: bool = True
+) -> Dict[str, float]:
+    """
+    Estimate one prevalence per disorder (orpha_code -> fraction of population).
+    Rows from the requested regions win; other regions are used only when
+    geographic_fallback is set. Among the remaining rows the most preferred
+    prevalence type wins and its estimates are combined by median.
+    """
+    geographic = geographic or DEFAULT_GEOGRAPHIC
+    prevalence_types = prevalence_types or DEFAULT_PREVALENCE_TYPES
+
+    df = epidemiology[epidemiology['prevalence_type'].isin(prevalence_types)].copy()
+    if df.empty:
+        return {}
+
+    # Exact values where Orphanet publishes one, class midpoints otherwise
+    has_value = (
+        df['prevalence_qualification'].isin(['Value and class', 'Value only'])
+        & (df['val_moy'] > 0)
+        & (df['prevalence_type'] != 'Cases/families')
+    )
+    df['estimate'] = df['prevalence_class'].map(PREVALENCE_CLASS_VALUES)
+    df.loc[has_value, 'estimate'] = df.loc[has_value, 'val_moy'] / 100000.0
+    df.loc[df['prevalence_type'] == 'Cases/families', 'estimate'] = CASES_PREVALENCE
+    df = df.dropna(subset=['orpha_code', 'estimate'])
+
+    df['geo_rank'] = np.where(df['prevalence_geographic'].isin(geographic), 0, 1)
+    if not geographic_fallback:
+        df = df[df['geo_rank'] == 0]
+
+    type_rank = {prevalence_type: i for i, prevalence_type in enumerate(prevalence_types)}
+    df['type_rank'] = df['prevalence_type'].map(type_rank)
+
+    # Keep only the best (region, type) rows for each disorder
+    df['orpha_code'] = df['orpha_code'].astype(int).astype(str)
+    best = df.groupby('orpha_code')[['geo_rank', 'type_rank']].transform('min')
+    df = df[(df['geo_rank'] == best['geo_rank']) & (df['type_rank'] == best['type_rank'])]
+
+    return df.groupby('orpha_code')['estimate'].median().to_dict()
+
+
+def load_prevalence_table(
+    geographic: Optional[List[str]] = None,
+    prevalence_types: Optional[List[str]] = None,
+    geographic_fallback: Optional[bool] = None,
+    data_dirs: Optional[List[str]] = None
+) -> Dict[str, float]:
+    """
+    Load the epidemiology product and estimate prevalences; empty when the file is missing.
+    Filters left as None come from DIAGNOSIS_PREVALENCE_GEOGRAPHIC, DIAGNOSIS_PREVALENCE_TYPES
+    and DIAGNOSIS_PREVALENCE_GEOGRAPHIC_FALLBACK.
+    """
+    geographic = geographic or PREVALENCE_GEOGRAPHIC
+    prevalence_types = prevalence_types or PREVALENCE_TYPES
+    if geographic_fallback is None:
+        geographic_fallback = PREVALENCE_GEOGRAPHIC_FALLBACK
+
+    try:
+        epidemiology = load_dataset(EPIDEMIOLOGY_PRODUCT, columns=EPIDEMIOLOGY_COLUMNS, data_dirs=data_dirs)
+        if epidemiology is None:
+            logger.warning("Epidemiology data not found - prevalence priors will use the fallback value")
+            return {}
+
+        prevalences = estimate_prevalences(epidemiology, geographic, prevalence_types, geographic_fallback)
+        logger.info(f"Estimated prevalence for {len(prevalences)} disorders "
+                    f"({', '.join(geographic)}; geographic fallback {'on' if geographic_fallback else 'off'})")
+        return prevalences
+
+    except Exception as e:
+        logger.error(f"Error loading prevalence data: {e}")
+        return {}
+
+
+def prior_weights(
+    mode: str,
+    orpha_codes: Sequence[str],
+    association_counts: Optional[Sequence[float]] = None,
+    prevalences: Optional[Dict[str, float]] = None,
+    fallback: float = FALLBACK_PREVALENCE
+) -> np.ndarray:
+    """Normalized prior vector aligned with orpha_codes for the given prior mode"""
+    n = len(orpha_codes)
+    if n == 0:
+        return np.zeros(0)
+
+    if mode == 'uniform':
+        weights = np.ones(n)
+    elif mode == 'association':
+        if association_counts is None:
+            raise ValueError("association_counts are required for the association prior")
+        weights = np.asarray(association_counts, dtype=np.float64)
+    elif mode == 'prevalence':
+        prevalences = prevalences or {}
+        weights = np.array([prevalences.get(str(code), fallback) for code in orpha_codes], dtype=np.float64)
+    else:
+        raise ValueError(f"Unknown prior mode: {mode} (expected one of {', '.join(PRIOR_MODES)})")
+
+    total = weights.sum()
+    return weights / total if total > 0 else np.full(n, 1.0 / n)
+
+
+def build_disease_priors(
+    disease_data: 'pd.DataFrame',
+    prevalences: Optional[Dict[str, float]] = None
+) -> Dict[str, Dict[str, float]]:
+    """Pre-compute P(disease) for every prior mode from clinical signs rows, keyed by disease name"""
+    if prevalences is None:
+        prevalences = load_prevalence_table()
+
+    grouped = disease_data.groupby('disorder_name')
+    association_counts = grouped.size()
+    names = association_counts.index.tolist()
+    orpha_codes = grouped['orpha_code'].first().astype(str).tolist()
+
+    priors = {}
+    for mode in PRIOR_MODES:
+        weights = prior_weights(mode, orpha_codes, association_counts.to_numpy(), prevalences)
+        priors[mode] = dict(zip(names, weights.tolist()))
+
+    return priors
@@ -9,10 +9,14 @@ import requests
 import pandas as pd
 import numpy as np
 import logging
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Set
 import time
 import json
 
+from prevalence_priors import build_disease_priors, load_prevalence_table, DEFAULT_PRIOR_MODE
+from disorder_filters import GENE_BOOST
+from diagnosis_metrics import record_cache, record_supabase
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -43,17 +47,31 @@ class SimpleSupabaseDiagnosis:
         }
         
         self.is_ready = False
+        
+        # Disease priors are rebuilt at most every CACHE_DURATION seconds
+        self._priors_cache = None
+        self._priors_timestamp = None
+        self._prevalences = None
+        self.CACHE_DURATION = 300  # 5 minutes
+        
         logger.info(f"🔧 Simple Supabase client initialized for {self.supabase_url}")
     
+    def _get(self, url: str, table: str, timeout: int) -> requests.Response:
+        """GET against the REST API, recording the call in the Supabase metrics"""
+        start = time.perf_counter()
+        status = 'error'
+        try:
+            response = requests.get(url, headers=self.headers, timeout=timeout)
+            status = str(response.status_code)
+            return response
+        finally:
+            record_supabase(table, status, time.perf_counter() - start)
+    
     def test_connection(self) -> bool:
         """Test connection using simple HTTP request"""
         try:
             # Try to access disorders table
-            response = requests.get(
-                f"{self.rest_url}/disorders?select=count&limit=1",
-                headers=self.headers,
-                timeout=10
-            )
+            response = self._get(f"{self.rest_url}/disorders?select=count&limit=1", 'disorders', timeout=10)
             
             if response.status_code == 200:
                 logger.info("✅ Simple Supabase connection successful")
@@ -76,7 +94,7 @@ class SimpleSupabaseDiagnosis:
             
             url += f"&limit={limit}"
             
-            response = requests.get(url, headers=self.headers, timeout=10)
+            response = self._get(url, 'hpo_terms', timeout=10)
             
             if response.status_code == 200:
                 data = response.json()
@@ -93,7 +111,9 @@ class SimpleSupabaseDiagnosis:
         self,
         present_symptoms: List[str],
         absent_symptoms: List[str] = None,
-        top_n: int = 10
+        top_n: int = 10,
+        candidate_codes: Optional[Set[str]] = None,
+        boosted_codes: Optional[Set[str]] = None
     ) -> Dict[str, Any]:
         """Fast diagnosis using simple HTTP queries"""
         
@@ -113,7 +133,7 @@ class SimpleSupabaseDiagnosis:
                 try:
                     # Try optimized view first
                     url = f"{self.rest_url}/disorder_symptoms_view?hpo_term=in.(''{symptom_list}'')"
-                    response = requests.get(url, headers=self.headers, timeout=30)
+                    response = self._get(url, 'disorder_symptoms_view', timeout=30)
                     
                     if response.status_code == 200:
                         data = response.json()
@@ -138,6 +158,9 @@ class SimpleSupabaseDiagnosis:
                         symptom = row.get('hpo_term', '')
                         frequency = row.get('hpo_frequency', 'Unknown')
                         
+                        if candidate_codes is not None and str(orpha_code) not in candidate_codes:
+                            continue
+                        
                         if disorder_name not in disorder_scores:
                             disorder_scores[disorder_name] = {
                                 'orpha_code': orpha_code,
@@ -164,6 +187,8 @@ class SimpleSupabaseDiagnosis:
                     for disorder_name, scores in disorder_scores.items():
                         matching_count = len(scores['matching_symptoms'])
                         confidence_score = matching_count / max(len(present_symptoms), 1)
+                        if boosted_codes and str(scores['orpha_code']) in boosted_codes:
+                            scores['total_score'] *= GENE_BOOST
                         probability = min(scores['total_score'] / max(len(present_symptoms), 1), 1.0)
                         
                         results.append({
@@ -192,11 +217,30 @@ class SimpleSupabaseDiagnosis:
             logger.error(f"Error in fast_diagnosis: {e}")
             raise Exception(f"Fast diagnosis failed: {str(e)}")
     
+    def _get_disease_priors(self, df: pd.DataFrame, prior_mode: str) -> Dict[str, float]:
+        """Disease priors for the given mode, cached instead of recomputed per request"""
+        now = time.time()
+        
+        expired = self._priors_cache is None or now - self._priors_timestamp > self.CACHE_DURATION
+        record_cache('priors', not expired)
+        if expired:
+            # Epidemiology data does not change while the process runs
+            if self._prevalences is None:
+                self._prevalences = load_prevalence_table()
+            
+            self._priors_cache = build_disease_priors(df, self._prevalences)
+            self._priors_timestamp = now
+        
+        return self._priors_cache[prior_mode]
+    
     def true_bayesian_diagnosis(
         self,
         present_symptoms: List[str],
         absent_symptoms: List[str] = None,
-        top_n: int = 10
+        top_n: int = 10,
+        prior_mode: str = DEFAULT_PRIOR_MODE,
+        candidate_codes: Optional[Set[str]] = None,
+        boosted_codes: Optional[Set[str]] = None
     ) -> Dict[str, Any]:
         """True Bayesian diagnosis using HTTP requests"""
         
@@ -213,9 +257,9 @@ class SimpleSupabaseDiagnosis:
             
             try:
                 # Try to get all data from view
-                response = requests.get(
+                response = self._get(
                     f"{self.rest_url}/disorder_symptoms_view?select=disorder_name,orpha_code,hpo_term,hpo_frequency",
-                    headers=self.headers,
+                    'disorder_symptoms_view',
                     timeout=60
                 )
                 
@@ -268,8 +312,8 @@ class SimpleSupabaseDiagnosis:
             
             logger.info(f"Valid present symptoms: {valid_present_symptoms}")
             
-            # Calculate total associations for priors
-            total_associations = len(df)
+            # Priors for the requested mode (uniform / association / prevalence)
+            priors = self._get_disease_priors(df, prior_mode)
             
             # Calculate evidence P(symptoms) by summing over all diseases
             evidence = 0.0
@@ -281,6 +325,12 @@ class SimpleSupabaseDiagnosis:
                 symptom_diseases = df[df['hpo_term'] == symptom]['disorder_name'].unique()
                 matching_diseases.update(symptom_diseases)
             
+            # Gene-constrained candidates (orpha codes from the gene bitsets)
+            if candidate_codes is not None:
+                allowed = set(df.loc[df['orpha_code'].astype(str).isin(candidate_codes), 'disorder_name'])
+                matching_diseases &= allowed
+                all_diseases = [disease for disease in all_diseases if disease in allowed]
+            
             # If we have too many matching diseases, limit to most frequent ones
             if len(matching_diseases) > 25:
                 disease_counts = df[df['disorder_name'].isin(matching_diseases)].groupby('disorder_name').size()
@@ -298,9 +348,10 @@ class SimpleSupabaseDiagnosis:
                 disease_data = df[df['disorder_name'] == disease]
                 symptom_freq_map = dict(zip(disease_data['hpo_term'], disease_data['frequency_numeric']))
                 
-                # Calculate prior P(disease)
-                disease_associations = len(disease_data)
-                prior = disease_associations / total_associations
+                # Prior P(disease) from the pre-computed table
+                prior = priors.get(disease, 0.0)
+                if boosted_codes and str(disease_data.iloc[0]['orpha_code']) in boosted_codes:
+                    prior *= GENE_BOOST
                 
                 # Calculate likelihood P(symptoms|disease)
                 likelihood = 1.0
@@ -8,13 +8,17 @@ import os
 import pandas as pd
 import numpy as np
 import logging
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, List, Any, Optional, Set, Tuple
 from collections import defaultdict
 import time
 import json
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
+from prevalence_priors import build_disease_priors, load_prevalence_table, DEFAULT_PRIOR_MODE
+from disorder_filters import GENE_BOOST
+from diagnosis_metrics import record_cache, record_supabase
+
 # Load environment variables
 load_dotenv('config.env')
 load_dotenv('.env')  # Also try .env file
@@ -52,14 +56,28 @@ class SupabaseDiagnosis:
         self._symptoms_cache = None
         self._diseases_cache = None
         self._cache_timestamp = None
+        self._priors_cache = None
+        self._priors_timestamp = None
+        self._prevalences = None
         self.CACHE_DURATION = 300  # 5 minutes
     
+    def _execute(self, query, table: str):
+        """Run a query builder, recording the call in the Supabase metrics"""
+        start = time.perf_counter()
+        status = 'error'
+        try:
+            result = query.execute()
+            status = '200'
+            return result
+        finally:
+            record_supabase(table, status, time.perf_counter() - start)
+    
     def test_connection(self) -> bool:
         """Test Supabase connection using new schema"""
         try:
             # Test with the new schema tables
             try:
-                result = self.supabase.table('disorders').select('count').limit(1).execute()
+                result = self._execute(self.supabase.table('disorders').select('count').limit(1), 'disorders')
                 logger.info("✅ Supabase connection successful - disorders table accessible")
                 return True
             except Exception as e:
@@ -67,7 +85,7 @@ class SupabaseDiagnosis:
                 
             # Fallback test with hpo_terms
             try:
-                result = self.supabase.table('hpo_terms').select('count').limit(1).execute()
+                result = self._execute(self.supabase.table('hpo_terms').select('count').limit(1), 'hpo_terms')
                 logger.info("✅ Supabase connection successful - hpo_terms table accessible")
                 return True
             except Exception as e:
@@ -86,7 +104,7 @@ class SupabaseDiagnosis:
                 query = self.supabase.table('fast_symptoms').select('symptom_name')
                 if search:
                     query = query.ilike('symptom_name', f'%{search}%')
-                result = query.order('symptom_count', desc=True).limit(limit).execute()
+                result = self._execute(query.order('symptom_count', desc=True).limit(limit), 'fast_symptoms')
                 return [row['symptom_name'] for row in result.data]
             except Exception as e:
                 logger.warning(f"fast_symptoms query failed: {e}")
@@ -96,7 +114,7 @@ class SupabaseDiagnosis:
                 query = self.supabase.table('hpo_terms').select('term')
                 if search:
                     query = query.ilike('term', f'%{search}%')
-                result = query.limit(limit).execute()
+                result = self._execute(query.limit(limit), 'hpo_terms')
                 return [row['term'] for row in result.data]
             except Exception as e:
                 logger.warning(f"hpo_terms query failed: {e}")
@@ -114,7 +132,7 @@ class SupabaseDiagnosis:
                 query = self.supabase.table('fast_diseases').select('disease_name, orpha_code, symptom_count')
                 if search:
                     query = query.ilike('disease_name', f'%{search}%')
-                result = query.order('symptom_count', desc=True).limit(limit).execute()
+                result = self._execute(query.order('symptom_count', desc=True).limit(limit), 'fast_diseases')
                 return result.data
             except Exception as e:
                 logger.warning(f"fast_diseases query failed: {e}")
@@ -124,7 +142,7 @@ class SupabaseDiagnosis:
                 query = self.supabase.table('disorders').select('name, orpha_code')
                 if search:
                     query = query.ilike('name', f'%{search}%')
-                result = query.limit(limit).execute()
+                result = self._execute(query.limit(limit), 'disorders')
                 return [{'disease_name': row['name'], 'orpha_code': row['orpha_code'], 'symptom_count': 0} for row in result.data]
             except Exception as e:
                 logger.warning(f"disorders query failed: {e}")
@@ -138,7 +156,9 @@ class SupabaseDiagnosis:
         self,
         present_symptoms: List[str],
         absent_symptoms: List[str] = None,
-        top_n: int = 10
+        top_n: int = 10,
+        candidate_codes: Optional[Set[str]] = None,
+        boosted_codes: Optional[Set[str]] = None
     ) -> Dict[str, Any]:
         """Fast diagnosis using pre-computed probabilities"""
         
@@ -151,10 +171,12 @@ class SupabaseDiagnosis:
             # Try to use fast_probabilities table first
             try:
                 if present_symptoms:
-                    result = self.supabase.table('fast_probabilities')\
-                        .select('disease_name, orpha_code, probability, frequency, confidence_score, symptom_name')\
-                        .in_('symptom_name', present_symptoms)\
-                        .execute()
+                    result = self._execute(
+                        self.supabase.table('fast_probabilities')
+                        .select('disease_name, orpha_code, probability, frequency, confidence_score, symptom_name')
+                        .in_('symptom_name', present_symptoms),
+                        'fast_probabilities'
+                    )
                     
                     probability_data = result.data
                 else:
@@ -170,6 +192,8 @@ class SupabaseDiagnosis:
                 
                 # Process present symptoms
                 for row in probability_data:
+                    if candidate_codes is not None and str(row['orpha_code']) not in candidate_codes:
+                        continue
                     disease = row['disease_name']
                     disease_scores[disease]['total_probability'] += row['probability']
                     disease_scores[disease]['matching_symptoms'].append(row['symptom_name'])
@@ -181,6 +205,8 @@ class SupabaseDiagnosis:
                 for disease, scores in disease_scores.items():
                     matching_count = len(set(scores['matching_symptoms']))
                     confidence_score = matching_count / max(len(present_symptoms), 1)
+                    if boosted_codes and str(scores['orpha_code']) in boosted_codes:
+                        scores['total_probability'] *= GENE_BOOST
                     
                     results.append({
                         'disorder_name': disease,
@@ -213,11 +239,30 @@ class SupabaseDiagnosis:
             logger.error(f"Error in fast_diagnosis: {e}")
             raise Exception(f"Fast diagnosis failed: {str(e)}")
     
+    def _get_disease_priors(self, df: pd.DataFrame, prior_mode: str) -> Dict[str, float]:
+        """Disease priors for the given mode, cached instead of recomputed per request"""
+        now = time.time()
+        
+        expired = self._priors_cache is None or now - self._priors_timestamp > self.CACHE_DURATION
+        record_cache('priors', not expired)
+        if expired:
+            # Epidemiology data does not change while the process runs
+            if self._prevalences is None:
+                self._prevalences = load_prevalence_table()
+            
+            self._priors_cache = build_disease_priors(df, self._prevalences)
+            self._priors_timestamp = now
+        
+        return self._priors_cache[prior_mode]
+    
     def true_bayesian_diagnosis(
         self,
         present_symptoms: List[str],
         absent_symptoms: List[str] = None,
-        top_n: int = 10
+        top_n: int = 10,
+        prior_mode: str = DEFAULT_PRIOR_MODE,
+        candidate_codes: Optional[Set[str]] = None,
+        boosted_codes: Optional[Set[str]] = None
     ) -> Dict[str, Any]:
         """True Bayesian diagnosis using full Supabase dataset"""
         
@@ -235,14 +280,16 @@ class SupabaseDiagnosis:
             try:
                 # Use the new schema with proper joins
                 logger.info("Using new normalized schema with joins...")
-                result = self.supabase.table('disorder_hpo_associations')\
+                result = self._execute(
+                    self.supabase.table('disorder_hpo_associations')
                     .select('''
                         frequency,
                         disorders(name, orpha_code),
                         hpo_terms(term)
-                    ''')\
-                    .limit(10000)\
-                    .execute()
+                    ''')
+                    .limit(10000),
+                    'disorder_hpo_associations'
+                )
                 
                 # Transform the joined data to match expected format
                 all_data = []
@@ -288,8 +335,8 @@ class SupabaseDiagnosis:
             
             logger.info(f"🔄 Computing true Bayesian probabilities for {len(all_diseases)} diseases...")
             
-            # Calculate total associations for priors
-            total_associations = len(df)
+            # Priors for the requested mode (uniform / association / prevalence)
+            priors = self._get_disease_priors(df, prior_mode)
             
             # Filter valid symptoms
             valid_present_symptoms = [s for s in present_symptoms if s in all_symptoms]
@@ -307,6 +354,12 @@ class SupabaseDiagnosis:
                 symptom_diseases = df[df['hpo_term'] == symptom]['disorder_name'].unique()
                 matching_diseases.update(symptom_diseases)
             
+            # Gene-constrained candidates (orpha codes from the gene bitsets)
+            if candidate_codes is not None:
+                allowed = set(df.loc[df['orpha_code'].astype(str).isin(candidate_codes), 'disorder_name'])
+                matching_diseases &= allowed
+                all_diseases = [disease for disease in all_diseases if disease in allowed]
+            
             # If we have too many matching diseases, limit to most frequent ones
             if len(matching_diseases) > 25:
                 disease_counts = df[df['disorder_name'].isin(matching_diseases)].groupby('disorder_name').size()
@@ -328,9 +381,10 @@ class SupabaseDiagnosis:
                 disease_data = df[df['disorder_name'] == disease]
                 symptom_freq_map = dict(zip(disease_data['hpo_term'], disease_data['frequency_numeric']))
                 
-                # Calculate prior P(disease)
-                disease_associations = len(disease_data)
-                prior = disease_associations / total_associations
+                # Prior P(disease) from the pre-computed table
+                prior = priors.get(disease, 0.0)
+                if boosted_codes and str(disease_data.iloc[0]['orpha_code']) in boosted_codes:
+                    prior *= GENE_BOOST
                 
                 # Calculate likelihood P(symptoms|disease)
                 likelihood = 1.0
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Readiness - Startup phases, warm-up diagnoses and liveness/readiness reports
+A process only reports ready (/ready 200) once its data is loaded and the warm-up diagnoses ran
+"""
+
+import os
+import time
+import logging
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# starting -> loading -> warming -> ready; failed when no engine could load its data
+PHASES = ('starting', 'loading', 'warming', 'ready', 'failed')
+
+# Calls per warm-up task: the first pays the lazy costs, the last shows the warmed latency (0 disables warm-up)
+WARMUP_ROUNDS = int(os.getenv('WARMUP_ROUNDS', '2'))
+
+
+def _timestamp(seconds: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(seconds, timezone.utc).isoformat() if seconds else None
+
+
+class ServiceState:
+    """Startup phase, active engine and index generation of this process"""
+
+    def __init__(self):
+        self.phase = 'starting'
+        self.engine: Optional[str] = None
+        self.index_generation: Optional[str] = None
+        self.warmup: Dict[str, Dict[str, Any]] = {}
+        self.error: Optional[str] = None
+        self.started_at = time.time()
+        self.ready_at: Optional[float] = None
+
+    def set_phase(self, phase: str, **details):
+        """Move to a phase; keyword arguments update engine, index_generation, warmup or error"""
+        if phase not in PHASES:
+            raise ValueError(f"Unknown phase: {phase}")
+        self.phase = phase
+        for name, value in details.items():
+            setattr(self, name, value)
+        if phase == 'ready':
+            self.ready_at = time.time()
+        logger.info(f"🚦 Service phase: {phase}" + (f" (engine={self.engine})" if self.engine else ""))
+
+    @property
+    def is_ready(self) -> bool:
+        return self.phase == 'ready'
+
+    def live_report(self) -> Dict[str, Any]:
+        return {
+            'status': 'alive',
+            'phase': self.phase,
+            'uptime_seconds': round(time.time() - self.started_at, 1)
+        }
+
+    def ready_report(self) -> Dict[str, Any]:
+        return {
+            'status': 'ready' if self.is_ready else 'not_ready',
+            'phase': self.phase,
+            'engine': self.engine,
+            'index_generation': self.index_generation,
+            'ready_at': _timestamp(self.ready_at),
+            'warmup': self.warmup,
+            'error': self.error
+        }
+
+
+def run_warmup(tasks: Dict[str, Callable[[], Any]], rounds: int = WARMUP_ROUNDS) -> Dict[str, Dict[str, Any]]:
+    """Run each task `rounds` times; returns first and last call latency per task (or its error)"""
+    report = {}
+    for name, task in tasks.items():
+        latencies = []
+        try:
+            for _ in range(rounds):
+                start = time.perf_counter()
+                task()
+                latencies.append((time.perf_counter() - start) * 1000)
+        except Exception as e:
+            logger.warning(f"⚠️ Warm-up of {name} failed: {e}")
+            report[name] = {'error': str(e)}
+            continue
+        if latencies:
+            report[name] = {'first_ms': round(latencies[0], 3), 'warm_ms': round(latencies[-1], 3)}
+
+    if report:
+        summary = ', '.join(f"{name} {r['first_ms']:.0f}->{r['warm_ms']:.0f}ms" for name, r in report.items() if 'first_ms' in r)
+        logger.info(f"🔥 Warm-up done: {summary}")
+    return report
+
+
+def representative_symptoms(index, sizes=(1, 5, 15)) -> Dict[str, List[str]]:
+    """
+    Warm-up symptom sets from a DiagnosisIndex: the most widespread symptoms (largest candidate sets)
+    and the most specific ones, at a few profile sizes
+    """
+    postings = np.diff(index.indptr)
+    annotated = np.flatnonzero(postings)
+    common = annotated[np.argsort(-postings[annotated], kind='stable')]
+    rare = annotated[np.argsort(-index.symptom_ic[annotated], kind='stable')]
+
+    profiles = {}
+    for size in sizes:
+        profiles[f'common_{size}'] = [index.symptom_names[s] for s in common[:size]]
+        profiles[f'rare_{size}'] = [index.symptom_names[s] for s in rare[:size]]
+    return profiles
+
+
+# Global instance
+service_state = ServiceState()
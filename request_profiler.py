@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Request Profiler - Opt-in per-request profiling and a rolling log of the slowest diagnoses
+Profiling is off unless DIAGNOSIS_PROFILING is set; slow requests keep a redacted summary of their inputs,
+and the full inputs for benchmark replay only while profiling is enabled
+"""
+
+import os
+import io
+import re
+import json
+import queue
+import heapq
+import hashlib
+import uuid
+import time
+import pstats
+import cProfile
+import logging
+import threading
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Profiling is restricted by config: enabled per deployment, optionally guarded by a shared token
+PROFILING_ENABLED = os.getenv('DIAGNOSIS_PROFILING', '').lower() in ('1', 'true', 'yes')
+PROFILE_TOKEN = os.getenv('DIAGNOSIS_PROFILE_TOKEN')
+PROFILE_DIR = os.getenv('DIAGNOSIS_PROFILE_DIR', 'profiles')
+PROFILE_HEADER = 'X-Profile'
+PROFILE_PATHS = ('/diagnose',)
+
+# Profile summaries kept in memory for GET /debug/profiles/{request_id}
+MAX_PROFILE_SUMMARIES = 100
+TOP_FRAMES = 25
+
+# Slowest requests kept since startup; also appended as JSON lines when DIAGNOSIS_SLOW_LOG is set.
+# Patient inputs (symptoms, genes, onset) are only stored in full while profiling is enabled
+SLOW_LOG_SIZE = int(os.getenv('DIAGNOSIS_SLOW_LOG_SIZE', '50'))
+SLOW_LOG_FILE = os.getenv('DIAGNOSIS_SLOW_LOG')
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+# Client-supplied IDs name profile artifacts, so only plain tokens are accepted
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+# Request ID of the request being handled, set by the middleware
+current_request_id: ContextVar[str] = ContextVar('current_request_id', default='')
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def profiling_requested(request) -> bool:
+    """Header X-Profile or query ?profile=; must match DIAGNOSIS_PROFILE_TOKEN when one is configured"""
+    if not PROFILING_ENABLED or request.url.path not in PROFILE_PATHS:
+        return False
+
+    value = request.headers.get(PROFILE_HEADER) or request.query_params.get('profile')
+    if not value:
+        return False
+    if PROFILE_TOKEN:
+        return value == PROFILE_TOKEN
+    return value.lower() not in ('0', 'false', 'no')
+
+
+def request_summary(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Redacted request: a digest of the full payload (equal requests share it), the size of every
+    list field and the numeric / boolean options; no symptom, gene or onset values
+    """
+    canonical = json.dumps(payload, sort_keys=True, default=str)
+    summary: Dict[str, Any] = {'digest': hashlib.sha256(canonical.encode()).hexdigest()[:16]}
+    for key, value in payload.items():
+        if isinstance(value, (list, tuple)):
+            summary[f"{key}_count"] = len(value)
+        elif isinstance(value, (bool, int, float)) or value is None:
+            summary[key] = value
+    return summary
+
+
+def top_frames(stats: pstats.Stats, limit: int = TOP_FRAMES) -> List[Dict[str, Any]]:
+    """Functions with the most own time (the event loop dominates cumulative time), as JSON-serializable rows"""
+    rows = []
+    for (filename, line, function), (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+        rows.append({
+            'function': f"{os.path.basename(filename)}:{line}({function})",
+            'calls': ncalls,
+            'own_ms': tottime * 1000,
+            'cumulative_ms': cumtime * 1000
+        })
+    rows.sort(key=lambda row: row['own_ms'], reverse=True)
+    return rows[:limit]
+
+
+class RequestProfiler:
+    """Runs selected requests under cProfile and saves <request_id>.prof artifacts (readable with pstats)"""
+
+    def __init__(self, profile_dir: str = PROFILE_DIR, max_summaries: int = MAX_PROFILE_SUMMARIES):
+        self.profile_dir = profile_dir
+        self.max_summaries = max_summaries
+        self.summaries: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        # cProfile hooks the whole thread, so only one request is profiled at a time
+        self._lock = threading.Lock()
+
+    async def run(self, request_id: str, call_next, request):
+        """call_next(request) under the profiler; returns (response, summary or None when busy)"""
+        if not self._lock.acquire(blocking=False):
+            logger.warning(f"⚠️ Profiler busy - request {request_id} not profiled")
+            return await call_next(request), None
+
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            profiler.enable()
+            try:
+                response = await call_next(request)
+            finally:
+                profiler.disable()
+        finally:
+            self._lock.release()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        os.makedirs(self.profile_dir, exist_ok=True)
+        artifact = os.path.join(self.profile_dir, f"{request_id}.prof")
+        profiler.dump_stats(artifact)
+
+        summary = {
+            'request_id': request_id,
+            'path': request.url.path,
+            'elapsed_ms': elapsed_ms,
+            'artifact': artifact,
+            'top_frames': top_frames(pstats.Stats(profiler, stream=io.StringIO()))
+        }
+        self.summaries[request_id] = summary
+        while len(self.summaries) > self.max_summaries:
+            self.summaries.popitem(last=False)
+
+        logger.info(f"🔬 Profiled {request.url.path} ({request_id}) in {elapsed_ms:.1f}ms -> {artifact}")
+        return response, summary
+
+    def get(self, request_id: str) -> Optional[Dict[str, Any]]:
+        return self.summaries.get(request_id)
+
+
+class SlowRequestLog:
+    """
+    The N slowest diagnoses since startup. Entries carry a redacted request summary; the full
+    request (needed to replay it) is kept only while profiling is enabled, unless full_requests
+    says otherwise. Log file lines are appended by a background thread, off the request path.
+    """
+
+    def __init__(
+        self,
+        capacity: int = SLOW_LOG_SIZE,
+        log_file: Optional[str] = SLOW_LOG_FILE,
+        full_requests: Optional[bool] = None
+    ):
+        self.capacity = capacity
+        self.log_file = log_file
+        self.full_requests = full_requests
+        self._heap: List[tuple] = []  # (elapsed_ms, sequence, entry) min-heap
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self._pending: 'queue.Queue[str]' = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+
+    def record(
+        self,
+        elapsed_ms: float,
+        payload: Dict[str, Any],
+        engine: str,
+        computation_mode: str,
+        stage_timings_ms: Optional[Dict[str, float]] = None
+    ) -> bool:
+        """Keep the request if it is among the slowest; returns whether it was kept"""
+        with self._lock:
+            if len(self._heap) >= self.capacity and elapsed_ms <= self._heap[0][0]:
+                return False
+
+            entry = {
+                'request_id': current_request_id.get() or new_request_id(),
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                'elapsed_ms': elapsed_ms,
+                'engine': engine,
+                'computation_mode': computation_mode,
+                'stage_timings_ms': stage_timings_ms or {},
+                'request_summary': request_summary(payload)
+            }
+            full_requests = PROFILING_ENABLED if self.full_requests is None else self.full_requests
+            if full_requests:
+                entry['request'] = payload
+            self._sequence += 1
+            if len(self._heap) >= self.capacity:
+                heapq.heapreplace(self._heap, (elapsed_ms, self._sequence, entry))
+            else:
+                heapq.heappush(self._heap, (elapsed_ms, self._sequence, entry))
+
+        if self.log_file:
+            self._pending.put(json.dumps(entry, default=str) + '\n')
+            with self._lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._write_lines, name='slow-request-log', daemon=True)
+                    self._writer.start()
+        return True
+
+    def _write_lines(self):
+        """Writer thread: appends queued lines, a batch per file open"""
+        while True:
+            lines = [self._pending.get()]
+            while not self._pending.empty():
+                lines.append(self._pending.get_nowait())
+            try:
+                with open(self.log_file, 'a') as f:
+                    f.writelines(lines)
+            except OSError as e:
+                logger.warning(f"⚠️ Could not append to slow request log {self.log_file}: {e}")
+            for _ in lines:
+                self._pending.task_done()
+
+    def flush(self):
+        """Wait until every queued line has been written"""
+        self._pending.join()
+
+    def slowest(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            entries = [entry for _, _, entry in sorted(self._heap, key=lambda item: item[0], reverse=True)]
+        return entries[:limit] if limit else entries
+
+
+profiler = RequestProfiler()
+slow_requests = SlowRequestLog()
+
+
+async def profile_requests(request, call_next):
+    """HTTP middleware: assigns request IDs and profiles opted-in requests"""
+    request_id = request.headers.get(REQUEST_ID_HEADER, '')
+    if not REQUEST_ID_PATTERN.match(request_id):
+        request_id = new_request_id()
+    token = current_request_id.set(request_id)
+    try:
+        summary = None
+        if profiling_requested(request):
+            response, summary = await profiler.run(request_id, call_next, request)
+        else:
+            response = await call_next(request)
+    finally:
+        current_request_id.reset(token)
+
+    response.headers[REQUEST_ID_HEADER] = request_id
+    if summary is not None:
+        response.headers['X-Profile-Artifact'] = summary['artifact']
+    return response
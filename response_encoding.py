@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Response Encoding - Pre-serialized /diagnose responses built straight from engine output
+JSON through orjson when installed (stdlib json otherwise), MessagePack for callers that send
+Accept: application/msgpack. The payload has exactly the fields of DiagnosisResponse.
+Bulk score vectors are sent as raw float32 or Arrow IPC, in the order of a cacheable disorder table.
+"""
+
+import json
+import math
+import logging
+import importlib.util
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from fastapi.responses import Response
+
+# Optional fast encoders
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+PYARROW_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+
+logger = logging.getLogger(__name__)
+
+JSON_MEDIA_TYPE = 'application/json'
+MSGPACK_MEDIA_TYPE = 'application/msgpack'
+MSGPACK_MEDIA_TYPES = (MSGPACK_MEDIA_TYPE, 'application/x-msgpack', 'application/vnd.msgpack')
+ARROW_MEDIA_TYPE = 'application/vnd.apache.arrow.stream'
+FLOAT32_MEDIA_TYPE = 'application/octet-stream'
+
+# Score vectors: raw little-endian float32 or an Arrow IPC stream; disorder tables: Arrow or columnar JSON
+SCORE_FORMATS = ('float32', 'arrow')
+TABLE_FORMATS = ('json', 'arrow')
+
+# Clients keep the disorder table until the index generation (its ETag) changes
+TABLE_CACHE_CONTROL = 'public, max-age=3600'
+
+
+def result_payload(res: Dict[str, Any]) -> Dict[str, Any]:
+    """One DiagnosisResult from an engine result dict, with the model's field types"""
+    return {
+        'disorder_name': str(res['disorder_name']),
+        'orpha_code': str(res['orpha_code']),
+        'probability': float(res['probability']),
+        'matching_symptoms': list(res['matching_symptoms']),
+        'total_symptoms': int(res['total_symptoms']),
+        'confidence_score': float(res['confidence_score'])
+    }
+
+
+def diagnosis_payload(
+    result: Dict[str, Any],
+    input_symptoms: List[str],
+    computation_mode: str,
+    unmatched_genes: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """DiagnosisResponse fields from engine output, without building pydantic models"""
+    return {
+        'success': True,
+        'results': [result_payload(res) for res in result['results']],
+        'total_diseases_evaluated': int(result['total_diseases_evaluated']),
+        'input_symptoms': list(input_symptoms),
+        'processing_time_ms': float(result['processing_time_ms']),
+        'computation_mode': computation_mode,
+        'unmatched_genes': list(unmatched_genes or []),
+        'groups': [
+            {
+                'group_name': str(group['group_name']),
+                'group_code': str(group['group_code']),
+                'probability': float(group['probability']),
+                'disorders_evaluated': int(group['disorders_evaluated']),
+                'top_disorders': [result_payload(res) for res in group['top_disorders']]
+            }
+            for group in result.get('groups', [])
+        ],
+        'scoring': result.get('scoring', 'exact'),
+        'stage_timings_ms': None
+    }
+
+
+def wants_msgpack(accept: Optional[str]) -> bool:
+    """Whether the Accept header asks for MessagePack"""
+    if not accept:
+        return False
+    return any(part.split(';')[0].strip().lower() in MSGPACK_MEDIA_TYPES for part in accept.split(','))
+
+
+def finite(value: Any) -> Any:
+    """Value with NaN / Infinity floats replaced by None, nested through dicts and lists"""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [finite(item) for item in value]
+    return value
+
+
+def encode_json(payload: Dict[str, Any]) -> bytes:
+    """
+    Compact JSON. Non-finite floats become null, as orjson and pydantic write them, so the
+    stdlib fallback never emits the NaN / Infinity tokens strict JSON parsers reject.
+    """
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(payload)
+    try:
+        return json.dumps(payload, separators=(',', ':'), allow_nan=False).encode()
+    except ValueError:
+        return json.dumps(finite(payload), separators=(',', ':'), allow_nan=False).encode()
+
+
+def encoded_response(payload: Dict[str, Any], accept: Optional[str] = None, status_code: int = 200) -> Response:
+    """
+    Encoded response for the payload. Returning a Response skips FastAPI's response_model validation
+    and serialization, while the route keeps its response_model for the OpenAPI schema.
+    """
+    if wants_msgpack(accept):
+        if MSGPACK_AVAILABLE:
+            return Response(msgpack.packb(payload), status_code=status_code, media_type=MSGPACK_MEDIA_TYPE)
+        logger.warning("⚠️ MessagePack requested but msgpack is not installed - answering with JSON")
+    return Response(encode_json(payload), status_code=status_code, media_type=JSON_MEDIA_TYPE)
+
+
+def encode_arrow(columns: Dict[str, Any], metadata: Optional[Dict[str, str]] = None) -> bytes:
+    """One record batch as an Arrow IPC stream"""
+    if not PYARROW_AVAILABLE:
+        raise ValueError("Arrow output needs pyarrow - use format=float32 (scores) or format=json (disorders)")
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+
+    table = pa.table(columns).replace_schema_metadata(metadata)
+    sink = pa.BufferOutputStream()
+    with pa_ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def score_vector_response(scores: np.ndarray, fmt: str, generation: str, headers: Optional[Dict[str, str]] = None) -> Response:
+    """
+    Full score vector in disorder table order. The X-Index-Generation header (and Arrow schema
+    metadata) tells clients which disorder table the positions refer to.
+    """
+    if fmt not in SCORE_FORMATS:
+        raise ValueError(f"Unknown score format: {fmt}")
+    headers = {**(headers or {}), 'X-Index-Generation': generation, 'X-Score-Count': str(len(scores))}
+
+    scores = np.ascontiguousarray(scores, dtype='<f4')
+    if fmt == 'arrow':
+        body = encode_arrow({'score': scores}, {'index_generation': generation})
+        return Response(body, media_type=ARROW_MEDIA_TYPE, headers=headers)
+    headers['X-Score-Dtype'] = 'float32-le'
+    return Response(scores.tobytes(), media_type=FLOAT32_MEDIA_TYPE, headers=headers)
+
+
+def disorder_table_response(
+    orpha_codes: List[str],
+    disorder_names: List[str],
+    fmt: str,
+    generation: str,
+    if_none_match: Optional[str] = None
+) -> Response:
+    """Disorder table (position = score vector position), 304 when the client holds this generation"""
+    if fmt not in TABLE_FORMATS:
+        raise ValueError(f"Unknown table format: {fmt}")
+    headers = {'ETag': f'"{generation}"', 'Cache-Control': TABLE_CACHE_CONTROL, 'X-Index-Generation': generation}
+    if if_none_match and generation in [tag.strip().removeprefix('W/').strip('"') for tag in if_none_match.split(',')]:
+        return Response(status_code=304, headers=headers)
+
+    if fmt == 'arrow':
+        body = encode_arrow({'orpha_code': orpha_codes, 'disorder_name': disorder_names}, {'index_generation': generation})
+        return Response(body, media_type=ARROW_MEDIA_TYPE, headers=headers)
+    payload = {'index_generation': generation, 'orpha_code': list(orpha_codes), 'disorder_name': list(disorder_names)}
+    return Response(encode_json(payload), media_type=JSON_MEDIA_TYPE, headers=headers)
@@ -7,6 +7,7 @@ This script will help you create the necessary tables in your Supabase database
 import os
 import sys
 from supabase_fast_diagnosis import supabase_diagnosis, setup_and_populate
+from fast_schema import FAST_PROBABILITIES_SCHEMA
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -16,48 +17,12 @@ logger = logging.getLogger(__name__)
 def print_sql_commands():
     """Print the SQL commands you need to run in Supabase SQL Editor"""
     
-    sql_commands = """
+    sql_commands = f"""
 -- =================================================================
 -- SQL Commands to Run in Supabase SQL Editor
 -- =================================================================
 
--- 1. Fast Symptoms Table (for quick symptom lookup)
-CREATE TABLE IF NOT EXISTS fast_symptoms (
-    id SERIAL PRIMARY KEY,
-    symptom_name TEXT UNIQUE NOT NULL,
-    symptom_count INTEGER DEFAULT 0,
-    created_at TIMESTAMP DEFAULT NOW()
-);
-
--- 2. Fast Diseases Table (for quick disease lookup)  
-CREATE TABLE IF NOT EXISTS fast_diseases (
-    id SERIAL PRIMARY KEY,
-    disease_name TEXT UNIQUE NOT NULL,
-    orpha_code TEXT,
-    symptom_count INTEGER DEFAULT 0,
-    created_at TIMESTAMP DEFAULT NOW()
-);
-
--- 3. Pre-computed Probabilities Table (the core optimization)
-CREATE TABLE IF NOT EXISTS fast_probabilities (
-    id SERIAL PRIMARY KEY,
-    symptom_name TEXT NOT NULL,
-    disease_name TEXT NOT NULL,
-    orpha_code TEXT,
-    probability FLOAT NOT NULL,
-    frequency FLOAT NOT NULL,
-    confidence_score FLOAT NOT NULL,
-    created_at TIMESTAMP DEFAULT NOW(),
-    UNIQUE(symptom_name, disease_name)
-);
-
--- 4. Indexes for ultra-fast queries
-CREATE INDEX IF NOT EXISTS idx_fast_probabilities_symptom ON fast_probabilities(symptom_name);
-CREATE INDEX IF NOT EXISTS idx_fast_probabilities_disease ON fast_probabilities(disease_name);
-CREATE INDEX IF NOT EXISTS idx_fast_probabilities_probability ON fast_probabilities(probability DESC);
-CREATE INDEX IF NOT EXISTS idx_fast_symptoms_name ON fast_symptoms(symptom_name);
-CREATE INDEX IF NOT EXISTS idx_fast_diseases_name ON fast_diseases(disease_name);
-
+{FAST_PROBABILITIES_SCHEMA.sql()}
 -- =================================================================
 -- After running the above SQL, come back and run this Python script
 -- =================================================================
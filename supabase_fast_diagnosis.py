@@ -15,6 +15,8 @@ import json
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
+from fast_schema import FAST_PROBABILITIES_SCHEMA
+
 # Load environment variables
 load_dotenv('config.env')
 load_dotenv('.env')  # Also try .env file
@@ -71,44 +73,7 @@ class SupabaseFastDiagnosis:
             logger.info("🔧 Setting up Supabase tables...")
             
             # SQL to create optimized tables
-            setup_sql = """
-            -- Fast Symptoms Table (for quick symptom lookup)
-            CREATE TABLE IF NOT EXISTS fast_symptoms (
-                id SERIAL PRIMARY KEY,
-                symptom_name TEXT UNIQUE NOT NULL,
-                symptom_count INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT NOW()
-            );
-            
-            -- Fast Diseases Table (for quick disease lookup)
-            CREATE TABLE IF NOT EXISTS fast_diseases (
-                id SERIAL PRIMARY KEY,
-                disease_name TEXT UNIQUE NOT NULL,
-                orpha_code TEXT,
-                symptom_count INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT NOW()
-            );
-            
-            -- Pre-computed Probabilities Table (the core optimization)
-            CREATE TABLE IF NOT EXISTS fast_probabilities (
-                id SERIAL PRIMARY KEY,
-                symptom_name TEXT NOT NULL,
-                disease_name TEXT NOT NULL,
-                orpha_code TEXT,
-                probability FLOAT NOT NULL,
-                frequency FLOAT NOT NULL,
-                confidence_score FLOAT NOT NULL,
-                created_at TIMESTAMP DEFAULT NOW(),
-                UNIQUE(symptom_name, disease_name)
-            );
-            
-            -- Indexes for ultra-fast queries
-            CREATE INDEX IF NOT EXISTS idx_fast_probabilities_symptom ON fast_probabilities(symptom_name);
-            CREATE INDEX IF NOT EXISTS idx_fast_probabilities_disease ON fast_probabilities(disease_name);
-            CREATE INDEX IF NOT EXISTS idx_fast_probabilities_probability ON fast_probabilities(probability DESC);
-            CREATE INDEX IF NOT EXISTS idx_fast_symptoms_name ON fast_symptoms(symptom_name);
-            CREATE INDEX IF NOT EXISTS idx_fast_diseases_name ON fast_diseases(disease_name);
-            """
+            setup_sql = FAST_PROBABILITIES_SCHEMA.sql()
             
             # Execute table creation (Note: This requires SQL execution via RPC or direct SQL)
             logger.info("📋 Tables and indexes created successfully")
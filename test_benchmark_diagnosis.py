@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Test script for the offline diagnosis benchmark harness (no dataset needed)
+"""
+
+import json
+import tempfile
+
+import pandas as pd
+
+from benchmark_diagnosis import make_profiles, corpus_hash, run_engine, summarize, load_replay_profiles, PROFILE_KINDS
+from diagnosis_index import DiagnosisIndex
+
+
+def make_index() -> DiagnosisIndex:
+    rows = [
+        ('Alpha syndrome', 1, 'Seizure', 0.9),
+        ('Alpha syndrome', 1, 'Macrocephaly', 0.55),
+        ('Beta disease', 2, 'Seizure', 0.17),
+        ('Beta disease', 2, 'Fever', 0.9),
+        ('Gamma disorder', 3, 'Short stature', 0.9),
+    ]
+    return DiagnosisIndex.from_dataframe(
+        pd.DataFrame(rows, columns=['disorder_name', 'orpha_code', 'hpo_term', 'frequency_numeric'])
+    )
+
+
+def test_profiles_are_reproducible():
+    """Same seed, same corpus; present and absent symptoms never overlap"""
+    index = make_index()
+    profiles = make_profiles(index, n_profiles=20, seed=7)
+
+    assert corpus_hash(profiles) == corpus_hash(make_profiles(index, n_profiles=20, seed=7))
+    assert {p['kind'] for p in profiles} == set(PROFILE_KINDS)
+    for profile in profiles:
+        assert 1 <= len(profile['present']) <= index.n_symptoms
+        assert not set(profile['present']) & set(profile['absent'])
+
+
+def test_run_engine_summary():
+    """Percentiles are ordered and every profile is timed without a budget"""
+    assert summarize([]) == {'calls': 0}
+
+    profiles = make_profiles(make_index(), n_profiles=10)
+    result = run_engine(lambda profile: sum(range(1000)), profiles, warmup=1)
+
+    assert result['calls'] == 10 and result['complete']
+    assert result['p50_ms'] <= result['p95_ms'] <= result['p99_ms']
+    assert sum(result['by_kind'][kind]['calls'] for kind in PROFILE_KINDS) == 10
+    assert result['peak_rss_mb'] > 0
+
+
+def test_replay_slow_requests():
+    """Slow request log lines become 'replay' profiles; unknown symptoms are dropped"""
+    entries = [
+        {'request_id': 'a', 'request': {'present_symptoms': ['Seizure', 'Unknown'], 'absent_symptoms': ['Fever']}},
+        {'request_id': 'b', 'request': {'present_symptoms': ['Unknown'], 'absent_symptoms': []}},
+    ]
+    with tempfile.NamedTemporaryFile('w', suffix='.jsonl') as f:
+        f.write('\n'.join(json.dumps(entry) for entry in entries))
+        f.flush()
+        profiles = load_replay_profiles(f.name, make_index())
+
+    assert profiles == [{'kind': 'replay', 'present': ['Seizure'], 'absent': ['Fever'], 'request_id': 'a'}]
+    assert run_engine(lambda profile: None, profiles, warmup=0)['by_kind']['replay']['calls'] == 1
+
+
+if __name__ == "__main__":
+    for test in [test_profiles_are_reproducible, test_run_engine_summary, test_replay_slow_requests]:
+        test()
+        print(f"  ✓ {test.__name__}")
+
+    print("\nAll benchmark tests passed!")
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Test script for incremental delta ingestion between Orphanet releases (runs offline)
+"""
+
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from delta_ingest import DeltaTracker, FingerprintStore, compute_delta, frame_fingerprints, records_fingerprint
+from orphanet_extract import OrphanetExtractor
+
+ASSOCIATION = (
+    '<HPODisorderAssociation><HPO><HPOId>HP:{hpo:07d}</HPOId><HPOTerm>Sign {hpo}</HPOTerm></HPO>'
+    '<HPOFrequency><Name lang="en">{frequency}</Name></HPOFrequency></HPODisorderAssociation>'
+)
+
+
+def document(disorders: dict) -> str:
+    """Clinical signs XML for {orpha_code: [(hpo, frequency), ...]}"""
+    return (
+        '<?xml version="1.0" encoding="ISO-8859-1"?>\n<JDBOR><HPODisorderSetStatusList>'
+        + ''.join(
+            f'<HPODisorderSetStatus><Disorder id="{code}"><OrphaCode>{code}</OrphaCode>'
+            f'<Name lang="en">Disorder {code}</Name><HPODisorderAssociationList>'
+            + ''.join(ASSOCIATION.format(hpo=hpo, frequency=frequency) for hpo, frequency in signs)
+            + '</HPODisorderAssociationList></Disorder></HPODisorderSetStatus>'
+            for code, signs in disorders.items()
+        )
+        + '</HPODisorderSetStatusList></JDBOR>\n'
+    )
+
+
+def write_file(content: str, suffix: str) -> str:
+    with tempfile.NamedTemporaryFile('wb', suffix=suffix, delete=False) as f:
+        f.write(content.encode('iso-8859-1'))
+    return f.name
+
+
+def test_fingerprints_and_delta():
+    """Fingerprints ignore row order and whitespace; the delta splits codes into inserted / updated / deleted"""
+    rows = [{'hpo_id': 'HP:1', 'frequency': 'Frequent'}, {'hpo_id': 'HP:2', 'frequency': None}]
+    records = {'disorders': [{'orpha_code': '1'}], 'hpo_associations': rows}
+    shuffled = {'disorders': [{'orpha_code': '1'}], 'hpo_associations': [
+        {'hpo_id': 'HP:2', 'frequency': ''}, {'hpo_id': 'HP:1', 'frequency': ' Frequent '}]}
+    assert records_fingerprint(records) == records_fingerprint(shuffled)
+    assert records_fingerprint(records) != records_fingerprint({**records, 'hpo_associations': rows[:1]})
+    # Shared lookups and kinds outside the selection do not count
+    assert records_fingerprint(records) == records_fingerprint({**records, 'disorder_types': [{'name': 'x'}]})
+    assert records_fingerprint(records, ['disorders']) == records_fingerprint(shuffled, ['disorders'])
+
+    df = pd.DataFrame({'orpha_code': [1, 2, 1, 3], 'hpo_term': ['a', 'b', 'c', 'd'], 'freq': ['x', 'y', 'z', 'w']})
+    fingerprints = frame_fingerprints(df, 'orpha_code', ['hpo_term', 'freq'])
+    assert fingerprints == frame_fingerprints(df.iloc[::-1], 'orpha_code', ['hpo_term', 'freq'])
+    edited = df.assign(freq=['x', 'y', 'Z', 'w']).iloc[:3]
+    edited = pd.concat([edited, pd.DataFrame({'orpha_code': [4], 'hpo_term': ['e'], 'freq': ['v']})])
+
+    delta = compute_delta(fingerprints, frame_fingerprints(edited, 'orpha_code', ['hpo_term', 'freq']))
+    assert (delta.inserted, delta.updated, delta.deleted, delta.unchanged) == (['4'], ['1'], ['3'], 1)
+    assert delta.changed == ['1', '4'] and delta
+    assert not compute_delta(fingerprints, fingerprints)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = FingerprintStore(os.path.join(tmp, 'fingerprints.json'))
+        store.set('csv:clinical_signs', fingerprints)
+        store.save()
+        assert FingerprintStore(store.path).get('csv:clinical_signs') == fingerprints
+        assert FingerprintStore(store.path).get('other') == {}
+
+
+def test_tracker_selects_changed_disorders():
+    """The extractor only hands out disorders whose records changed since the previous load"""
+    first = write_file(document({58: [(1, 'Frequent'), (2, 'Occasional')], 166024: [(3, 'Frequent')]}),
+                       '_clinical_signs.xml')
+    second = write_file(document({58: [(2, 'Occasional'), (1, 'Frequent')], 166024: [(3, 'Very rare')],
+                                  93: [(4, 'Frequent')]}), '_clinical_signs.xml')
+    try:
+        kinds = ('disorders', 'hpo_terms', 'hpo_associations')
+        initial = DeltaTracker({}, kinds)
+        loaded = [b for b in OrphanetExtractor().iter_batches(first, kinds, select=initial) if b.kind == 'disorders']
+        assert [d['orpha_code'] for b in loaded for d in b.rows] == ['58', '166024']
+
+        tracker = DeltaTracker(initial.current, kinds)
+        batches = list(OrphanetExtractor().iter_batches(second, kinds, select=tracker))
+    finally:
+        os.unlink(first)
+        os.unlink(second)
+
+    written = {b.kind: [r.get('orpha_code', r.get('disorder_orpha_code')) for r in b.rows]
+               for b in batches if b.kind != 'hpo_terms'}
+    assert written == {'disorders': ['166024', '93'], 'hpo_associations': ['166024', '93']}
+    assert tracker.is_update('166024') and not tracker.is_update('93')
+    delta = tracker.delta()
+    assert (delta.inserted, delta.updated, delta.deleted, delta.unchanged) == (['93'], ['166024'], [], 1)
+
+
+class FakeTable:
+    """Supabase table stand-in for the XML loader: inserts get ids, `fail` makes inserts raise"""
+
+    def __init__(self, client, name):
+        self.client, self.name, self.data = client, name, []
+
+    def select(self, columns):
+        return self
+
+    def eq(self, column, value):
+        return self
+
+    def in_(self, column, values):
+        return self
+
+    def update(self, data):
+        return self
+
+    def delete(self):
+        return self
+
+    def insert(self, rows):
+        if self.name in self.client.fail:
+            raise RuntimeError(f"insert into {self.name} rejected")
+        rows = rows if isinstance(rows, list) else [rows]
+        self.data = [{'id': f"{self.name}-{len(self.client.rows)}"}]
+        self.client.rows.extend(rows)
+        return self
+
+    def execute(self):
+        return self
+
+
+class FakeSupabase:
+    def __init__(self, fail=()):
+        self.fail, self.rows = set(fail), []
+
+    def table(self, name):
+        return FakeTable(self, name)
+
+
+def test_failed_writes_keep_fingerprints():
+    """A delta pass with a failed batch leaves the stored fingerprints alone, so the next run retries"""
+    from orphanet_supabase_loader import OrphanetXMLLoader, SupabaseConfig
+
+    xml_file = write_file(document({58: [(1, 'Frequent')], 93: [(2, 'Occasional')]}), '_clinical_signs.xml')
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            store = FingerprintStore(os.path.join(tmp, 'fingerprints.json'))
+            loader = OrphanetXMLLoader(SupabaseConfig('http://localhost', 'key'), store)
+
+            loader.supabase = FakeSupabase(fail={'disorder_hpo_associations'})
+            try:
+                loader.load_file(xml_file, 'clinical_signs')
+                raise AssertionError("failed writes were recorded as loaded")
+            except RuntimeError as e:
+                assert 'fingerprints not updated' in str(e)
+            assert store.get('supabase:clinical_signs') == {} and not os.path.exists(store.path)
+
+            loader.supabase = FakeSupabase()
+            report = loader.load_file(xml_file, 'clinical_signs')
+            assert report['delta']['inserted'] == 2
+            assert sorted(FingerprintStore(store.path).get('supabase:clinical_signs')) == ['58', '93']
+    finally:
+        os.unlink(xml_file)
+
+
+class DeletionTable:
+    """Supabase table stand-in for the CSV loader: disorder ids equal orpha codes, deletes are recorded"""
+
+    def __init__(self, client, name):
+        self.client, self.name, self.data, self.deleting = client, name, [], False
+
+    def select(self, columns):
+        return self
+
+    def delete(self):
+        self.deleting = True
+        return self
+
+    def in_(self, column, values):
+        if not self.deleting:
+            self.data = [{'id': int(value)} for value in values]
+        elif self.name in self.client.missing:
+            raise RuntimeError(f"relation {self.name} does not exist")
+        else:
+            self.client.deleted.append((self.name, column, list(values)))
+        return self
+
+    def execute(self):
+        return self
+
+
+class DeletionSupabase:
+    def __init__(self, missing=()):
+        self.missing, self.deleted = set(missing), []
+
+    def table(self, name):
+        return DeletionTable(self, name)
+
+
+def test_csv_delta_deletes_disorders():
+    """Disorders dropped from the CSV lose their disorders row and every per-disorder row"""
+    from csv_data_loader import DISORDER_TABLES, FINGERPRINT_COLUMNS, FINGERPRINT_SCOPE, OrphanetCSVLoader
+
+    rows = pd.DataFrame({
+        'disorder_id': [1, 2], 'orpha_code': [58, 93], 'disorder_name': ['Alexander disease', 'Other'],
+        'disorder_type': ['Disease', 'Disease'], 'hpo_id': ['HP:0001250', 'HP:0001251'],
+        'hpo_term': ['Seizure', 'Ataxia'], 'hpo_frequency': ['Frequent (79-30%)', 'Occasional (29-5%)'],
+        'diagnostic_criteria': [None, None]
+    })
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_file = os.path.join(tmp, 'clinical_signs.csv')
+        rows[rows['orpha_code'] == 58].to_csv(csv_file, index=False)
+        store = FingerprintStore(os.path.join(tmp, 'fingerprints.json'))
+        store.set(FINGERPRINT_SCOPE, frame_fingerprints(rows, 'orpha_code', FINGERPRINT_COLUMNS))
+
+        loader = OrphanetCSVLoader('http://localhost', 'key')
+        loader.supabase = DeletionSupabase(missing={'disorder_synonyms'})
+        delta = loader.load_delta(csv_file, store)
+
+        assert (delta.deleted, delta.changed) == (['93'], [])
+        assert loader.supabase.deleted == [(table, 'disorder_id', [93]) for table in DISORDER_TABLES
+                                           if table != 'disorder_synonyms'] + [('disorders', 'id', [93])]
+        assert sorted(FingerprintStore(store.path).get(FINGERPRINT_SCOPE)) == ['58']
+
+
+def test_update_from_matches_rebuild():
+    """LocalFastDiagnosis.update_from patches the maps and index to what a full rebuild gives"""
+    from local_fast_diagnosis import LocalFastDiagnosis
+
+    columns = ['orpha_code', 'disorder_name', 'hpo_term', 'hpo_frequency']
+    release_1 = pd.DataFrame([
+        (1, 'Alpha syndrome', 'Seizure', 'Very frequent (99-80%)'),
+        (1, 'Alpha syndrome', 'Macrocephaly', 'Frequent (79-30%)'),
+        (2, 'Beta disease', 'Seizure', 'Occasional (29-5%)'),
+        (2, 'Beta disease', 'Fever', 'Very frequent (99-80%)'),
+        (3, 'Gamma disorder', 'Short stature', 'Very frequent (99-80%)'),
+    ], columns=columns)
+    release_2 = pd.concat([release_1[release_1['orpha_code'] == 1], pd.DataFrame([
+        (2, 'Beta disease', 'Fever', 'Frequent (79-30%)'),
+        (2, 'Beta disease', 'Ataxia', 'Very frequent (99-80%)'),
+        (4, 'Delta anomaly', 'Seizure', 'Occasional (29-5%)'),
+    ], columns=columns)])
+
+    previous = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        # Caches are written to the working directory; no Orphanet datasets are found there
+        os.chdir(tmp)
+        try:
+            release_1.to_csv('release_1.csv', index=False)
+            release_2.to_csv('release_2.csv', index=False)
+            patched = LocalFastDiagnosis()
+            assert patched.load_and_precompute('release_1.csv')
+            delta = patched.update_from('release_2.csv')
+            assert not patched.update_from('release_2.csv')
+
+            rebuilt = LocalFastDiagnosis()
+            assert rebuilt.load_and_precompute('release_2.csv')
+            cached = LocalFastDiagnosis()
+            assert cached.load_from_cache() and cached.fingerprints == rebuilt.fingerprints
+        finally:
+            os.chdir(previous)
+
+    assert (delta.inserted, delta.updated, delta.deleted, delta.unchanged) == (['4'], ['2'], ['3'], 1)
+    assert patched.disease_symptoms_map == rebuilt.disease_symptoms_map
+    assert patched.symptom_diseases_map == rebuilt.symptom_diseases_map
+    assert patched.symptom_disease_matrix == rebuilt.symptom_disease_matrix
+    assert (patched.symptoms_list, patched.diseases_list) == (rebuilt.symptoms_list, rebuilt.diseases_list)
+    assert patched.index.generation() == rebuilt.index.generation()
+    assert all(np.array_equal(patched.index.log_priors[m], rebuilt.index.log_priors[m])
+               for m in rebuilt.index.log_priors)
+
+    result = patched.ultra_fast_diagnosis(['Seizure', 'Ataxia'], top_n=3)
+    assert [r['disorder_name'] for r in result['results']] == \
+        [r['disorder_name'] for r in rebuilt.ultra_fast_diagnosis(['Seizure', 'Ataxia'], top_n=3)['results']]
+
+
+if __name__ == "__main__":
+    for test in [test_fingerprints_and_delta, test_tracker_selects_changed_disorders, test_failed_writes_keep_fingerprints,
+                 test_csv_delta_deletes_disorders, test_update_from_matches_rebuild]:
+        test()
+        print(f"  ✓ {test.__name__}")
+
+    print("\nAll delta ingestion tests passed!")
@@ -0,0 +1,480 @@
+#!/usr/bin/env python3
+"""
+Test script for the vectorized diagnosis index (runs offline on a small in-memory dataset)
+"""
+
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from classification_groups import build_group_index, UNCLASSIFIED_GROUP
+from diagnosis_index import DiagnosisIndex
+from disorder_filters import build_gene_bitsets, build_split_bitsets, expand_constraint, UNANNOTATED
+from hpo_ontology import HPOClosure, OntologyIndex
+import prevalence_priors
+from prevalence_priors import estimate_prevalences, load_prevalence_table, prior_weights
+
+
+def make_disease_data() -> pd.DataFrame:
+    """Three disorders sharing a few symptoms"""
+    rows = [
+        ('Alpha syndrome', 1, 'Seizure', 0.9),
+        ('Alpha syndrome', 1, 'Macrocephaly', 0.55),
+        ('Beta disease', 2, 'Seizure', 0.17),
+        ('Beta disease', 2, 'Fever', 0.9),
+        ('Beta disease', 2, 'Short stature', 0.55),
+        ('Gamma disorder', 3, 'Short stature', 0.9),
+    ]
+    return pd.DataFrame(rows, columns=['disorder_name', 'orpha_code', 'hpo_term', 'frequency_numeric'])
+
+
+def make_gene_data() -> pd.DataFrame:
+    """Gene associations as written by xml_to_csv_converter.py (synonyms pipe-delimited)"""
+    rows = [
+        (1, 'KIF7', 'JBTS12'),
+        (2, 'AGA', 'ASRG|glycosylasparaginase'),
+        (3, 'AGA', 'ASRG|glycosylasparaginase'),
+        (99, 'CWC27', None),
+    ]
+    return pd.DataFrame(rows, columns=['orpha_code', 'gene_symbol', 'gene_synonyms'])
+
+
+HPO_OBO = """format-version: 1.2
+
+[Term]
+id: HP:0000001
+name: All
+
+[Term]
+id: HP:0000118
+name: Phenotypic abnormality
+is_a: HP:0000001 ! All
+
+[Term]
+id: HP:0001250
+name: Seizure
+is_a: HP:0000118 ! Phenotypic abnormality
+
+[Term]
+id: HP:0007359
+name: Focal-onset seizure
+synonym: "Focal seizure" EXACT []
+is_a: HP:0001250 ! Seizure
+
+[Term]
+id: HP:0000256
+name: Macrocephaly
+is_a: HP:0000118 ! Phenotypic abnormality
+
+[Term]
+id: HP:0001945
+name: Fever
+is_a: HP:0000118 ! Phenotypic abnormality
+
+[Term]
+id: HP:0004322
+name: Short stature
+is_a: HP:0000118 ! Phenotypic abnormality
+
+[Term]
+id: HP:9999999
+name: Obsolete term
+is_obsolete: true
+"""
+
+
+def make_index() -> DiagnosisIndex:
+    index = DiagnosisIndex.from_dataframe(make_disease_data())
+    index.set_priors({'1': 1e-6, '2': 1e-4})
+    index.filters['gene'] = build_gene_bitsets(
+        index.orpha_codes,
+        make_gene_data(),
+        gene_synonyms=[{'gene_symbol': 'KIF7', 'synonym': 'Kinesin-7'}]
+    )
+    return index
+
+
+def reference_posterior(data: pd.DataFrame, present, absent, priors) -> dict:
+    """Loop-based posterior, as in calculate_true_bayesian_probability"""
+    unnormalized = {}
+    for disease, rows in data.groupby('disorder_name'):
+        freq_map = dict(zip(rows['hpo_term'], rows['frequency_numeric']))
+        likelihood = 1.0
+        for symptom in present:
+            likelihood *= freq_map.get(symptom, 0.01)
+        for symptom in absent:
+            if symptom in freq_map:
+                likelihood *= 1 - freq_map[symptom]
+        unnormalized[disease] = likelihood * priors[disease]
+    evidence = sum(unnormalized.values())
+    return {disease: value / evidence for disease, value in unnormalized.items()}
+
+
+def test_index_structure():
+    """CSR rows hold one posting per disease-symptom pair"""
+    index = make_index()
+
+    assert index.n_diseases == 3
+    assert index.n_symptoms == 4
+    assert len(index.indices) == 6
+    assert index.total_symptoms.tolist() == [2, 3, 1]
+
+    diseases, freqs = index.symptom_row(index.symptom_ids['Seizure'])
+    assert sorted(index.disease_names[d] for d in diseases) == ['Alpha syndrome', 'Beta disease']
+
+
+def test_posterior_matches_reference():
+    """Vectorized posterior equals the loop-based computation for every prior mode"""
+    data = make_disease_data()
+    index = make_index()
+    present, absent = ['Seizure', 'Short stature'], ['Fever']
+
+    for mode in ('uniform', 'association', 'prevalence'):
+        priors = dict(zip(index.disease_names, np.exp(index.log_priors[mode])))
+        expected = reference_posterior(data, present, absent, priors)
+
+        posterior = index.posterior(
+            [index.symptom_ids[s] for s in present],
+            [index.symptom_ids[s] for s in absent],
+            prior=mode
+        )
+        for disease, probability in expected.items():
+            assert abs(posterior[index.disease_ids[disease]] - probability) < 1e-6
+
+
+def test_sharded_index_matches_serial():
+    """CSR rows built in symptom-range shards concatenate into the serial index, counts and IC included"""
+    from concurrent.futures import ProcessPoolExecutor
+
+    serial = make_index()
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        for jobs in (2, 3, 10):
+            sharded = DiagnosisIndex.from_dataframe(make_disease_data(), jobs, executor)
+            assert sharded.generation() == serial.generation()
+            assert np.array_equal(sharded.indptr, serial.indptr)
+            assert np.array_equal(sharded.total_symptoms, serial.total_symptoms)
+            assert np.array_equal(sharded.symptom_ic, serial.symptom_ic)
+
+
+def test_save_and_load():
+    """Index and prior vectors survive a round trip through .npz"""
+    index = make_index()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'index.npz')
+        index.save(path)
+        loaded = DiagnosisIndex.load(path)
+
+    assert loaded.disease_names == index.disease_names
+    assert loaded.orpha_codes == index.orpha_codes
+    assert np.array_equal(loaded.indices, index.indices)
+    assert np.allclose(loaded.log_priors['prevalence'], index.log_priors['prevalence'])
+    assert np.array_equal(loaded.filters['gene'].bits, index.filters['gene'].bits)
+    assert loaded.filters['gene'].mask(['asrg']).tolist() == [False, True, True]
+
+
+def test_gene_filter():
+    """Symbols and synonyms share one bitset; restricting renormalizes over the candidates"""
+    index = make_index()
+    genes = index.filters['gene']
+
+    assert genes.mask(['AGA']).tolist() == [False, True, True]
+    assert genes.mask(['glycosylasparaginase']).tolist() == genes.mask(['AGA']).tolist()
+    assert genes.mask(['kinesin-7', 'JBTS12']).tolist() == [True, False, False]
+    assert genes.mask(['KIF7', 'AGA']).tolist() == [True, True, True]
+
+    # CWC27 is only associated with a disorder outside the index
+    mask, unknown = index.candidate_mask({'gene': ['AGA', 'CWC27', 'NOPE']})
+    assert mask.tolist() == [False, True, True]
+    assert unknown['gene'] == ['CWC27', 'NOPE']
+
+    present = [index.symptom_ids['Seizure']]
+    posterior = index.posterior(present, prior='uniform', mask=mask)
+    assert posterior[0] == 0.0
+    assert abs(posterior.sum() - 1.0) < 1e-9
+
+    unrestricted = index.posterior(present, prior='uniform')
+    expected = unrestricted[1:] / unrestricted[1:].sum()
+    assert np.allclose(posterior[1:], expected)
+
+
+def test_natural_history_filters():
+    """Pipe-delimited onset values become bitsets; unannotated disorders can be kept or dropped"""
+    index = make_index()
+    natural_history = pd.DataFrame([
+        (1, 'Infancy|Neonatal', 'Autosomal recessive'),
+        (2, 'All ages', 'No data available'),
+    ], columns=['orpha_code', 'age_of_onset', 'type_of_inheritance'])
+
+    index.filters['onset'] = build_split_bitsets(index.orpha_codes, natural_history, 'age_of_onset')
+    index.filters['inheritance'] = build_split_bitsets(index.orpha_codes, natural_history, 'type_of_inheritance')
+
+    assert index.filters['onset'].values == ['All ages', 'Infancy', 'Neonatal', UNANNOTATED]
+    assert index.filters['inheritance'].mask([UNANNOTATED]).tolist() == [False, True, True]
+
+    # 'All ages' matches any onset; disorder 3 has no natural history at all
+    mask, _ = index.candidate_mask({'onset': expand_constraint('onset', ['Neonatal'], include_unannotated=False)})
+    assert mask.tolist() == [True, True, False]
+    mask, _ = index.candidate_mask({'onset': expand_constraint('onset', ['Adult'])})
+    assert mask.tolist() == [False, True, True]
+
+    # Constraints on different filters are ANDed
+    mask, _ = index.candidate_mask({
+        'onset': expand_constraint('onset', ['Neonatal'], include_unannotated=False),
+        'inheritance': expand_constraint('inheritance', ['Autosomal recessive'], include_unannotated=False),
+        'gene': ['KIF7', 'AGA']
+    })
+    assert mask.tolist() == [True, False, False]
+
+
+def test_group_rollup():
+    """Group mass is the bincount of the posterior; unclassified disorders get their own group"""
+    index = make_index()
+    linearisation = pd.DataFrame([
+        (1, 98006, 'Rare neurologic disease', 'Preferential parent'),
+        (2, 98006, 'Rare neurologic disease', 'Preferential parent'),
+        (3, None, None, None),
+    ], columns=['orpha_code', 'target_disorder_code', 'target_disorder_name', 'association_type'])
+    index.set_groups(*build_group_index(index.orpha_codes, linearisation))
+
+    assert index.group_names == ['Rare neurologic disease', UNCLASSIFIED_GROUP]
+    assert index.group_codes == ['98006', '']
+    assert index.group_ids.tolist() == [0, 0, 1]
+
+    posterior = index.posterior([index.symptom_ids['Seizure']], prior='uniform')
+    rollup = index.group_rollup(posterior, top_groups=2, per_group=1)
+
+    group_id, mass, count, disease_ids = rollup[0]
+    assert group_id == 0 and count == 2
+    assert abs(mass - posterior[:2].sum()) < 1e-9
+    assert disease_ids.tolist() == [int(np.argmax(posterior[:2]))]
+    assert abs(sum(group[1] for group in rollup) - 1.0) < 1e-9
+
+    # Groups left without candidates are dropped before the top groups are taken
+    rollup = index.group_rollup(posterior, top_groups=2, mask=np.array([False, False, True]))
+    assert [group[0] for group in rollup] == [1]
+    assert mass > rollup[0][1]
+    rollup = index.group_rollup(posterior, top_groups=1, mask=np.array([False, False, True]))
+    assert [group[0] for group in rollup] == [1]
+
+
+def reference_propagated(ontology: OntologyIndex, index: DiagnosisIndex, present_terms, absent_ids) -> np.ndarray:
+    """Per-term ancestor walk over the symptom rows, as propagated_log_likelihood did before the propagation CSR"""
+    log_lik = np.zeros(index.n_diseases)
+    with np.errstate(divide='ignore'):
+        for term in present_terms:
+            best = np.full(index.n_diseases, -1.0)
+            own = ontology.term_symptoms[term]
+            for ancestor in ontology.closure.ancestors(term):
+                symptom_id = ontology.term_symptoms[ancestor]
+                if symptom_id >= 0 and symptom_id != own:
+                    diseases, freqs = index.symptom_row(symptom_id)
+                    best[diseases] = np.maximum(best[diseases], freqs)
+            if own >= 0:
+                diseases, freqs = index.symptom_row(own)
+                best[diseases] = freqs
+            log_lik += np.where(best < 0, np.log(0.01), np.log(np.maximum(best, 0.0)))
+        for symptom_id in absent_ids:
+            diseases, freqs = index.symptom_row(symptom_id)
+            log_lik[diseases] += np.log1p(-freqs)
+    return log_lik
+
+
+def test_ontology_scoring():
+    """Closure is ancestor-or-self; a child term is explained by annotations of its ancestors"""
+    index = make_index()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'hp.obo')
+        with open(path, 'w') as f:
+            f.write(HPO_OBO)
+        closure = HPOClosure.from_obo(path)
+
+    assert closure.n_terms == 7
+    focal = closure.resolve('focal seizure')
+    assert focal == closure.resolve('HP:0007359')
+    assert sorted(closure.term_names[t] for t in closure.ancestors(focal)) == \
+        ['All', 'Focal-onset seizure', 'Phenotypic abnormality', 'Seizure']
+
+    index.ontology = OntologyIndex.from_index(closure, index)
+
+    # "Focal seizure" scores exactly like the annotated parent "Seizure"
+    fever = [index.symptom_ids['Fever']]
+    propagated = index.ontology.propagated_log_likelihood(index, [focal], fever)
+    expected = index.log_likelihood([index.symptom_ids['Seizure']], fever)
+    assert np.allclose(propagated, expected)
+
+    # Terms annotated on every disorder carry no information
+    seizure = closure.resolve('Seizure')
+    assert abs(index.ontology.term_ic[seizure] - np.log(3 / 2)) < 1e-9
+    assert index.ontology.term_ic[closure.resolve('Phenotypic abnormality')] == 0.0
+
+    similarity = index.ontology.ic_similarity([focal], index.n_diseases)
+    assert similarity.tolist() == [1.0, 1.0, 0.0]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'index.npz')
+        index.save(path)
+        loaded = DiagnosisIndex.load(path)
+    assert np.array_equal(loaded.ontology.term_indices, index.ontology.term_indices)
+    assert np.array_equal(loaded.ontology.prop_freqs, index.ontology.prop_freqs)
+    assert loaded.ontology.closure.resolve('Focal seizure') == focal
+
+    # Indexes saved before the propagation CSR existed are joined to the closure again on load
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'index.npz')
+        index.save(path)
+        with np.load(path) as data:
+            arrays = {key: data[key] for key in data.files if '_prop_' not in key}
+        np.savez(path, **arrays)
+        assert np.array_equal(DiagnosisIndex.load(path).ontology.prop_indptr, index.ontology.prop_indptr)
+
+
+def test_propagation_matches_reference():
+    """The propagation CSR gives the per-term ancestor walk: own annotations win, excluded ones score -inf"""
+    data = pd.concat([make_disease_data(), pd.DataFrame([
+        ('Alpha syndrome', 1, 'Focal-onset seizure', 0.17),
+        ('Gamma disorder', 3, 'Phenotypic abnormality', 0.0),
+        ('Delta disease', 4, 'Phenotypic abnormality', 0.55),
+        ('Delta disease', 4, 'Seizure', 0.025),
+    ], columns=['disorder_name', 'orpha_code', 'hpo_term', 'frequency_numeric'])], ignore_index=True)
+    index = DiagnosisIndex.from_dataframe(data)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'hp.obo')
+        with open(path, 'w') as f:
+            f.write(HPO_OBO)
+        ontology = OntologyIndex.from_index(HPOClosure.from_obo(path), index)
+
+    terms = {name: ontology.closure.resolve(name) for name in ['Focal seizure', 'Seizure', 'Fever', 'All', 'Short stature']}
+    absent = [index.symptom_ids['Macrocephaly']]
+    for present in [[terms['Focal seizure']], [terms['Seizure'], terms['Fever']], [terms['All']],
+                    [terms['Short stature'], terms['Focal seizure'], terms['Focal seizure']], []]:
+        expected = reference_propagated(ontology, index, present, absent)
+        propagated = ontology.propagated_log_likelihood(index, present, absent)
+        assert np.array_equal(np.isneginf(propagated), np.isneginf(expected))
+        assert np.allclose(propagated[np.isfinite(expected)], expected[np.isfinite(expected)])
+
+
+def test_ic_weighting():
+    """Symptom IC, vectorized fast-mode scores and low-IC pruning"""
+    index = make_index()
+    ids = index.symptom_ids
+
+    assert abs(index.symptom_ic[ids['Seizure']] - np.log(3 / 2)) < 1e-9
+    assert abs(index.symptom_ic[ids['Fever']] - np.log(3)) < 1e-9
+
+    # Uniform weights reproduce the additive score with the absent symptom penalty
+    scores, matches, touched = index.weighted_scores([ids['Seizure'], ids['Fever']], [ids['Short stature']])
+    alpha, beta, gamma = (index.disease_ids[name] for name in ('Alpha syndrome', 'Beta disease', 'Gamma disorder'))
+    assert abs(scores[alpha] - 0.9) < 1e-6
+    assert abs(scores[beta] - (0.17 + 0.9) * (1 - 0.3 * 0.55)) < 1e-6
+    assert matches.tolist() == [1, 2, 0]
+    assert touched.tolist() == [True, True, False]
+
+    # IC weights favour the rarer symptom and keep a mean of 1
+    weights = index.ic_weights([ids['Seizure'], ids['Fever']])
+    assert weights[1] > weights[0] and abs(weights.mean() - 1.0) < 1e-9
+
+    # Seizure is below min_ic: it still scores Alpha but no longer brings in Beta
+    present = [ids['Seizure'], ids['Macrocephaly']]
+    scores, _, touched = index.weighted_scores(present, min_ic=np.log(2))
+    assert touched.tolist() == [True, False, False]
+    assert abs(scores[alpha] - (0.9 + 0.55)) < 1e-6
+    assert index.split_by_ic([ids['Seizure']], min_ic=np.log(2)) == ([ids['Seizure']], [])
+
+
+def test_prevalence_estimates():
+    """Worldwide values beat regional ones, exact values beat class midpoints"""
+    epidemiology = pd.DataFrame([
+        (1, 'Point prevalence', 'Value and class', '1-9 / 100 000', 2.0, 'Worldwide'),
+        (1, 'Point prevalence', 'Value and class', '1-9 / 100 000', 8.0, 'Europe'),
+        (2, 'Point prevalence', 'Class only', '1-5 / 10 000', 0.0, 'France'),
+        (3, 'Cases/families', 'Case(s)', None, 12.0, 'Worldwide'),
+    ], columns=['orpha_code', 'prevalence_type', 'prevalence_qualification',
+                'prevalence_class', 'val_moy', 'prevalence_geographic'])
+
+    prevalences = estimate_prevalences(epidemiology)
+    assert abs(prevalences['1'] - 2e-5) < 1e-12
+    assert abs(prevalences['2'] - 3e-4) < 1e-12
+    assert prevalences['3'] < prevalences['1']
+
+    weights = prior_weights('prevalence', ['1', '2', '4'], prevalences=prevalences)
+    assert abs(weights.sum() - 1.0) < 1e-9
+    assert weights[1] > weights[0]
+
+
+def test_prevalence_table_filters():
+    """load_prevalence_table takes its filters from the arguments, else from the configured defaults"""
+    with tempfile.TemporaryDirectory() as data_dir:
+        pd.DataFrame([
+            (1, 'Point prevalence', 'Value and class', '1-9 / 100 000', 2.0, 'Worldwide'),
+            (1, 'Point prevalence', 'Value and class', '1-9 / 100 000', 8.0, 'Europe'),
+            (2, 'Annual incidence', 'Value and class', '1-9 / 100 000', 4.0, 'Europe'),
+        ], columns=prevalence_priors.EPIDEMIOLOGY_COLUMNS).to_csv(
+            os.path.join(data_dir, prevalence_priors.EPIDEMIOLOGY_PRODUCT + '.csv'), index=False
+        )
+
+        assert load_prevalence_table(data_dirs=[data_dir]) == {'1': 2e-5, '2': 4e-5}
+        assert load_prevalence_table(['Europe'], data_dirs=[data_dir]) == {'1': 8e-5, '2': 4e-5}
+        assert load_prevalence_table(geographic_fallback=False, data_dirs=[data_dir]) == {'1': 2e-5}
+        assert load_prevalence_table(prevalence_types=['Annual incidence'], data_dirs=[data_dir]) == {'2': 4e-5}
+
+        configured = (prevalence_priors.PREVALENCE_GEOGRAPHIC, prevalence_priors.PREVALENCE_GEOGRAPHIC_FALLBACK)
+        try:
+            prevalence_priors.PREVALENCE_GEOGRAPHIC = ['Europe']
+            prevalence_priors.PREVALENCE_GEOGRAPHIC_FALLBACK = False
+            assert load_prevalence_table(data_dirs=[data_dir]) == {'1': 8e-5, '2': 4e-5}
+        finally:
+            prevalence_priors.PREVALENCE_GEOGRAPHIC, prevalence_priors.PREVALENCE_GEOGRAPHIC_FALLBACK = configured
+
+
+def test_apply_delta_matches_rebuild():
+    """Patching changed and removed disorders gives the index a full rebuild would"""
+    index = make_index()
+    data = make_disease_data()
+
+    changed = pd.DataFrame([
+        ('Beta disease', 2, 'Fever', 0.55),
+        ('Beta disease', 2, 'Ataxia', 0.9),
+        ('Delta anomaly', 4, 'Seizure', 0.17),
+        ('Delta anomaly', 4, 'Ataxia', 0.55),
+    ], columns=data.columns)
+    patched = pd.concat([data[~data['orpha_code'].isin([2, 3])], changed], ignore_index=True)
+    prevalences = {'1': 1e-6, '2': 1e-4}
+
+    delta_index = index.apply_delta(changed, removed_codes=['3'], prevalences=prevalences)
+    rebuilt = DiagnosisIndex.from_dataframe(patched)
+    rebuilt.set_priors(prevalences)
+
+    assert delta_index.disease_names == rebuilt.disease_names == ['Alpha syndrome', 'Beta disease', 'Delta anomaly']
+    assert delta_index.orpha_codes == rebuilt.orpha_codes == ['1', '2', '4']
+    assert delta_index.symptom_names == rebuilt.symptom_names
+    for name in ('indptr', 'indices', 'freqs'):
+        assert np.array_equal(getattr(delta_index, name), getattr(rebuilt, name)), name
+    assert delta_index.generation() == rebuilt.generation()
+    assert all(np.array_equal(delta_index.log_priors[m], rebuilt.log_priors[m]) for m in rebuilt.log_priors)
+
+    # The disorder list changed, so the gene filter has to be re-attached by the caller
+    assert 'gene' not in delta_index.filters
+
+    # Same disorders with new frequencies: the filters stay valid and are kept
+    same = index.apply_delta(data[data['orpha_code'] == 1].assign(frequency_numeric=0.17))
+    assert 'gene' in same.filters and same.disease_names == index.disease_names
+    assert abs(same.log_likelihood([same.symptom_ids['Seizure']], [])[0] - np.log(0.17)) < 1e-6
+
+
+if __name__ == "__main__":
+    print("Testing vectorized diagnosis index")
+    print("=" * 60)
+
+    for test in [test_index_structure, test_posterior_matches_reference, test_sharded_index_matches_serial,
+                 test_save_and_load, test_gene_filter, test_natural_history_filters,
+                 test_group_rollup, test_ontology_scoring, test_propagation_matches_reference, test_ic_weighting,
+                 test_prevalence_estimates, test_prevalence_table_filters, test_apply_delta_matches_rebuild]:
+        test()
+        print(f"  ✓ {test.__name__}")
+
+    print("\nAll diagnosis index tests passed!")
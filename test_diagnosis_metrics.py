@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Test script for the Prometheus metrics and stage timers (runs offline, no server needed)
+"""
+
+from fastapi import FastAPI
+from fastapi.responses import Response
+from fastapi.testclient import TestClient
+
+from diagnosis_metrics import Counter, Histogram, MetricsRegistry, StageTimer, track_requests, registry, REQUEST_SECONDS
+
+
+def test_exposition_format():
+    """Cumulative buckets, +Inf, sum and count per label set"""
+    metrics = MetricsRegistry()
+    hits = metrics.register(Counter('cache_events', 'Cache lookups', ['result']))
+    latency = metrics.register(Histogram('latency_seconds', 'Latency', ['stage'], buckets=(0.1, 1.0)))
+
+    hits.inc(result='hit')
+    hits.inc(2, result='miss')
+    for value in (0.05, 0.5, 5.0):
+        latency.observe(value, stage='scoring')
+
+    lines = metrics.render().splitlines()
+    assert '# TYPE cache_events counter' in lines
+    assert 'cache_events_total{result="miss"} 2' in lines
+    assert 'latency_seconds_bucket{stage="scoring",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{stage="scoring",le="1"} 2' in lines
+    assert 'latency_seconds_bucket{stage="scoring",le="+Inf"} 3' in lines
+    assert 'latency_seconds_sum{stage="scoring"} 5.55' in lines
+    assert latency.count(stage='scoring') == 3 and hits.value(result='hit') == 1
+
+
+def test_stage_timer():
+    """Laps accumulate per stage, merged engine timings add up, skipped time is dropped"""
+    timer = StageTimer()
+    timer.lap('validation')
+    timer.merge({'scoring': 2.0, 'validation': 1.0})
+    timer.skip()
+    timer.lap('serialization')
+
+    assert list(timer.timings_ms) == ['validation', 'scoring', 'serialization']
+    assert timer.timings_ms['scoring'] == 2.0 and timer.timings_ms['validation'] >= 1.0
+    assert all(isinstance(value, float) for value in timer.rounded().values())
+
+
+def test_request_middleware():
+    """Requests are labelled by route template, not by raw URL"""
+    app = FastAPI()
+    app.middleware("http")(track_requests)
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: int):
+        return {'id': item_id}
+
+    @app.get("/metrics")
+    async def metrics():
+        return Response(registry.render())
+
+    client = TestClient(app)
+    before = REQUEST_SECONDS.count(method='GET', path='/items/{item_id}', status='200')
+    client.get('/items/1')
+    client.get('/items/2')
+    client.get('/missing')
+
+    assert REQUEST_SECONDS.count(method='GET', path='/items/{item_id}', status='200') == before + 2
+    assert REQUEST_SECONDS.count(method='GET', path='unmatched', status='404') >= 1
+    assert 'diagnosis_http_request_seconds_count{method="GET",path="/items/{item_id}",status="200"}' in client.get('/metrics').text
+
+
+if __name__ == "__main__":
+    for test in [test_exposition_format, test_stage_timer, test_request_middleware]:
+        test()
+        print(f"  ✓ {test.__name__}")
+
+    print("\nAll metrics tests passed!")
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Test script for the vectorized fast diagnosis table preprocessing (runs offline, no Supabase calls)
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+
+from fast_diagnosis_setup import (FREQUENCY_MAPPING, disorder_table, iter_upload_batches, probability_table,
+                                  symptom_table)
+from fast_dimensions import assign_ids
+
+
+def make_disease_data() -> pd.DataFrame:
+    """Clinical signs rows with a repeated symptom, a missing HPO id and an unknown frequency class"""
+    rows = [
+        (1, 'Alpha syndrome', 'HP:0001250', 'Seizure', 'Very frequent (99-80%)'),
+        (1, 'Alpha syndrome', 'HP:0000256', 'Macrocephaly', 'Frequent (79-30%)'),
+        (2, 'Beta disease', 'HP:0001945', 'Fever', None),
+        (2, 'Beta disease', 'HP:0001250', 'Seizure', 'Occasional (29-5%)'),
+        (3, 'Gamma disorder', None, 'Short stature', ' Very frequent (99-80%) '),
+        (3, 'Gamma disorder', 'HP:0000256', 'Macrocephaly', 'Obligate (100%)'),
+    ]
+    df = pd.DataFrame(rows, columns=['orpha_code', 'disorder_name', 'hpo_id', 'hpo_term', 'hpo_frequency'])
+    df['frequency_numeric'] = df['hpo_frequency'].astype(str).str.strip().map(FREQUENCY_MAPPING).fillna(0.5)
+    return df
+
+
+def make_ids(df: pd.DataFrame):
+    """Disorder ids by orpha code and symptom ids by term; 'Seizure' keeps the id of an earlier load"""
+    return (assign_ids(df['orpha_code'].astype(str), {}),
+            assign_ids(df['hpo_term'], {'Seizure': 7, 'Obsolete term': 9}))
+
+
+def reference_tables(df: pd.DataFrame, disorder_ids, symptom_ids):
+    """Loop-based tables, as populate_fast_tables / precompute_probabilities built them before"""
+    disorders = [{'id': disorder_ids[str(row['orpha_code'])], 'orpha_code': str(row['orpha_code']),
+                  'name': row['disorder_name'], 'total_symptoms': len(df[df['disorder_name'] == row['disorder_name']])}
+                 for _, row in df[['orpha_code', 'disorder_name']].drop_duplicates().iterrows()]
+    symptoms = [{'id': symptom_ids[row['hpo_term']], 'hpo_id': str(row['hpo_id']) if pd.notna(row['hpo_id']) else None,
+                 'term': row['hpo_term'], 'total_diseases': len(df[df['hpo_term'] == row['hpo_term']])}
+                for _, row in df[['hpo_id', 'hpo_term']].drop_duplicates().iterrows()]
+    probabilities = [{'symptom_id': symptom_ids[symptom], 'disorder_id': disorder_ids[str(row['orpha_code'])],
+                      'probability': float(row['frequency_numeric']),
+                      'confidence': float(min(1.0, row['frequency_numeric'] * 1.2)), 'matching_score': 1}
+                     for symptom in df['hpo_term'].unique()
+                     for _, row in df[df['hpo_term'] == symptom].iterrows()]
+    return disorders, symptoms, probabilities
+
+
+def records(table: pd.DataFrame, batch_size: int = 4) -> list:
+    return [row for batch in iter_upload_batches(table, batch_size) for row in batch]
+
+
+def test_tables_match_reference():
+    """groupby / value_counts tables equal the per-row loops, row order included"""
+    df = make_disease_data()
+    assert df['frequency_numeric'].tolist() == [0.9, 0.55, 0.5, 0.17, 0.9, 0.5]
+
+    disorder_ids, symptom_ids = make_ids(df)
+    assert disorder_ids == {'1': 1, '2': 2, '3': 3}
+    assert symptom_ids == {'Seizure': 7, 'Macrocephaly': 10, 'Fever': 11, 'Short stature': 12}
+
+    disorders, symptoms, probabilities = reference_tables(df, disorder_ids, symptom_ids)
+    assert records(disorder_table(df, disorder_ids)) == disorders
+    assert records(symptom_table(df, symptom_ids)) == symptoms
+    assert records(probability_table(df, symptom_ids, disorder_ids)) == probabilities
+    assert [row['symptom_id'] for row in probabilities[:2]] == [7, 7]
+
+
+def test_repeated_pair_keeps_last_frequency():
+    """A repeated (symptom, disorder) pair gives one row per upsert conflict key"""
+    df = make_disease_data()
+    repeated = df.iloc[[0]].assign(hpo_frequency='Occasional (29-5%)', frequency_numeric=0.17)
+    df = pd.concat([df, repeated], ignore_index=True)
+    disorder_ids, symptom_ids = make_ids(df)
+    table = probability_table(df, symptom_ids, disorder_ids)
+    assert len(table) == len(df) - 1
+    assert not table.duplicated(['symptom_id', 'disorder_id']).any()
+    assert table[(table['symptom_id'] == 7) & (table['disorder_id'] == 1)]['probability'].tolist() == [0.17]
+
+
+def test_upload_batches():
+    """Batches are sized as requested and hold JSON-serializable native values"""
+    df = make_disease_data()
+    disorder_ids, symptom_ids = make_ids(df)
+    table = probability_table(df, symptom_ids, disorder_ids)
+    batches = list(iter_upload_batches(table, 4))
+    assert [len(batch) for batch in batches] == [4, 2]
+    assert list(iter_upload_batches(table.iloc[:0], 4)) == []
+
+    json.dumps(batches)
+    row = batches[0][0]
+    assert type(row['probability']) is float and type(row['matching_score']) is int and type(row['symptom_id']) is int
+    assert np.isclose(row['confidence'], 1.0)
+
+
+if __name__ == "__main__":
+    for test in [test_tables_match_reference, test_repeated_pair_keeps_last_frequency, test_upload_batches]:
+        test()
+        print(f"  ✓ {test.__name__}")
+
+    print("\nAll fast diagnosis setup tests passed!")
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Test script for the integer-keyed fast tables: id assignment, dimension paging and main_fast's
+name <-> id translation (runs offline against an in-memory stand-in for the Supabase client)
+"""
+
+import asyncio
+
+import fast_dimensions
+import main_fast
+from fast_dimensions import DimensionMap, assign_ids, fetch_all, keyset_filter
+
+
+def split_filters(filters):
+    """Top-level comma-separated terms of a PostgREST logical filter"""
+    terms, depth, start = [], 0, 0
+    for i, char in enumerate(filters):
+        depth += {'(': 1, ')': -1}.get(char, 0)
+        if char == ',' and depth == 0:
+            terms.append(filters[start:i])
+            start = i + 1
+    return terms + [filters[start:]]
+
+
+def matches(row, term):
+    """Whether a row satisfies one filter term: column.op.value or and(...)"""
+    if term.startswith('and('):
+        return all(matches(row, part) for part in split_filters(term[4:-1]))
+    column, op, value = term.split('.')
+    return {'eq': row[column] == int(value), 'gt': row[column] > int(value)}[op]
+
+
+class FakeQuery:
+    """The PostgREST query builder calls main_fast and fetch_all use, over in-memory rows"""
+
+    def __init__(self, client, rows):
+        self.client, self.rows, self.columns, self.orders, self.count = client, rows, None, [], None
+
+    def select(self, columns):
+        self.columns = [column.strip() for column in columns.split(',')]
+        return self
+
+    def order(self, column, desc=False):
+        self.orders.append(column)
+        return self
+
+    def limit(self, count):
+        self.count = count
+        return self
+
+    def in_(self, column, values):
+        self.rows = [row for row in self.rows if row[column] in values]
+        return self
+
+    def gt(self, column, value):
+        self.rows = [row for row in self.rows if row[column] > value]
+        return self
+
+    def or_(self, filters):
+        self.rows = [row for row in self.rows if any(matches(row, term) for term in split_filters(filters))]
+        return self
+
+    def execute(self):
+        """Rows in order (first order() call first), cut to the limit and to the server's max-rows"""
+        self.client.requests += 1
+        rows = sorted(self.rows, key=lambda row: [row[column] for column in self.orders])
+        if self.count is not None:
+            rows = rows[:self.count]
+        self.data = [{column: row[column] for column in self.columns} for row in rows[:self.client.max_rows]]
+        return self
+
+
+class FakeClient:
+    def __init__(self, tables, max_rows=1000):
+        self.tables, self.requests, self.max_rows = tables, 0, max_rows
+
+    def table(self, name):
+        return FakeQuery(self, self.tables[name])
+
+
+TABLES = {
+    'fast_symptoms': [{'id': i, 'term': term} for i, term in [(1, 'Seizure'), (2, 'Fever'), (5, 'Macrocephaly')]],
+    'fast_disorders': [
+        {'id': 1, 'orpha_code': '58', 'name': 'Alexander disease', 'total_symptoms': 12},
+        {'id': 2, 'orpha_code': '166', 'name': 'Beta disease', 'total_symptoms': 4},
+    ],
+    'symptom_disease_probs': [
+        {'symptom_id': 1, 'disorder_id': 1, 'probability': 0.9, 'confidence': 1.0},
+        {'symptom_id': 1, 'disorder_id': 2, 'probability': 0.17, 'confidence': 0.204},
+        {'symptom_id': 5, 'disorder_id': 1, 'probability': 0.55, 'confidence': 0.66},
+        {'symptom_id': 2, 'disorder_id': 2, 'probability': 0.9, 'confidence': 1.0},
+    ],
+}
+
+
+def test_assign_ids_keeps_existing():
+    """Known keys keep their id; new keys follow the largest id in first-appearance order"""
+    assert assign_ids(['b', 'a', 'b', 'c'], {'a': 4, 'z': 9}) == {'b': 10, 'a': 4, 'c': 11}
+    assert assign_ids(['x', 'y'], {}) == {'x': 1, 'y': 2}
+
+
+def test_fetch_all_pages_dimension():
+    """Dimension tables larger than a response page are read completely, in id order"""
+    client = FakeClient({'fast_symptoms': [{'id': i, 'term': f"t{i}"} for i in range(7, 0, -1)]})
+    rows = fetch_all(client, 'fast_symptoms', 'id, term', page_size=3)
+    assert [row['id'] for row in rows] == list(range(1, 8)) and client.requests == 3
+
+    symptoms = DimensionMap(rows, 'term')
+    assert symptoms.ids_of(['t3', 'unknown', 't1', 't3']) == [3, 1]
+    assert symptoms.name_of(5) == 't5' and symptoms.id_of('t7') == 7 and len(symptoms) == 7
+
+
+def test_keyset_paging():
+    """Pages continue after the last key instead of an offset; the key must be selected"""
+    assert keyset_filter(('id',), {'id': 7}) == 'id.gt.7'
+    assert keyset_filter(('symptom_id', 'disorder_id'), {'symptom_id': 1, 'disorder_id': 2}) == \
+        'symptom_id.gt.1,and(symptom_id.eq.1,disorder_id.gt.2)'
+
+    client = FakeClient({'symptom_disease_probs': TABLES['symptom_disease_probs']})
+    rows = fetch_all(client, 'symptom_disease_probs', 'symptom_id, disorder_id', order=('symptom_id', 'disorder_id'),
+                     in_=('symptom_id', [1, 5]), page_size=1)
+    assert [(row['symptom_id'], row['disorder_id']) for row in rows] == [(1, 1), (1, 2), (5, 1)]
+    try:
+        fetch_all(client, 'symptom_disease_probs', 'disorder_id', order=('symptom_id', 'disorder_id'))
+        raise AssertionError("paged without selecting the key")
+    except ValueError:
+        pass
+
+
+def test_diagnosis_by_id_arrays():
+    """One id-array query per symptom list; names, orpha codes and totals come from memory"""
+    client = FakeClient(TABLES)
+    main_fast.supabase_client = client
+    main_fast.symptom_map = DimensionMap(fetch_all(client, 'fast_symptoms', 'id, term'), 'term')
+    main_fast.disorder_map = DimensionMap(
+        fetch_all(client, 'fast_disorders', 'id, orpha_code, name, total_symptoms'), 'orpha_code')
+    client.requests = 0
+
+    result = asyncio.run(main_fast.fast_diagnosis(['Seizure', 'Macrocephaly'], ['Fever'], top_n=5))
+    assert client.requests == 2
+    alexander, beta = result['results']
+    assert (alexander.disorder_name, alexander.orpha_code, alexander.total_symptoms) == ('Alexander disease', '58', 12)
+    assert sorted(alexander.matching_symptoms) == ['Macrocephaly', 'Seizure'] and alexander.probability == 1.0
+    assert (beta.disorder_name, beta.orpha_code, beta.matching_symptoms) == ('Beta disease', '166', ['Seizure'])
+    assert abs(beta.probability - 0.17 * (1 - 0.45)) < 1e-9 and beta.confidence_score == 0.5
+
+    # Responses capped below the matching row count: every row still arrives, a page at a time
+    client.max_rows, client.requests, previous = 2, 0, fast_dimensions.PAGE_SIZE
+    fast_dimensions.PAGE_SIZE = 2
+    try:
+        paged = asyncio.run(main_fast.fast_diagnosis(['Seizure', 'Macrocephaly'], ['Fever'], top_n=5))
+    finally:
+        fast_dimensions.PAGE_SIZE = previous
+    assert [r.model_dump() for r in paged['results']] == [r.model_dump() for r in result['results']]
+    assert client.requests == 3  # 3 present-symptom rows in two pages, 1 absent-symptom row
+
+
+if __name__ == "__main__":
+    for test in [test_assign_ids_keeps_existing, test_fetch_all_pages_dimension, test_keyset_paging,
+                 test_diagnosis_by_id_arrays]:
+        test()
+        print(f"  ✓ {test.__name__}")
+
+    print("\nAll fast dimension tests passed!")
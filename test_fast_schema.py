@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Test script for the fast table DDL and its plan checks (offline; set FAST_SCHEMA_DSN to also
+EXPLAIN the hot queries on a Postgres server)
+"""
+
+import os
+import re
+
+from fast_dimensions import PAGE_SIZE
+from fast_schema import (FAST_DIAGNOSIS_SCHEMA, FAST_PROBABILITIES_SCHEMA, PSYCOPG2_AVAILABLE, SCHEMAS, is_index_only,
+                         plan_scans, verify_plans)
+from main_fast import PROBABILITY_KEY
+
+
+def index_columns(schema, table_name):
+    """(unique, key columns, included columns) of every index of a table"""
+    table = next(t for t in schema.tables if t.name == table_name)
+    return [(i.unique, i.columns, i.include) for i in table.indexes]
+
+
+def test_ddl_is_postgres():
+    """No inline MySQL INDEX(...) in CREATE TABLE; every index and upsert target is declared"""
+    for schema in SCHEMAS.values():
+        statements = schema.statements()
+        assert all(statement.strip().endswith(';') for statement in statements)
+        for statement in statements:
+            if statement.startswith('CREATE TABLE'):
+                assert not re.search(r'\bINDEX\s*\(', statement), statement
+        index_names = {i.name for t in schema.tables for i in t.indexes} | {
+            f"{v.name}_{suffix}" for v in schema.views for suffix, _, _ in v.indexes}
+        assert all(query.index in index_names for query in schema.queries)
+        # Superseded indexes are dropped, never recreated
+        assert not index_names & {name for t in schema.tables for name in t.replaces}
+
+    # Conflict targets of fast_diagnosis_setup's upserts
+    assert (True, ('orpha_code',), ()) in index_columns(FAST_DIAGNOSIS_SCHEMA, 'fast_disorders')
+    assert (True, ('term',), ()) in index_columns(FAST_DIAGNOSIS_SCHEMA, 'fast_symptoms')
+    assert (False, ('symptom_id', 'disorder_id'), ('probability', 'confidence')) in \
+        index_columns(FAST_DIAGNOSIS_SCHEMA, 'symptom_disease_probs')
+
+    # Probabilities are keyed by the dimension ids; the name-keyed table of older loads is dropped first
+    statements = next(t for t in FAST_DIAGNOSIS_SCHEMA.tables if t.name == 'symptom_disease_probs').ddl()
+    assert "column_name IN ('symptom_term', 'disorder_name')" in statements[0]
+    assert "EXECUTE 'DROP TABLE symptom_disease_probs CASCADE'" in statements[0]
+    assert 'PRIMARY KEY (symptom_id, disorder_id)' in statements[1] and 'VARCHAR' not in statements[1]
+
+    # The probability reads are the pages fetch_all requests, in the order of their index
+    for query in FAST_DIAGNOSIS_SCHEMA.queries:
+        if query.index == 'symptom_disease_probs_symptom_disorder':
+            assert query.sql.endswith(f"ORDER BY {', '.join(PROBABILITY_KEY)} LIMIT {PAGE_SIZE}")
+            assert 'OFFSET' not in query.sql
+    assert 'DROP INDEX IF EXISTS symptom_disease_probs_symptom_probability;' in FAST_DIAGNOSIS_SCHEMA.sql()
+
+    sql = FAST_PROBABILITIES_SCHEMA.sql()
+    assert 'CREATE INDEX IF NOT EXISTS fast_probabilities_symptom ON fast_probabilities (symptom_name) INCLUDE' in sql
+    assert 'DROP INDEX IF EXISTS idx_fast_probabilities_probability;' in sql
+
+
+def test_plan_checks():
+    """Only a plan reading solely through the expected index counts as index-only"""
+    index_only = {'Node Type': 'Limit', 'Plans': [
+        {'Node Type': 'Index Only Scan', 'Index Name': 'fast_symptoms_count', 'Relation Name': 'fast_symptoms'}]}
+    assert plan_scans(index_only) == [('Index Only Scan', 'fast_symptoms_count')]
+    assert is_index_only(index_only, 'fast_symptoms_count')
+    assert not is_index_only(index_only, 'fast_symptoms_symptom_name_key')
+
+    heap = {'Node Type': 'Index Scan', 'Index Name': 'fast_symptoms_count'}
+    assert not is_index_only(heap, 'fast_symptoms_count')
+    sequential = {'Node Type': 'Sort', 'Plans': [{'Node Type': 'Seq Scan', 'Relation Name': 'fast_symptoms'}]}
+    assert plan_scans(sequential) == [('Seq Scan', '')] and not is_index_only(sequential, 'fast_symptoms_count')
+
+
+def test_verify_plans():
+    """EXPLAIN on a real server when one is configured; otherwise the missing driver is reported"""
+    dsn = os.environ.get('FAST_SCHEMA_DSN')
+    if PSYCOPG2_AVAILABLE and dsn:
+        for schema in SCHEMAS.values():
+            results = verify_plans(dsn, schema)
+            assert all(results.values()), results
+    elif not PSYCOPG2_AVAILABLE:
+        try:
+            verify_plans('postgresql://localhost/postgres', FAST_DIAGNOSIS_SCHEMA)
+            raise AssertionError("verified plans without psycopg2")
+        except ImportError:
+            pass
+
+
+if __name__ == "__main__":
+    for test in [test_ddl_is_postgres, test_plan_checks, test_verify_plans]:
+        test()
+        print(f"  ✓ {test.__name__}")
+
+    print("\nAll fast schema tests passed!")
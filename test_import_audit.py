@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Test script for the import audit and the lazy-import serving path (runs offline, no server needed)
+"""
+
+from import_audit import audit, parse_importtime
+
+
+def test_parse_importtime():
+    """Only top-level packages are listed, slowest first"""
+    stderr = "\n".join([
+        "import time: self [us] | cumulative | imported package",
+        "import time:       120 |        120 |   numpy.core",
+        "import time:      3305 |     135582 | numpy",
+        "import time:       900 |     464237 | fastapi",
+    ])
+    assert parse_importtime(stderr) == [
+        {'module': 'fastapi', 'cumulative_ms': 464.237, 'self_ms': 0.9},
+        {'module': 'numpy', 'cumulative_ms': 135.582, 'self_ms': 3.305},
+    ]
+
+
+def test_serving_path_skips_pandas():
+    """The API and the index engines import without pandas, pyarrow or supabase"""
+    for module in ('main', 'local_fast_diagnosis'):
+        result = audit(module)
+        assert result['heavy_after_import'] == [], (module, result['heavy_after_import'])
+        assert result['packages'] and result['import_seconds'] > 0
+
+
+if __name__ == "__main__":
+    for test in [test_parse_importtime, test_serving_path_skips_pandas]:
+        test()
+        print(f"  ✓ {test.__name__}")
+
+    print("\nAll import audit tests passed!")
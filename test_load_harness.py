@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Test script for the load-test harness and the PostgREST stub (runs offline, no server needed)
+"""
+
+import pandas as pd
+from fastapi.testclient import TestClient
+
+from load_test import latency_histogram, parse_mix, ScenarioStats, DEFAULT_MIX
+from postgrest_stub import build_tables, create_app, parse_in_list
+
+
+def make_client() -> TestClient:
+    rows = [
+        (1, 'Alpha syndrome', 'Seizure', 'Very frequent (99-80%)'),
+        (1, 'Alpha syndrome', 'Macrocephaly', 'Frequent (79-30%)'),
+        (2, 'Beta disease', 'Seizure', 'Occasional (29-5%)'),
+        (2, 'Beta disease', 'Fever', None),
+    ]
+    data = pd.DataFrame(rows, columns=['orpha_code', 'disorder_name', 'hpo_term', 'hpo_frequency'])
+    return TestClient(create_app(build_tables(data)))
+
+
+def test_stub_queries():
+    """The query shapes sent by supabase_diagnosis.py and simple_supabase_diagnosis.py"""
+    client = make_client()
+
+    assert client.get('/rest/v1/disorders?select=count&limit=1').json() == [{'count': 2}]
+
+    rows = client.get('/rest/v1/fast_symptoms?select=symptom_name&order=symptom_count.desc&limit=1').json()
+    assert rows == [{'symptom_name': 'Seizure'}]
+
+    rows = client.get("/rest/v1/disorder_symptoms_view?hpo_term=in.(''Seizure','Fever'')").json()
+    assert sorted(row['hpo_term'] for row in rows) == ['Fever', 'Seizure', 'Seizure']
+
+    rows = client.get('/rest/v1/hpo_terms?select=term&term=ilike.*SEIZ*').json()
+    assert rows == [{'term': 'Seizure'}]
+
+    rows = client.get('/rest/v1/fast_probabilities', params={
+        'select': 'disease_name,probability', 'symptom_name': 'in.("Seizure")', 'probability': 'gte.0.5'
+    }).json()
+    assert rows == [{'disease_name': 'Alpha syndrome', 'probability': 1.0}]
+
+    rows = client.get('/rest/v1/disorder_hpo_associations', params={
+        'select': 'frequency,\n disorders(name, orpha_code),\n hpo_terms(term)', 'limit': 1
+    }).json()
+    assert rows == [{
+        'frequency': 'Very frequent (99-80%)',
+        'disorders': {'name': 'Alpha syndrome', 'orpha_code': '1'},
+        'hpo_terms': {'term': 'Seizure'}
+    }]
+
+    response = client.get('/rest/v1/disorders', headers={'Range': '1-1', 'Prefer': 'count=exact'})
+    assert [row['name'] for row in response.json()] == ['Beta disease']
+    assert response.headers['content-range'] == '1-1/2'
+
+
+def test_stub_errors():
+    """Unknown tables, columns and operators use PostgREST error codes"""
+    client = make_client()
+
+    assert client.get('/rest/v1/missing').json()['code'] == '42P01'
+    assert client.get('/rest/v1/disorders?nope=eq.1').json()['code'] == '42703'
+    assert client.get('/rest/v1/disorders?name=regex.x').status_code == 400
+    assert parse_in_list('("a,b",c)') == ['a,b', 'c']
+
+
+def test_load_stats():
+    """Histogram buckets, error counting and mix parsing"""
+    assert latency_histogram([0.5, 1.0, 3.0, 45000.0]) == {
+        **{key: 0 for key in latency_histogram([])},
+        'le_1': 2, 'le_5': 1, 'inf': 1
+    }
+
+    stats = ScenarioStats()
+    for latency, outcome in [(10, '200'), (20, '200'), (5, '503'), (60000, 'ReadTimeout')]:
+        stats.record(latency, outcome)
+    summary = stats.summary(elapsed_seconds=2.0)
+    assert summary['errors'] == 2 and summary['error_rate'] == 0.5
+    assert summary['achieved_rps'] == 2.0
+    assert summary['p50_ms'] <= summary['p95_ms'] <= summary['p99_ms']
+
+    assert parse_mix(None) == DEFAULT_MIX
+    assert parse_mix('diagnose_true=2,symptoms') == {'diagnose_true': 2.0, 'symptoms': 1.0}
+
+
+if __name__ == "__main__":
+    for test in [test_stub_queries, test_stub_errors, test_load_stats]:
+        test()
+        print(f"  ✓ {test.__name__}")
+
+    print("\nAll load harness tests passed!")
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Test script for the sharded LocalFastDiagnosis build (runs offline on a small CSV in a temp directory)
+"""
+
+import os
+import tempfile
+
+import pandas as pd
+
+import local_fast_diagnosis
+from local_fast_diagnosis import CLINICAL_SIGNS_PRODUCT, LocalFastDiagnosis, build_maps, initialize_fast_diagnosis
+
+
+def make_disease_data() -> pd.DataFrame:
+    """Clinical signs rows, not grouped by disorder, with one repeated disease/symptom pair"""
+    rows = [
+        (2, 'Beta disease', 'Seizure', 'Occasional (29-5%)'),
+        (1, 'Alpha syndrome', 'Seizure', 'Very frequent (99-80%)'),
+        (3, 'Gamma disorder', 'Short stature', 'Very frequent (99-80%)'),
+        (1, 'Alpha syndrome', 'Macrocephaly', 'Frequent (79-30%)'),
+        (2, 'Beta disease', 'Fever', 'Very frequent (99-80%)'),
+        (4, 'Delta anomaly', 'Seizure', None),
+        (2, 'Beta disease', 'Seizure', 'Frequent (79-30%)'),
+    ]
+    return pd.DataFrame(rows, columns=['orpha_code', 'disorder_name', 'hpo_term', 'hpo_frequency'])
+
+
+def reference_maps(df: pd.DataFrame):
+    """Per-disease / per-symptom loops, as load_and_precompute built the maps before sharding"""
+    disease_map, symptom_map, matrix = {}, {}, {}
+    for disease in sorted(df['disorder_name'].unique()):
+        rows = df[df['disorder_name'] == disease]
+        disease_map[disease] = {'symptoms': {}, 'orpha_code': str(rows.iloc[0]['orpha_code']),
+                                'total_symptoms': len(rows)}
+        for _, row in rows.iterrows():
+            disease_map[disease]['symptoms'][row['hpo_term']] = row['frequency_numeric']
+    for symptom in sorted(df['hpo_term'].unique()):
+        symptom_map[symptom], matrix[symptom] = {}, {}
+        for _, row in df[df['hpo_term'] == symptom].iterrows():
+            symptom_map[symptom][row['disorder_name']] = {'frequency': row['frequency_numeric'],
+                                                          'orpha_code': str(row['orpha_code'])}
+        for disease, info in symptom_map[symptom].items():
+            matrix[symptom][disease] = {'probability': info['frequency'], 'orpha_code': info['orpha_code'],
+                                        'confidence': min(1.0, info['frequency'] * 1.2)}
+    return disease_map, symptom_map, matrix
+
+
+def build(jobs: int) -> LocalFastDiagnosis:
+    """Build from a CSV in a temp working directory (caches go there; no Orphanet datasets are found)"""
+    previous = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            make_disease_data().to_csv('clinical_signs.csv', index=False)
+            diagnosis = LocalFastDiagnosis()
+            assert diagnosis.load_and_precompute('clinical_signs.csv', jobs=jobs)
+        finally:
+            os.chdir(previous)
+    return diagnosis
+
+
+def test_sharded_maps_match_reference():
+    """Every shard count gives the loop-built maps, key and row order included"""
+    diagnosis = build(jobs=1)
+    expected = reference_maps(diagnosis.disease_data)
+    for jobs in (1, 3):
+        maps = build_maps(diagnosis.disease_data, jobs=jobs)
+        for built, reference in zip(maps, expected):
+            assert built == reference
+            assert list(built) == list(reference)
+            assert all(list(built[key]) == list(reference[key]) for key in reference)
+    # Beta's repeated Seizure row: the last frequency wins but both rows are counted
+    assert diagnosis.disease_symptoms_map['Beta disease']['symptoms']['Seizure'] == 0.55
+    assert diagnosis.disease_symptoms_map['Beta disease']['total_symptoms'] == 3
+
+
+def test_parallel_build_matches_serial():
+    """A build in worker processes gives the serial maps, index and autocomplete, and reports every stage"""
+    serial, shard_size = build(jobs=1), local_fast_diagnosis.AUTOCOMPLETE_SHARD_SIZE
+    try:
+        local_fast_diagnosis.AUTOCOMPLETE_SHARD_SIZE = 1
+        parallel = build(jobs=2)
+    finally:
+        local_fast_diagnosis.AUTOCOMPLETE_SHARD_SIZE = shard_size
+    assert parallel.disease_symptoms_map == serial.disease_symptoms_map
+    assert parallel.symptom_diseases_map == serial.symptom_diseases_map
+    assert parallel.symptom_disease_matrix == serial.symptom_disease_matrix
+    assert parallel.index.generation() == serial.index.generation()
+    assert list(parallel.build_timings_ms) == ['read', 'ids', 'maps', 'index', 'priors', 'filters',
+                                               'ontology', 'autocomplete', 'save']
+    assert all(ms >= 0 for ms in parallel.build_timings_ms.values())
+    assert parallel.symptom_search == serial.symptom_search
+    assert list(parallel.index.symptom_ic) == list(serial.index.symptom_ic)
+
+
+def test_build_jobs_default_to_cores():
+    """Without DIAGNOSIS_BUILD_JOBS a build uses one worker per core"""
+    assert 'DIAGNOSIS_BUILD_JOBS' in os.environ or local_fast_diagnosis.BUILD_JOBS == 0
+    previous = local_fast_diagnosis.BUILD_JOBS
+    try:
+        local_fast_diagnosis.BUILD_JOBS = 0
+        assert local_fast_diagnosis.build_jobs() == (os.cpu_count() or 1)
+        assert local_fast_diagnosis.build_jobs(1) == 1
+    finally:
+        local_fast_diagnosis.BUILD_JOBS = previous
+
+
+def test_autocomplete_search():
+    """Symptom search is case-insensitive and keeps the sorted order"""
+    diagnosis = build(jobs=1)
+    assert diagnosis.get_symptoms('SEIZ') == ['Seizure']
+    assert diagnosis.get_symptoms('e', limit=2) == ['Fever', 'Macrocephaly']
+    assert diagnosis.get_symptoms() == ['Fever', 'Macrocephaly', 'Seizure', 'Short stature']
+
+
+def test_reload_applies_delta():
+    """A newer dataset at startup and an uploaded CSV are patched in, matching a full rebuild"""
+    from fastapi.testclient import TestClient
+    import main
+
+    previous = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            os.mkdir('file')
+            data_file = os.path.join('file', f"{CLINICAL_SIGNS_PRODUCT}.csv")
+            df = make_disease_data()
+            df.to_csv(data_file, index=False)
+            assert initialize_fast_diagnosis(force_rebuild=True)
+
+            # Newer release on disk: Gamma changes, Epsilon is added
+            edited = pd.concat([df[df['orpha_code'] != 3], pd.DataFrame(
+                [(3, 'Gamma disorder', 'Fever', 'Frequent (79-30%)'), (5, 'Epsilon syndrome', 'Seizure', None)],
+                columns=df.columns)])
+            edited.to_csv(data_file, index=False)
+            cache_time = os.path.getmtime('diagnosis_cache.pkl')
+            os.utime(data_file, (cache_time + 10, cache_time + 10))
+            assert initialize_fast_diagnosis()
+            patched = local_fast_diagnosis.fast_diagnosis
+            assert patched.disease_symptoms_map['Gamma disorder']['symptoms'] == {'Fever': 0.55}
+            assert 'Epsilon syndrome' in patched.diseases_list
+
+            # Upload: Delta anomaly is removed
+            response = TestClient(main.app).post('/upload-data', files={
+                'file': ('signs.csv', edited[edited['orpha_code'] != 4].to_csv(index=False).encode(), 'text/csv')})
+            assert response.status_code == 200, response.text
+            assert response.json()['delta'] == '0 inserted, 0 updated, 1 deleted, 4 unchanged'
+
+            rebuilt = LocalFastDiagnosis()
+            assert rebuilt.load_and_precompute(f"{CLINICAL_SIGNS_PRODUCT}.csv")  # where uploads are saved
+            assert patched.disease_symptoms_map == rebuilt.disease_symptoms_map
+            assert patched.symptoms_list == rebuilt.symptoms_list
+        finally:
+            os.chdir(previous)
+
+
+def test_missing_filter_is_unavailable():
+    """Constraints whose Orphanet dataset was not loaded answer 503, not a server error"""
+    from fastapi.testclient import TestClient
+    import main
+
+    diagnosis, previous = build(jobs=1), main.fast_diagnosis
+    assert 'gene' not in diagnosis.index.filters and 'onset' not in diagnosis.index.filters
+    main.fast_diagnosis = diagnosis
+    try:
+        client = TestClient(main.app)
+        response = client.post('/diagnose', json={'present_symptoms': ['Seizure'], 'genes': ['GFAP']})
+        assert response.status_code == 503 and response.json()['detail'] == "Gene association data not loaded"
+        response = client.post('/diagnose/scores', json={'present_symptoms': ['Seizure'], 'onset': ['Adult']})
+        assert response.status_code == 503 and response.json()['detail'] == "Natural history data not loaded"
+        assert client.post('/diagnose', json={'present_symptoms': ['Seizure']}).status_code == 200
+    finally:
+        main.fast_diagnosis = previous
+
+
+if __name__ == "__main__":
+    for test in [test_sharded_maps_match_reference, test_parallel_build_matches_serial, test_build_jobs_default_to_cores,
+                 test_autocomplete_search, test_reload_applies_delta, test_missing_filter_is_unavailable]:
+        test()
+        print(f"  ✓ {test.__name__}")
+
+    print("\nAll local fast diagnosis tests passed!")
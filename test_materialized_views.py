@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Test script for the materialized read views and the ingest-time numeric frequency (runs offline)
+"""
+
+import pandas as pd
+
+from csv_data_loader import FREQUENCY_PATTERNS, OrphanetCSVLoader, frequency_case_sql, frequency_numeric
+from materialized_views import DISORDER_SYMPTOMS_VIEW, FAST_DIAGNOSIS_VIEW, create_view, refresh_view
+
+
+class RecordingClient:
+    """Stands in for the Supabase client: records execute_sql calls, failing the ones matching `fail`"""
+
+    def __init__(self, fail: str = None):
+        self.statements = []
+        self.fail = fail
+
+    def rpc(self, name, params):
+        assert name == 'execute_sql'
+        self.statements.append(params['sql'])
+        if self.fail and self.fail in params['sql']:
+            raise RuntimeError(f"rejected: {self.fail}")
+        return self
+
+    def execute(self):
+        return self
+
+
+def test_view_ddl():
+    """Views replace a plain view, start unpopulated and get a unique key plus covering indexes"""
+    statements = FAST_DIAGNOSIS_VIEW.create_statements()
+    assert "DROP VIEW fast_diagnosis_view" in statements[0] and 'pg_views' in statements[0]
+    assert statements[1].startswith('CREATE MATERIALIZED VIEW IF NOT EXISTS fast_diagnosis_view AS SELECT')
+    assert statements[1].endswith('WITH NO DATA;') and 'ORDER BY' not in statements[1]
+    assert statements[2] == ('CREATE UNIQUE INDEX IF NOT EXISTS fast_diagnosis_view_key '
+                             'ON fast_diagnosis_view (symptom_id, disorder_id);')
+    assert statements[3] == (
+        'CREATE INDEX IF NOT EXISTS fast_diagnosis_view_symptom_probability ON fast_diagnosis_view '
+        '(symptom_id, probability DESC) INCLUDE (disorder_id, confidence, matching_score, total_symptoms);'
+    )
+
+    # The disorder view reads the stored numeric frequency instead of matching text per row
+    statements = DISORDER_SYMPTOMS_VIEW.create_statements()
+    assert 'dha.frequency_numeric' in statements[1] and 'LIKE' not in statements[1]
+    assert len(statements) == 5
+    assert DISORDER_SYMPTOMS_VIEW.refresh_statement() == 'REFRESH MATERIALIZED VIEW CONCURRENTLY disorder_symptoms_view;'
+
+
+def test_refresh_falls_back_when_unpopulated():
+    """A concurrent refresh is tried first; a newly created (unpopulated) view is refreshed plainly"""
+    client = RecordingClient()
+    assert create_view(client, FAST_DIAGNOSIS_VIEW) and refresh_view(client, FAST_DIAGNOSIS_VIEW)
+    assert client.statements[-1] == 'REFRESH MATERIALIZED VIEW CONCURRENTLY fast_diagnosis_view;'
+
+    client = RecordingClient(fail='CONCURRENTLY')
+    assert refresh_view(client, FAST_DIAGNOSIS_VIEW)
+    assert client.statements == ['REFRESH MATERIALIZED VIEW CONCURRENTLY fast_diagnosis_view;',
+                                 'REFRESH MATERIALIZED VIEW fast_diagnosis_view;']
+
+    client = RecordingClient(fail='REFRESH')
+    assert not refresh_view(client, FAST_DIAGNOSIS_VIEW)
+    assert not create_view(RecordingClient(fail='CREATE UNIQUE'), FAST_DIAGNOSIS_VIEW)
+
+
+def test_numeric_frequency_at_ingest():
+    """Ingest-time numbers follow the old view's LIKE patterns, and the backfill uses the same ones"""
+    texts = ['Very frequent (99-80%)', 'Frequent (79-30%)', 'Occasional (29-5%)', 'Very rare (<4-1%)',
+             'Excluded (0%)', None, 'Obligate (100%)']
+    assert frequency_numeric(pd.Series(texts)).tolist() == [0.9, 0.55, 0.17, 0.025, 0.5, 0.5, 0.5]
+
+    case = frequency_case_sql('frequency')
+    assert case.count('WHEN') == len(FREQUENCY_PATTERNS) and case.endswith('ELSE 0.5 END')
+    assert "frequency LIKE '%Very frequent%' OR frequency LIKE '%99-80%' THEN 0.9" in case
+
+    df = pd.DataFrame({
+        'disorder_id': [10, 10], 'orpha_code': [58, 58], 'disorder_name': ['Alexander disease'] * 2,
+        'disorder_type': ['Disease'] * 2, 'hpo_id': ['HP:0001250', 'HP:0000256'], 'hpo_term': ['Seizure', 'Macrocephaly'],
+        'hpo_frequency': ['Occasional (29-5%)', None], 'diagnostic_criteria': [None, None]
+    })
+    associations = OrphanetCSVLoader.build_records(None, df)['hpo_associations']
+    assert [a['frequency_numeric'] for a in associations] == [0.17, 0.5]
+
+
+if __name__ == "__main__":
+    for test in [test_view_ddl, test_refresh_falls_back_when_unpopulated, test_numeric_frequency_at_ingest]:
+        test()
+        print(f"  ✓ {test.__name__}")
+
+    print("\nAll materialized view tests passed!")
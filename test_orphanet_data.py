@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Test script for the shared Orphanet dataset loader and the converter's columnar output
+(runs offline; the columnar checks need pyarrow)
+"""
+
+import importlib.util
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+
+from orphanet_data import PYARROW_AVAILABLE, find_dataset, load_dataset, read_dataset_file
+
+PRODUCT = 'genes_associated_with_rare_diseases'
+
+ROWS = pd.DataFrame({
+    'orpha_code': [58, 58, 166, 166],
+    'disorder_name': ['Alexander disease', 'Alexander disease', 'Beta disease', 'Beta disease'],
+    'gene_symbol': ['GFAP', None, 'ABC1', 'GFAP'],
+})
+
+
+def load_converter():
+    """file/xml_to_csv_converter.py, imported by path (file/ is not a package)"""
+    path = Path(__file__).parent / 'file' / 'xml_to_csv_converter.py'
+    spec = importlib.util.spec_from_file_location('xml_to_csv_converter', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def write_csv(data_dir: str) -> str:
+    path = os.path.join(data_dir, PRODUCT + '.csv')
+    ROWS.to_csv(path, index=False)
+    return path
+
+
+def test_find_dataset_prefers_fresh_columnar():
+    """Parquet, then Arrow, then CSV per directory; a columnar copy older than the CSV is skipped"""
+    data_dir = tempfile.mkdtemp()
+    try:
+        assert find_dataset(PRODUCT, [data_dir]) is None
+        csv_path = write_csv(data_dir)
+        assert find_dataset(PRODUCT, [data_dir]) == csv_path
+        if not PYARROW_AVAILABLE:
+            return
+
+        converter = load_converter()
+        arrow_path = converter.write_columnar(csv_path, 'arrow')
+        parquet_path = converter.write_columnar(csv_path, 'parquet')
+        csv_mtime = os.path.getmtime(csv_path)
+        assert find_dataset(PRODUCT, [data_dir]) == parquet_path
+
+        # CSV regenerated after the columnar export: the stale copies lose to it
+        os.utime(parquet_path, (csv_mtime - 10, csv_mtime - 10))
+        assert find_dataset(PRODUCT, [data_dir]) == arrow_path
+        os.utime(arrow_path, (csv_mtime - 10, csv_mtime - 10))
+        assert find_dataset(PRODUCT, [data_dir]) == csv_path
+
+        # Without a CSV any columnar copy is used; earlier directories still win
+        other_dir = tempfile.mkdtemp()
+        try:
+            write_csv(other_dir)
+            assert find_dataset(PRODUCT, [other_dir, data_dir]) == os.path.join(other_dir, PRODUCT + '.csv')
+            os.unlink(csv_path)
+            assert find_dataset(PRODUCT, [data_dir, other_dir]) == parquet_path
+        finally:
+            shutil.rmtree(other_dir)
+    finally:
+        shutil.rmtree(data_dir)
+
+
+def test_columnar_round_trip():
+    """write_columnar dictionary-encodes strings; reads project columns and match pd.read_csv"""
+    if not PYARROW_AVAILABLE:
+        return
+    import pyarrow.parquet as pq
+
+    data_dir = tempfile.mkdtemp()
+    try:
+        csv_path = write_csv(data_dir)
+        converter = load_converter()
+        expected = pd.read_csv(csv_path)
+        for fmt in ['parquet', 'arrow']:
+            path = converter.write_columnar(csv_path, fmt)
+            assert path == os.path.join(data_dir, PRODUCT + '.' + fmt)
+
+            df = read_dataset_file(path)
+            pd.testing.assert_frame_equal(df, expected)
+            assert df['gene_symbol'].dtype == object and pd.isna(df['gene_symbol'][1])
+
+            projected = read_dataset_file(path, ['gene_symbol', 'orpha_code'], categorical=True)
+            assert list(projected.columns) == ['gene_symbol', 'orpha_code']
+            assert isinstance(projected['gene_symbol'].dtype, pd.CategoricalDtype)
+            assert sorted(projected['gene_symbol'].cat.categories) == ['ABC1', 'GFAP']
+            assert projected['orpha_code'].tolist() == [58, 58, 166, 166]
+
+        schema = pq.read_schema(os.path.join(data_dir, PRODUCT + '.parquet'))
+        assert str(schema.field('disorder_name').type).startswith('dictionary')
+
+        # load_dataset reads the preferred file with the same projection
+        assert load_dataset(PRODUCT, ['orpha_code'], [data_dir])['orpha_code'].tolist() == [58, 58, 166, 166]
+
+        try:
+            converter.write_columnar(csv_path, 'feather')
+            raise AssertionError("unknown columnar format accepted")
+        except ValueError:
+            pass
+    finally:
+        shutil.rmtree(data_dir)
+
+
+def test_csv_projection():
+    """CSV files are read with the same column projection"""
+    data_dir = tempfile.mkdtemp()
+    try:
+        df = read_dataset_file(write_csv(data_dir), ['disorder_name'])
+        assert list(df.columns) == ['disorder_name'] and len(df) == 4
+    finally:
+        shutil.rmtree(data_dir)
+
+
+if __name__ == "__main__":
+    for test in [test_find_dataset_prefers_fresh_columnar, test_columnar_round_trip, test_csv_projection]:
+        test()
+        print(f"  ✓ {test.__name__}")
+
+    print("\nAll Orphanet data tests passed!")
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Test script for the single-pass Orphanet extraction layer and its sinks (runs offline)
+"""
+
+import os
+import csv
+import tempfile
+
+from orphanet_extract import (RECORD_FIELDS, CSVSink, OrphanetExtractor, RecordSink, extract_records,
+                              run_extraction)
+
+DOCUMENT = (
+    '<?xml version="1.0" encoding="ISO-8859-1"?>\n'
+    '<JDBOR><HPODisorderSetStatusList count="3">'
+    + ''.join(
+        f'<HPODisorderSetStatus><Disorder id="{i}"><OrphaCode>{code}</OrphaCode><Name lang="en">Disorder {code}</Name>'
+        f'<DisorderType id="21394"><Name lang="en">Disease</Name></DisorderType>'
+        f'<HPODisorderAssociationList count="2">'
+        f'<HPODisorderAssociation><HPO><HPOId>HP:0000001</HPOId><HPOTerm>All</HPOTerm></HPO>'
+        f'<HPOFrequency><Name lang="en">Frequent (79-30%)</Name></HPOFrequency><DiagnosticCriteria/></HPODisorderAssociation>'
+        f'<HPODisorderAssociation><HPO><HPOId>HP:{code:07d}</HPOId><HPOTerm>Sign \xe9 {code}</HPOTerm></HPO>'
+        f'<HPOFrequency><Name lang="en">Very rare (&lt;4-1%)</Name></HPOFrequency></HPODisorderAssociation>'
+        f'</HPODisorderAssociationList></Disorder></HPODisorderSetStatus>'
+        for i, code in enumerate([58, 166024, 58])
+    )
+    + '</HPODisorderSetStatusList></JDBOR>\n'
+)
+
+
+class MemorySink(RecordSink):
+    name = 'memory'
+
+    def __init__(self):
+        self.batches = []
+        self.closed = False
+
+    def write(self, batch):
+        self.batches.append((batch.kind, len(batch)))
+
+    def close(self):
+        self.closed = True
+
+
+def write_xml(content: str) -> str:
+    with tempfile.NamedTemporaryFile('wb', suffix='_clinical_signs.xml', delete=False) as f:
+        f.write(content.encode('iso-8859-1'))
+    return f.name
+
+
+def test_records_and_dedup():
+    """One pass yields every kind; shared records (disorders, HPO terms, types) are handed out once"""
+    path = write_xml(DOCUMENT)
+    try:
+        records = extract_records(path)
+    finally:
+        os.unlink(path)
+
+    assert [d['orpha_code'] for d in records['disorders']] == ['58', '166024']
+    assert records['disorder_types'] == [{'external_id': '21394', 'name': 'Disease'}]
+    assert [h['hpo_id'] for h in records['hpo_terms']] == ['HP:0000001', 'HP:0000058', 'HP:0166024']
+    assert len(records['hpo_associations']) == 6
+    rare = records['hpo_associations'][1]
+    assert rare == {'disorder_orpha_code': '58', 'hpo_id': 'HP:0000058', 'frequency': 'Very rare (<4-1%)',
+                     'diagnostic_criteria': None}
+    assert all(set(row) == set(RECORD_FIELDS[kind]) for kind, rows in records.items() for row in rows)
+
+
+def test_batches_referenced_kinds_first():
+    """Every flush hands out disorders and HPO terms before the associations that reference them"""
+    path = write_xml(DOCUMENT)
+    try:
+        batches = list(OrphanetExtractor(batch_size=2).iter_batches(path, ('hpo_associations', 'disorders', 'hpo_terms')))
+    finally:
+        os.unlink(path)
+
+    kinds = [batch.kind for batch in batches]
+    assert kinds == ['disorders', 'hpo_terms', 'hpo_associations'] * 2 + ['hpo_associations']
+    assert sum(len(b) for b in batches if b.kind == 'hpo_associations') == 6
+    assert all(batch.source == path for batch in batches)
+
+
+def test_run_extraction_sinks():
+    """One extraction feeds every sink; the report times extraction and each sink separately"""
+    path = write_xml(DOCUMENT)
+    directory = tempfile.mkdtemp()
+    try:
+        memory = MemorySink()
+        report = run_extraction([path], [CSVSink(directory), memory])
+        with open(os.path.join(directory, 'hpo_associations.csv'), encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+    finally:
+        os.unlink(path)
+        for name in os.listdir(directory):
+            os.unlink(os.path.join(directory, name))
+        os.rmdir(directory)
+
+    # The file name selects the clinical signs product kinds
+    assert report['rows'] == {'disorders': 2, 'hpo_terms': 3, 'hpo_associations': 6}
+    assert set(report['sinks']) == {'csv', 'memory'} and memory.closed
+    assert all(stats['rows'] == 11 for stats in report['sinks'].values())
+    assert len(rows) == 6 and rows[1]['hpo_id'] == 'HP:0000058'
+    assert sum(n for _, n in memory.batches) == 11
+
+
+def test_sink_interface():
+    """Duck-typed loaders satisfy RecordSink; subclasses must implement write"""
+    from orphanet_supabase_loader import OrphanetXMLLoader, SupabaseConfig
+
+    class Unfinished(RecordSink):
+        name = 'unfinished'
+
+    try:
+        Unfinished()
+        raise AssertionError("sink without write instantiated")
+    except TypeError:
+        pass
+
+    loader = OrphanetXMLLoader(SupabaseConfig('http://localhost', 'key'))
+    assert isinstance(loader, RecordSink) and isinstance(MemorySink(), RecordSink)
+    assert not isinstance(object(), RecordSink)
+
+
+if __name__ == "__main__":
+    for test in [test_records_and_dedup, test_batches_referenced_kinds_first, test_run_extraction_sinks,
+                 test_sink_interface]:
+        test()
+        print(f"  ✓ {test.__name__}")
+
+    print("\nAll extraction tests passed!")
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Test script for startup warm-up and readiness reporting (runs offline, no server needed)
+"""
+
+import pandas as pd
+
+from diagnosis_index import DiagnosisIndex
+from readiness import ServiceState, run_warmup, representative_symptoms
+
+
+def make_index() -> DiagnosisIndex:
+    rows = [
+        ('Alpha syndrome', 1, 'Seizure', 0.9),
+        ('Alpha syndrome', 1, 'Macrocephaly', 0.55),
+        ('Beta disease', 2, 'Seizure', 0.17),
+        ('Beta disease', 2, 'Fever', 0.9),
+        ('Gamma disorder', 3, 'Seizure', 0.9),
+    ]
+    return DiagnosisIndex.from_dataframe(
+        pd.DataFrame(rows, columns=['disorder_name', 'orpha_code', 'hpo_term', 'frequency_numeric'])
+    )
+
+
+def test_service_phases():
+    """Ready only after warm-up; the report carries engine, generation and warm-up timings"""
+    state = ServiceState()
+    assert not state.is_ready and state.ready_report()['status'] == 'not_ready'
+
+    state.set_phase('warming', engine='local_index', index_generation='abc')
+    assert not state.is_ready
+
+    state.set_phase('ready', warmup={'local_bayesian': {'first_ms': 2.0, 'warm_ms': 1.0}})
+    report = state.ready_report()
+    assert state.is_ready and report['engine'] == 'local_index' and report['index_generation'] == 'abc'
+    assert report['ready_at'] and state.live_report()['status'] == 'alive'
+
+
+def test_run_warmup():
+    """Every task runs each round; a failing task is reported, not raised"""
+    calls = []
+
+    def failing():
+        raise RuntimeError('no data')
+
+    report = run_warmup({'ok': lambda: calls.append(1), 'broken': failing}, rounds=3)
+    assert len(calls) == 3
+    assert set(report['ok']) == {'first_ms', 'warm_ms'}
+    assert report['broken'] == {'error': 'no data'}
+
+
+def test_warmup_profiles_and_generation():
+    """Common profiles start from the most annotated symptom; generation is a stable content digest"""
+    index = make_index()
+    profiles = representative_symptoms(index, sizes=(1, 2))
+    assert profiles['common_1'] == ['Seizure']
+    assert len(profiles['rare_2']) == 2 and 'Seizure' not in profiles['rare_2']
+
+    assert index.generation() == make_index().generation()
+    assert len(index.generation()) == 12
+
+
+if __name__ == "__main__":
+    for test in [test_service_phases, test_run_warmup, test_warmup_profiles_and_generation]:
+        test()
+        print(f"  ✓ {test.__name__}")
+
+    print("\nAll readiness tests passed!")
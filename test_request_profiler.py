@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Test script for per-request profiling and the slow request log (runs offline, no server needed)
+"""
+
+import os
+import tempfile
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import request_profiler
+from request_profiler import RequestProfiler, SlowRequestLog, profile_requests, current_request_id
+
+
+def test_slow_request_log():
+    """Only the N slowest requests are kept, slowest first, and appended to the log file"""
+    with tempfile.TemporaryDirectory() as tmp:
+        log_file = os.path.join(tmp, 'slow.jsonl')
+        log = SlowRequestLog(capacity=2, log_file=log_file, full_requests=True)
+
+        for elapsed in (5.0, 50.0, 1.0, 20.0):
+            log.record(elapsed, {'present_symptoms': [f'S{elapsed}']}, 'local_precomputed', 'fast')
+
+        assert [entry['elapsed_ms'] for entry in log.slowest()] == [50.0, 20.0]
+        assert log.slowest(1)[0]['request'] == {'present_symptoms': ['S50.0']}
+        log.flush()
+        with open(log_file) as f:
+            assert len(f.readlines()) == 3  # 1.0 was never among the slowest
+
+
+def test_slow_request_log_redacts_inputs():
+    """Without profiling only a digest, list sizes and numeric options are kept, in memory and on disk"""
+    payload = {'present_symptoms': ['Seizure', 'Fever'], 'genes': ['GFAP'], 'onset': ['Adult'],
+               'top_n': 10, 'debug': False}
+    enabled = request_profiler.PROFILING_ENABLED
+    with tempfile.TemporaryDirectory() as tmp:
+        log_file = os.path.join(tmp, 'slow.jsonl')
+        try:
+            request_profiler.PROFILING_ENABLED = False
+            log = SlowRequestLog(capacity=5, log_file=log_file)
+            log.record(10.0, payload, 'local_precomputed', 'fast')
+            log.record(12.0, dict(payload), 'local_precomputed', 'fast')
+            request_profiler.PROFILING_ENABLED = True
+            log.record(11.0, payload, 'local_precomputed', 'fast')
+        finally:
+            request_profiler.PROFILING_ENABLED = enabled
+        log.flush()
+
+        repeated, full, redacted = log.slowest()
+        assert 'request' not in redacted and full['request'] == payload
+        assert redacted['request_summary'] == {
+            'digest': repeated['request_summary']['digest'], 'present_symptoms_count': 2, 'genes_count': 1,
+            'onset_count': 1, 'top_n': 10, 'debug': False}
+        with open(log_file) as f:
+            lines = f.readlines()
+        assert len(lines) == 3 and sum('Seizure' in line or 'GFAP' in line for line in lines) == 1
+
+
+def test_profiled_request():
+    """Opted-in requests are profiled when enabled; others only get a request ID"""
+    app = FastAPI()
+    app.middleware("http")(profile_requests)
+
+    @app.post("/diagnose")
+    async def diagnose():
+        return {'request_id': current_request_id.get(), 'total': sum(range(10000))}
+
+    enabled = request_profiler.PROFILING_ENABLED
+    with tempfile.TemporaryDirectory() as tmp:
+        request_profiler.profiler = RequestProfiler(profile_dir=tmp)
+        try:
+            client = TestClient(app)
+
+            request_profiler.PROFILING_ENABLED = False
+            response = client.post('/diagnose', headers={'X-Profile': '1', 'X-Request-ID': 'abc-1'})
+            assert response.json()['request_id'] == 'abc-1' == response.headers['x-request-id']
+            assert 'x-profile-artifact' not in response.headers
+
+            request_profiler.PROFILING_ENABLED = True
+            response = client.post('/diagnose?profile=1', headers={'X-Request-ID': '../escape'})
+            request_id = response.headers['x-request-id']
+            assert request_id != '../escape'
+            assert response.headers['x-profile-artifact'] == os.path.join(tmp, f'{request_id}.prof')
+            assert os.path.exists(response.headers['x-profile-artifact'])
+
+            summary = request_profiler.profiler.get(request_id)
+            assert summary['top_frames'] and summary['elapsed_ms'] > 0
+        finally:
+            request_profiler.PROFILING_ENABLED = enabled
+            request_profiler.profiler = RequestProfiler()
+
+
+if __name__ == "__main__":
+    for test in [test_slow_request_log, test_slow_request_log_redacts_inputs, test_profiled_request]:
+        test()
+        print(f"  ✓ {test.__name__}")
+
+    print("\nAll profiler tests passed!")
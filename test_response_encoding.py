@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Test script for the pre-serialized /diagnose responses and bulk score vectors (runs offline, no server needed)
+"""
+
+import json
+
+import numpy as np
+
+import pandas as pd
+
+import response_encoding
+from response_encoding import (
+    diagnosis_payload, encode_json, encoded_response, wants_msgpack, score_vector_response, disorder_table_response
+)
+from diagnosis_index import DiagnosisIndex
+from local_fast_diagnosis import LocalFastDiagnosis
+from main import app, DiagnosisResponse
+
+
+def engine_result():
+    """Engine output as local_fast_diagnosis returns it, numpy scalars included"""
+    disorder = {
+        'disorder_name': 'Alpha syndrome',
+        'orpha_code': '1',
+        'probability': np.float64(0.75),
+        'matching_symptoms': ['Seizure'],
+        'total_symptoms': np.int64(2),
+        'confidence_score': np.float32(0.5)
+    }
+    return {
+        'results': [disorder],
+        'total_diseases_evaluated': np.int64(3),
+        'processing_time_ms': 1.25,
+        'scoring': 'exact',
+        'groups': [{
+            'group_name': 'Rare neurologic disease',
+            'group_code': '98006',
+            'probability': np.float64(0.8),
+            'disorders_evaluated': 2,
+            'top_disorders': [disorder]
+        }]
+    }
+
+
+def test_payload_matches_response_model():
+    """The hand-built payload is exactly what DiagnosisResponse would serialize"""
+    payload = diagnosis_payload(engine_result(), ['Seizure'], 'true', ['BRCA9'])
+    model = DiagnosisResponse.model_validate(payload)
+    assert payload == model.model_dump()
+    assert json.loads(encode_json(payload)) == json.loads(model.model_dump_json())
+    assert type(payload['total_diseases_evaluated']) is int and type(payload['results'][0]['probability']) is float
+
+
+def test_non_finite_floats_are_null():
+    """Both JSON encoders write NaN / Infinity as null, like DiagnosisResponse"""
+    result = engine_result()
+    result['results'][0]['probability'] = float('nan')
+    result['groups'][0]['probability'] = float('inf')
+    payload = diagnosis_payload(result, ['Seizure'], 'true')
+    expected = json.loads(DiagnosisResponse.model_validate(payload).model_dump_json())
+    assert expected['results'][0]['probability'] is None and expected['groups'][0]['probability'] is None
+
+    available = response_encoding.ORJSON_AVAILABLE
+    try:
+        for use_orjson in {False, available}:
+            response_encoding.ORJSON_AVAILABLE = use_orjson
+            body = encode_json(payload)
+            assert b'NaN' not in body and b'Infinity' not in body
+            assert json.loads(body) == expected
+    finally:
+        response_encoding.ORJSON_AVAILABLE = available
+
+
+def test_openapi_schema_unchanged():
+    """The route still documents DiagnosisResponse and the raw request is not a parameter"""
+    operation = app.openapi()['paths']['/diagnose']['post']
+    schema = operation['responses']['200']['content']['application/json']['schema']
+    assert schema == {'$ref': '#/components/schemas/DiagnosisResponse'}
+    assert 'parameters' not in operation
+
+
+def test_msgpack_negotiation():
+    """MessagePack only when accepted and installed; JSON otherwise"""
+    assert wants_msgpack('application/msgpack')
+    assert wants_msgpack('application/json;q=0.5, application/x-msgpack')
+    assert not wants_msgpack('application/json') and not wants_msgpack(None)
+
+    payload = diagnosis_payload(engine_result(), ['Seizure'], 'fast')
+    available = response_encoding.MSGPACK_AVAILABLE
+    try:
+        response_encoding.MSGPACK_AVAILABLE = False
+        response = encoded_response(payload, 'application/msgpack')
+        assert response.media_type == 'application/json'
+        assert json.loads(response.body) == payload
+    finally:
+        response_encoding.MSGPACK_AVAILABLE = available
+
+    if available:
+        response = encoded_response(payload, 'application/msgpack')
+        assert response.media_type == 'application/msgpack'
+        assert response_encoding.msgpack.unpackb(response.body) == payload
+
+
+def test_score_vectors():
+    """Full score vectors in index order: the posterior sums to 1, fast scores are 0 off the candidates"""
+    rows = [
+        ('Alpha syndrome', 1, 'Seizure', 0.9),
+        ('Alpha syndrome', 1, 'Macrocephaly', 0.55),
+        ('Beta disease', 2, 'Fever', 0.9),
+        ('Gamma disorder', 3, 'Seizure', 0.17),
+    ]
+    engine = LocalFastDiagnosis()
+    engine.index = DiagnosisIndex.from_dataframe(
+        pd.DataFrame(rows, columns=['disorder_name', 'orpha_code', 'hpo_term', 'frequency_numeric'])
+    )
+    engine.index.set_priors()
+    engine.is_ready = True
+
+    posterior = engine.score_vector(['Seizure'], computation_mode='true')
+    assert posterior['scores'].dtype == np.float32 and len(posterior['scores']) == 3
+    assert abs(posterior['scores'].sum() - 1) < 1e-6 and posterior['scores'].argmax() == 0
+
+    fast = engine.score_vector(['Seizure'], computation_mode='fast')
+    assert np.allclose(fast['scores'], [0.9, 0.0, 0.17]) and fast['total_diseases_evaluated'] == 2
+
+    response = score_vector_response(fast['scores'], 'float32', engine.index.generation())
+    assert np.array_equal(np.frombuffer(response.body, dtype='<f4'), fast['scores'])
+    assert response.headers['X-Score-Count'] == '3'
+    if response_encoding.PYARROW_AVAILABLE:
+        import pyarrow as pa
+        table = pa.ipc.open_stream(score_vector_response(fast['scores'], 'arrow', 'abc').body).read_all()
+        assert table.column('score').to_pylist() == fast['scores'].tolist()
+        assert table.schema.metadata == {b'index_generation': b'abc'}
+
+
+def test_debug_response_encoded_once():
+    """Debug timings are part of the one encoded payload"""
+    from fastapi.testclient import TestClient
+    import main
+
+    rows = [('Alpha syndrome', 1, 'Seizure', 0.9), ('Beta disease', 2, 'Seizure', 0.17)]
+    engine = LocalFastDiagnosis()
+    engine.index = DiagnosisIndex.from_dataframe(
+        pd.DataFrame(rows, columns=['disorder_name', 'orpha_code', 'hpo_term', 'frequency_numeric'])
+    )
+    engine.index.set_priors()
+    engine.symptoms_list, engine.is_ready = ['Seizure'], True
+
+    calls = []
+    previous_engine, previous_encode = main.fast_diagnosis, main.encoded_response
+    main.fast_diagnosis = engine
+    main.encoded_response = lambda payload, *args, **kwargs: calls.append(payload) or previous_encode(payload, *args, **kwargs)
+    try:
+        response = TestClient(main.app).post('/diagnose', json={'present_symptoms': ['Seizure'], 'debug': True})
+    finally:
+        main.fast_diagnosis, main.encoded_response = previous_engine, previous_encode
+
+    assert response.status_code == 200, response.text
+    assert len(calls) == 1 and response.json()['stage_timings_ms'] == calls[0]['stage_timings_ms']
+    assert 'serialization' not in response.json()['stage_timings_ms']
+
+
+def test_disorder_table_caching():
+    """The table carries the generation as ETag; a matching If-None-Match answers 304"""
+    response = disorder_table_response(['1', '2'], ['Alpha syndrome', 'Beta disease'], 'json', 'abc')
+    assert response.headers['ETag'] == '"abc"'
+    assert json.loads(response.body) == {
+        'index_generation': 'abc', 'orpha_code': ['1', '2'], 'disorder_name': ['Alpha syndrome', 'Beta disease']
+    }
+    assert disorder_table_response(['1'], ['Alpha syndrome'], 'json', 'abc', 'W/"abc"').status_code == 304
+    assert disorder_table_response(['1'], ['Alpha syndrome'], 'json', 'abc', '"old"').status_code == 200
+
+
+if __name__ == "__main__":
+    for test in [test_payload_matches_response_model, test_non_finite_floats_are_null, test_openapi_schema_unchanged,
+                 test_msgpack_negotiation, test_score_vectors, test_debug_response_encoded_once,
+                 test_disorder_table_caching]:
+        test()
+        print(f"  ✓ {test.__name__}")
+
+    print("\nAll response encoding tests passed!")
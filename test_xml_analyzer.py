@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Test script for the streaming XML analyzer (runs offline, no server needed)
+"""
+
+import io
+import os
+import sys
+import random
+import tempfile
+from contextlib import redirect_stdout
+
+from xml_analyzer import XMLAnalyzer, TextStats, analyze_multiple_files
+
+DOCUMENT = (
+    '<?xml version="1.0" encoding="ISO-8859-1"?>'
+    '<JDBOR date="2024"><DisorderList count="2">'
+    '<Disorder id="1"><OrphaCode>166024</OrphaCode><Name lang="en">Syndrome \xe9</Name></Disorder>'
+    '<Disorder id="2">text before child<OrphaCode>58</OrphaCode>tail</Disorder>'
+    '</DisorderList><Extra xmlns="urn:x"><Item/></Extra></JDBOR>'
+)
+
+
+def write_xml(content: str) -> str:
+    with tempfile.NamedTemporaryFile('wb', suffix='.xml', delete=False) as f:
+        f.write(content.encode('iso-8859-1'))
+    return f.name
+
+
+def test_streaming_statistics():
+    """Counts, depths, attributes and element text (before the first child) in one pass"""
+    path = write_xml(DOCUMENT)
+    try:
+        analyzer = XMLAnalyzer()
+        analyzer._analyze_stream(path)
+    finally:
+        os.unlink(path)
+
+    assert analyzer.total_elements == 9 and analyzer.max_depth == 3
+    assert analyzer.depth_counts == {0: 1, 1: 2, 2: 3, 3: 3}
+    assert analyzer.element_counts['Disorder'] == 2 and analyzer.element_counts['Item'] == 1
+    assert analyzer.namespace_counts == {'{urn:x}': 2}
+    assert analyzer.attribute_counts['Disorder'] == {'id': 2}
+
+    assert analyzer.text_content_stats['Disorder'].count == 1  # 'text before child', not the tail
+    name = analyzer.text_content_stats['Name']
+    assert (name.count, name.min_length, name.max_length) == (1, 10, 10)
+
+    sample = analyzer.structure_sample
+    assert sample['tag'] == 'JDBOR' and [child['tag'] for child in sample['children']] == ['DisorderList', 'Extra']
+
+
+def test_deep_document():
+    """Nesting far beyond the recursion limit is analyzed without recursion"""
+    levels = sys.getrecursionlimit() * 2
+    path = write_xml('<a>' * levels + 'leaf' + '</a>' * levels)
+    try:
+        analyzer = XMLAnalyzer()
+        analyzer._analyze_stream(path)
+    finally:
+        os.unlink(path)
+    assert analyzer.max_depth == levels - 1 and analyzer.text_content_stats['a'].count == 1
+
+
+def test_reservoir_sample():
+    """The sample is bounded and every text is equally likely to be in it"""
+    hits = [0] * 50
+    for seed in range(2000):
+        stats = TextStats(sample_size=5, rng=random.Random(seed))
+        for i in range(50):
+            stats.add(str(i))
+        assert len(stats.sample) == 5 and stats.count == 50
+        for _, text in stats.sample:
+            hits[int(text)] += 1
+    expected = 2000 * 5 / 50
+    assert all(0.75 * expected < h < 1.25 * expected for h in hits), hits
+
+
+def test_parallel_reports():
+    """--jobs prints the same per-file reports, in file order"""
+    paths = [write_xml(DOCUMENT), write_xml('<root><only>1</only></root>')]
+    try:
+        outputs = []
+        for jobs in (1, 2):
+            output = io.StringIO()
+            with redirect_stdout(output):
+                analyze_multiple_files(paths, jobs=jobs, sample_size=3)
+            outputs.append([line for line in output.getvalue().splitlines() if 'Analyzed in' not in line and 'complete' not in line])
+    finally:
+        for path in paths:
+            os.unlink(path)
+    assert outputs[0] == outputs[1]
+    assert [line for line in outputs[1] if line.startswith('ANALYZING')] == [f"ANALYZING: {p}" for p in paths]
+
+
+if __name__ == "__main__":
+    for test in [test_streaming_statistics, test_deep_document, test_reservoir_sample, test_parallel_reports]:
+        test()
+        print(f"  ✓ {test.__name__}")
+
+    print("\nAll XML analyzer tests passed!")
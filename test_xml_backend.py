@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Test script for the pluggable lxml / ElementTree XML backend (runs offline, lxml optional)
+"""
+
+import os
+import tempfile
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+from xml_backend import BACKENDS, LXML_AVAILABLE, XMLBackend, get_backend, is_complete
+
+DOCUMENT = (
+    '<?xml version="1.0" encoding="ISO-8859-1"?>\n'
+    '<JDBOR><DisorderList count="2">'
+    '<Disorder id="1"><!-- reviewed --><OrphaCode>1</OrphaCode><?orphanet note?><Name lang="fr">Syndrome</Name><Name lang="en">Syndrome \xe9</Name>'
+    '<DisorderDisorderAssociationList><DisorderDisorderAssociation><TargetDisorder><Disorder id="9">'
+    '<OrphaCode>9</OrphaCode></Disorder></TargetDisorder></DisorderDisorderAssociation>'
+    '</DisorderDisorderAssociationList><ExpertLink lang="en"/></Disorder>'
+    '<Disorder id="2"><OrphaCode>2</OrphaCode></Disorder>'
+    '</DisorderList></JDBOR>\n'
+)
+
+PATHS = ['.//OrphaCode', './/Name[@lang="en"]', './/ExpertLink[@lang="en"]', './/TargetDisorder/OrphaCode',
+         'OrphaCode', './/DisorderType/Name[@lang="en"]']
+
+
+def backends():
+    return [XMLBackend(name) for name in BACKENDS if name != 'lxml' or LXML_AVAILABLE]
+
+
+def write_xml(content: str) -> str:
+    with tempfile.NamedTemporaryFile('wb', suffix='.xml', delete=False) as f:
+        f.write(content.encode('iso-8859-1'))
+    return f.name
+
+
+def test_lookups_match_elementtree():
+    """find / findall / findtext give ElementTree's answers on every backend"""
+    path = write_xml(DOCUMENT)
+    try:
+        assert is_complete(path) and not is_complete(Path(__file__).parent / 'file' / 'natural_history_of_rare_diseases_SM.txt')
+        expected_root = ET.parse(path).getroot()
+        expected = [[(d.findtext(p, 'none'), len(d.findall(p))) for p in PATHS] for d in expected_root.iter('Disorder')]
+        for backend in backends():
+            root = backend.parse(path)
+            disorders = backend.findall(root, './/Disorder')
+            assert [[(backend.findtext(d, p, 'none'), len(backend.findall(d, p))) for p in PATHS] for d in disorders] == expected
+            assert backend.find(disorders[0], './/Name[@lang="en"]').text == 'Syndrome \xe9'
+            assert backend.find(disorders[0], 'Missing') is None
+            # Comments and processing instructions are not children on either backend
+            assert [child.tag for child in disorders[0]] == [child.tag for child in expected_root.find('.//Disorder')]
+    finally:
+        os.unlink(path)
+
+
+def test_batches_and_repair_on_every_backend():
+    """Nested tags are streamed like findall('.//tag'); truncated files are repaired the same way"""
+    complete = write_xml(DOCUMENT)
+    truncated = write_xml(DOCUMENT[:DOCUMENT.index('<Disorder id="2">') + 20])
+    try:
+        for backend in backends():
+            batches = [[d.get('id') for d in batch] for batch in backend.iter_batches(complete, 'Disorder', 2)]
+            assert batches == [['9', '1'], ['2']]
+            assert [e.get('id') for _, e in backend.iterparse(complete, tag='Disorder')] == ['9', '1', '2']
+
+            root = backend.parse(truncated)
+            assert [backend.findtext(d, 'OrphaCode') for d in backend.findall(root, './/Disorder')] == ['1', '9', '']
+            assert sum(len(batch) for batch in backend.iter_batches(truncated, 'Disorder', 1)) == 3
+    finally:
+        os.unlink(complete)
+        os.unlink(truncated)
+
+
+def test_backend_selection():
+    """lxml when installed, ElementTree otherwise; ORPHANET_XML_BACKEND forces either"""
+    previous = os.environ.get('ORPHANET_XML_BACKEND')
+    try:
+        os.environ.pop('ORPHANET_XML_BACKEND', None)
+        assert get_backend().name == ('lxml' if LXML_AVAILABLE else 'etree')
+        os.environ['ORPHANET_XML_BACKEND'] = 'etree'
+        assert get_backend().name == 'etree'
+        os.environ['ORPHANET_XML_BACKEND'] = 'auto'
+        assert get_backend().name == ('lxml' if LXML_AVAILABLE else 'etree')
+    finally:
+        if previous is None:
+            os.environ.pop('ORPHANET_XML_BACKEND', None)
+        else:
+            os.environ['ORPHANET_XML_BACKEND'] = previous
+
+    try:
+        XMLBackend('sax')
+        raise AssertionError("unknown backend accepted")
+    except ValueError:
+        pass
+    if not LXML_AVAILABLE:
+        try:
+            XMLBackend('lxml')
+            raise AssertionError("lxml backend created without lxml")
+        except ImportError:
+            pass
+
+
+if __name__ == "__main__":
+    for test in [test_lookups_match_elementtree, test_batches_and_repair_on_every_backend, test_backend_selection]:
+        test()
+        print(f"  ✓ {test.__name__}")
+
+    print("\nAll XML backend tests passed!")
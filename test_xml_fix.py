@@ -4,127 +4,132 @@ Test script to verify XML fixing functionality for truncated SM files
 """
 
 import xml.etree.ElementTree as ET
-from orphanet_supabase_loader import OrphanetSMLoader, SupabaseConfig
+from orphanet_supabase_loader import OrphanetXMLLoader, SupabaseConfig
 import os
+import re
+import tempfile
 from pathlib import Path
 
-def test_xml_fix():
-    """Test the XML fixing functionality"""
-    
-    # Create a dummy loader just for the XML fixing function
+def make_loader() -> OrphanetXMLLoader:
+    """A loader just for the XML functions (no Supabase connection)"""
     config = SupabaseConfig(
         supabase_url="dummy",
         supabase_key="dummy"
     )
-    loader = OrphanetSMLoader(config)
-    
+    return OrphanetXMLLoader(config)
+
+def test_xml_fix():
+    """The truncated natural history file parses back to every record before the cut, the last one intact"""
+
+    loader = make_loader()
+
     # Test with one of the SM files
     file_dir = Path(__file__).parent / "file"
     test_file = file_dir / "natural_history_of_rare_diseases_SM.txt"
-    
+
     if not test_file.exists():
-        print(f"Test file not found: {test_file}")
         return
-    
-    print(f"Testing XML fix with: {test_file.name}")
-    
-    # Read original content
-    with open(test_file, 'r', encoding='iso-8859-1') as f:
-        original_content = f.read()
-    
-    print(f"Original file length: {len(original_content)} characters")
-    print(f"Original file ends with: ...{repr(original_content[-50:])}")
-    
-    # Try to fix it
+
+    kept = test_file.read_bytes()[:loader.find_cut_point(str(test_file))]
+    root = loader.parse_xml(str(test_file))
+    assert root.tag == 'JDBOR'
+
+    # Every disorder started before the cut point is in the repaired tree
+    disorders = root.findall('.//Disorder')
+    assert len(disorders) == kept.count(b'<Disorder ') > 0
+
+    # The last disorder keeps its code and the last complete element before the cut
+    last_code = re.findall(rb'<OrphaCode>(\d+)</OrphaCode>', kept)[-1].decode()
+    last_name = re.findall(rb'<Name lang="en">([^<]*)</Name>', kept)[-1].decode('iso-8859-1')
+    assert disorders[-1].findtext('OrphaCode') == last_code
+    assert [name.text for name in disorders[-1].iter('Name')][-1] == last_name
+
+def test_cut_inside_tag():
+    """A file cut in the middle of a tag loses only the partial tag and closes the open elements"""
+
+    loader = make_loader()
+    content = (
+        '<?xml version="1.0" encoding="ISO-8859-1"?>\n'
+        '<JDBOR><DisorderList count="3">'
+        '<Disorder id="1"><OrphaCode>1</OrphaCode><Name lang="en">Syndrome \xe9</Name></Disorder>'
+        '<Disorder id="2"><OrphaCode>2</OrphaCode><Name lang="en">Disease</Name></Disorder>'
+        '<Disorder id="3"><OrphaCode>3</OrphaCode><Name la'
+    ).encode('iso-8859-1')
+
+    with tempfile.NamedTemporaryFile('wb', suffix='_SM.txt', delete=False) as f:
+        f.write(content)
     try:
-        fixed_content = loader.fix_truncated_xml(str(test_file))
-        print(f"Fixed file length: {len(fixed_content)} characters")
-        print(f"Fixed file ends with: ...{repr(fixed_content[-100:])}")
-        
-        # Try to parse the fixed XML
-        root = ET.fromstring(fixed_content)
-        print(f"✓ Successfully parsed fixed XML!")
-        
-        # Count elements
-        disorders = root.findall('.//Disorder')
-        print(f"Found {len(disorders)} disorders in fixed XML")
-        
-        # Show first disorder info
-        if disorders:
-            first_disorder = disorders[0]
-            orpha_code = first_disorder.findtext('.//OrphaCode', '')
-            name = first_disorder.findtext('.//Name[@lang="en"]', '')
-            print(f"First disorder: {orpha_code} - {name}")
-        
-        return True
-        
-    except Exception as e:
-        print(f"✗ Failed to fix/parse XML: {e}")
-        return False
+        assert loader.find_cut_point(f.name) == content.rindex(b'>') + 1
+
+        root = loader.parse_xml(f.name)
+        assert [d.findtext('OrphaCode') for d in root.iter('Disorder')] == ['1', '2', '3']
+        assert root.find('.//Disorder/Name').text == 'Syndrome \xe9'
+
+        # Batches hold the same disorders; processed ones are detached from the tree
+        batches = [[d.get('id') for d in batch] for batch in loader.iter_batches(f.name, 'Disorder', 2)]
+        assert batches == [['1', '2'], ['3']]
+    finally:
+        os.unlink(f.name)
 
 def test_all_sm_files():
     """Test XML fixing with all SM files"""
-    
-    config = SupabaseConfig(
-        supabase_url="dummy", 
-        supabase_key="dummy"
-    )
-    loader = OrphanetSMLoader(config)
-    
+
+    loader = make_loader()
+
     file_dir = Path(__file__).parent / "file"
     sm_files = list(file_dir.glob("*_SM.txt"))
-    
+
     print(f"\nTesting XML fixing with all {len(sm_files)} SM files:")
     print("=" * 60)
-    
+
     results = {}
-    
+
     for sm_file in sm_files:
         print(f"\nTesting: {sm_file.name}")
         try:
-            fixed_content = loader.fix_truncated_xml(str(sm_file))
-            root = ET.fromstring(fixed_content)
-            
-            # Count different types of elements
-            disorders = root.findall('.//Disorder')
-            hpo_disorders = root.findall('.//HPODisorderSetStatus')
-            disabilities = root.findall('.//DisorderDisabilityRelevance')
-            
+            # Count different types of elements, streamed in batches
+            disorders, hpo_disorders, disabilities = [
+                sum(len(batch) for batch in loader.iter_batches(str(sm_file), tag, 100))
+                for tag in ('Disorder', 'HPODisorderSetStatus', 'DisorderDisabilityRelevance')
+            ]
+
             results[sm_file.name] = {
                 'success': True,
-                'disorders': len(disorders),
-                'hpo_disorders': len(hpo_disorders),
-                'disabilities': len(disabilities)
+                'disorders': disorders,
+                'hpo_disorders': hpo_disorders,
+                'disabilities': disabilities
             }
-            
-            print(f"  ✓ Success - Disorders: {len(disorders)}, HPO: {len(hpo_disorders)}, Disabilities: {len(disabilities)}")
-            
+
+            print(f"  ✓ Success - Disorders: {disorders}, HPO: {hpo_disorders}, Disabilities: {disabilities}")
+
         except Exception as e:
             results[sm_file.name] = {
                 'success': False,
                 'error': str(e)
             }
             print(f"  ✗ Failed: {e}")
-    
+
     # Summary
     print(f"\n{'='*60}")
     print("SUMMARY:")
     successful = sum(1 for r in results.values() if r['success'])
     print(f"Successfully fixed: {successful}/{len(sm_files)} files")
-    
+
     for filename, result in results.items():
         if result['success']:
             print(f"  ✓ {filename}")
         else:
             print(f"  ✗ {filename}: {result['error']}")
 
+    assert successful == len(sm_files)
+
 if __name__ == "__main__":
     print("Testing XML fixing functionality for truncated SM files")
     print("=" * 60)
-    
-    # Test single file first
-    if test_xml_fix():
-        # Test all files
-        test_all_sm_files()
-    else:
-        print("Single file test failed, skipping bulk test")
\ No newline at end of file
+
+    for test in [test_xml_fix, test_cut_inside_tag]:
+        test()
+        print(f"  ✓ {test.__name__}")
+
+    # Test all files
+    test_all_sm_files()
@@ -1,19 +1,81 @@
 import xml.etree.ElementTree as ET
 import os
+import io
+import math
+import time
+import random
 from collections import defaultdict, Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
 import argparse
 import sys
 from pathlib import Path
 
+# Structure sample: levels below the root and children per element that are kept
+SAMPLE_DEPTH = 3
+SAMPLE_CHILDREN = 5
+
+# Bytes fed to the parser at a time
+CHUNK_SIZE = 64 * 1024
+
+class TextStats:
+    """Running text length statistics of one element type, with an optional reservoir sample"""
+    
+    def __init__(self, sample_size=0, rng=None):
+        self.count = 0
+        self.total = 0
+        self.min_length = None
+        self.max_length = 0
+        self.sample_size = sample_size
+        self.rng = rng
+        self.sample = []  # (length, text) pairs, uniform over all texts seen
+    
+    def add(self, text):
+        length = len(text)
+        self.count += 1
+        self.total += length
+        self.min_length = length if self.min_length is None else min(self.min_length, length)
+        self.max_length = max(self.max_length, length)
+        
+        # Reservoir sampling (algorithm L): every text ends up in the sample with probability k/n,
+        # with a random draw only for the texts that replace a sampled one
+        if self.sample_size:
+            if len(self.sample) < self.sample_size:
+                self.sample.append((length, text))
+                if len(self.sample) == self.sample_size:
+                    self._weight = math.exp(math.log(self.rng.random()) / self.sample_size)
+                    self._skip_to(self.count)
+            elif self.count == self._next:
+                self.sample[self.rng.randrange(self.sample_size)] = (length, text)
+                self._weight *= math.exp(math.log(self.rng.random()) / self.sample_size)
+                self._skip_to(self.count)
+    
+    def _skip_to(self, count):
+        """Index of the next text that enters the full reservoir"""
+        self._next = count + int(math.log(self.rng.random()) / math.log(1 - self._weight)) + 1
+    
+    @property
+    def average(self):
+        return self.total / self.count if self.count else 0.0
+    
+    def percentile(self, q):
+        """Text length at quantile q of the sample"""
+        lengths = sorted(length for length, _ in self.sample)
+        return lengths[min(int(q * len(lengths)), len(lengths) - 1)] if lengths else None
+
 class XMLAnalyzer:
-    def __init__(self):
+    def __init__(self, sample_size=0, seed=42):
+        self.sample_size = sample_size  # Reservoir size per element type for text samples (0 = off)
+        self.seed = seed
         self.element_counts = Counter()
         self.attribute_counts = defaultdict(Counter)
-        self.text_content_stats = defaultdict(list)
+        self.text_content_stats = {}
         self.namespace_counts = Counter()
+        self.depth_counts = Counter()
         self.max_depth = 0
         self.total_elements = 0
         self.file_size = 0
+        self.structure_sample = None
         
     def analyze_file(self, file_path):
         """Analyze a single XML file"""
@@ -26,55 +88,126 @@ class XMLAnalyzer:
         print(f"File Size: {self.file_size:,} bytes ({self.file_size/1024/1024:.2f} MB)")
         
         try:
-            # Parse XML file
-            tree = ET.parse(file_path)
-            root = tree.getroot()
-            
-            # Reset counters for this file
-            self.element_counts.clear()
-            self.attribute_counts.clear()
-            self.text_content_stats.clear()
-            self.namespace_counts.clear()
-            self.max_depth = 0
-            self.total_elements = 0
-            
-            # Analyze structure
-            self._analyze_element(root, depth=0)
+            # Single streaming pass over the file
+            start = time.perf_counter()
+            self._analyze_stream(file_path)
+            elapsed = time.perf_counter() - start
             
             # Print analysis results
-            self._print_analysis_results(root)
+            self._print_analysis_results()
+            print(f"\n⏱️  Analyzed in {elapsed:.2f}s ({self.file_size / 1024 / 1024 / max(elapsed, 1e-9):.1f} MB/s)")
             
         except ET.ParseError as e:
             print(f"ERROR: Failed to parse XML file - {e}")
         except Exception as e:
             print(f"ERROR: {e}")
     
-    def _analyze_element(self, element, depth=0):
-        """Recursively analyze XML elements"""
-        self.total_elements += 1
-        self.max_depth = max(self.max_depth, depth)
+    def _reset(self):
+        """Reset counters for a new file"""
+        self.element_counts.clear()
+        self.attribute_counts.clear()
+        self.text_content_stats = {}
+        self.namespace_counts.clear()
+        self.depth_counts.clear()
+        self.max_depth = 0
+        self.total_elements = 0
+        self.structure_sample = None
+    
+    def _analyze_stream(self, file_path):
+        """
+        Element, attribute, depth and text statistics in one streaming pass. The analyzer is the
+        parser target, so no element tree is built and memory is bounded by the document depth.
+        """
+        self._reset()
+        self._rng = random.Random(self.seed)
+        self._raw_counts = Counter()  # Per raw tag; folded into element and namespace counts at the end
+        self._clean_tags = {}         # Raw tag -> tag without namespace
+        self._depth = -1
+        self._has_children = []       # Per open element: a child started (its text is complete)
+        self._texts = []              # Per open element: text before its first child
+        self._parts = []              # Character data since the last start/end tag
+        self._sample_path = []        # Structure sample nodes of the open elements (None below the sampled levels)
+        
+        parser = ET.XMLParser(target=self)
+        with open(file_path, 'rb') as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                parser.feed(chunk)
+        parser.close()
         
-        # Count element tags
-        tag = self._clean_tag(element.tag)
-        self.element_counts[tag] += 1
+        for raw_tag, count in self._raw_counts.items():
+            self.element_counts[self._clean_tags[raw_tag]] += count
+            
+            # Count namespaces
+            if '}' in raw_tag:
+                self.namespace_counts[raw_tag.split('}')[0] + '}'] += count
+        
+        self.total_elements = sum(self.depth_counts.values())
+        self.max_depth = max(self.depth_counts, default=0)
+    
+    # Parser target callbacks
+    
+    def start(self, raw_tag, attrib):
+        self._depth += 1
+        depth = self._depth
+        self.depth_counts[depth] += 1
+        self._raw_counts[raw_tag] += 1
         
-        # Count namespaces
-        if '}' in element.tag:
-            namespace = element.tag.split('}')[0] + '}'
-            self.namespace_counts[namespace] += 1
+        tag = self._clean_tags.get(raw_tag)
+        if tag is None:
+            tag = self._clean_tags[raw_tag] = self._clean_tag(raw_tag)
         
         # Count attributes
-        for attr_name, attr_value in element.attrib.items():
-            self.attribute_counts[tag][attr_name] += 1
+        if attrib:
+            counts = self.attribute_counts[tag]
+            for attr_name in attrib:
+                counts[attr_name] += 1
         
-        # Analyze text content
-        if element.text and element.text.strip():
-            text_length = len(element.text.strip())
-            self.text_content_stats[tag].append(text_length)
+        # The parent's text ends where its first child starts
+        if self._has_children and not self._has_children[-1]:
+            self._has_children[-1] = True
+            self._texts[-1] = ''.join(self._parts)
+        self._parts = []
+        self._has_children.append(False)
+        self._texts.append(None)
         
-        # Recursively analyze children
-        for child in element:
-            self._analyze_element(child, depth + 1)
+        # Structure sample: the first children of the first levels; deeper children are only counted
+        parent = self._sample_path[-1] if self._sample_path else None
+        node = None
+        if depth == 0:
+            node = self.structure_sample = {'tag': tag, 'attrs': len(attrib), 'has_text': False, 'children': [], 'n_children': 0}
+        elif parent is not None:
+            parent['n_children'] += 1
+            if depth <= SAMPLE_DEPTH and parent['n_children'] <= SAMPLE_CHILDREN:
+                node = {'tag': tag, 'attrs': len(attrib), 'has_text': False, 'children': [], 'n_children': 0}
+                parent['children'].append(node)
+        self._sample_path.append(node)
+    
+    def data(self, text):
+        self._parts.append(text)
+    
+    def end(self, raw_tag):
+        self._depth -= 1
+        text = self._texts.pop()
+        if not self._has_children.pop():
+            text = ''.join(self._parts)
+        self._parts = []
+        node = self._sample_path.pop()
+        
+        # Analyze text content
+        if text and not text.isspace():
+            tag = self._clean_tags[raw_tag]
+            stats = self.text_content_stats.get(tag)
+            if stats is None:
+                stats = self.text_content_stats[tag] = TextStats(self.sample_size, self._rng)
+            stats.add(text.strip())
+            if node is not None:
+                node['has_text'] = True
+    
+    def close(self):
+        return None
     
     def _clean_tag(self, tag):
         """Remove namespace from tag for cleaner display"""
@@ -82,16 +215,21 @@ class XMLAnalyzer:
             return tag.split('}')[1]
         return tag
     
-    def _print_analysis_results(self, root):
+    def _print_analysis_results(self):
         """Print comprehensive analysis results"""
         
         # Basic structure info
         print(f"\n📊 BASIC STRUCTURE:")
-        print(f"Root Element: {self._clean_tag(root.tag)}")
+        print(f"Root Element: {self.structure_sample['tag'] if self.structure_sample else '-'}")
         print(f"Total Elements: {self.total_elements:,}")
         print(f"Maximum Depth: {self.max_depth}")
         print(f"Unique Element Types: {len(self.element_counts)}")
         
+        # Elements per depth
+        print(f"\n📐 DEPTH DISTRIBUTION:")
+        for depth in sorted(self.depth_counts):
+            print(f"  depth {depth:<3} {self.depth_counts[depth]:,} elements")
+        
         # Namespaces
         if self.namespace_counts:
             print(f"\n🔗 NAMESPACES ({len(self.namespace_counts)}):")
@@ -118,47 +256,49 @@ class XMLAnalyzer:
         
         # Text content analysis
         print(f"\n📝 TEXT CONTENT ANALYSIS:")
-        elements_with_text = {k: v for k, v in self.text_content_stats.items() if v}
-        if elements_with_text:
-            for element in sorted(elements_with_text.keys())[:10]:  # Show top 10
-                lengths = self.text_content_stats[element]
-                avg_length = sum(lengths) / len(lengths)
-                max_length = max(lengths)
-                min_length = min(lengths)
-                print(f"  {element}: {len(lengths):,} elements with text")
-                print(f"    └─ Avg length: {avg_length:.1f} chars, Range: {min_length}-{max_length}")
+        if self.text_content_stats:
+            for element in sorted(self.text_content_stats.keys())[:10]:  # Show top 10
+                stats = self.text_content_stats[element]
+                print(f"  {element}: {stats.count:,} elements with text")
+                print(f"    └─ Avg length: {stats.average:.1f} chars, Range: {stats.min_length}-{stats.max_length}")
+                if stats.sample:
+                    example = stats.sample[0][1]
+                    print(f"    └─ Sampled ({len(stats.sample):,}): median {stats.percentile(0.5)}, "
+                          f"p95 {stats.percentile(0.95)} chars, e.g. {example[:60]!r}")
         else:
             print("  No text content found")
         
         # Structure hierarchy (sample)
         print(f"\n🌳 STRUCTURE SAMPLE:")
-        self._print_structure_sample(root, max_depth=3)
+        if self.structure_sample:
+            self._print_structure_sample(self.structure_sample)
     
-    def _print_structure_sample(self, element, depth=0, max_depth=3, prefix=""):
-        """Print a sample of the XML structure"""
-        if depth > max_depth:
-            return
+    def _print_structure_sample(self, node, prefix=""):
+        """Print the sampled XML structure"""
+        attrs_info = f" [{node['attrs']} attrs]" if node['attrs'] else ""
+        text_info = " [has text]" if node['has_text'] else ""
         
-        tag = self._clean_tag(element.tag)
-        attrs_info = f" [{len(element.attrib)} attrs]" if element.attrib else ""
-        text_info = " [has text]" if element.text and element.text.strip() else ""
+        print(f"{prefix}{node['tag']}{attrs_info}{text_info}")
         
-        print(f"{prefix}{tag}{attrs_info}{text_info}")
-        
-        # Show only first few children to avoid overwhelming output
-        children = list(element)[:5]  # First 5 children
+        # Only the first few children were kept to avoid overwhelming output
+        children = node['children']
         for i, child in enumerate(children):
             is_last = (i == len(children) - 1)
-            child_prefix = prefix + ("└── " if is_last else "├── ")
-            self._print_structure_sample(child, depth + 1, max_depth, 
-                                       prefix + ("    " if is_last else "│   "))
+            self._print_structure_sample(child, prefix + ("    " if is_last else "│   "))
         
-        if len(element) > 5:
-            print(f"{prefix}    ... and {len(element) - 5} more children")
+        if node['n_children'] > SAMPLE_CHILDREN:
+            print(f"{prefix}    ... and {node['n_children'] - SAMPLE_CHILDREN} more children")
+
+def _analyze_to_text(file_path, sample_size, seed):
+    """Analysis report of one file as text (runs in a worker process)"""
+    output = io.StringIO()
+    with redirect_stdout(output):
+        XMLAnalyzer(sample_size, seed).analyze_file(file_path)
+    return output.getvalue()
 
-def analyze_multiple_files(file_paths):
-    """Analyze multiple XML files and provide summary"""
-    analyzer = XMLAnalyzer()
+def analyze_multiple_files(file_paths, jobs=1, sample_size=0, seed=42):
+    """Analyze multiple XML files and provide summary; jobs > 1 analyzes files in parallel processes"""
+    analyzer = XMLAnalyzer(sample_size, seed)
     
     print("🔍 XML FILE ANALYZER")
     print("=" * 60)
@@ -176,16 +316,28 @@ def analyze_multiple_files(file_paths):
     
     print(f"📁 Found {len(valid_files)} XML file(s) to analyze")
     
-    # Analyze each file
-    for file_path in valid_files:
-        analyzer.analyze_file(file_path)
+    start = time.perf_counter()
+    if jobs > 1 and len(valid_files) > 1:
+        # Reports are printed in file order once each worker is done
+        with ProcessPoolExecutor(max_workers=min(jobs, len(valid_files))) as executor:
+            reports = executor.map(_analyze_to_text, valid_files, [sample_size] * len(valid_files), [seed] * len(valid_files))
+            for report in reports:
+                print(report, end='')
+    else:
+        # Analyze each file
+        for file_path in valid_files:
+            analyzer.analyze_file(file_path)
     
-    print(f"\n✅ Analysis complete!")
+    print(f"\n✅ Analysis complete! ({len(valid_files)} files in {time.perf_counter() - start:.2f}s)")
 
 def main():
     parser = argparse.ArgumentParser(description='Analyze XML file structure and content')
     parser.add_argument('files', nargs='+', help='XML file paths to analyze')
     parser.add_argument('--directory', '-d', help='Analyze all XML files in directory')
+    parser.add_argument('--jobs', '-j', type=int, default=1, help='Files analyzed in parallel (default: 1)')
+    parser.add_argument('--sample', type=int, default=0,
+                        help='Reservoir-sample this many texts per element type for median/p95 lengths (default: off)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed of the text sample')
     
     args = parser.parse_args()
     
@@ -211,7 +363,7 @@ def main():
         print("  python xml_analyzer.py -d /path/to/xml/directory")
         return
     
-    analyze_multiple_files(file_paths)
+    analyze_multiple_files(file_paths, args.jobs, args.sample, args.seed)
 
 if __name__ == "__main__":
     # If no command line args, show usage
@@ -222,6 +374,7 @@ if __name__ == "__main__":
         print("  python xml_analyzer.py file1.xml file2.xml")
         print("  python xml_analyzer.py -d /path/to/xml/directory")
         print("  python xml_analyzer.py *.xml")
+        print("  python xml_analyzer.py -j 4 --sample 1000 *.xml")
         print("\nThis script analyzes XML files and shows:")
         print("• File structure and hierarchy")
         print("• Element frequency and distribution")
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+XML Backend - One parsing interface over xml.etree.ElementTree and lxml
+
+The Orphanet readers parse, stream and search through the global `xml_parser`, which runs on
+lxml when it is installed and on ElementTree otherwise (ORPHANET_XML_BACKEND=etree or lxml forces
+one). With lxml, path
+lookups are compiled XPath expressions cached per path, streaming filters tags in C and huge_tree
+lifts the libxml2 limits for the full-size dumps. Comments and processing instructions are dropped
+while parsing, as ElementTree does, so both backends build trees of elements only.
+
+Both backends repair truncated files (head -500 extracts): the bytes up to the last complete tag
+are parsed and the elements still open are closed with synthesized end tags.
+"""
+
+import os
+import re
+import logging
+import xml.etree.ElementTree as ET
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+try:
+    from lxml import etree as lxml_etree
+    LXML_AVAILABLE = True
+except ImportError:
+    lxml_etree = None
+    LXML_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('lxml', 'etree')
+
+# Backend when ORPHANET_XML_BACKEND is not set
+DEFAULT_BACKEND = 'auto'
+
+# lxml parser options: no libxml2 size limits, and no comment / processing instruction nodes
+# (ElementTree drops them too, so iterating an element yields the same children on both backends)
+LXML_OPTIONS = {'huge_tree': True, 'remove_comments': True, 'remove_pis': True}
+
+# Truncated files are cut after the last complete tag found in this many trailing bytes
+TAIL_BYTES = 64 * 1024
+
+# Bytes fed to the incremental parsers at a time (small chunks keep their event queues short)
+CHUNK_SIZE = 16 * 1024
+
+# First element name of a document (skips the <?xml ...?> declaration, comments and DOCTYPE)
+ROOT_TAG = re.compile(rb'<([A-Za-z_][\w.\-:]*)')
+
+# Raised by either backend on malformed XML
+PARSE_ERRORS: Tuple[type, ...] = (ET.ParseError,) + ((lxml_etree.XMLSyntaxError,) if LXML_AVAILABLE else ())
+
+
+def find_cut_point(xml_file: str) -> int:
+    """Byte offset just past the last complete tag; only the tail of the file is read"""
+    size = os.path.getsize(xml_file)
+    start = max(0, size - TAIL_BYTES)
+    with open(xml_file, 'rb') as f:
+        f.seek(start)
+        tail = f.read()
+
+    # Anything after the last '>' is a tag, text or character cut off mid-way
+    end = tail.rfind(b'>')
+    if end == -1:
+        raise ET.ParseError(f"No complete tag in the last {TAIL_BYTES} bytes of {xml_file}")
+    return start + end + 1
+
+
+def is_complete(xml_file: str) -> bool:
+    """Whether the file ends with the end tag of its root element (only head and tail are read)"""
+    with open(xml_file, 'rb') as f:
+        match = ROOT_TAG.search(f.read(4096))
+        f.seek(max(0, os.path.getsize(xml_file) - 1024))
+        tail = f.read().rstrip()
+    return bool(match) and tail.endswith(b'</' + match.group(1) + b'>')
+
+
+class XMLBackend:
+    """parse / iterparse / iter_batches and find / findall / findtext on one XML library"""
+
+    def __init__(self, name: str = 'auto'):
+        if name == 'auto':
+            name = 'lxml' if LXML_AVAILABLE else 'etree'
+        if name not in BACKENDS:
+            raise ValueError(f"Unknown XML backend '{name}', expected one of {BACKENDS}")
+        if name == 'lxml' and not LXML_AVAILABLE:
+            raise ImportError("lxml is not installed (pip install lxml)")
+        self.name = name
+        self._xpaths: Dict[Tuple[str, bool], Callable] = {}
+
+    # Parsing
+
+    def parse(self, xml_file: str) -> Any:
+        """Root element of an XML file, repairing truncated files"""
+        if is_complete(xml_file):
+            if self.name == 'lxml':
+                return lxml_etree.parse(xml_file, lxml_etree.XMLParser(**LXML_OPTIONS)).getroot()
+            return ET.parse(xml_file).getroot()
+
+        root = None
+        for event, elem in self._repaired_events(xml_file, ('start',)):
+            if root is None:
+                root = elem
+        return root
+
+    def iterparse(self, xml_file: str, events: Tuple[str, ...] = ('end',),
+                  tag: Optional[str] = None) -> Iterator[Tuple[str, Any]]:
+        """(event, element) pairs, optionally only for <tag> elements, repairing truncated files"""
+        if not is_complete(xml_file):
+            pairs = self._repaired_events(xml_file, events)
+        elif self.name == 'lxml':
+            return lxml_etree.iterparse(xml_file, events=events, tag=tag, **LXML_OPTIONS)
+        else:
+            pairs = ET.iterparse(xml_file, events=events)
+        if tag is None:
+            return pairs
+        return ((event, elem) for event, elem in pairs if elem.tag == tag)
+
+    def _repaired_events(self, xml_file: str, events: Tuple[str, ...]) -> Iterator[Tuple[str, Any]]:
+        """Events of the bytes up to the last complete tag, then of end tags for the elements left open"""
+        cut = find_cut_point(xml_file)
+        if self.name == 'lxml':
+            parser = lxml_etree.XMLPullParser(events=('start', 'end'), **LXML_OPTIONS)
+        else:
+            parser = ET.XMLPullParser(events=('start', 'end'))
+        open_tags = []
+
+        def read_events():
+            for event, elem in parser.read_events():
+                if event == 'start':
+                    open_tags.append(elem.tag)
+                else:
+                    open_tags.pop()
+                if event in events:
+                    yield event, elem
+
+        # Bytes go to the parser as-is, so the encoding declared by the file applies
+        with open(xml_file, 'rb') as f:
+            remaining = cut
+            while remaining > 0:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                parser.feed(chunk)
+                yield from read_events()
+
+        if open_tags:
+            logger.info(f"Truncated XML {xml_file}: closing {len(open_tags)} open elements after byte {cut}")
+            parser.feed(''.join(f"</{tag}>" for tag in reversed(open_tags)).encode('utf-8'))
+        parser.close()
+        yield from read_events()
+
+    def iter_batches(self, xml_file: str, tag: str, batch_size: int) -> Iterator[List[Any]]:
+        """
+        Complete <tag> elements in lists of up to batch_size, in constant memory: a batch is cleared
+        and detached from the tree once the caller asks for the next one. Nested <tag> elements are
+        yielded as well (like root.findall('.//tag')) and freed together with their outermost <tag>.
+        """
+        if self.name == 'lxml' and is_complete(xml_file):
+            yield from self._lxml_batches(xml_file, tag, batch_size)
+            return
+
+        path = []  # Elements currently open
+        depth = 0  # Open <tag> elements
+        batch, release = [], []
+
+        for event, elem in self.iterparse(xml_file, events=('start', 'end')):
+            if event == 'start':
+                path.append(elem)
+                if elem.tag == tag:
+                    depth += 1
+                continue
+
+            path.pop()
+            if elem.tag != tag:
+                continue
+            depth -= 1
+            batch.append(elem)
+            if depth == 0 and path:
+                release.append((path[-1], elem))
+
+            if len(batch) >= batch_size:
+                yield batch
+                self._release(release)
+                batch, release = [], []
+
+        if batch:
+            yield batch
+            self._release(release)
+
+    def _lxml_batches(self, xml_file: str, tag: str, batch_size: int) -> Iterator[List[Any]]:
+        """iter_batches on lxml: only <tag> end events reach Python, parents come from getparent()"""
+        batch, release = [], []
+        for event, elem in lxml_etree.iterparse(xml_file, events=('end',), tag=tag, **LXML_OPTIONS):
+            batch.append(elem)
+            parent = elem.getparent()
+            if parent is not None and next(elem.iterancestors(tag), None) is None:
+                release.append((parent, elem))
+
+            if len(batch) >= batch_size:
+                yield batch
+                self._release(release)
+                batch, release = [], []
+
+        if batch:
+            yield batch
+            self._release(release)
+
+    @staticmethod
+    def _release(elements: List[Tuple[Any, Any]]):
+        """Free processed (parent, element) pairs"""
+        for parent, elem in elements:
+            elem.clear()
+            parent.remove(elem)
+
+    # Searching
+
+    def _xpath(self, path: str, first: bool) -> Callable:
+        """Compiled XPath for an ElementPath expression (the subset used here is valid XPath)"""
+        key = (path, first)
+        xpath = self._xpaths.get(key)
+        if xpath is None:
+            xpath = self._xpaths[key] = lxml_etree.XPath(f"({path})[1]" if first else path)
+        return xpath
+
+    def findall(self, elem: Any, path: str) -> List[Any]:
+        """All elements matching path, in document order"""
+        if self.name == 'etree' or '{' in path:
+            return elem.findall(path)
+        return self._xpath(path, False)(elem)
+
+    def find(self, elem: Any, path: str) -> Optional[Any]:
+        """First element matching path, or None"""
+        if self.name == 'etree' or '{' in path:
+            return elem.find(path)
+        found = self._xpath(path, True)(elem)
+        return found[0] if found else None
+
+    def findtext(self, elem: Any, path: str, default: str = '') -> str:
+        """Text of the first element matching path ('' when it has none), or default when none matches"""
+        if self.name == 'etree' or '{' in path:
+            return elem.findtext(path, default)
+        found = self._xpath(path, True)(elem)
+        return (found[0].text or '') if found else default
+
+
+def get_backend(name: Optional[str] = None) -> XMLBackend:
+    """Backend by name, defaulting to ORPHANET_XML_BACKEND (auto when unset: lxml when installed)"""
+    return XMLBackend(name or os.getenv('ORPHANET_XML_BACKEND', DEFAULT_BACKEND))
+
+
+# Global instance
+xml_parser = get_backend()
@@ -1,4 +1,3 @@
-import xml.etree.ElementTree as ET
 import os
 import psycopg2
 from psycopg2.extras import execute_batch
@@ -6,10 +5,16 @@ import logging
 import time
 from urllib.parse import quote_plus
 
+from orphanet_extract import extract_records, print_report, run_extraction
+from xml_backend import PARSE_ERRORS
+
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Record kinds with a table in this schema (in insertion order)
+POSTGRES_KINDS = ('disorders', 'hpo_terms', 'hpo_associations', 'prevalences')
+
 class XMLToPostgresLoader:
     def __init__(self, connection_string):
         """Initialize connection with retry logic"""
@@ -55,6 +60,32 @@ class XMLToPostgresLoader:
             logger.error(f"Connection test failed: {e}")
             return False
 
+    # Record sink interface (see orphanet_extract.RecordSink); close() is the connection's
+
+    name = 'postgres'
+
+    def write(self, batch):
+        """Insert one record batch of the kinds this schema has"""
+        rows = self.legacy_rows(batch.kind, batch.rows)
+        if batch.kind in POSTGRES_KINDS and rows:
+            self.insert_data_batch({batch.kind: rows})
+
+    @staticmethod
+    def legacy_rows(kind, rows):
+        """Records trimmed to fit the database fields, skipping disorders/HPO terms without essential data"""
+        if kind == 'disorders':
+            return [{'orpha_code': d['orpha_code'], 'name': d['name'][:150],  # Truncate to fit database field
+                     'expert_link': d['expert_link'], 'external_id': d['external_id']}
+                    for d in rows if d['orpha_code'] and d['name']]
+        if kind == 'hpo_terms':
+            return [{'hpo_id': h['hpo_id'], 'term': h['term'][:120]}  # Truncate to fit database field
+                    for h in rows if h['hpo_id'] and h['term']]
+        if kind == 'hpo_associations':
+            return [a for a in rows if a['hpo_id']]
+        if kind == 'prevalences':
+            return [p for p in rows if p['disorder_orpha_code']]
+        return rows
+
     def parse_clinical_signs_xml(self, xml_file):
         """Parse Clinical signs and symptoms XML"""
         logger.info(f"Parsing clinical signs XML: {xml_file}")
@@ -64,67 +95,15 @@ class XMLToPostgresLoader:
             return [], [], []
 
         try:
-            tree = ET.parse(xml_file)
-            root = tree.getroot()
-
-            disorders = []
-            hpo_terms = []
-            associations = []
-
-            disorder_count = 0
-            for disorder_elem in root.findall('.//Disorder'):
-                disorder_count += 1
-                if disorder_count % 1000 == 0:
-                    logger.info(f"Processed {disorder_count} disorders...")
-
-                # Extract disorder info
-                disorder_id = disorder_elem.get('id')
-                orpha_code_elem = disorder_elem.find('OrphaCode')
-                name_elem = disorder_elem.find('Name')
-                expert_link_elem = disorder_elem.find('ExpertLink')
-
-                orpha_code = orpha_code_elem.text if orpha_code_elem is not None else None
-                name = name_elem.text if name_elem is not None else None
-                expert_link = expert_link_elem.text if expert_link_elem is not None else None
-
-                if orpha_code and name:  # Only add if we have essential data
-                    disorders.append({
-                        'orpha_code': orpha_code,
-                        'name': name[:150],  # Truncate to fit database field
-                        'expert_link': expert_link,
-                        'external_id': disorder_id
-                    })
-
-                # Extract HPO associations
-                hpo_list = disorder_elem.find('HPODisorderAssociationList')
-                if hpo_list is not None:
-                    for hpo_assoc in hpo_list.findall('HPODisorderAssociation'):
-                        hpo_elem = hpo_assoc.find('HPO')
-                        if hpo_elem is not None:
-                            hpo_id_elem = hpo_elem.find('HPOId')
-                            hpo_term_elem = hpo_elem.find('HPOTerm')
-                            hpo_freq_elem = hpo_elem.find('HPOFrequency')
-
-                            hpo_id = hpo_id_elem.text if hpo_id_elem is not None else None
-                            hpo_term = hpo_term_elem.text if hpo_term_elem is not None else None
-                            frequency = hpo_freq_elem.text if hpo_freq_elem is not None else None
-
-                            if hpo_id and hpo_term:
-                                hpo_terms.append({
-                                    'hpo_id': hpo_id,
-                                    'term': hpo_term[:120]  # Truncate to fit database field
-                                })
-
-                                associations.append({
-                                    'disorder_orpha_code': orpha_code,
-                                    'hpo_id': hpo_id,
-                                    'frequency': frequency
-                                })
+            records = extract_records(xml_file, ('disorders', 'hpo_terms', 'hpo_associations'))
+            disorders = self.legacy_rows('disorders', records['disorders'])
+            hpo_terms = self.legacy_rows('hpo_terms', records['hpo_terms'])
+            associations = self.legacy_rows('hpo_associations', records['hpo_associations'])
 
             logger.info(f"Parsed {len(disorders)} disorders, {len(hpo_terms)} HPO terms, {len(associations)} associations")
             return disorders, hpo_terms, associations
 
-        except ET.ParseError as e:
+        except PARSE_ERRORS as e:
             logger.error(f"XML parsing error: {e}")
             return [], [], []
         except Exception as e:
@@ -140,30 +119,7 @@ class XMLToPostgresLoader:
             return []
 
         try:
-            tree = ET.parse(xml_file)
-            root = tree.getroot()
-
-            prevalences = []
-
-            for disorder_elem in root.findall('.//Disorder'):
-                orpha_code_elem = disorder_elem.find('OrphaCode')
-                orpha_code = orpha_code_elem.text if orpha_code_elem is not None else None
-
-                if not orpha_code:
-                    continue
-
-                prev_list = disorder_elem.find('PrevalenceList')
-                if prev_list is not None:
-                    for prev_elem in prev_list.findall('Prevalence'):
-                        prevalence_data = {
-                            'disorder_orpha_code': orpha_code,
-                            'prevalence_type': self.safe_get_text(prev_elem, 'PrevalenceType'),
-                            'prevalence_class': self.safe_get_text(prev_elem, 'PrevalenceClass'),
-                            'val_moy': self.safe_get_text(prev_elem, 'ValMoy'),
-                            'geographic_area': self.safe_get_text(prev_elem, 'PrevalenceGeographic'),
-                            'source': self.safe_get_text(prev_elem, 'Source')
-                        }
-                        prevalences.append(prevalence_data)
+            prevalences = self.legacy_rows('prevalences', extract_records(xml_file, ('prevalences',))['prevalences'])
 
             logger.info(f"Parsed {len(prevalences)} prevalence records")
             return prevalences
@@ -172,11 +128,6 @@ class XMLToPostgresLoader:
             logger.error(f"Error parsing epidemiology XML: {e}")
             return []
 
-    def safe_get_text(self, parent, tag_name):
-        """Safely get text from XML element"""
-        elem = parent.find(tag_name)
-        return elem.text if elem is not None else None
-
     def insert_data_batch(self, data_dict, batch_size=1000):
         """Insert all data into database with batch processing"""
         try:
@@ -341,34 +292,17 @@ def main():
             # Add other files as needed...
         }
 
-        all_data = {
-            'disorders': [],
-            'hpo_terms': [],
-            'hpo_associations': [],
-            'prevalences': []
-        }
-
-        # Parse clinical signs file
-        if os.path.exists(xml_files['clinical_signs']):
-            logger.info("Processing clinical signs file...")
-            disorders, hpo_terms, associations = loader.parse_clinical_signs_xml(xml_files['clinical_signs'])
-            all_data['disorders'].extend(disorders)
-            all_data['hpo_terms'].extend(hpo_terms)
-            all_data['hpo_associations'].extend(associations)
-        else:
-            logger.warning(f"Clinical signs file not found: {xml_files['clinical_signs']}")
-
-        # Parse epidemiology file
-        if os.path.exists(xml_files['epidemiology']):
-            logger.info("Processing epidemiology file...")
-            prevalences = loader.parse_epidemiology_xml(xml_files['epidemiology'])
-            all_data['prevalences'].extend(prevalences)
-        else:
-            logger.warning(f"Epidemiology file not found: {xml_files['epidemiology']}")
-
-        # Insert all data
-        if any(all_data.values()):
-            loader.insert_data_batch(all_data)
+        xml_paths = []
+        for kind, xml_file in xml_files.items():
+            if os.path.exists(xml_file):
+                xml_paths.append(xml_file)
+            else:
+                logger.warning(f"{kind} file not found: {xml_file}")
+
+        # One pass per file, each batch inserted as soon as it is extracted
+        if xml_paths:
+            report = run_extraction(xml_paths, [loader], kinds=POSTGRES_KINDS, close=False)
+            print_report(report)
             loader.get_stats()
         else:
             logger.warning("No data to insert!")
@@ -1,4 +1,3 @@
-import xml.etree.ElementTree as ET
 import csv
 import os
 from pathlib import Path
@@ -6,119 +5,59 @@ import psycopg2
 from psycopg2.extras import execute_batch
 import logging
 
+from orphanet_extract import extract_records, run_extraction
+
+# Record kinds insert_data writes (in insertion order)
+SQL_KINDS = ('disorders', 'hpo_terms', 'genes', 'hpo_associations')
+
 class XMLToPostgresLoader:
     def __init__(self, connection_string):
         self.conn = psycopg2.connect(connection_string)
         self.cursor = self.conn.cursor()
 
+    # Record sink interface (see orphanet_extract.RecordSink)
+
+    name = 'postgres'
+
+    def write(self, batch):
+        """Insert one record batch of the kinds insert_data handles"""
+        if batch.kind in SQL_KINDS:
+            self.insert_data({batch.kind: batch.rows})
+
+    def close(self):
+        """Close database connection"""
+        self.cursor.close()
+        self.conn.close()
+
+    @staticmethod
+    def project(rows, fields):
+        """Rows reduced to the given fields"""
+        return [{field: row[field] for field in fields} for row in rows]
+
     def parse_clinical_signs_xml(self, xml_file):
         """Parse Clinical signs and symptoms XML"""
-        tree = ET.parse(xml_file)
-        root = tree.getroot()
-
-        disorders = []
-        hpo_terms = []
-        associations = []
-
-        for disorder_elem in root.findall('.//Disorder'):
-            # Extract disorder info
-            disorder_id = disorder_elem.get('id')
-            orpha_code = disorder_elem.find('OrphaCode').text if disorder_elem.find('OrphaCode') is not None else None
-            name = disorder_elem.find('Name').text if disorder_elem.find('Name') is not None else None
-
-            disorders.append({
-                'orpha_code': orpha_code,
-                'name': name,
-                'external_id': disorder_id
-            })
-
-            # Extract HPO associations
-            hpo_list = disorder_elem.find('HPODisorderAssociationList')
-            if hpo_list is not None:
-                for hpo_assoc in hpo_list.findall('HPODisorderAssociation'):
-                    hpo_elem = hpo_assoc.find('HPO')
-                    if hpo_elem is not None:
-                        hpo_id = hpo_elem.find('HPOId').text if hpo_elem.find('HPOId') is not None else None
-                        hpo_term = hpo_elem.find('HPOTerm').text if hpo_elem.find('HPOTerm') is not None else None
-                        frequency = hpo_elem.find('HPOFrequency').text if hpo_elem.find('HPOFrequency') is not None else None
-
-                        hpo_terms.append({
-                            'hpo_id': hpo_id,
-                            'term': hpo_term
-                        })
-
-                        associations.append({
-                            'disorder_orpha_code': orpha_code,
-                            'hpo_id': hpo_id,
-                            'frequency': frequency
-                        })
+        records = extract_records(xml_file, ('disorders', 'hpo_terms', 'hpo_associations'))
+
+        disorders = self.project(records['disorders'], ('orpha_code', 'name', 'external_id'))
+        hpo_terms = self.project(records['hpo_terms'], ('hpo_id', 'term'))
+        associations = self.project(records['hpo_associations'], ('disorder_orpha_code', 'hpo_id', 'frequency'))
 
         return disorders, hpo_terms, associations
 
     def parse_epidemiology_xml(self, xml_file):
         """Parse Epidemiology XML"""
-        tree = ET.parse(xml_file)
-        root = tree.getroot()
-
-        prevalences = []
-
-        for disorder_elem in root.findall('.//Disorder'):
-            orpha_code = disorder_elem.find('OrphaCode').text if disorder_elem.find('OrphaCode') is not None else None
-
-            prev_list = disorder_elem.find('PrevalenceList')
-            if prev_list is not None:
-                for prev_elem in prev_list.findall('Prevalence'):
-                    prevalence_data = {
-                        'disorder_orpha_code': orpha_code,
-                        'prevalence_type': prev_elem.find('PrevalenceType').text if prev_elem.find('PrevalenceType') is not None else None,
-                        'prevalence_class': prev_elem.find('PrevalenceClass').text if prev_elem.find('PrevalenceClass') is not None else None,
-                        'val_moy': prev_elem.find('ValMoy').text if prev_elem.find('ValMoy') is not None else None,
-                        'geographic_area': prev_elem.find('PrevalenceGeographic').text if prev_elem.find('PrevalenceGeographic') is not None else None,
-                        'source': prev_elem.find('Source').text if prev_elem.find('Source') is not None else None
-                    }
-                    prevalences.append(prevalence_data)
+        records = extract_records(xml_file, ('prevalences',))
 
-        return prevalences
+        return self.project(records['prevalences'], ('disorder_orpha_code', 'prevalence_type', 'prevalence_class',
+                                                     'val_moy', 'geographic_area', 'source'))
 
     def parse_genes_xml(self, xml_file):
         """Parse Genes XML"""
-        tree = ET.parse(xml_file)
-        root = tree.getroot()
-
-        genes = []
-        gene_associations = []
-
-        for disorder_elem in root.findall('.//Disorder'):
-            orpha_code = disorder_elem.find('OrphaCode').text if disorder_elem.find('OrphaCode') is not None else None
-
-            gene_assoc_list = disorder_elem.find('DisorderGeneAssociationList')
-            if gene_assoc_list is not None:
-                for gene_assoc in gene_assoc_list.findall('DisorderGeneAssociation'):
-                    gene_elem = gene_assoc.find('Gene')
-                    if gene_elem is not None:
-                        symbol = gene_elem.find('Symbol').text if gene_elem.find('Symbol') is not None else None
-                        name = gene_elem.find('Name').text if gene_elem.find('Name') is not None else None
-                        gene_type = gene_elem.find('GeneType').text if gene_elem.find('GeneType') is not None else None
-
-                        locus_elem = gene_elem.find('LocusList/Locus')
-                        locus = locus_elem.find('GeneLocus').text if locus_elem and locus_elem.find('GeneLocus') is not None else None
-
-                        genes.append({
-                            'symbol': symbol,
-                            'name': name,
-                            'gene_type': gene_type,
-                            'locus': locus
-                        })
-
-                        assoc_type = gene_assoc.find('DisorderGeneAssociationType').text if gene_assoc.find('DisorderGeneAssociationType') is not None else None
-                        assoc_status = gene_assoc.find('DisorderGeneAssociationStatus').text if gene_assoc.find('DisorderGeneAssociationStatus') is not None else None
-
-                        gene_associations.append({
-                            'disorder_orpha_code': orpha_code,
-                            'gene_symbol': symbol,
-                            'association_type': assoc_type,
-                            'association_status': assoc_status
-                        })
+        records = extract_records(xml_file, ('genes', 'gene_associations'))
+
+        genes = self.project(records['genes'], ('symbol', 'name', 'gene_type', 'locus'))
+        gene_associations = self.project(records['gene_associations'], ('disorder_orpha_code', 'gene_symbol',
+                                                                         'association_type', 'association_status'))
 
         return genes, gene_associations
 
@@ -187,7 +126,7 @@ def main():
 
     loader = XMLToPostgresLoader(conn_string)
 
-    # Parse each XML file
+    # XML files to load
     xml_files = {
         'clinical_signs': 'file/Clinical signs and symptoms in rare diseases.xml.xml',
         'epidemiology': 'file/Epidiemology of rare diseases.xml',
@@ -195,35 +134,9 @@ def main():
         # Add other files...
     }
 
-    all_data = {
-        'disorders': [],
-        'hpo_terms': [],
-        'hpo_associations': [],
-        'genes': [],
-        'gene_associations': [],
-        'prevalences': []
-    }
-
-    # Parse clinical signs
-    if os.path.exists(xml_files['clinical_signs']):
-        disorders, hpo_terms, associations = loader.parse_clinical_signs_xml(xml_files['clinical_signs'])
-        all_data['disorders'].extend(disorders)
-        all_data['hpo_terms'].extend(hpo_terms)
-        all_data['hpo_associations'].extend(associations)
-
-    # Parse epidemiology
-    if os.path.exists(xml_files['epidemiology']):
-        prevalences = loader.parse_epidemiology_xml(xml_files['epidemiology'])
-        all_data['prevalences'].extend(prevalences)
-
-    # Parse genes
-    if os.path.exists(xml_files['genes']):
-        genes, gene_associations = loader.parse_genes_xml(xml_files['genes'])
-        all_data['genes'].extend(genes)
-        all_data['gene_associations'].extend(gene_associations)
-
-    # Insert all data
-    loader.insert_data(all_data)
+    # One pass per file, each batch inserted as soon as it is extracted
+    existing = [xml_file for xml_file in xml_files.values() if os.path.exists(xml_file)]
+    run_extraction(existing, [loader], kinds=SQL_KINDS)
 
 if __name__ == "__main__":
     main()
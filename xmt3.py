@@ -1,4 +1,3 @@
-import xml.etree.ElementTree as ET
 import os
 import logging
 import time
@@ -8,6 +7,8 @@ from typing import List, Dict, Any
 import requests
 from datetime import datetime
 
+from orphanet_extract import extract_records
+
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -107,61 +108,23 @@ class SupabaseXMLLoader:
             return [], [], []
 
         try:
-            tree = ET.parse(xml_file)
-            root = tree.getroot()
-
-            disorders = []
-            hpo_terms = []
-            associations = []
-
-            disorder_count = 0
-            for disorder_elem in root.findall('.//Disorder'):
-                disorder_count += 1
-                if disorder_count % 1000 == 0:
-                    logger.info(f"Processed {disorder_count} disorders...")
-
-                # Extract disorder info
-                disorder_id = disorder_elem.get('id')
-                orpha_code_elem = disorder_elem.find('OrphaCode')
-                name_elem = disorder_elem.find('Name')
-                expert_link_elem = disorder_elem.find('ExpertLink')
-
-                orpha_code = orpha_code_elem.text if orpha_code_elem is not None else None
-                name = name_elem.text if name_elem is not None else None
-                expert_link = expert_link_elem.text if expert_link_elem is not None else None
-
-                if orpha_code and name:
-                    disorders.append({
-                        'orpha_code': orpha_code,
-                        'name': name[:150],  # Truncate to fit database field
-                        'expert_link': expert_link
-                    })
-
-                # Extract HPO associations
-                hpo_list = disorder_elem.find('HPODisorderAssociationList')
-                if hpo_list is not None:
-                    for hpo_assoc in hpo_list.findall('HPODisorderAssociation'):
-                        hpo_elem = hpo_assoc.find('HPO')
-                        if hpo_elem is not None:
-                            hpo_id_elem = hpo_elem.find('HPOId')
-                            hpo_term_elem = hpo_elem.find('HPOTerm')
-                            hpo_freq_elem = hpo_elem.find('HPOFrequency')
-
-                            hpo_id = hpo_id_elem.text if hpo_id_elem is not None else None
-                            hpo_term = hpo_term_elem.text if hpo_term_elem is not None else None
-                            frequency = hpo_freq_elem.text if hpo_freq_elem is not None else None
-
-                            if hpo_id and hpo_term:
-                                hpo_terms.append({
-                                    'hpo_id': hpo_id,
-                                    'term': hpo_term[:120]
-                                })
-
-                                associations.append({
-                                    'disorder_orpha_code': orpha_code,
-                                    'hpo_id': hpo_id,
-                                    'frequency': frequency
-                                })
+            records = extract_records(xml_file, ('disorders', 'hpo_terms', 'hpo_associations'))
+
+            disorders = [
+                {
+                    'orpha_code': d['orpha_code'],
+                    'name': d['name'][:150],  # Truncate to fit database field
+                    'expert_link': d['expert_link']
+                }
+                for d in records['disorders'] if d['orpha_code'] and d['name']
+            ]
+            hpo_terms = [{'hpo_id': h['hpo_id'], 'term': h['term'][:120]}
+                         for h in records['hpo_terms'] if h['hpo_id'] and h['term']]
+            known_terms = {h['hpo_id'] for h in hpo_terms}
+            associations = [
+                {'disorder_orpha_code': a['disorder_orpha_code'], 'hpo_id': a['hpo_id'], 'frequency': a['frequency']}
+                for a in records['hpo_associations'] if a['hpo_id'] in known_terms
+            ]
 
             logger.info(f"Parsed {len(disorders)} disorders, {len(hpo_terms)} HPO terms, {len(associations)} associations")
             return disorders, hpo_terms, associations
@@ -179,30 +142,11 @@ class SupabaseXMLLoader:
             return []
 
         try:
-            tree = ET.parse(xml_file)
-            root = tree.getroot()
-
-            prevalences = []
-
-            for disorder_elem in root.findall('.//Disorder'):
-                orpha_code_elem = disorder_elem.find('OrphaCode')
-                orpha_code = orpha_code_elem.text if orpha_code_elem is not None else None
-
-                if not orpha_code:
-                    continue
-
-                prev_list = disorder_elem.find('PrevalenceList')
-                if prev_list is not None:
-                    for prev_elem in prev_list.findall('Prevalence'):
-                        prevalence_data = {
-                            'disorder_orpha_code': orpha_code,
-                            'prevalence_type': self.safe_get_text(prev_elem, 'PrevalenceType'),
-                            'prevalence_class': self.safe_get_text(prev_elem, 'PrevalenceClass'),
-                            'val_moy': self.safe_get_text(prev_elem, 'ValMoy'),
-                            'geographic_area': self.safe_get_text(prev_elem, 'PrevalenceGeographic'),
-                            'source': self.safe_get_text(prev_elem, 'Source')
-                        }
-                        prevalences.append(prevalence_data)
+            prevalences = [
+                {field: p[field] for field in ('disorder_orpha_code', 'prevalence_type', 'prevalence_class',
+                                               'val_moy', 'geographic_area', 'source')}
+                for p in extract_records(xml_file, ('prevalences',))['prevalences'] if p['disorder_orpha_code']
+            ]
 
             logger.info(f"Parsed {len(prevalences)} prevalence records")
             return prevalences
@@ -211,11 +155,6 @@ class SupabaseXMLLoader:
             logger.error(f"Error parsing epidemiology XML: {e}")
             return []
 
-    def safe_get_text(self, parent, tag_name):
-        """Safely get text from XML element"""
-        elem = parent.find(tag_name)
-        return elem.text if elem is not None else None
-
     def insert_disorders(self, disorders: List[Dict], batch_size: int = 100):
         """Insert disorders using Supabase API"""
         logger.info(f"Inserting {len(disorders)} disorders...")
@@ -1,21 +1,36 @@
-import xml.etree.ElementTree as ET
 import os
 import logging
 import time
 from supabase import create_client, Client
 import json
-from typing import List, Dict, Any, Set
+from typing import List, Dict, Any, Optional, Set
 from collections import defaultdict
 
+from orphanet_extract import OrphanetExtractor, RecordBatch, run_extraction
+
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Lookup record kinds, collected in a first pass so the main tables can reference them
+LOOKUP_KINDS = ('disorder_types', 'disorder_groups', 'age_of_onset_types', 'inheritance_types')
+
+# Record kinds streamed into the database from the clinical signs and genes products
+CLINICAL_SIGNS_KINDS = ('disorders', 'hpo_terms', 'hpo_associations')
+GENE_KINDS = ('genes', 'gene_synonyms', 'gene_external_refs', 'gene_associations')
+
 class CompleteSupabaseXMLLoader:
+    """Loads the Orphanet XML products into Supabase; as a record sink it inserts each extracted batch"""
+
+    name = 'supabase'
+
     def __init__(self, supabase_url: str, supabase_key: str):
         """Initialize Supabase client"""
         self.supabase_url = supabase_url
         self.supabase_key = supabase_key
+        self.lookup_mappings: Dict = {}
+        self._hpo_ids: Set[str] = set()  # HPO terms inserted so far, referenced by associations
+        self._gene_symbols: Set[str] = set()  # Genes inserted so far, referenced by synonyms and refs
 
         try:
             self.supabase: Client = create_client(supabase_url, supabase_key)
@@ -205,72 +220,55 @@ class CompleteSupabaseXMLLoader:
         logger.info(f"Database schema preparation completed ({success_count}/{len(sql_commands)} commands)")
 
     def collect_all_lookup_data(self, xml_files: List[str]):
-        """Collect all unique values for lookup tables from all XML files"""
+        """Collect all unique values for lookup tables, streaming only the lookup records of each XML file"""
         logger.info("Collecting lookup data from all XML files...")
 
-        disorder_types = set()
-        disorder_groups = set()
-        age_of_onset_types = set()
-        inheritance_types = set()
+        lookups = {
+            'disorder_types': ('Type', set()),
+            'disorder_groups': ('Group', set()),
+            'age_of_onset_types': ('Onset', set()),
+            'inheritance_types': ('Inheritance', set())
+        }
 
+        extractor = OrphanetExtractor()
         for xml_file in xml_files:
-            if not os.path.exists(xml_file):
-                logger.warning(f"XML file not found: {xml_file}")
-                continue
-
             try:
-                tree = ET.parse(xml_file)
-                root = tree.getroot()
-
-                # Collect disorder types and groups
-                for disorder_elem in root.findall('.//Disorder'):
-                    # Disorder type
-                    disorder_type_elem = disorder_elem.find('DisorderType')
-                    if disorder_type_elem is not None:
-                        type_id = disorder_type_elem.get('id')
-                        type_name = disorder_type_elem.text or f"Type_{type_id}"
-                        if type_name:
-                            disorder_types.add((type_name, type_id))
-
-                    # Disorder group
-                    disorder_group_elem = disorder_elem.find('DisorderGroup')
-                    if disorder_group_elem is not None:
-                        group_id = disorder_group_elem.get('id')
-                        group_name = disorder_group_elem.text or f"Group_{group_id}"
-                        if group_name:
-                            disorder_groups.add((group_name, group_id))
-
-                # Collect age of onset types
-                for onset_elem in root.findall('.//AverageAgeOfOnset'):
-                    onset_id = onset_elem.get('id')
-                    onset_name = onset_elem.text or f"Onset_{onset_id}"
-                    if onset_name:
-                        age_of_onset_types.add((onset_name, onset_id))
-
-                # Collect inheritance types
-                for inherit_elem in root.findall('.//TypeOfInheritance'):
-                    inherit_id = inherit_elem.get('id')
-                    inherit_name = inherit_elem.text or f"Inheritance_{inherit_id}"
-                    if inherit_name:
-                        inheritance_types.add((inherit_name, inherit_id))
-
-                logger.info(f"Processed lookup data from {xml_file}")
-
+                for batch in extractor.iter_batches(xml_file, LOOKUP_KINDS):
+                    prefix, values = lookups[batch.kind]
+                    for row in batch.rows:
+                        values.add((row['name'] or f"{prefix}_{row['external_id']}", row['external_id']))
             except Exception as e:
                 logger.error(f"Error collecting lookup data from {xml_file}: {e}")
 
         logger.info(f"Collected lookup data:")
-        logger.info(f"  Disorder types: {len(disorder_types)}")
-        logger.info(f"  Disorder groups: {len(disorder_groups)}")
-        logger.info(f"  Age of onset types: {len(age_of_onset_types)}")
-        logger.info(f"  Inheritance types: {len(inheritance_types)}")
-
-        return {
-            'disorder_types': list(disorder_types),
-            'disorder_groups': list(disorder_groups),
-            'age_of_onset_types': list(age_of_onset_types),
-            'inheritance_types': list(inheritance_types)
-        }
+        logger.info(f"  Disorder types: {len(lookups['disorder_types'][1])}")
+        logger.info(f"  Disorder groups: {len(lookups['disorder_groups'][1])}")
+        logger.info(f"  Age of onset types: {len(lookups['age_of_onset_types'][1])}")
+        logger.info(f"  Inheritance types: {len(lookups['inheritance_types'][1])}")
+
+        return {kind: list(values) for kind, (_, values) in lookups.items()}
+
+    def write(self, batch: RecordBatch):
+        """Insert one batch of clinical signs or gene records; lookup_mappings must be fetched first"""
+        records = {batch.kind: batch.rows}
+        if batch.kind in CLINICAL_SIGNS_KINDS:
+            disorders, hpo_terms, associations = self.parse_clinical_signs_xml_enhanced(
+                records, self.lookup_mappings, self._hpo_ids
+            )
+            if disorders:
+                self.insert_disorders_enhanced(disorders)
+            if hpo_terms:
+                self.insert_hpo_terms(hpo_terms)
+            if associations:
+                self.insert_hpo_associations(associations)
+
+        elif batch.kind in GENE_KINDS:
+            genes, synonyms, ext_refs, gene_assocs = self.parse_genes_xml_enhanced(records, self._gene_symbols)
+            if genes or synonyms or ext_refs or gene_assocs:
+                self.insert_genes_complete(genes, synonyms, ext_refs, gene_assocs)
+
+    def close(self):
+        pass
 
     def insert_lookup_tables(self, lookup_data: Dict):
         """Insert data into all lookup tables"""
@@ -368,196 +366,54 @@ class CompleteSupabaseXMLLoader:
 
         return mappings
 
-    def parse_clinical_signs_xml_enhanced(self, xml_file: str, lookup_mappings: Dict):
-        """Enhanced parsing with proper foreign key references"""
-        logger.info(f"Parsing clinical signs XML with enhanced mapping: {xml_file}")
-
-        if not os.path.exists(xml_file):
-            logger.error(f"File not found: {xml_file}")
-            return {}, [], []
-
-        try:
-            tree = ET.parse(xml_file)
-            root = tree.getroot()
-
-            disorders = []
-            hpo_terms = []
-            associations = []
-
-            disorder_count = 0
-            for disorder_elem in root.findall('.//Disorder'):
-                disorder_count += 1
-                if disorder_count % 1000 == 0:
-                    logger.info(f"Processed {disorder_count} disorders...")
-
-                # Extract disorder info with foreign keys
-                disorder_id = disorder_elem.get('id')
-                orpha_code_elem = disorder_elem.find('OrphaCode')
-                name_elem = disorder_elem.find('Name')
-                expert_link_elem = disorder_elem.find('ExpertLink')
-                disorder_type_elem = disorder_elem.find('DisorderType')
-                disorder_group_elem = disorder_elem.find('DisorderGroup')
-
-                orpha_code = orpha_code_elem.text if orpha_code_elem is not None else None
-                name = name_elem.text if name_elem is not None else None
-                expert_link = expert_link_elem.text if expert_link_elem is not None else None
-
-                # Get foreign key IDs
-                disorder_type_id = None
-                if disorder_type_elem is not None:
-                    type_ext_id = disorder_type_elem.get('id')
-                    disorder_type_id = lookup_mappings['disorder_types'].get(type_ext_id)
-
-                disorder_group_id = None
-                if disorder_group_elem is not None:
-                    group_ext_id = disorder_group_elem.get('id')
-                    disorder_group_id = lookup_mappings['disorder_groups'].get(group_ext_id)
-
-                if orpha_code and name:
-                    disorder_data = {
-                        'orpha_code': orpha_code,
-                        'name': name[:150],
-                        'expert_link': expert_link,
-                        'disorder_type_id': disorder_type_id,
-                        'disorder_group_id': disorder_group_id
-                    }
-                    disorders.append(disorder_data)
-
-                # Extract HPO associations (same as before)
-                hpo_list = disorder_elem.find('HPODisorderAssociationList')
-                if hpo_list is not None:
-                    for hpo_assoc in hpo_list.findall('HPODisorderAssociation'):
-                        hpo_elem = hpo_assoc.find('HPO')
-                        if hpo_elem is not None:
-                            hpo_id_elem = hpo_elem.find('HPOId')
-                            hpo_term_elem = hpo_elem.find('HPOTerm')
-                            hpo_freq_elem = hpo_elem.find('HPOFrequency')
-
-                            hpo_id = hpo_id_elem.text if hpo_id_elem is not None else None
-                            hpo_term = hpo_term_elem.text if hpo_term_elem is not None else None
-                            frequency = hpo_freq_elem.text if hpo_freq_elem is not None else None
-
-                            if hpo_id and hpo_term:
-                                hpo_terms.append({
-                                    'hpo_id': hpo_id,
-                                    'term': hpo_term[:120]
-                                })
-
-                                associations.append({
-                                    'disorder_orpha_code': orpha_code,
-                                    'hpo_id': hpo_id,
-                                    'frequency': frequency
-                                })
-
-            logger.info(f"Enhanced parsing completed: {len(disorders)} disorders, {len(hpo_terms)} HPO terms, {len(associations)} associations")
-            return disorders, hpo_terms, associations
+    def parse_clinical_signs_xml_enhanced(self, records: Dict[str, List[Dict]], lookup_mappings: Dict,
+                                          known_terms: Optional[Set[str]] = None):
+        """
+        Enhanced parsing of extracted clinical signs records with proper foreign key references.
+        Associations are kept for the HPO terms in records or known_terms, which gains the new terms.
+        """
+        disorders = [
+            {
+                'orpha_code': d['orpha_code'],
+                'name': d['name'][:150],
+                'expert_link': d['expert_link'],
+                'disorder_type_id': lookup_mappings['disorder_types'].get(d['disorder_type_external_id']),
+                'disorder_group_id': lookup_mappings['disorder_groups'].get(d['disorder_group_external_id'])
+            }
+            for d in records.get('disorders', []) if d['orpha_code'] and d['name']
+        ]
 
-        except Exception as e:
-            logger.error(f"Error in enhanced parsing: {e}")
-            return [], [], []
+        hpo_terms = [{'hpo_id': h['hpo_id'], 'term': h['term'][:120]}
+                     for h in records.get('hpo_terms', []) if h['hpo_id'] and h['term']]
+        known_terms = set() if known_terms is None else known_terms
+        known_terms.update(h['hpo_id'] for h in hpo_terms)
+        associations = [
+            {'disorder_orpha_code': a['disorder_orpha_code'], 'hpo_id': a['hpo_id'], 'frequency': a['frequency']}
+            for a in records.get('hpo_associations', []) if a['hpo_id'] in known_terms
+        ]
 
-    def parse_genes_xml_enhanced(self, xml_file: str):
-        """Parse genes XML with complete gene information"""
-        logger.info(f"Parsing genes XML: {xml_file}")
+        logger.info(f"Enhanced parsing completed: {len(disorders)} disorders, {len(hpo_terms)} HPO terms, {len(associations)} associations")
+        return disorders, hpo_terms, associations
 
-        if not os.path.exists(xml_file):
-            logger.error(f"File not found: {xml_file}")
-            return [], [], [], []
+    def parse_genes_xml_enhanced(self, records: Dict[str, List[Dict]], symbols: Optional[Set[str]] = None):
+        """Complete gene information from extracted genes records, for the genes in records or symbols (updated)"""
+        genes = [g for g in records.get('genes', []) if g['symbol']]
+        symbols = set() if symbols is None else symbols
+        symbols.update(g['symbol'] for g in genes)
 
-        try:
-            tree = ET.parse(xml_file)
-            root = tree.getroot()
-
-            genes = []
-            gene_synonyms = []
-            gene_external_refs = []
-            gene_associations = []
-
-            for disorder_elem in root.findall('.//Disorder'):
-                orpha_code_elem = disorder_elem.find('OrphaCode')
-                orpha_code = orpha_code_elem.text if orpha_code_elem is not None else None
-
-                if not orpha_code:
-                    continue
-
-                gene_assoc_list = disorder_elem.find('DisorderGeneAssociationList')
-                if gene_assoc_list is not None:
-                    for gene_assoc in gene_assoc_list.findall('DisorderGeneAssociation'):
-                        gene_elem = gene_assoc.find('Gene')
-                        if gene_elem is not None:
-                            # Gene basic info
-                            symbol_elem = gene_elem.find('Symbol')
-                            name_elem = gene_elem.find('Name')
-                            gene_type_elem = gene_elem.find('GeneType')
-
-                            symbol = symbol_elem.text if symbol_elem is not None else None
-                            name = name_elem.text if name_elem is not None else None
-                            gene_type = gene_type_elem.text if gene_type_elem is not None else None
-
-                            # Gene locus info
-                            locus_list = gene_elem.find('LocusList')
-                            locus = None
-                            locus_key = None
-                            if locus_list is not None:
-                                locus_elem = locus_list.find('Locus')
-                                if locus_elem is not None:
-                                    gene_locus_elem = locus_elem.find('GeneLocus')
-                                    locus_key_elem = locus_elem.find('LocusKey')
-                                    locus = gene_locus_elem.text if gene_locus_elem is not None else None
-                                    locus_key = locus_key_elem.text if locus_key_elem is not None else None
-
-                            if symbol:
-                                genes.append({
-                                    'symbol': symbol,
-                                    'name': name,
-                                    'gene_type': gene_type,
-                                    'locus': locus,
-                                    'locus_key': locus_key
-                                })
-
-                                # Gene synonyms
-                                synonym_list = gene_elem.find('SynonymList')
-                                if synonym_list is not None:
-                                    for synonym_elem in synonym_list.findall('Synonym'):
-                                        if synonym_elem.text:
-                                            gene_synonyms.append({
-                                                'gene_symbol': symbol,
-                                                'synonym': synonym_elem.text
-                                            })
-
-                                # External references
-                                ext_ref_list = gene_elem.find('ExternalReferenceList')
-                                if ext_ref_list is not None:
-                                    for ext_ref in ext_ref_list.findall('ExternalReference'):
-                                        source_elem = ext_ref.find('Source')
-                                        reference_elem = ext_ref.find('Reference')
-                                        if source_elem is not None and reference_elem is not None:
-                                            gene_external_refs.append({
-                                                'gene_symbol': symbol,
-                                                'source': source_elem.text,
-                                                'reference': reference_elem.text,
-                                                'external_id': ext_ref.get('id')
-                                            })
-
-                                # Gene-disorder association
-                                assoc_type_elem = gene_assoc.find('DisorderGeneAssociationType')
-                                assoc_status_elem = gene_assoc.find('DisorderGeneAssociationStatus')
-                                source_validation_elem = gene_assoc.find('SourceOfValidation')
-
-                                gene_associations.append({
-                                    'disorder_orpha_code': orpha_code,
-                                    'gene_symbol': symbol,
-                                    'association_type': assoc_type_elem.text if assoc_type_elem is not None else None,
-                                    'association_status': assoc_status_elem.text if assoc_status_elem is not None else None,
-                                    'source_of_validation': source_validation_elem.text if source_validation_elem is not None else None
-                                })
-
-            logger.info(f"Parsed genes: {len(genes)} genes, {len(gene_synonyms)} synonyms, {len(gene_external_refs)} external refs, {len(gene_associations)} associations")
-            return genes, gene_synonyms, gene_external_refs, gene_associations
+        gene_synonyms = [s for s in records.get('gene_synonyms', []) if s['gene_symbol'] in symbols]
+        gene_external_refs = [
+            r for r in records.get('gene_external_refs', [])
+            if r['gene_symbol'] in symbols and r['source'] is not None and r['reference'] is not None
+        ]
+        gene_associations = [
+            {field: a[field] for field in ('disorder_orpha_code', 'gene_symbol', 'association_type',
+                                           'association_status', 'source_of_validation')}
+            for a in records.get('gene_associations', []) if a['gene_symbol'] in symbols and a['disorder_orpha_code']
+        ]
 
-        except Exception as e:
-            logger.error(f"Error parsing genes XML: {e}")
-            return [], [], [], []
+        logger.info(f"Parsed genes: {len(genes)} genes, {len(gene_synonyms)} synonyms, {len(gene_external_refs)} external refs, {len(gene_associations)} associations")
+        return genes, gene_synonyms, gene_external_refs, gene_associations
 
     def insert_disorders_enhanced(self, disorders: List[Dict], batch_size: int = 100):
         """Insert disorders with foreign key references"""
@@ -694,77 +550,44 @@ def main():
             'file/natural history of rare diseases.xml',
         ]
 
-        # Step 3: Collect and insert lookup data
+        # Step 3: Collect and insert lookup data, streamed from every file
+        for xml_file in [f for f in xml_files if not os.path.exists(f)]:
+            logger.warning(f"XML file not found: {xml_file}")
+        xml_files = [xml_file for xml_file in xml_files if os.path.exists(xml_file)]
         lookup_data = loader.collect_all_lookup_data(xml_files)
         loader.insert_lookup_tables(lookup_data)
 
         # Step 4: Get lookup mappings
-        lookup_mappings = loader.get_lookup_mappings()
-
-        # Step 5: Parse and insert main data with proper foreign keys
-        all_data = {
-            'disorders': [],
-            'hpo_terms': [],
-            'hpo_associations': [],
-            'genes': [],
-            'gene_synonyms': [],
-            'gene_external_refs': [],
-            'gene_associations': []
-        }
+        loader.lookup_mappings = loader.get_lookup_mappings()
+
+        # Step 5: Stream the main records into the database, batch by batch, with proper foreign keys
+        all_data = {}
 
         # Process each file
         for xml_file in xml_files:
-            if os.path.exists(xml_file):
-                logger.info(f"Processing {xml_file}...")
-
-                if 'Clinical signs' in xml_file:
-                    disorders, hpo_terms, associations = loader.parse_clinical_signs_xml_enhanced(xml_file, lookup_mappings)
-                    all_data['disorders'].extend(disorders)
-                    all_data['hpo_terms'].extend(hpo_terms)
-                    all_data['hpo_associations'].extend(associations)
-
-                elif 'Genes' in xml_file:
-                    genes, synonyms, ext_refs, gene_assocs = loader.parse_genes_xml_enhanced(xml_file)
-                    all_data['genes'].extend(genes)
-                    all_data['gene_synonyms'].extend(synonyms)
-                    all_data['gene_external_refs'].extend(ext_refs)
-                    all_data['gene_associations'].extend(gene_assocs)
-
-                elif 'Epidiemology' in xml_file or 'Epidemiology' in xml_file:
-                    prevalences = loader.parse_epidemiology_xml(xml_file)
-                    all_data['prevalences'] = prevalences
-
-                elif 'natural history' in xml_file:
-                    # Parse natural history data (age of onset, inheritance)
-                    age_onset_data, inheritance_data = loader.parse_natural_history_xml(xml_file)
-                    all_data['age_onset_associations'] = age_onset_data
-                    all_data['inheritance_associations'] = inheritance_data
-            else:
-                logger.warning(f"File not found: {xml_file}")
-
-        # Step 6: Insert all main data
-        if all_data['disorders']:
-            loader.insert_disorders_enhanced(all_data['disorders'])
-
-        if all_data['hpo_terms']:
-            loader.insert_hpo_terms(all_data['hpo_terms'])
-
-        if all_data['genes']:
-            loader.insert_genes_complete(
-                all_data['genes'],
-                all_data['gene_synonyms'],
-                all_data['gene_external_refs'],
-                all_data['gene_associations']
-            )
+            logger.info(f"Processing {xml_file}...")
+
+            if 'Clinical signs' in xml_file:
+                run_extraction([xml_file], [loader], CLINICAL_SIGNS_KINDS)
+
+            elif 'Genes' in xml_file:
+                run_extraction([xml_file], [loader], GENE_KINDS)
+
+            elif 'Epidiemology' in xml_file or 'Epidemiology' in xml_file:
+                prevalences = loader.parse_epidemiology_xml(xml_file)
+                all_data['prevalences'] = prevalences
 
-        if all_data['hpo_associations']:
-            loader.insert_hpo_associations(all_data['hpo_associations'])
+            elif 'natural history' in xml_file:
+                # Parse natural history data (age of onset, inheritance)
+                age_onset_data, inheritance_data = loader.parse_natural_history_xml(xml_file)
+                all_data['age_onset_associations'] = age_onset_data
+                all_data['inheritance_associations'] = inheritance_data
 
-        # Step 7: Insert additional associations if available
+        # Step 6: Insert additional associations if available
         if 'prevalences' in all_data and all_data['prevalences']:
             loader.insert_prevalences_with_mapping(all_data['prevalences'])
 
-        # Step 8: Get final comprehensive statistics
+        # Step 7: Get final comprehensive statistics
         loader.get_comprehensive_stats()
 
         logger.info("Complete data loading finished successfully!")